@@ -1,4 +1,6 @@
 import { useQuery, useMutation } from "@tanstack/react-query";
+import { usePaginatedQuery } from "@/hooks/usePaginatedQuery";
+import { LoadMore } from "@/components/load-more";
 import { apiRequest, queryClient } from "@/lib/queryClient";
 import { Card } from "@/components/ui/card";
 import { Button } from "@/components/ui/button";
@@ -12,22 +14,25 @@ import {
 } from "@/components/ui/table";
 import { useToast } from "@/hooks/use-toast";
 import { Loader2, Check, X, ExternalLink } from "lucide-react";
-import type { BalanceRequest, PaymentMethod } from "@shared/schema";
+import { normalizeAmount, convertToUsd, type BalanceRequestWithUser, type Page, type PaymentMethod } from "@shared/schema";
 
-interface ExtendedBalanceRequest extends BalanceRequest {
-  user?: {
-    username: string;
-    email: string;
-  };
-  paymentMethod?: PaymentMethod;
+type ExtendedBalanceRequest = BalanceRequestWithUser;
+
+interface BalanceRequestPage extends Page<ExtendedBalanceRequest> {
+  counts: Record<string, number>;
 }
 
 export default function BalanceRequestsTab() {
   const { toast } = useToast();
 
-  const { data: requests = [], isLoading } = useQuery<ExtendedBalanceRequest[]>({
-    queryKey: ["/api/balance-requests"],
-  });
+  const {
+    items: requests,
+    firstPage,
+    isLoading,
+    hasNextPage,
+    fetchNextPage,
+    isFetchingNextPage,
+  } = usePaginatedQuery<ExtendedBalanceRequest, BalanceRequestPage>("/api/balance-requests");
 
   const { data: paymentMethods = [] } = useQuery<PaymentMethod[]>({
     queryKey: ["/api/payment-methods"],
@@ -52,12 +57,12 @@ export default function BalanceRequestsTab() {
     return paymentMethods.find((m) => m.id === id);
   };
 
+  // What approving would credit; null when the server would refuse the amount
   const calculateUsdAmount = (request: ExtendedBalanceRequest) => {
     const method = getPaymentMethodById(request.paymentMethodId);
-    if (!method) return "0.00";
-    const amountSent = parseFloat(request.amountSent);
-    const usdRate = parseFloat(method.usdRate);
-    return (amountSent / usdRate).toFixed(2);
+    const amount = normalizeAmount(request.amountSent);
+    if (!method || !amount) return null;
+    return convertToUsd(amount, method.usdRate);
   };
 
   if (isLoading) {
@@ -68,9 +73,9 @@ export default function BalanceRequestsTab() {
     );
   }
 
-  const pendingCount = requests.filter(r => r.status === 'pending').length;
-  const approvedCount = requests.filter(r => r.status === 'approved').length;
-  const rejectedCount = requests.filter(r => r.status === 'rejected').length;
+  const pendingCount = firstPage?.counts.pending ?? 0;
+  const approvedCount = firstPage?.counts.approved ?? 0;
+  const rejectedCount = firstPage?.counts.rejected ?? 0;
 
   return (
     <div className="space-y-6">
@@ -140,6 +145,7 @@ export default function BalanceRequestsTab() {
             <TableBody>
               {requests.map((request) => {
                 const method = getPaymentMethodById(request.paymentMethodId);
+                const usdAmount = calculateUsdAmount(request);
                 return (
                   <TableRow key={request.id}>
                     <TableCell>
@@ -154,7 +160,7 @@ export default function BalanceRequestsTab() {
                       {request.amountSent} {method?.currency || ""}
                     </TableCell>
                     <TableCell className="font-medium text-green-600 dark:text-green-400">
-                      ${calculateUsdAmount(request)} USD
+                      {usdAmount ? `$${usdAmount} USD` : "—"}
                     </TableCell>
                     <TableCell>
                       <div className="flex items-center gap-2">
@@ -240,6 +246,7 @@ export default function BalanceRequestsTab() {
               })}
             </TableBody>
           </Table>
+          <LoadMore hasNextPage={hasNextPage} isFetchingNextPage={isFetchingNextPage} fetchNextPage={fetchNextPage} />
         </div>
       )}
       </Card>
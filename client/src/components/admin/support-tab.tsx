@@ -1,4 +1,6 @@
-import { useQuery, useMutation } from "@tanstack/react-query";
+import { useMutation } from "@tanstack/react-query";
+import { usePaginatedQuery } from "@/hooks/usePaginatedQuery";
+import { LoadMore } from "@/components/load-more";
 import { apiRequest, queryClient } from "@/lib/queryClient";
 import { Card } from "@/components/ui/card";
 import { Button } from "@/components/ui/button";
@@ -14,39 +16,30 @@ import {
 import { useToast } from "@/hooks/use-toast";
 import { Loader2, MessageSquare, Send, ArrowLeft } from "lucide-react";
 import { useState } from "react";
+import type { SupportConversation, SupportMessageWithUser, UserSummary } from "@shared/schema";
 
-interface User {
-  id: string;
-  username: string;
-  email: string;
-}
-
-interface SupportMessage {
-  id: string;
-  userId: string;
-  message: string;
-  isFromUser: boolean;
-  createdAt: Date;
-  user?: User;
-}
-
-interface UserConversation {
-  userId: string;
-  user: User;
-  messages: SupportMessage[];
-  lastMessage: SupportMessage;
-  unreadCount: number;
-}
+const unknownUser = (userId: string): UserSummary => ({ id: userId, username: "Unknown", email: "Unknown" });
 
 export default function SupportTab() {
   const { toast } = useToast();
   const [selectedUserId, setSelectedUserId] = useState<string | null>(null);
   const [replyMessage, setReplyMessage] = useState("");
 
-  const { data: allMessages = [], isLoading } = useQuery<SupportMessage[]>({
-    queryKey: ["/api/admin/support/messages"],
-    refetchInterval: 5000,
-  });
+  const {
+    items: conversations,
+    isLoading,
+    hasNextPage,
+    fetchNextPage,
+    isFetchingNextPage,
+  } = usePaginatedQuery<SupportConversation>("/api/admin/support/conversations", {}, { refetchInterval: 5000 });
+
+  // Newest first from the server; shown oldest first
+  const messagesQuery = usePaginatedQuery<SupportMessageWithUser>(
+    "/api/admin/support/messages",
+    { userId: selectedUserId ?? undefined },
+    { enabled: !!selectedUserId, refetchInterval: 5000 },
+  );
+  const conversationMessages = [...messagesQuery.items].reverse();
 
   const sendReplyMutation = useMutation({
     mutationFn: async ({ userId, message }: { userId: string; message: string }) => {
@@ -55,6 +48,7 @@ export default function SupportTab() {
     onSuccess: () => {
       setReplyMessage("");
       queryClient.invalidateQueries({ queryKey: ["/api/admin/support/messages"] });
+      queryClient.invalidateQueries({ queryKey: ["/api/admin/support/conversations"] });
       toast({ title: "Success", description: "Reply sent successfully" });
     },
     onError: (error: Error) => {
@@ -62,32 +56,10 @@ export default function SupportTab() {
     },
   });
 
-  // Group messages by user
-  const userConversations: UserConversation[] = Object.values(
-    allMessages.reduce((acc, msg) => {
-      if (!acc[msg.userId]) {
-        acc[msg.userId] = {
-          userId: msg.userId,
-          user: msg.user || { id: msg.userId, username: 'Unknown', email: 'Unknown' },
-          messages: [],
-          lastMessage: msg,
-          unreadCount: 0,
-        };
-      }
-      acc[msg.userId].messages.push(msg);
-      if (new Date(msg.createdAt) > new Date(acc[msg.userId].lastMessage.createdAt)) {
-        acc[msg.userId].lastMessage = msg;
-      }
-      if (msg.isFromUser) {
-        acc[msg.userId].unreadCount++;
-      }
-      return acc;
-    }, {} as Record<string, UserConversation>)
-  ).sort((a, b) => 
-    new Date(b.lastMessage.createdAt).getTime() - new Date(a.lastMessage.createdAt).getTime()
-  );
-
-  const selectedConversation = userConversations.find(c => c.userId === selectedUserId);
+  const selectedConversation = conversations.find(c => c.userId === selectedUserId);
+  const selectedUser = selectedConversation
+    ? selectedConversation.user ?? unknownUser(selectedConversation.userId)
+    : null;
 
   const handleSendReply = (e: React.FormEvent) => {
     e.preventDefault();
@@ -104,7 +76,7 @@ export default function SupportTab() {
     );
   }
 
-  if (selectedConversation) {
+  if (selectedConversation && selectedUser) {
     return (
       <Card className="p-6">
         <div className="mb-6">
@@ -119,43 +91,54 @@ export default function SupportTab() {
           </Button>
           <div className="flex items-center gap-3">
             <div className="h-10 w-10 rounded-full bg-primary text-primary-foreground flex items-center justify-center font-semibold">
-              {selectedConversation.user.username.charAt(0).toUpperCase()}
+              {selectedUser.username.charAt(0).toUpperCase()}
             </div>
             <div>
-              <h2 className="text-xl font-bold">{selectedConversation.user.username}</h2>
-              <p className="text-sm text-muted-foreground">{selectedConversation.user.email}</p>
+              <h2 className="text-xl font-bold">{selectedUser.username}</h2>
+              <p className="text-sm text-muted-foreground">{selectedUser.email}</p>
             </div>
           </div>
         </div>
 
         <div className="border rounded-lg overflow-hidden">
           <div className="h-[400px] overflow-y-auto p-4 space-y-4 bg-muted/30">
-            {selectedConversation.messages
-              .sort((a, b) => new Date(a.createdAt).getTime() - new Date(b.createdAt).getTime())
-              .map((msg) => (
+            {messagesQuery.hasNextPage && (
+              <div className="flex justify-center">
+                <Button
+                  variant="ghost"
+                  size="sm"
+                  onClick={() => messagesQuery.fetchNextPage()}
+                  disabled={messagesQuery.isFetchingNextPage}
+                >
+                  {messagesQuery.isFetchingNextPage && <Loader2 className="h-4 w-4 mr-2 animate-spin" />}
+                  Load earlier messages
+                </Button>
+              </div>
+            )}
+            {conversationMessages.map((msg) => (
+              <div
+                key={msg.id}
+                className={`flex ${msg.isFromUser ? 'justify-start' : 'justify-end'}`}
+              >
                 <div
-                  key={msg.id}
-                  className={`flex ${msg.isFromUser ? 'justify-start' : 'justify-end'}`}
+                  className={`max-w-[70%] rounded-lg p-3 ${
+                    msg.isFromUser
+                      ? 'bg-muted'
+                      : 'bg-primary text-primary-foreground'
+                  }`}
                 >
-                  <div
-                    className={`max-w-[70%] rounded-lg p-3 ${
-                      msg.isFromUser
-                        ? 'bg-muted'
-                        : 'bg-primary text-primary-foreground'
-                    }`}
-                  >
-                    <div className="flex items-center gap-2 mb-1">
-                      <span className="text-xs font-semibold">
-                        {msg.isFromUser ? selectedConversation.user.username : 'Support Team'}
-                      </span>
-                    </div>
-                    <p className="text-sm whitespace-pre-wrap">{msg.message}</p>
-                    <p className="text-xs opacity-70 mt-1">
-                      {new Date(msg.createdAt).toLocaleString()}
-                    </p>
+                  <div className="flex items-center gap-2 mb-1">
+                    <span className="text-xs font-semibold">
+                      {msg.isFromUser ? selectedUser.username : 'Support Team'}
+                    </span>
                   </div>
+                  <p className="text-sm whitespace-pre-wrap">{msg.message}</p>
+                  <p className="text-xs opacity-70 mt-1">
+                    {new Date(msg.createdAt).toLocaleString()}
+                  </p>
                 </div>
-              ))}
+              </div>
+            ))}
           </div>
 
           <form onSubmit={handleSendReply} className="p-4 border-t bg-background">
@@ -201,7 +184,7 @@ export default function SupportTab() {
         </p>
       </div>
 
-      {userConversations.length === 0 ? (
+      {conversations.length === 0 ? (
         <div className="text-center py-8 text-muted-foreground">
           <MessageSquare className="h-12 w-12 mx-auto mb-3 opacity-50" />
           <p>No support conversations yet.</p>
@@ -218,50 +201,54 @@ export default function SupportTab() {
             </TableRow>
           </TableHeader>
           <TableBody>
-            {userConversations.map((conversation) => (
-              <TableRow key={conversation.userId}>
-                <TableCell>
-                  <div className="flex items-center gap-3">
-                    <div className="h-8 w-8 rounded-full bg-primary text-primary-foreground flex items-center justify-center text-xs font-semibold">
-                      {conversation.user.username.charAt(0).toUpperCase()}
-                    </div>
-                    <div>
-                      <div className="font-medium">{conversation.user.username}</div>
-                      <div className="text-sm text-muted-foreground">
-                        {conversation.user.email}
+            {conversations.map((conversation) => {
+              const user = conversation.user ?? unknownUser(conversation.userId);
+              return (
+                <TableRow key={conversation.userId}>
+                  <TableCell>
+                    <div className="flex items-center gap-3">
+                      <div className="h-8 w-8 rounded-full bg-primary text-primary-foreground flex items-center justify-center text-xs font-semibold">
+                        {user.username.charAt(0).toUpperCase()}
+                      </div>
+                      <div>
+                        <div className="font-medium">{user.username}</div>
+                        <div className="text-sm text-muted-foreground">
+                          {user.email}
+                        </div>
                       </div>
                     </div>
-                  </div>
-                </TableCell>
-                <TableCell className="max-w-xs truncate">
-                  {conversation.lastMessage.message}
-                </TableCell>
-                <TableCell>
-                  <span className="text-sm">{conversation.messages.length} messages</span>
-                  {conversation.unreadCount > 0 && (
-                    <span className="ml-2 px-2 py-1 rounded-full text-xs bg-blue-100 text-blue-700">
-                      {conversation.unreadCount} new
-                    </span>
-                  )}
-                </TableCell>
-                <TableCell>
-                  {new Date(conversation.lastMessage.createdAt).toLocaleString()}
-                </TableCell>
-                <TableCell className="text-right">
-                  <Button
-                    variant="outline"
-                    size="sm"
-                    onClick={() => setSelectedUserId(conversation.userId)}
-                  >
-                    <MessageSquare className="h-4 w-4 mr-2" />
-                    View Chat
-                  </Button>
-                </TableCell>
-              </TableRow>
-            ))}
+                  </TableCell>
+                  <TableCell className="max-w-xs truncate">
+                    {conversation.lastMessage.message}
+                  </TableCell>
+                  <TableCell>
+                    <span className="text-sm">{conversation.messageCount} messages</span>
+                    {conversation.fromUserCount > 0 && (
+                      <span className="ml-2 px-2 py-1 rounded-full text-xs bg-blue-100 text-blue-700">
+                        {conversation.fromUserCount} new
+                      </span>
+                    )}
+                  </TableCell>
+                  <TableCell>
+                    {new Date(conversation.lastMessage.createdAt).toLocaleString()}
+                  </TableCell>
+                  <TableCell className="text-right">
+                    <Button
+                      variant="outline"
+                      size="sm"
+                      onClick={() => setSelectedUserId(conversation.userId)}
+                    >
+                      <MessageSquare className="h-4 w-4 mr-2" />
+                      View Chat
+                    </Button>
+                  </TableCell>
+                </TableRow>
+              );
+            })}
           </TableBody>
         </Table>
       )}
+      <LoadMore hasNextPage={hasNextPage} isFetchingNextPage={isFetchingNextPage} fetchNextPage={fetchNextPage} />
     </Card>
   );
 }
@@ -1,5 +1,5 @@
 import { useState } from "react";
-import { useQuery, useMutation } from "@tanstack/react-query";
+import { useMutation } from "@tanstack/react-query";
 import { apiRequest, queryClient } from "@/lib/queryClient";
 import { Card } from "@/components/ui/card";
 import { Input } from "@/components/ui/input";
@@ -23,24 +23,32 @@ import {
 } from "@/components/ui/dialog";
 import { useToast } from "@/hooks/use-toast";
 import { Loader2, Edit, Eye } from "lucide-react";
-import type { User, Repository } from "@shared/schema";
+import type { PublicUser, Repository } from "@shared/schema";
+import { usePaginatedQuery } from "@/hooks/usePaginatedQuery";
+import { LoadMore } from "@/components/load-more";
 import { Badge } from "@/components/ui/badge";
 
 export default function UsersTab() {
   const { toast } = useToast();
-  const [selectedUser, setSelectedUser] = useState<User | null>(null);
+  const [selectedUser, setSelectedUser] = useState<PublicUser | null>(null);
   const [newPassword, setNewPassword] = useState("");
   const [showPasswordDialog, setShowPasswordDialog] = useState(false);
   const [showDetailsDialog, setShowDetailsDialog] = useState(false);
 
-  const { data: users = [], isLoading } = useQuery<User[]>({
-    queryKey: ["/api/admin/users"],
-  });
+  const {
+    items: users,
+    isLoading,
+    hasNextPage,
+    fetchNextPage,
+    isFetchingNextPage,
+  } = usePaginatedQuery<PublicUser>("/api/admin/users");
 
-  const { data: userRepositories = [] } = useQuery<Repository[]>({
-    queryKey: ["/api/admin/users", selectedUser?.id, "repositories"],
-    enabled: !!selectedUser,
-  });
+  const repositoriesQuery = usePaginatedQuery<Repository>(
+    `/api/admin/users/${selectedUser?.id}/repositories`,
+    {},
+    { enabled: !!selectedUser },
+  );
+  const userRepositories = repositoriesQuery.items;
 
   const changePasswordMutation = useMutation({
     mutationFn: async (data: { userId: string; newPassword: string }) => {
@@ -149,6 +157,7 @@ export default function UsersTab() {
             ))}
           </TableBody>
         </Table>
+        <LoadMore hasNextPage={hasNextPage} isFetchingNextPage={isFetchingNextPage} fetchNextPage={fetchNextPage} />
       </Card>
 
       <Dialog open={showPasswordDialog} onOpenChange={setShowPasswordDialog}>
@@ -203,7 +212,7 @@ export default function UsersTab() {
                 </div>
                 <div>
                   <Label>Balance</Label>
-                  <p className="text-sm mt-1">${(selectedUser.balance || 0).toFixed(2)}</p>
+                  <p className="text-sm mt-1">${parseFloat(selectedUser.balance || '0').toFixed(2)}</p>
                 </div>
                 <div>
                   <Label>Joined</Label>
@@ -1,6 +1,7 @@
 import { useState, useRef, useEffect } from "react";
 import { useMutation } from "@tanstack/react-query";
 import { queryClient, apiRequest } from "@/lib/queryClient";
+import { subscribeTopic } from "@/lib/socket";
 import { Button } from "@/components/ui/button";
 import { Card } from "@/components/ui/card";
 import { Input } from "@/components/ui/input";
@@ -62,52 +63,12 @@ export function FilesTab({ repositoryId, files }: FilesTabProps) {
 
   // إضافة مستمع WebSocket لتحديثات الملفات الفورية
   useEffect(() => {
-    const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
-    const wsUrl = `${protocol}//${window.location.host}/ws`;
-    const ws = new WebSocket(wsUrl);
-
-    ws.onopen = () => {
-      console.log('WebSocket connected, subscribing to repository:', repositoryId);
-      ws.send(JSON.stringify({ type: 'subscribe', repositoryId }));
-    };
-
-    ws.onmessage = (event) => {
-      try {
-        const data = JSON.parse(event.data);
-        if (data.type === 'log' && data.repositoryId === repositoryId) {
-          const message = data.message || '';
-          
-          // تحقق من رسائل التزامن التلقائي
-          if (message.includes('__FILE_SYNC__:') || 
-              message.includes('تم إنشاء المجلد تلقائيًا:') ||
-              message.includes('تم حفظ الملف الجديد تلقائيًا:') ||
-              message.includes('تم حفظ التغييرات تلقائيًا:') ||
-              message.includes('تم حذف الملف تلقائيًا:') ||
-              message.includes('تم حذف المجلد تلقائيًا:')) {
-            
-            console.log('File sync detected, refreshing file list...');
-            // تحديث قائمة الملفات فوراً
-            queryClient.invalidateQueries({ queryKey: ["/api/repositories", repositoryId, "files"] });
-          }
-        }
-      } catch (error) {
-        console.error('Error parsing WebSocket message:', error);
-      }
-    };
-
-    ws.onerror = (error) => {
-      console.error('WebSocket error:', error);
-    };
-
-    ws.onclose = () => {
-      console.log('WebSocket disconnected');
-    };
-
-    return () => {
-      if (ws.readyState === WebSocket.OPEN) {
-        ws.close();
+    return subscribeTopic("file-sync", repositoryId, (data) => {
+      if (data.type === "file_sync") {
+        // تحديث قائمة الملفات فوراً
+        queryClient.invalidateQueries({ queryKey: ["/api/repositories", repositoryId, "files"] });
       }
-    };
+    });
   }, [repositoryId]);
 
   const createForm = useForm<InsertFile>({
@@ -248,13 +209,17 @@ export function FilesTab({ repositoryId, files }: FilesTabProps) {
 
   const syncFilesMutation = useMutation({
     mutationFn: async () => {
-      return apiRequest("POST", `/api/repositories/${repositoryId}/sync-files`, {});
+      const res = await apiRequest("POST", `/api/repositories/${repositoryId}/sync-files`, {});
+      return await res.json();
     },
-    onSuccess: () => {
+    onSuccess: (data: { syncReport?: { filesCreated: number; filesUpdated: number; filesDeleted: number; bytesWritten: number; durationMs: number } }) => {
       queryClient.invalidateQueries({ queryKey: ["/api/repositories", repositoryId, "files"] });
+      const report = data?.syncReport;
       toast({
         title: "Files synced",
-        description: "Runtime files have been synced to database successfully",
+        description: report
+          ? `${report.filesCreated} created, ${report.filesUpdated} updated, ${report.filesDeleted} deleted (${report.bytesWritten} bytes, ${report.durationMs}ms)`
+          : "Runtime files have been synced to database successfully",
       });
     },
     onError: (error: Error) => {
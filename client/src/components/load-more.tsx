@@ -0,0 +1,22 @@
+import { Button } from "@/components/ui/button";
+import { Loader2 } from "lucide-react";
+
+interface LoadMoreProps {
+  hasNextPage: boolean;
+  isFetchingNextPage: boolean;
+  fetchNextPage: () => unknown;
+  label?: string;
+}
+
+// Footer for lists loaded with usePaginatedQuery; renders nothing on the last page
+export function LoadMore({ hasNextPage, isFetchingNextPage, fetchNextPage, label = "Load more" }: LoadMoreProps) {
+  if (!hasNextPage) return null;
+  return (
+    <div className="flex justify-center pt-4">
+      <Button variant="outline" onClick={() => fetchNextPage()} disabled={isFetchingNextPage} data-testid="button-load-more">
+        {isFetchingNextPage && <Loader2 className="h-4 w-4 mr-2 animate-spin" />}
+        {label}
+      </Button>
+    </div>
+  );
+}
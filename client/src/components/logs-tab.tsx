@@ -5,6 +5,7 @@ import { Switch } from "@/components/ui/switch";
 import { Label } from "@/components/ui/label";
 import { Download, Trash2, Terminal } from "lucide-react";
 import { useToast } from "@/hooks/use-toast";
+import { subscribeTopic, subscribeAll, onConnectionChange } from "@/lib/socket";
 
 interface LogsTabProps {
   repositoryId: string;
@@ -21,84 +22,66 @@ export function LogsTab({ repositoryId, isRunning }: LogsTabProps) {
   const [autoScroll, setAutoScroll] = useState(true);
   const logsEndRef = useRef<HTMLDivElement>(null);
   const logsContainerRef = useRef<HTMLDivElement>(null);
-  const wsRef = useRef<WebSocket | null>(null);
   const { toast } = useToast();
 
   useEffect(() => {
-    if (!isRunning) {
-      if (wsRef.current) {
-        wsRef.current.close();
-        wsRef.current = null;
+    // Live lines numbered at or below this were already part of the replayed backlog
+    let replayedThrough = 0;
+    const unsubscribe = subscribeTopic("logs", repositoryId, (data) => {
+      if (data.type === "log_backlog") {
+        // Recent history replayed by the server on (re)subscribe
+        replayedThrough = data.seq ?? 0;
+        setLogs(data.entries.filter((entry: LogEntry) => entry.message.trim()));
+      } else if (data.type === "log") {
+        const timestamp = new Date().toISOString();
+        const received: string[] = data.message.split('\n');
+        const lines = received.filter((line, index) => line.trim() && data.seq + index > replayedThrough);
+        // Only the first messages after a replay can overlap it; numbering may restart later
+        if (data.seq + received.length - 1 > replayedThrough) replayedThrough = 0;
+        setLogs((prev) => [
+          ...prev,
+          ...lines.map((line: string) => ({ timestamp, message: line })),
+        ]);
       }
-      return;
-    }
-
-    const protocol = window.location.protocol === "https:" ? "wss:" : "ws:";
-    const wsUrl = `${protocol}//${window.location.host}/ws`;
-    
-    console.log("Connecting to WebSocket:", wsUrl);
-    const ws = new WebSocket(wsUrl);
-
-    ws.onopen = () => {
-      console.log("WebSocket connected, subscribing to repository:", repositoryId);
-      ws.send(JSON.stringify({ type: "subscribe", repositoryId }));
-      setLogs((prev) => [
-        ...prev,
-        {
-          timestamp: new Date().toISOString(),
-          message: "🔌 Connected to log stream",
-        },
-      ]);
-    };
+    });
 
-    ws.onmessage = (event) => {
-      try {
-        const data = JSON.parse(event.data);
-        if (data.type === "log" && data.repositoryId === repositoryId) {
-          const lines = data.message.split('\n').filter((line: string) => line.trim());
-          lines.forEach((line: string) => {
-            setLogs((prev) => [
-              ...prev,
-              {
-                timestamp: new Date().toISOString(),
-                message: line,
-              },
-            ]);
-          });
-        }
-      } catch (error) {
-        console.error("Error parsing WebSocket message:", error);
+    let wasConnected = false;
+    const stopListening = onConnectionChange((connected) => {
+      if (!connected && wasConnected) {
+        toast({
+          title: "Connection error",
+          description: "Lost connection to log stream",
+          variant: "destructive",
+        });
       }
-    };
-
-    ws.onerror = (error) => {
-      console.error("WebSocket error:", error);
-      toast({
-        title: "Connection error",
-        description: "Lost connection to log stream",
-        variant: "destructive",
-      });
-    };
-
-    ws.onclose = () => {
-      console.log("WebSocket disconnected");
+      wasConnected = connected;
       setLogs((prev) => [
         ...prev,
         {
           timestamp: new Date().toISOString(),
-          message: "🔌 Disconnected from log stream",
+          message: connected ? "🔌 Connected to log stream" : "🔌 Disconnected from log stream",
         },
       ]);
-    };
+    });
 
-    wsRef.current = ws;
+    const stopSkipNotices = subscribeAll((data) => {
+      if (data.type === "frames_skipped") {
+        setLogs((prev) => [
+          ...prev,
+          {
+            timestamp: new Date().toISOString(),
+            message: `⚠️ ${data.count} updates skipped (slow connection)`,
+          },
+        ]);
+      }
+    });
 
     return () => {
-      if (ws && ws.readyState === WebSocket.OPEN) {
-        ws.close();
-      }
+      unsubscribe();
+      stopListening();
+      stopSkipNotices();
     };
-  }, [repositoryId, isRunning, toast]);
+  }, [repositoryId, toast]);
 
   useEffect(() => {
     if (autoScroll && logsEndRef.current) {
@@ -203,7 +186,7 @@ export function LogsTab({ repositoryId, isRunning }: LogsTabProps) {
             <div className="flex items-center justify-center h-full text-muted-foreground">
               {isRunning
                 ? "Waiting for application output..."
-                : "Start the application to view logs"}
+                : "No recent output. Start the application to view logs"}
             </div>
           ) : (
             <div className="space-y-1">
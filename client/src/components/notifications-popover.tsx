@@ -1,7 +1,10 @@
 
-import { useState } from "react";
+import { useEffect, useState } from "react";
 import { useQuery, useMutation } from "@tanstack/react-query";
 import { apiRequest, queryClient } from "@/lib/queryClient";
+import { usePaginatedQuery } from "@/hooks/usePaginatedQuery";
+import { LoadMore } from "@/components/load-more";
+import { subscribeAll, onConnectionChange } from "@/lib/socket";
 import { Bell, Check, X } from "lucide-react";
 import { Button } from "@/components/ui/button";
 import {
@@ -16,16 +19,43 @@ import type { Notification } from "@shared/schema";
 export default function NotificationsPopover() {
   const [open, setOpen] = useState(false);
 
-  const { data: notifications = [] } = useQuery<Notification[]>({
-    queryKey: ["/api/notifications"],
-    refetchInterval: 30000, // Refresh every 30 seconds
-  });
+  const {
+    items: notifications,
+    hasNextPage,
+    fetchNextPage,
+    isFetchingNextPage,
+  } = usePaginatedQuery<Notification>("/api/notifications");
 
   const { data: unreadCount } = useQuery<{ count: number }>({
     queryKey: ["/api/notifications/unread-count"],
-    refetchInterval: 10000, // Refresh every 10 seconds
   });
 
+  // The server pushes new notifications and count changes over the socket;
+  // after a reconnect anything missed in between is fetched once
+  useEffect(() => {
+    const stopMessages = subscribeAll((data) => {
+      if (data.type !== "notification" && data.type !== "notifications_read") return;
+      queryClient.setQueryData(["/api/notifications/unread-count"], { count: data.unreadCount });
+      queryClient.invalidateQueries({ queryKey: ["/api/notifications"] });
+    });
+
+    let disconnected = false;
+    const stopListening = onConnectionChange((connected) => {
+      if (!connected) {
+        disconnected = true;
+      } else if (disconnected) {
+        disconnected = false;
+        queryClient.invalidateQueries({ queryKey: ["/api/notifications"] });
+        queryClient.invalidateQueries({ queryKey: ["/api/notifications/unread-count"] });
+      }
+    });
+
+    return () => {
+      stopMessages();
+      stopListening();
+    };
+  }, []);
+
   const markAsReadMutation = useMutation({
     mutationFn: async (id: string) => {
       return await apiRequest("PATCH", `/api/notifications/${id}/read`, {});
@@ -131,6 +161,7 @@ export default function NotificationsPopover() {
                   </div>
                 </div>
               ))}
+              <LoadMore hasNextPage={hasNextPage} isFetchingNextPage={isFetchingNextPage} fetchNextPage={fetchNextPage} />
             </div>
           )}
         </ScrollArea>
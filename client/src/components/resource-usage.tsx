@@ -0,0 +1,60 @@
+import { useEffect, useState } from "react";
+import { subscribeTopic } from "@/lib/socket";
+
+interface MetricsSample {
+  timestamp: number;
+  cpuPercent: number;
+  rssBytes: number;
+  fds: number;
+  threads: number;
+  processes: number;
+  readBytesPerSec: number;
+  writeBytesPerSec: number;
+}
+
+interface ResourceUsageProps {
+  repositoryId: string;
+}
+
+function formatBytes(bytes: number) {
+  if (bytes < 1024) return `${bytes} B`;
+  if (bytes < 1024 * 1024) return `${(bytes / 1024).toFixed(1)} KB`;
+  if (bytes < 1024 * 1024 * 1024) return `${(bytes / 1024 / 1024).toFixed(1)} MB`;
+  return `${(bytes / 1024 / 1024 / 1024).toFixed(2)} GB`;
+}
+
+export function ResourceUsage({ repositoryId }: ResourceUsageProps) {
+  const [sample, setSample] = useState<MetricsSample | null>(null);
+
+  useEffect(() => {
+    setSample(null);
+    return subscribeTopic("metrics", repositoryId, (data) => {
+      if (data.type === "metrics") {
+        setSample(data.sample);
+      } else if (data.type === "metrics_history" && data.points.length > 0) {
+        setSample(data.points[data.points.length - 1]);
+      }
+    });
+  }, [repositoryId]);
+
+  if (!sample) return null;
+
+  const items = [
+    { label: "CPU", value: `${sample.cpuPercent.toFixed(1)}%` },
+    { label: "Memory", value: formatBytes(sample.rssBytes) },
+    { label: "Threads", value: String(sample.threads) },
+    { label: "Open files", value: String(sample.fds) },
+    { label: "Disk I/O", value: `${formatBytes(sample.readBytesPerSec)}/s read, ${formatBytes(sample.writeBytesPerSec)}/s write` },
+  ];
+
+  return (
+    <div className="flex flex-wrap items-center gap-4" data-testid="resource-usage">
+      {items.map((item) => (
+        <div key={item.label} className="flex items-center gap-2">
+          <span className="text-sm text-muted-foreground">{item.label}:</span>
+          <span className="text-sm font-mono">{item.value}</span>
+        </div>
+      ))}
+    </div>
+  );
+}
@@ -1,5 +1,5 @@
 import { useState } from "react";
-import { useMutation } from "@tanstack/react-query";
+import { useQuery, useMutation } from "@tanstack/react-query";
 import { queryClient, apiRequest } from "@/lib/queryClient";
 import { Button } from "@/components/ui/button";
 import { Card } from "@/components/ui/card";
@@ -47,12 +47,17 @@ import { useLocation } from "wouter";
 
 const settingsSchema = z.object({
   mainFile: z.string().optional(),
-  pythonVersion: z.string(),
+  // null runs on the server's default interpreter
+  pythonVersion: z.string().nullable(),
   autoInstallFromRequirements: z.boolean().default(false),
+  restartPolicy: z.enum(["never", "on-failure", "always"]),
 });
 
 type SettingsForm = z.infer<typeof settingsSchema>;
 
+// Select items need a non-empty value; stands for pythonVersion null
+const SERVER_DEFAULT_VERSION = "default";
+
 interface SettingsTabProps {
   repository: Repository;
   files: FileType[];
@@ -66,6 +71,10 @@ export function SettingsTab({
 }: SettingsTabProps) {
   const [, setLocation] = useLocation();
   const { toast } = useToast();
+
+  const { data: pythonVersions } = useQuery<{ default: string | null; versions: { version: string; fullVersion: string }[] }>({
+    queryKey: ["/api/python-versions"],
+  });
   const [envVars, setEnvVars] = useState<Array<{ key: string; value: string }>>(
     environmentVariables.map((ev) => ({ key: ev.key, value: ev.value }))
   );
@@ -77,6 +86,7 @@ export function SettingsTab({
       mainFile: repository.mainFile || "",
       pythonVersion: repository.pythonVersion,
       autoInstallFromRequirements: repository.autoInstallFromRequirements || false,
+      restartPolicy: (repository.restartPolicy as SettingsForm["restartPolicy"]) || "on-failure",
     },
   });
 
@@ -364,18 +374,29 @@ export function SettingsTab({
               render={({ field }) => (
                 <FormItem>
                   <FormLabel>Python Version</FormLabel>
-                  <Select onValueChange={field.onChange} defaultValue={field.value}>
+                  <Select
+                    onValueChange={(value) => field.onChange(value === SERVER_DEFAULT_VERSION ? null : value)}
+                    defaultValue={field.value ?? SERVER_DEFAULT_VERSION}
+                  >
                     <FormControl>
                       <SelectTrigger data-testid="select-python-version">
                         <SelectValue />
                       </SelectTrigger>
                     </FormControl>
                     <SelectContent>
-                      <SelectItem value="3.8">Python 3.8</SelectItem>
-                      <SelectItem value="3.9">Python 3.9</SelectItem>
-                      <SelectItem value="3.10">Python 3.10</SelectItem>
-                      <SelectItem value="3.11">Python 3.11</SelectItem>
-                      <SelectItem value="3.12">Python 3.12</SelectItem>
+                      <SelectItem value={SERVER_DEFAULT_VERSION}>
+                        Server default{pythonVersions?.default ? ` (Python ${pythonVersions.default})` : ""}
+                      </SelectItem>
+                      {pythonVersions?.versions.map(({ version, fullVersion }) => (
+                        <SelectItem key={version} value={version}>
+                          Python {fullVersion}
+                        </SelectItem>
+                      ))}
+                      {repository.pythonVersion && !pythonVersions?.versions.some((v) => v.version === repository.pythonVersion) && (
+                        <SelectItem value={repository.pythonVersion} disabled>
+                          Python {repository.pythonVersion} (not available)
+                        </SelectItem>
+                      )}
                     </SelectContent>
                   </Select>
                   <FormDescription>
@@ -386,6 +407,32 @@ export function SettingsTab({
               )}
             />
 
+            <FormField
+              control={form.control}
+              name="restartPolicy"
+              render={({ field }) => (
+                <FormItem>
+                  <FormLabel>Restart Policy</FormLabel>
+                  <Select onValueChange={field.onChange} defaultValue={field.value}>
+                    <FormControl>
+                      <SelectTrigger data-testid="select-restart-policy">
+                        <SelectValue />
+                      </SelectTrigger>
+                    </FormControl>
+                    <SelectContent>
+                      <SelectItem value="never">Never</SelectItem>
+                      <SelectItem value="on-failure">On failure</SelectItem>
+                      <SelectItem value="always">Always</SelectItem>
+                    </SelectContent>
+                  </Select>
+                  <FormDescription>
+                    Restart the application automatically when it exits. Repeated quick crashes pause automatic restarts
+                  </FormDescription>
+                  <FormMessage />
+                </FormItem>
+              )}
+            />
+
             <FormField
               control={form.control}
               name="autoInstallFromRequirements"
@@ -4,7 +4,8 @@ import { apiRequest } from "@/lib/queryClient";
 import { Card } from "@/components/ui/card";
 import { Button } from "@/components/ui/button";
 import { Input } from "@/components/ui/input";
-import { Terminal, Send, Loader2, Trash2 } from "lucide-react";
+import { Terminal, Send, Loader2, Trash2, Square } from "lucide-react";
+import { subscribeTopic, type SocketMessage } from "@/lib/socket";
 
 interface TerminalTabProps {
   repositoryId: string;
@@ -15,11 +16,20 @@ interface TerminalOutput {
   timestamp: string;
   message: string;
   type: "info" | "error" | "success" | "command";
+  jobId?: string;
+}
+
+interface CommandJob {
+  id: string;
+  status: "queued" | "running" | "succeeded" | "failed" | "cancelled";
+  error: string | null;
 }
 
 export function TerminalTab({ repositoryId, isRunning }: TerminalTabProps) {
   const [command, setCommand] = useState("");
   const [outputs, setOutputs] = useState<TerminalOutput[]>([]);
+  const [activeJob, setActiveJob] = useState<CommandJob | null>(null);
+  const activeJobRef = useRef<string | null>(null);
   const outputEndRef = useRef<HTMLDivElement>(null);
   const inputRef = useRef<HTMLInputElement>(null);
 
@@ -40,21 +50,71 @@ export function TerminalTab({ repositoryId, isRunning }: TerminalTabProps) {
     ]);
   };
 
+  // Command output is streamed over the shared socket while the job runs.
+  // Events can arrive before the POST response names the job, so they are held until then.
+  const earlyEvents = useRef<SocketMessage[]>([]);
+
+  const handleJobMessage = (message: SocketMessage) => {
+    if (message.type === "job_output" && message.jobId === activeJobRef.current) {
+      setOutputs((prev) => {
+        const last = prev[prev.length - 1];
+        if (last && last.jobId === message.jobId && last.type === "info") {
+          return [...prev.slice(0, -1), { ...last, message: last.message + message.data }];
+        }
+        return [...prev, { timestamp: new Date().toISOString(), message: message.data, type: "info", jobId: message.jobId }];
+      });
+    } else if (message.type === "job_status" && message.job.id === activeJobRef.current) {
+      const job: CommandJob = message.job;
+      if (job.status === "queued" || job.status === "running") {
+        setActiveJob(job);
+        return;
+      }
+      if (job.status === "succeeded") {
+        addOutput("✓ Done", "success");
+      } else if (job.status === "cancelled") {
+        addOutput("Command cancelled", "error");
+      } else {
+        addOutput(`Error: ${job.error || "Command failed"}`, "error");
+      }
+      activeJobRef.current = null;
+      setActiveJob(null);
+      inputRef.current?.focus();
+    }
+  };
+
+  useEffect(() => {
+    return subscribeTopic("jobs", repositoryId, (message) => {
+      if (!activeJobRef.current && (message.type === "job_output" || message.type === "job_status")) {
+        earlyEvents.current = [...earlyEvents.current.slice(-199), message];
+        return;
+      }
+      handleJobMessage(message);
+    });
+  }, [repositoryId]);
+
   const executeCommandMutation = useMutation({
     mutationFn: async (cmd: string) => {
-      return await apiRequest("POST", `/api/repositories/${repositoryId}/execute-command`, {
+      const res = await apiRequest("POST", `/api/repositories/${repositoryId}/execute-command`, {
         command: cmd,
       });
+      return await res.json();
     },
     onMutate: (cmd) => {
       addOutput(`$ ${cmd}`, "command");
     },
-    onSuccess: (data: any) => {
-      const output = data.output || data.message || "Command executed successfully";
-      const type = data.success ? "success" : "info";
-      addOutput(output, type);
+    onSuccess: (data: { job: CommandJob }) => {
+      activeJobRef.current = data.job.id;
+      setActiveJob(data.job);
+      if (data.job.status === "queued") {
+        addOutput("Waiting for a free worker...", "info");
+      }
       setCommand("");
-      inputRef.current?.focus();
+
+      const early = earlyEvents.current;
+      earlyEvents.current = [];
+      early
+        .filter((message) => (message.jobId ?? message.job?.id) === data.job.id)
+        .forEach(handleJobMessage);
     },
     onError: (error: Error) => {
       addOutput(`Error: ${error.message}`, "error");
@@ -69,6 +129,15 @@ export function TerminalTab({ repositoryId, isRunning }: TerminalTabProps) {
     }
   };
 
+  const handleCancel = async () => {
+    if (!activeJob) return;
+    try {
+      await apiRequest("POST", `/api/jobs/${activeJob.id}/cancel`);
+    } catch (error: any) {
+      addOutput(`Error: ${error.message}`, "error");
+    }
+  };
+
   const handleClear = () => {
     setOutputs([]);
   };
@@ -134,7 +203,7 @@ export function TerminalTab({ repositoryId, isRunning }: TerminalTabProps) {
                     [{formatTimestamp(output.timestamp)}]
                   </span>
                   <span
-                    className={`flex-1 break-all ${
+                    className={`flex-1 break-all whitespace-pre-wrap ${
                       output.type === "error"
                         ? "text-destructive"
                         : output.type === "success"
@@ -161,23 +230,35 @@ export function TerminalTab({ repositoryId, isRunning }: TerminalTabProps) {
                 placeholder="اكتب أمر Python أو pip... (مثال: pip install requests)"
                 value={command}
                 onChange={(e) => setCommand(e.target.value)}
-                disabled={executeCommandMutation.isPending || isRunning}
+                disabled={executeCommandMutation.isPending || Boolean(activeJob) || isRunning}
                 className="border-0 focus-visible:ring-0 font-mono"
                 data-testid="input-terminal-command"
               />
             </div>
-            <Button
-              type="submit"
-              disabled={!command.trim() || executeCommandMutation.isPending || isRunning}
-              data-testid="button-execute-command"
-            >
-              {executeCommandMutation.isPending ? (
-                <Loader2 className="h-4 w-4 mr-2 animate-spin" />
-              ) : (
-                <Send className="h-4 w-4 mr-2" />
-              )}
-              تنفيذ
-            </Button>
+            {activeJob ? (
+              <Button
+                type="button"
+                variant="destructive"
+                onClick={handleCancel}
+                data-testid="button-cancel-command"
+              >
+                <Square className="h-4 w-4 mr-2" />
+                إيقاف
+              </Button>
+            ) : (
+              <Button
+                type="submit"
+                disabled={!command.trim() || executeCommandMutation.isPending || isRunning}
+                data-testid="button-execute-command"
+              >
+                {executeCommandMutation.isPending ? (
+                  <Loader2 className="h-4 w-4 mr-2 animate-spin" />
+                ) : (
+                  <Send className="h-4 w-4 mr-2" />
+                )}
+                تنفيذ
+              </Button>
+            )}
           </form>
         </div>
       </Card>
@@ -188,8 +269,8 @@ export function TerminalTab({ repositoryId, isRunning }: TerminalTabProps) {
           <div className="space-y-2 text-sm">
             <p className="font-semibold text-blue-500">أمثلة على الأوامر المتاحة:</p>
             <div className="space-y-1 text-muted-foreground font-mono">
-              <p>• pip install --user --break-system-packages package_name - لتثبيت مكتبة</p>
-              <p>• pip uninstall -y --break-system-packages package_name - لإزالة مكتبة</p>
+              <p>• pip install package_name - لتثبيت مكتبة</p>
+              <p>• pip uninstall -y package_name - لإزالة مكتبة</p>
               <p>• pip list - لعرض جميع المكتبات المثبتة</p>
               <p>• pip freeze &gt; requirements.txt - لحفظ المكتبات (للمرجعية فقط)</p>
               <p>• python --version - لعرض إصدار Python</p>
@@ -1,8 +1,8 @@
 import { useQuery } from "@tanstack/react-query";
-import type { User } from "@shared/schema";
+import type { PublicUser } from "@shared/schema";
 
 export function useAuth() {
-  const { data: user, isLoading } = useQuery<User>({
+  const { data: user, isLoading } = useQuery<PublicUser>({
     queryKey: ["/api/auth/user"],
     retry: false,
   });
@@ -0,0 +1,35 @@
+import { useMemo } from "react";
+import { useInfiniteQuery } from "@tanstack/react-query";
+import { apiRequest } from "@/lib/queryClient";
+import type { Page } from "@shared/schema";
+
+type QueryParams = Record<string, string | undefined>;
+
+// Loads a keyset-paginated list endpoint page by page. The query key starts
+// with the path, so invalidating [path] refetches every loaded page.
+export function usePaginatedQuery<T, P extends Page<T> = Page<T>>(
+  path: string,
+  params: QueryParams = {},
+  options: { refetchInterval?: number; enabled?: boolean } = {},
+) {
+  const query = useInfiniteQuery({
+    queryKey: [path, params],
+    initialPageParam: null as string | null,
+    queryFn: async ({ pageParam }) => {
+      const search = new URLSearchParams();
+      for (const [key, value] of Object.entries(params)) {
+        if (value) search.set(key, value);
+      }
+      if (pageParam) search.set("cursor", pageParam);
+      const queryString = search.toString();
+      const res = await apiRequest("GET", queryString ? `${path}?${queryString}` : path);
+      return (await res.json()) as P;
+    },
+    getNextPageParam: (lastPage) => lastPage.nextCursor,
+    ...options,
+  });
+
+  const items = useMemo(() => query.data?.pages.flatMap((page) => page.items) ?? [], [query.data]);
+
+  return { ...query, items, firstPage: query.data?.pages[0] };
+}
@@ -0,0 +1,44 @@
+import { useEffect } from "react";
+import type { InfiniteData } from "@tanstack/react-query";
+import { queryClient } from "@/lib/queryClient";
+import { subscribeAll, onConnectionChange } from "@/lib/socket";
+import type { Page, Repository } from "@shared/schema";
+
+// Applies the status transitions the server pushes for the user's
+// repositories to the cached list and detail queries, so both stay live
+// without refetching. After a reconnect, anything missed is fetched once.
+export function useRepositoryStatusUpdates() {
+  useEffect(() => {
+    const stopMessages = subscribeAll((message) => {
+      if (message.type !== "repository_status" || !message.repositoryId) return;
+
+      const update: Partial<Repository> = { status: message.status };
+      if (message.transition === "crashed" || message.transition === "running") {
+        update.exitReason = message.exitReason;
+      }
+      const apply = (repo: Repository) => (repo.id === message.repositoryId ? { ...repo, ...update } : repo);
+
+      queryClient.setQueryData<Repository>(["/api/repositories", message.repositoryId], (repo) => repo && apply(repo));
+      // List queries are keyed by [path, params]; detail and tab queries by id
+      queryClient.setQueriesData<InfiniteData<Page<Repository>>>(
+        { queryKey: ["/api/repositories"], predicate: (query) => typeof query.queryKey[1] === "object" },
+        (data) => data && { ...data, pages: data.pages.map((page) => ({ ...page, items: page.items.map(apply) })) }
+      );
+    });
+
+    let disconnected = false;
+    const stopListening = onConnectionChange((connected) => {
+      if (!connected) {
+        disconnected = true;
+      } else if (disconnected) {
+        disconnected = false;
+        queryClient.invalidateQueries({ queryKey: ["/api/repositories"] });
+      }
+    });
+
+    return () => {
+      stopMessages();
+      stopListening();
+    };
+  }, []);
+}
@@ -0,0 +1,141 @@
+// Single multiplexed WebSocket shared by every component in the tab.
+// Components subscribe to (topic, repositoryId) pairs; the connection is
+// opened on first use, re-established with backoff and resubscribed after drops.
+
+export type Topic = "logs" | "file-sync" | "metrics" | "jobs";
+
+export type SocketMessage = {
+  type: string;
+  topic?: Topic;
+  repositoryId?: string;
+  [key: string]: any;
+};
+
+type MessageHandler = (message: SocketMessage) => void;
+type ConnectionListener = (connected: boolean) => void;
+
+const HEARTBEAT_INTERVAL_MS = 25 * 1000;
+const MAX_RECONNECT_DELAY_MS = 30 * 1000;
+
+let socket: WebSocket | null = null;
+let reconnectDelay = 1000;
+let reconnectTimer: ReturnType<typeof setTimeout> | null = null;
+let heartbeatTimer: ReturnType<typeof setInterval> | null = null;
+
+const handlers = new Map<string, Set<MessageHandler>>();
+const globalHandlers = new Set<MessageHandler>();
+const connectionListeners = new Set<ConnectionListener>();
+
+const keyOf = (topic: Topic, repositoryId: string) => `${topic}:${repositoryId}`;
+
+function send(message: object) {
+  if (socket && socket.readyState === WebSocket.OPEN) {
+    socket.send(JSON.stringify(message));
+  }
+}
+
+function connect() {
+  if (socket && (socket.readyState === WebSocket.OPEN || socket.readyState === WebSocket.CONNECTING)) {
+    return;
+  }
+
+  const protocol = window.location.protocol === "https:" ? "wss:" : "ws:";
+  const ws = new WebSocket(`${protocol}//${window.location.host}/ws`);
+  socket = ws;
+
+  ws.onopen = () => {
+    reconnectDelay = 1000;
+    Array.from(handlers.keys()).forEach((key) => {
+      const separator = key.indexOf(":");
+      send({ type: "subscribe", topic: key.slice(0, separator), repositoryId: key.slice(separator + 1) });
+    });
+    heartbeatTimer = setInterval(() => send({ type: "ping" }), HEARTBEAT_INTERVAL_MS);
+    connectionListeners.forEach((listener) => listener(true));
+  };
+
+  ws.onmessage = (event) => {
+    try {
+      const message: SocketMessage = JSON.parse(event.data);
+      globalHandlers.forEach((handler) => handler(message));
+      if (message.topic && message.repositoryId) {
+        handlers.get(keyOf(message.topic, message.repositoryId))?.forEach((handler) => handler(message));
+      }
+    } catch (error) {
+      console.error("Error parsing WebSocket message:", error);
+    }
+  };
+
+  ws.onclose = () => {
+    if (heartbeatTimer) {
+      clearInterval(heartbeatTimer);
+      heartbeatTimer = null;
+    }
+    if (socket === ws) {
+      socket = null;
+    }
+    connectionListeners.forEach((listener) => listener(false));
+    scheduleReconnect();
+  };
+}
+
+function scheduleReconnect() {
+  if (reconnectTimer || (handlers.size === 0 && globalHandlers.size === 0)) {
+    return;
+  }
+  reconnectTimer = setTimeout(() => {
+    reconnectTimer = null;
+    connect();
+  }, reconnectDelay);
+  reconnectDelay = Math.min(reconnectDelay * 2, MAX_RECONNECT_DELAY_MS);
+}
+
+// Close the socket once nothing is listening any more
+function releaseIfUnused() {
+  if (handlers.size === 0 && globalHandlers.size === 0 && socket) {
+    socket.close();
+    socket = null;
+  }
+}
+
+export function subscribeTopic(topic: Topic, repositoryId: string, handler: MessageHandler): () => void {
+  const key = keyOf(topic, repositoryId);
+  let set = handlers.get(key);
+  if (!set) {
+    set = new Set();
+    handlers.set(key, set);
+    send({ type: "subscribe", topic, repositoryId });
+  }
+  set.add(handler);
+  connect();
+
+  return () => {
+    const current = handlers.get(key);
+    if (!current) return;
+    current.delete(handler);
+    if (current.size === 0) {
+      handlers.delete(key);
+      send({ type: "unsubscribe", topic, repositoryId });
+      releaseIfUnused();
+    }
+  };
+}
+
+// Receive every message on the connection (e.g. user-level events without a topic)
+export function subscribeAll(handler: MessageHandler): () => void {
+  globalHandlers.add(handler);
+  connect();
+  return () => {
+    globalHandlers.delete(handler);
+    releaseIfUnused();
+  };
+}
+
+export function onConnectionChange(listener: ConnectionListener): () => void {
+  connectionListeners.add(listener);
+  if (socket && socket.readyState === WebSocket.OPEN) {
+    listener(true);
+  }
+  return () => {
+    connectionListeners.delete(listener);
+  };
+}
@@ -1,5 +1,7 @@
 import { useState } from "react";
-import { useQuery, useMutation } from "@tanstack/react-query";
+import { useMutation } from "@tanstack/react-query";
+import { usePaginatedQuery } from "@/hooks/usePaginatedQuery";
+import { LoadMore } from "@/components/load-more";
 import { apiRequest, queryClient } from "@/lib/queryClient";
 import { Card } from "@/components/ui/card";
 import { Input } from "@/components/ui/input";
@@ -60,9 +62,13 @@ export default function Notes() {
     },
   });
 
-  const { data: notes = [], isLoading } = useQuery<Note[]>({
-    queryKey: ["/api/notes"],
-  });
+  const {
+    items: notes,
+    isLoading,
+    hasNextPage,
+    fetchNextPage,
+    isFetchingNextPage,
+  } = usePaginatedQuery<Note>("/api/notes");
 
   const createNoteMutation = useMutation({
     mutationFn: async (data: InsertNote) => {
@@ -249,6 +255,7 @@ export default function Notes() {
           ))}
         </div>
       )}
+      <LoadMore hasNextPage={hasNextPage} isFetchingNextPage={isFetchingNextPage} fetchNextPage={fetchNextPage} />
 
       <Dialog open={isCreateDialogOpen} onOpenChange={setIsCreateDialogOpen}>
         <DialogContent>
@@ -1,6 +1,9 @@
 import { useState } from "react";
 import { useQuery, useMutation } from "@tanstack/react-query";
 import { queryClient, apiRequest } from "@/lib/queryClient";
+import { usePaginatedQuery } from "@/hooks/usePaginatedQuery";
+import { useRepositoryStatusUpdates } from "@/hooks/useRepositoryStatusUpdates";
+import { LoadMore } from "@/components/load-more";
 import { Button } from "@/components/ui/button";
 import { Card } from "@/components/ui/card";
 import { Input } from "@/components/ui/input";
@@ -35,8 +38,17 @@ export default function Repositories() {
   const [open, setOpen] = useState(false);
   const { toast } = useToast();
 
-  const { data: repositories, isLoading } = useQuery<Repository[]>({
-    queryKey: ["/api/repositories"],
+  const {
+    items: repositories,
+    isLoading,
+    hasNextPage,
+    fetchNextPage,
+    isFetchingNextPage,
+  } = usePaginatedQuery<Repository>("/api/repositories");
+  useRepositoryStatusUpdates();
+
+  const { data: pythonVersions } = useQuery<{ default: string | null; versions: { version: string }[] }>({
+    queryKey: ["/api/python-versions"],
   });
 
   const form = useForm<InsertRepository>({
@@ -44,7 +56,6 @@ export default function Repositories() {
     defaultValues: {
       name: "",
       description: "",
-      pythonVersion: "3.11",
     },
   });
 
@@ -70,6 +81,7 @@ export default function Repositories() {
     },
   });
 
+  // New repositories run on the server's default interpreter until one is chosen in Settings
   const onSubmit = (data: InsertRepository) => {
     createMutation.mutate(data);
   };
@@ -189,6 +201,8 @@ export default function Repositories() {
                     className={`h-2 w-2 rounded-full ${
                       repo.status === "running"
                         ? "bg-status-online animate-pulse"
+                        : repo.status === "starting" || repo.status === "restarting"
+                        ? "bg-status-away animate-pulse"
                         : repo.status === "error"
                         ? "bg-status-busy"
                         : repo.status === "completed"
@@ -209,7 +223,7 @@ export default function Repositories() {
               <div className="flex items-center gap-4 text-sm text-muted-foreground">
                 <div className="flex items-center gap-1">
                   <Badge variant="secondary" className="font-mono text-xs">
-                    Python {repo.pythonVersion}
+                    Python {repo.pythonVersion ?? pythonVersions?.default ?? "(server default)"}
                   </Badge>
                 </div>
                 <div>
@@ -263,6 +277,7 @@ export default function Repositories() {
           </Button>
         </Card>
       )}
+      <LoadMore hasNextPage={hasNextPage} isFetchingNextPage={isFetchingNextPage} fetchNextPage={fetchNextPage} />
     </div>
   );
 }
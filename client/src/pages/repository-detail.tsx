@@ -16,11 +16,13 @@ import {
 } from "@/components/ui/breadcrumb";
 import { Play, Square, ChevronLeft, Loader2 } from "lucide-react";
 import { useToast } from "@/hooks/use-toast";
-import type { Repository, File as FileType, EnvironmentVariable } from "@shared/schema";
+import { useRepositoryStatusUpdates } from "@/hooks/useRepositoryStatusUpdates";
+import { activeRepositoryStatuses, type Repository, type File as FileType, type EnvironmentVariable } from "@shared/schema";
 import { FilesTab } from "@/components/files-tab";
 import { LogsTab } from "@/components/logs-tab";
 import { SettingsTab } from "@/components/settings-tab";
 import { TerminalTab } from "@/components/terminal-tab";
+import { ResourceUsage } from "@/components/resource-usage";
 import { Skeleton } from "@/components/ui/skeleton";
 
 export default function RepositoryDetail() {
@@ -35,6 +37,7 @@ export default function RepositoryDetail() {
     queryKey: ["/api/repositories", repositoryId],
     enabled: !!repositoryId,
   });
+  useRepositoryStatusUpdates();
 
   const { data: files = [] } = useQuery<FileType[]>({
     queryKey: ["/api/repositories", repositoryId, "files"],
@@ -46,6 +49,11 @@ export default function RepositoryDetail() {
     enabled: !!repositoryId,
   });
 
+  const { data: limits } = useQuery<{ enabled: boolean; tier: string }>({
+    queryKey: ["/api/repositories", repositoryId, "limits"],
+    enabled: !!repositoryId,
+  });
+
   const startMutation = useMutation({
     mutationFn: async () => {
       return await apiRequest("POST", `/api/repositories/${repositoryId}/start`, {});
@@ -115,6 +123,8 @@ export default function RepositoryDetail() {
   }
 
   const isRunning = repository.status === "running";
+  // Starting and restarting repositories can be stopped but not started again
+  const isActive = (activeRepositoryStatuses as readonly string[]).includes(repository.status);
   const canStart = repository.status === "stopped" || repository.status === "error" || repository.status === "completed";
 
   return (
@@ -152,6 +162,8 @@ export default function RepositoryDetail() {
                 className={`h-3 w-3 rounded-full ${
                   isRunning
                     ? "bg-status-online animate-pulse"
+                    : isActive
+                    ? "bg-status-away animate-pulse"
                     : repository.status === "error"
                     ? "bg-status-busy"
                     : repository.status === "completed"
@@ -167,14 +179,36 @@ export default function RepositoryDetail() {
               >
                 {repository.status}
               </Badge>
+              {repository.status === "error" && repository.exitReason && (
+                <Badge variant="destructive" data-testid="badge-exit-reason">
+                  {repository.exitReason === "oom" ? "Out of memory" : "Process limit reached"}
+                </Badge>
+              )}
             </div>
             <div className="h-4 w-px bg-border" />
             <div className="flex items-center gap-2">
               <span className="text-sm text-muted-foreground">Python Version:</span>
               <Badge variant="secondary" className="font-mono">
-                {repository.pythonVersion}
+                {repository.pythonVersion ?? "Server default"}
               </Badge>
             </div>
+            {limits?.enabled && (
+              <>
+                <div className="h-4 w-px bg-border" />
+                <div className="flex items-center gap-2">
+                  <span className="text-sm text-muted-foreground">Tier:</span>
+                  <Badge variant="secondary" className="capitalize" data-testid="badge-resource-tier">
+                    {limits.tier}
+                  </Badge>
+                </div>
+              </>
+            )}
+            {isRunning && (
+              <>
+                <div className="h-4 w-px bg-border" />
+                <ResourceUsage repositoryId={repositoryId!} />
+              </>
+            )}
           </div>
         </Card>
       </div>
@@ -183,7 +217,7 @@ export default function RepositoryDetail() {
         <div className="flex gap-2 w-full">
           <Button
             onClick={() => startMutation.mutate()}
-            disabled={startMutation.isPending || isRunning}
+            disabled={startMutation.isPending || isActive}
             data-testid="button-start-repository"
             variant={canStart ? "default" : "outline"}
             className="flex-1"
@@ -198,7 +232,7 @@ export default function RepositoryDetail() {
           <Button
             variant="destructive"
             onClick={() => stopMutation.mutate()}
-            disabled={stopMutation.isPending || !isRunning}
+            disabled={stopMutation.isPending || !isActive}
             data-testid="button-stop-repository"
             className="flex-1"
           >
@@ -0,0 +1,5 @@
+-- Add restart policy used by the process supervisor ('never', 'on-failure', 'always').
+-- Existing repositories keep their previous behaviour (no automatic restarts);
+-- repositories created from now on default to 'on-failure'.
+ALTER TABLE repositories ADD COLUMN IF NOT EXISTS restart_policy VARCHAR(20) DEFAULT 'never' NOT NULL;
+ALTER TABLE repositories ALTER COLUMN restart_policy SET DEFAULT 'on-failure';
@@ -0,0 +1,2 @@
+-- Resource limit that ended a repository's last run ('oom', 'pids_limit'); NULL otherwise
+ALTER TABLE repositories ADD COLUMN IF NOT EXISTS exit_reason VARCHAR(40);
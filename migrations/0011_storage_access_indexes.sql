@@ -0,0 +1,45 @@
+-- Indexes matching the DatabaseStorage access paths. Listings page on
+-- (timestamp, id), so composite indexes end with those two columns.
+-- Verify with: npm run db:check-indexes
+
+-- Repositories: listed per user, restored by status
+UPDATE repositories SET created_at = COALESCE(updated_at, NOW()) WHERE created_at IS NULL;
+ALTER TABLE repositories ALTER COLUMN created_at SET NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_repositories_user_created ON repositories (user_id, created_at, id);
+CREATE INDEX IF NOT EXISTS idx_repositories_status ON repositories (status);
+
+-- Files: one row per (repository, path, name). Keep the most recently updated
+-- copy of any duplicates so the unique index can be built and upserts can
+-- target it.
+DELETE FROM files older
+USING files newer
+WHERE older.repository_id = newer.repository_id
+  AND older.path = newer.path
+  AND older.name = newer.name
+  AND (COALESCE(older.updated_at, 'epoch'::timestamp), older.id) < (COALESCE(newer.updated_at, 'epoch'::timestamp), newer.id);
+CREATE UNIQUE INDEX IF NOT EXISTS uq_files_repository_path_name ON files (repository_id, path, name);
+
+CREATE INDEX IF NOT EXISTS idx_environment_variables_repository ON environment_variables (repository_id, key);
+
+-- Users: admin listing and Telegram chat lookups
+CREATE INDEX IF NOT EXISTS idx_users_created ON users (created_at, id);
+CREATE INDEX IF NOT EXISTS idx_users_telegram_chat_id ON users (telegram_chat_id) WHERE telegram_chat_id IS NOT NULL;
+
+-- Balance requests: all, per user, per status, and the pending review queue
+CREATE INDEX IF NOT EXISTS idx_balance_requests_created ON balance_requests (created_at, id);
+CREATE INDEX IF NOT EXISTS idx_balance_requests_user_created ON balance_requests (user_id, created_at, id);
+CREATE INDEX IF NOT EXISTS idx_balance_requests_status_created ON balance_requests (status, created_at, id);
+CREATE INDEX IF NOT EXISTS idx_balance_requests_pending ON balance_requests (created_at, id) WHERE status = 'pending';
+
+CREATE INDEX IF NOT EXISTS idx_support_messages_created ON support_messages (created_at, id);
+CREATE INDEX IF NOT EXISTS idx_support_messages_user_created ON support_messages (user_id, created_at, id);
+
+-- Notifications: the composite index serves user_id lookups, and is_read on
+-- its own is too unselective to help; unread counts use the partial index
+DROP INDEX IF EXISTS idx_notifications_user_id;
+DROP INDEX IF EXISTS idx_notifications_is_read;
+CREATE INDEX IF NOT EXISTS idx_notifications_user_created ON notifications (user_id, created_at, id);
+CREATE INDEX IF NOT EXISTS idx_notifications_unread ON notifications (user_id) WHERE is_read = false;
+
+-- Notes are listed by last edit
+CREATE INDEX IF NOT EXISTS idx_notes_user_updated ON notes (user_id, updated_at, id);
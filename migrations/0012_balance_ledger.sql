@@ -0,0 +1,58 @@
+-- users.balance becomes NUMERIC and every change to it is recorded in
+-- balance_transactions. idempotency_key makes re-applying the same credit
+-- (e.g. approving a balance request twice) a no-op.
+
+ALTER TABLE users ALTER COLUMN balance DROP DEFAULT;
+ALTER TABLE users
+  ALTER COLUMN balance TYPE NUMERIC(14, 2)
+  USING COALESCE(NULLIF(TRIM(balance), '')::numeric, 0);
+ALTER TABLE users ALTER COLUMN balance SET DEFAULT 0;
+ALTER TABLE users ALTER COLUMN balance SET NOT NULL;
+
+CREATE TABLE IF NOT EXISTS balance_transactions (
+  id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+  user_id UUID NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+  amount NUMERIC(14, 2) NOT NULL,
+  kind TEXT NOT NULL,
+  balance_request_id UUID REFERENCES balance_requests(id) ON DELETE SET NULL,
+  idempotency_key TEXT NOT NULL UNIQUE,
+  created_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_balance_transactions_user_created ON balance_transactions (user_id, created_at, id);
+CREATE INDEX IF NOT EXISTS idx_balance_transactions_kind ON balance_transactions (kind);
+
+-- Backfill: one deposit per approved request, converted to USD at its payment
+-- method's current rate (amount_sent is in the method's currency), then an
+-- opening entry per user for whatever the existing balance does not explain
+-- (manual edits, requests credited twice or unconverted before this
+-- migration, amounts that are not plain numbers), so each user's ledger sums
+-- to their balance.
+WITH deposits AS (
+  SELECT
+    r.id,
+    r.user_id,
+    r.created_at,
+    CASE
+      WHEN r.amount_sent ~ '^\s*[0-9]+(\.[0-9]+)?\s*$'
+        AND p.usd_rate ~ '^\s*[0-9]+(\.[0-9]+)?\s*$'
+      THEN ROUND(TRIM(r.amount_sent)::numeric / NULLIF(TRIM(p.usd_rate)::numeric, 0), 2)
+    END AS amount
+  FROM balance_requests r
+  JOIN payment_methods p ON p.id = r.payment_method_id
+  WHERE r.status = 'approved'
+)
+INSERT INTO balance_transactions (user_id, amount, kind, balance_request_id, idempotency_key, created_at)
+SELECT user_id, amount, 'deposit', id, 'balance_request:' || id, created_at
+FROM deposits
+WHERE amount > 0
+ON CONFLICT (idempotency_key) DO NOTHING;
+
+INSERT INTO balance_transactions (user_id, amount, kind, idempotency_key, created_at)
+SELECT u.id, u.balance - COALESCE(t.total, 0), 'opening', 'opening:' || u.id, COALESCE(u.created_at, NOW())
+FROM users u
+LEFT JOIN (
+  SELECT user_id, SUM(amount) AS total FROM balance_transactions GROUP BY user_id
+) t ON t.user_id = u.id
+WHERE u.balance <> COALESCE(t.total, 0)
+ON CONFLICT (idempotency_key) DO NOTHING;
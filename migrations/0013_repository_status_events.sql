@@ -0,0 +1,5 @@
+-- Transient states written by the process manager's status events, and when
+-- the current status was entered
+ALTER TYPE repository_status ADD VALUE IF NOT EXISTS 'starting';
+ALTER TYPE repository_status ADD VALUE IF NOT EXISTS 'restarting';
+ALTER TABLE repositories ADD COLUMN IF NOT EXISTS status_changed_at TIMESTAMP;
@@ -0,0 +1,3 @@
+-- When the repository's files were last written to its runtime directory, so
+-- file sync can tell deleted files from ones created after that
+ALTER TABLE repositories ADD COLUMN IF NOT EXISTS files_materialized_at TIMESTAMP;
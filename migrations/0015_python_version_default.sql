@@ -0,0 +1,6 @@
+-- NULL runs the repository on the server's default interpreter. Rows still on
+-- the old column default are moved to it, so they keep starting on hosts
+-- without Python 3.11.
+ALTER TABLE repositories ALTER COLUMN python_version DROP DEFAULT;
+ALTER TABLE repositories ALTER COLUMN python_version DROP NOT NULL;
+UPDATE repositories SET python_version = NULL WHERE python_version = '3.11';
@@ -0,0 +1,131 @@
+// Checks that the hot DatabaseStorage queries can be served by index scans.
+//
+//   npm run db:check-indexes            plans with sequential scans disabled
+//   npm run db:check-indexes -- --analyze   also times each query as planned normally
+//
+// Each storage method is called once with the pool intercepted, so the SQL
+// checked is exactly what the application sends. Only EXPLAIN statements
+// reach the database; nothing is written.
+import { randomUUID } from "crypto";
+import { pool } from "../server/db";
+import { storage } from "../server/storage";
+import { activeRepositoryStatuses } from "@shared/schema";
+
+interface Check {
+  name: string;
+  // Any of these indexes appearing in the plan passes the check
+  indexes: string[];
+  run: () => Promise<unknown>;
+}
+
+interface PlanNode {
+  "Node Type": string;
+  "Index Name"?: string;
+  Plans?: PlanNode[];
+}
+
+const analyze = process.argv.includes("--analyze");
+const userId = randomUUID();
+const repositoryId = randomUUID();
+const cursor = Buffer.from(JSON.stringify(["2024-01-01 00:00:00", randomUUID()])).toString("base64url");
+
+const checks: Check[] = [
+  { name: "repositories by user", indexes: ["idx_repositories_user_created"], run: () => storage.getRepositories(userId) },
+  { name: "repositories by user, next page", indexes: ["idx_repositories_user_created"], run: () => storage.getRepositories(userId, { cursor }) },
+  { name: "repositories by status", indexes: ["idx_repositories_status"], run: () => storage.getRepositoriesByStatus(activeRepositoryStatuses) },
+  { name: "file by path", indexes: ["uq_files_repository_path_name"], run: () => storage.getFileByPath(repositoryId, "pkg/main.py") },
+  { name: "files of repository", indexes: ["uq_files_repository_path_name"], run: () => storage.getFiles(repositoryId) },
+  { name: "file index of repository", indexes: ["uq_files_repository_path_name"], run: () => storage.getFileIndex(repositoryId) },
+  { name: "environment variables", indexes: ["idx_environment_variables_repository"], run: () => storage.getEnvironmentVariables(repositoryId) },
+  { name: "user by username or email", indexes: ["users_username_unique", "users_email_unique"], run: () => storage.getUserByUsernameOrEmail("someone") },
+  { name: "users, next page", indexes: ["idx_users_created"], run: () => storage.getAllUsers({ cursor }) },
+  { name: "balance requests", indexes: ["idx_balance_requests_created"], run: () => storage.getBalanceRequestsWithUsers({}) },
+  { name: "balance requests by user", indexes: ["idx_balance_requests_user_created"], run: () => storage.getBalanceRequestsWithUsers({ userId }) },
+  {
+    name: "pending balance requests",
+    indexes: ["idx_balance_requests_pending", "idx_balance_requests_status_created"],
+    run: () => storage.getBalanceRequestsWithUsers({ status: "pending" }),
+  },
+  { name: "balance transactions by user", indexes: ["idx_balance_transactions_user_created"], run: () => storage.getBalanceTransactions(userId) },
+  { name: "support messages", indexes: ["idx_support_messages_created"], run: () => storage.getSupportMessagesWithUsers({}) },
+  { name: "support messages by user", indexes: ["idx_support_messages_user_created"], run: () => storage.getSupportMessagesWithUsers({ userId }) },
+  { name: "notifications by user", indexes: ["idx_notifications_user_created"], run: () => storage.getNotifications(userId) },
+  { name: "unread notification count", indexes: ["idx_notifications_unread"], run: () => storage.getUnreadNotificationsCount(userId) },
+  { name: "unread counts of all users", indexes: ["idx_notifications_unread"], run: () => storage.getUnreadNotificationCounts() },
+  { name: "notes by user", indexes: ["idx_notes_user_updated"], run: () => storage.getNotes(userId) },
+];
+
+// Collects the statements a storage call sends instead of running them
+async function capture(run: () => Promise<unknown>): Promise<Array<{ text: string; values: unknown[] }>> {
+  const statements: Array<{ text: string; values: unknown[] }> = [];
+  const query = pool.query;
+  (pool as any).query = (config: string | { text: string }, values?: unknown[]) => {
+    statements.push({ text: typeof config === "string" ? config : config.text, values: values ?? [] });
+    return Promise.resolve({ rows: [], fields: [], rowCount: 0 });
+  };
+  try {
+    await run();
+  } catch {
+    // Methods that expect a row fail on the empty result; the SQL is already captured
+  } finally {
+    (pool as any).query = query;
+  }
+  return statements;
+}
+
+function indexesIn(node: PlanNode, found: Set<string> = new Set()): Set<string> {
+  if (node["Index Name"]) found.add(node["Index Name"]);
+  for (const child of node.Plans ?? []) indexesIn(child, found);
+  return found;
+}
+
+async function explain(text: string, values: unknown[], options: { analyze: boolean }) {
+  const client = await pool.connect();
+  try {
+    await client.query("BEGIN");
+    if (!options.analyze) {
+      await client.query("SET LOCAL enable_seqscan = off");
+    }
+    const result = await client.query(`EXPLAIN (${options.analyze ? "ANALYZE, " : ""}FORMAT JSON) ${text}`, values);
+    return result.rows[0]["QUERY PLAN"][0] as { Plan: PlanNode; "Execution Time"?: number };
+  } finally {
+    await client.query("ROLLBACK");
+    client.release();
+  }
+}
+
+async function main() {
+  let failures = 0;
+
+  for (const check of checks) {
+    const [statement] = (await capture(check.run)).filter((s) => /^\s*select/i.test(s.text));
+    if (!statement) {
+      console.log(`✗ ${check.name}: no SELECT captured`);
+      failures++;
+      continue;
+    }
+
+    const plan = await explain(statement.text, statement.values, { analyze: false });
+    const used = indexesIn(plan.Plan);
+    const ok = check.indexes.some((index) => used.has(index));
+    if (!ok) failures++;
+
+    let timing = "";
+    if (analyze) {
+      const analyzed = await explain(statement.text, statement.values, { analyze: true });
+      timing = ` ${analyzed["Execution Time"]?.toFixed(3)}ms (${analyzed.Plan["Node Type"]})`;
+    }
+    const usedList = used.size > 0 ? Array.from(used).join(", ") : "no index";
+    console.log(`${ok ? "✓" : "✗"} ${check.name}: ${usedList}${timing}`);
+  }
+
+  console.log(failures === 0 ? `\nAll ${checks.length} queries use their indexes` : `\n${failures} of ${checks.length} queries missed their index`);
+  await pool.end();
+  process.exit(failures === 0 ? 0 : 1);
+}
+
+main().catch(async (error) => {
+  console.error("Index check failed:", error);
+  await pool.end();
+  process.exit(1);
+});
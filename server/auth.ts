@@ -1,6 +1,6 @@
-
 import bcrypt from "bcrypt";
 import { storage } from "./storage";
+import { authCache, type Principal } from "./authCache";
 import type { Request, Response, NextFunction } from "express";
 
 export async function hashPassword(password: string): Promise<string> {
@@ -17,3 +17,40 @@ export const isAuthenticated = (req: Request, res: Response, next: NextFunction)
   }
   res.status(401).json({ message: "Unauthorized" });
 };
+
+// The user behind a session, served from the auth cache when possible
+export async function getPrincipal(userId: string): Promise<Principal | undefined> {
+  const cached = authCache.principals.get(userId);
+  if (cached) {
+    return cached;
+  }
+
+  const generation = authCache.principals.generation;
+  const user = await storage.getUser(userId);
+  if (!user) {
+    return undefined;
+  }
+  const { password: _password, ...principal } = user;
+  if (generation === authCache.principals.generation) {
+    authCache.principals.set(userId, principal);
+  }
+  return principal;
+}
+
+// Ownership check for routes that need nothing else from the repository row
+export async function getRepositoryOwner(repositoryId: string): Promise<string | undefined> {
+  let owner = authCache.owners.get(repositoryId);
+  if (owner === undefined) {
+    const repo = await storage.getRepositoryById(repositoryId);
+    if (!repo) {
+      return undefined;
+    }
+    owner = repo.userId;
+    authCache.owners.set(repositoryId, owner);
+  }
+  return owner;
+}
+
+export async function ownsRepository(userId: string, repositoryId: string): Promise<boolean> {
+  return (await getRepositoryOwner(repositoryId)) === userId;
+}
@@ -0,0 +1,103 @@
+import type { Store, SessionData } from "express-session";
+import type { PublicUser } from "@shared/schema";
+import { TtlCache } from "./ttlCache";
+
+// Sessions and users are re-read from Postgres at most this often per entry.
+// Other server instances see logouts and role changes once their entries expire.
+const AUTH_CACHE_TTL_MS = parseInt(process.env.AUTH_CACHE_TTL_MS || "30000", 10);
+// Repositories never change owner, so ownership can be kept much longer
+const OWNERSHIP_CACHE_TTL_MS = parseInt(process.env.OWNERSHIP_CACHE_TTL_MS || "600000", 10);
+// Session expiry is pushed back at most this often instead of on every request
+const SESSION_TOUCH_INTERVAL_MS = parseInt(process.env.SESSION_TOUCH_INTERVAL_MS || "300000", 10);
+const AUTH_CACHE_MAX_ENTRIES = parseInt(process.env.AUTH_CACHE_MAX_ENTRIES || "10000", 10);
+
+// What authorization checks need to know about a user
+export type Principal = PublicUser;
+
+/**
+ * In-process caches for the authentication hot path: session rows, the users
+ * behind them and repository owners. Writes that change who a user is (logout,
+ * password or admin changes, balance updates) invalidate through
+ * invalidateUser; everything else ages out after its TTL.
+ */
+class AuthCache {
+  readonly principals = new TtlCache<string, Principal>(AUTH_CACHE_TTL_MS, AUTH_CACHE_MAX_ENTRIES);
+  readonly owners = new TtlCache<string, string>(OWNERSHIP_CACHE_TTL_MS, AUTH_CACHE_MAX_ENTRIES);
+  // Serialized session data, so each request gets its own copy to modify
+  private sessions = new TtlCache<string, { userId?: string; data: string }>(AUTH_CACHE_TTL_MS, AUTH_CACHE_MAX_ENTRIES);
+  private touched = new TtlCache<string, true>(SESSION_TOUCH_INTERVAL_MS, AUTH_CACHE_MAX_ENTRIES);
+
+  invalidateUser(userId: string): void {
+    this.principals.delete(userId);
+    this.sessions.deleteWhere((session) => session.userId === userId);
+  }
+
+  /**
+   * Serves session reads from memory and skips most expiry touches. Writes go
+   * straight to the store and refresh the cached copy.
+   */
+  wrapSessionStore<S extends Store>(store: S): S {
+    const get = store.get.bind(store);
+    const set = store.set.bind(store);
+    const destroy = store.destroy.bind(store);
+    const touch = store.touch?.bind(store);
+
+    store.get = (sid, callback) => {
+      const cached = this.sessions.get(sid);
+      if (cached) {
+        const session = JSON.parse(cached.data) as SessionData;
+        if (!session.cookie?.expires || new Date(session.cookie.expires).getTime() > Date.now()) {
+          return callback(null, session);
+        }
+      }
+      const generation = this.sessions.generation;
+      get(sid, (error, session) => {
+        if (!error && session && generation === this.sessions.generation) {
+          this.sessions.set(sid, { userId: session.userId, data: JSON.stringify(session) });
+        }
+        callback(error, session);
+      });
+    };
+
+    store.set = (sid, session, callback) => {
+      this.sessions.delete(sid);
+      set(sid, session, (error) => {
+        if (!error) {
+          this.sessions.set(sid, { userId: session.userId, data: JSON.stringify(session) });
+          this.touched.set(sid, true);
+        }
+        callback?.(error);
+      });
+    };
+
+    store.destroy = (sid, callback) => {
+      this.sessions.delete(sid);
+      this.touched.delete(sid);
+      destroy(sid, callback);
+    };
+
+    if (touch) {
+      store.touch = (sid, session, callback) => {
+        if (this.touched.get(sid)) {
+          return callback?.();
+        }
+        this.touched.set(sid, true);
+        touch(sid, session, callback);
+      };
+    }
+
+    return store;
+  }
+
+  getStats() {
+    return {
+      ttlMs: AUTH_CACHE_TTL_MS,
+      sessions: this.sessions.getStats(),
+      principals: this.principals.getStats(),
+      owners: this.owners.getStats(),
+      touchesSkipped: this.touched.getStats().hits,
+    };
+  }
+}
+
+export const authCache = new AuthCache();
@@ -0,0 +1,103 @@
+import { test } from "node:test";
+import assert from "node:assert/strict";
+
+// Limits are read when the module loads
+process.env.BOT_UPDATE_CONCURRENCY = "2";
+process.env.BOT_UPDATE_QUEUE_MAX = "4";
+const { botUpdateQueue } = await import("./botUpdateQueue");
+
+// A task that runs until release() is called
+function blocker() {
+  let release!: () => void;
+  const done = new Promise<void>((resolve) => {
+    release = resolve;
+  });
+  return { task: () => done, release };
+}
+
+const settle = () => new Promise((resolve) => setImmediate(resolve));
+
+test("updates of one chat run one at a time in arrival order", async () => {
+  const order: string[] = [];
+  const first = blocker();
+  botUpdateQueue.push("ordered", async () => {
+    order.push("first:start");
+    await first.task();
+    order.push("first:end");
+  });
+  botUpdateQueue.push("ordered", async () => {
+    order.push("second");
+  });
+
+  await settle();
+  assert.deepEqual(order, ["first:start"]);
+  first.release();
+  await settle();
+  assert.deepEqual(order, ["first:start", "first:end", "second"]);
+});
+
+test("a busy chat does not hold up other chats", async () => {
+  const busy = blocker();
+  const ran: string[] = [];
+  botUpdateQueue.push("busy", busy.task);
+  botUpdateQueue.push("busy", async () => {
+    ran.push("busy");
+  });
+  botUpdateQueue.push("other", async () => {
+    ran.push("other");
+  });
+
+  await settle();
+  assert.deepEqual(ran, ["other"]);
+  busy.release();
+  await settle();
+  assert.deepEqual(ran, ["other", "busy"]);
+});
+
+test("a failing update is counted and the chat carries on", async () => {
+  const { failed, processed } = botUpdateQueue.getStats();
+  botUpdateQueue.push("failing", async () => {
+    throw new Error("boom");
+  });
+  botUpdateQueue.push("failing", async () => {});
+
+  await settle();
+  const stats = botUpdateQueue.getStats();
+  assert.equal(stats.failed, failed + 1);
+  assert.equal(stats.processed, processed + 1);
+  assert.equal(stats.chats, 0);
+});
+
+test("updates are dropped once the queue is full", async () => {
+  const slots = [blocker(), blocker()];
+  slots.forEach((slot, i) => botUpdateQueue.push(`slot-${i}`, slot.task));
+
+  const dropped = botUpdateQueue.getStats().dropped;
+  const accepted = [1, 2, 3, 4, 5].map((i) => botUpdateQueue.push(`waiting-${i}`, async () => {}));
+  assert.deepEqual(accepted, [true, true, true, true, false]);
+  assert.equal(botUpdateQueue.isFull(), true);
+  assert.equal(botUpdateQueue.getStats().dropped, dropped + 1);
+
+  slots.forEach((slot) => slot.release());
+  await settle();
+  assert.equal(botUpdateQueue.getStats().queued, 0);
+});
+
+// Registers a listener for good, so it runs last
+test("with a pressure listener the queue reports full and half empty instead of dropping", async () => {
+  const events: boolean[] = [];
+  botUpdateQueue.onPressure((full) => events.push(full));
+
+  const slots = [blocker(), blocker()];
+  slots.forEach((slot, i) => botUpdateQueue.push(`slot-${i}`, slot.task));
+  const accepted = [1, 2, 3, 4, 5, 6].map((i) => botUpdateQueue.push(`waiting-${i}`, async () => {}));
+
+  assert.ok(accepted.every(Boolean));
+  assert.equal(botUpdateQueue.getStats().queued, 6);
+  assert.deepEqual(events, [true]);
+
+  slots.forEach((slot) => slot.release());
+  await settle();
+  assert.deepEqual(events, [true, false]);
+  assert.equal(botUpdateQueue.getStats().queued, 0);
+});
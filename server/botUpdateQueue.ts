@@ -0,0 +1,153 @@
+// Bot updates handled at the same time across all chats
+const BOT_UPDATE_CONCURRENCY = parseInt(process.env.BOT_UPDATE_CONCURRENCY || "8", 10);
+// Updates waiting beyond this are refused so Telegram redelivers them later, or
+// pause polling (see onPressure)
+const BOT_UPDATE_QUEUE_MAX = parseInt(process.env.BOT_UPDATE_QUEUE_MAX || "1000", 10);
+// Recent queue lags kept for the percentiles in getStats()
+const LAG_SAMPLES = 512;
+
+type ChatKey = number | string;
+
+interface QueuedUpdate {
+  task: () => Promise<void>;
+  enqueuedAt: number;
+}
+
+export interface BotUpdateQueueStats {
+  concurrency: number;
+  maxQueued: number;
+  queued: number;
+  active: number;
+  chats: number;
+  processed: number;
+  failed: number;
+  dropped: number;
+  // Time from arrival until a handler started, over the last LAG_SAMPLES updates
+  lagMs: { p50: number; p95: number; max: number };
+  // How long the oldest waiting update has been queued
+  oldestWaitingMs: number;
+}
+
+/**
+ * Runs Telegram update handlers off the receiving path. Updates of one chat
+ * run strictly in arrival order, one at a time, while different chats share
+ * BOT_UPDATE_CONCURRENCY handler slots round-robin, so a burst from one chat
+ * neither reorders its own conversation nor starves the others.
+ */
+class BotUpdateQueue {
+  // Chats with queued or running updates; a chat's array holds only the queued ones
+  private chats: Map<ChatKey, QueuedUpdate[]> = new Map();
+  // Chats with queued updates and nothing running, in the order they get a slot
+  private ready: ChatKey[] = [];
+  private queued = 0;
+  private active = 0;
+  private processed = 0;
+  private failed = 0;
+  private dropped = 0;
+  private lags: number[] = [];
+  private lagIndex = 0;
+  private pressureListener: ((full: boolean) => void) | null = null;
+  private pressured = false;
+
+  isFull(): boolean {
+    return this.queued >= BOT_UPDATE_QUEUE_MAX;
+  }
+
+  // For receivers that can stop fetching: called with true once the queue is
+  // full and with false once it is half empty again. While a listener is set,
+  // push() queues past the limit instead of dropping.
+  onPressure(listener: (full: boolean) => void): void {
+    this.pressureListener = listener;
+  }
+
+  // false when the queue is full and the update was dropped
+  push(chatId: ChatKey, task: () => Promise<void>): boolean {
+    if (this.isFull() && !this.pressureListener) {
+      this.dropped++;
+      console.warn(`[BotUpdates] Queue full (${this.queued} waiting), dropping update for chat ${chatId}`);
+      return false;
+    }
+
+    const update = { task, enqueuedAt: Date.now() };
+    const chat = this.chats.get(chatId);
+    if (chat) {
+      // Already ready or running; a running chat is made ready again when it finishes
+      chat.push(update);
+    } else {
+      this.chats.set(chatId, [update]);
+      this.ready.push(chatId);
+    }
+    this.queued++;
+    this.drain();
+    if (!this.pressured && this.pressureListener && this.isFull()) {
+      this.pressured = true;
+      this.pressureListener(true);
+    }
+    return true;
+  }
+
+  private drain(): void {
+    while (this.active < BOT_UPDATE_CONCURRENCY && this.ready.length > 0) {
+      const chatId = this.ready.shift()!;
+      const update = this.chats.get(chatId)!.shift()!;
+      this.queued--;
+      this.active++;
+      this.recordLag(Date.now() - update.enqueuedAt);
+      this.run(chatId, update);
+    }
+    if (this.pressured && this.queued <= BOT_UPDATE_QUEUE_MAX / 2) {
+      this.pressured = false;
+      this.pressureListener?.(false);
+    }
+  }
+
+  private async run(chatId: ChatKey, update: QueuedUpdate): Promise<void> {
+    try {
+      await update.task();
+      this.processed++;
+    } catch (error) {
+      this.failed++;
+      console.error(`[BotUpdates] Update for chat ${chatId} failed:`, error);
+    } finally {
+      this.active--;
+      const chat = this.chats.get(chatId)!;
+      if (chat.length > 0) {
+        this.ready.push(chatId);
+      } else {
+        this.chats.delete(chatId);
+      }
+      this.drain();
+    }
+  }
+
+  private recordLag(lagMs: number): void {
+    this.lags[this.lagIndex] = lagMs;
+    this.lagIndex = (this.lagIndex + 1) % LAG_SAMPLES;
+  }
+
+  getStats(): BotUpdateQueueStats {
+    const lags = this.lags.slice().sort((a, b) => a - b);
+    const percentile = (p: number) => (lags.length > 0 ? lags[Math.min(lags.length - 1, Math.floor(lags.length * p))] : 0);
+
+    const now = Date.now();
+    let oldestWaitingMs = 0;
+    this.chats.forEach((chat) => {
+      if (chat.length > 0) oldestWaitingMs = Math.max(oldestWaitingMs, now - chat[0].enqueuedAt);
+    });
+
+    return {
+      concurrency: BOT_UPDATE_CONCURRENCY,
+      maxQueued: BOT_UPDATE_QUEUE_MAX,
+      queued: this.queued,
+      active: this.active,
+      chats: this.chats.size,
+      processed: this.processed,
+      failed: this.failed,
+      dropped: this.dropped,
+      lagMs: { p50: percentile(0.5), p95: percentile(0.95), max: lags.length > 0 ? lags[lags.length - 1] : 0 },
+      oldestWaitingMs,
+    };
+  }
+}
+
+export const botUpdateQueue = new BotUpdateQueue();
@@ -0,0 +1,175 @@
+import { spawn } from "child_process";
+import * as fs from "fs";
+import * as path from "path";
+import { interpreterRegistry, type Interpreter } from "./interpreters";
+
+// Cached modules not used by any start for this long are removed
+const BYTECODE_MAX_IDLE_DAYS = parseFloat(process.env.PYTHON_BYTECODE_MAX_IDLE_DAYS || "14");
+const PRUNE_INTERVAL_MS = 24 * 60 * 60 * 1000;
+
+// Reads {"store": dir, "files": [paths]} on stdin. Every source is compiled
+// once per SHA-256 of its content into the store as a checked-hash pyc, which
+// stays valid wherever identical source lives. The cached pyc is then linked to
+// the path the import system looks at (under PYTHONPYCACHEPREFIX), so imports
+// and the entry script loader skip parsing and compiling. Prints counts as JSON.
+const PREPARE_SOURCE = `
+import hashlib, importlib.util, json, os, py_compile, sys, tempfile
+
+request = json.load(sys.stdin)
+store = request["store"]
+os.makedirs(store, exist_ok=True)
+result = {"files": 0, "hits": 0, "misses": 0, "errors": 0}
+
+def place(cached, target):
+    if os.path.exists(target) and os.path.samefile(cached, target):
+        return
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    temp = "%s.%d.tmp" % (target, os.getpid())
+    try:
+        os.link(cached, temp)
+    except OSError:
+        with open(cached, "rb") as src, open(temp, "wb") as dst:
+            dst.write(src.read())
+    os.replace(temp, target)
+
+for source in request["files"]:
+    result["files"] += 1
+    try:
+        with open(source, "rb") as f:
+            digest = hashlib.sha256(f.read()).hexdigest()
+        cached = os.path.join(store, digest + ".pyc")
+        if os.path.exists(cached):
+            os.utime(cached)
+            result["hits"] += 1
+        else:
+            fd, temp = tempfile.mkstemp(dir=store, suffix=".tmp")
+            os.close(fd)
+            try:
+                py_compile.compile(source, cfile=temp, doraise=True,
+                                   invalidation_mode=py_compile.PycInvalidationMode.CHECKED_HASH)
+                os.replace(temp, cached)
+            finally:
+                if os.path.exists(temp):
+                    os.remove(temp)
+            result["misses"] += 1
+        place(cached, importlib.util.cache_from_source(source))
+    except (OSError, ValueError, py_compile.PyCompileError):
+        # Syntax errors surface when the program runs
+        result["errors"] += 1
+
+print(json.dumps(result))
+`;
+
+export interface BytecodeStats {
+  entries: number;
+  bytes: number;
+  files: number;
+  hits: number;
+  misses: number;
+  errors: number;
+  hitRate: number;
+}
+
+/**
+ * Shared bytecode for hosted Python sources, keyed by interpreter version and
+ * source content. Restarts, and repositories that share files, load compiled
+ * code instead of recompiling it.
+ */
+class BytecodeCache {
+  private counters = { files: 0, hits: 0, misses: 0, errors: 0 };
+
+  constructor() {
+    setInterval(() => {
+      this.pruneIdle().catch((error) => console.error("[Bytecode] Prune failed:", error));
+    }, PRUNE_INTERVAL_MS).unref();
+  }
+
+  // Compile (or reuse) bytecode for the given .py files before the interpreter starts
+  prepare(interpreter: Interpreter, files: string[]): Promise<{ files: number; hits: number; misses: number; errors: number }> {
+    return new Promise((resolve, reject) => {
+      const compile = spawn(interpreter.executable, ["-c", PREPARE_SOURCE], {
+        env: { ...process.env, PYTHONPYCACHEPREFIX: interpreter.pycachePrefix },
+        stdio: ["pipe", "pipe", "pipe"],
+      });
+      let stdout = "";
+      let stderr = "";
+      compile.stdout.on("data", (data: Buffer) => {
+        stdout += data.toString();
+      });
+      compile.stderr.on("data", (data: Buffer) => {
+        stderr += data.toString();
+      });
+      compile.on("error", reject);
+      compile.on("close", (code) => {
+        if (code !== 0) {
+          reject(new Error(stderr.trim().split("\n").pop() || `bytecode compiler exited with code ${code}`));
+          return;
+        }
+        try {
+          const result = JSON.parse(stdout);
+          this.counters.files += result.files;
+          this.counters.hits += result.hits;
+          this.counters.misses += result.misses;
+          this.counters.errors += result.errors;
+          resolve(result);
+        } catch (error) {
+          reject(error);
+        }
+      });
+      compile.stdin.end(JSON.stringify({ store: interpreter.codeCacheDir, files }));
+    });
+  }
+
+  async getStats(): Promise<BytecodeStats> {
+    let entries = 0;
+    let bytes = 0;
+    for (const interpreter of interpreterRegistry.list()) {
+      for (const { stat } of await this.listEntries(interpreter)) {
+        entries++;
+        bytes += stat.size;
+      }
+    }
+    const lookups = this.counters.hits + this.counters.misses;
+    return {
+      entries,
+      bytes,
+      ...this.counters,
+      hitRate: lookups ? this.counters.hits / lookups : 0,
+    };
+  }
+
+  private async listEntries(interpreter: Interpreter): Promise<Array<{ file: string; stat: fs.Stats }>> {
+    let names: string[];
+    try {
+      names = await fs.promises.readdir(interpreter.codeCacheDir);
+    } catch {
+      return [];
+    }
+    const entries: Array<{ file: string; stat: fs.Stats }> = [];
+    for (const name of names) {
+      if (!name.endsWith(".pyc")) continue;
+      const file = path.join(interpreter.codeCacheDir, name);
+      const stat = await fs.promises.stat(file).catch(() => null);
+      if (stat) entries.push({ file, stat });
+    }
+    return entries;
+  }
+
+  // Linked copies under the pycache prefix stay valid; only the shared entry goes
+  private async pruneIdle(): Promise<void> {
+    const cutoff = Date.now() - BYTECODE_MAX_IDLE_DAYS * 24 * 60 * 60 * 1000;
+    let removed = 0;
+    for (const interpreter of interpreterRegistry.list()) {
+      for (const { file, stat } of await this.listEntries(interpreter)) {
+        if (stat.mtimeMs >= cutoff) continue;
+        await fs.promises.rm(file, { force: true });
+        removed++;
+      }
+    }
+    if (removed > 0) {
+      console.log(`[Bytecode] Removed ${removed} idle cache entries`);
+    }
+  }
+}
+
+export const bytecodeCache = new BytecodeCache();
@@ -0,0 +1,21 @@
+// Run `worker` over `items` with at most `limit` calls in flight.
+// Results keep the order of `items`.
+export async function mapWithConcurrency<T, R>(
+  items: T[],
+  limit: number,
+  worker: (item: T, index: number) => Promise<R>
+): Promise<R[]> {
+  const results = new Array<R>(items.length);
+  let next = 0;
+
+  const run = async () => {
+    while (next < items.length) {
+      const index = next++;
+      results[index] = await worker(items[index], index);
+    }
+  };
+
+  const runners = Array.from({ length: Math.max(1, Math.min(limit, items.length)) }, run);
+  await Promise.all(runners);
+  return results;
+}
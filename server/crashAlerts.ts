@@ -0,0 +1,162 @@
+import { storage } from "./storage";
+import { getPrincipal } from "./auth";
+import { scheduler } from "./scheduler";
+import { EXIT_REASON_MESSAGES, type ExitReason } from "./resourceLimits";
+import type { RepositoryStatusEvent } from "./pythonProcessManager";
+
+// Events arriving this long after an owner's first alert go into the same message
+const BOT_ALERT_WINDOW_MS = parseInt(process.env.BOT_ALERT_WINDOW_MS || "5000", 10);
+// At most one alert message per owner this often; later events wait and are batched
+const BOT_ALERT_MIN_INTERVAL_MS = parseInt(process.env.BOT_ALERT_MIN_INTERVAL_MS || "60000", 10);
+// Recent log lines attached per repository
+const BOT_ALERT_LOG_LINES = parseInt(process.env.BOT_ALERT_LOG_LINES || "10", 10);
+const MAX_LOG_LINE_LENGTH = 200;
+// Telegram rejects longer messages
+const TELEGRAM_MESSAGE_LIMIT = 4096;
+
+interface RepositoryAlert {
+  name: string;
+  crashes: number;
+  exitReason: ExitReason | null;
+  parked: boolean;
+  nextRestartAt: number | null;
+  recovered: boolean;
+}
+
+interface PendingDigest {
+  chatId: string;
+  repositories: Map<string, RepositoryAlert>;
+}
+
+type Sender = (chatId: string, text: string) => Promise<unknown>;
+
+/**
+ * Tells repository owners on Telegram when their repositories crash, get
+ * parked after a crash loop or are restarted. Events per owner are collected
+ * into one digest that is sent after BOT_ALERT_WINDOW_MS, and no owner gets
+ * more than one message per BOT_ALERT_MIN_INTERVAL_MS; a crash loop becomes a
+ * single message with a crash count rather than one message per exit.
+ */
+class CrashAlerts {
+  // Keyed by owner user id
+  private pending: Map<string, PendingDigest> = new Map();
+  private lastSentAt: Map<string, number> = new Map();
+  private send: Sender | null = null;
+
+  start(send: Sender): void {
+    this.send = send;
+    scheduler.onStatusChange((event) => {
+      this.handle(event).catch((error) => {
+        console.error(`[CrashAlerts] Failed to handle ${event.transition} of ${event.repositoryId}:`, error);
+      });
+    });
+  }
+
+  private async handle(event: RepositoryStatusEvent): Promise<void> {
+    // A repository that is back up before the digest goes out is reported as recovered
+    if (event.transition === "running") {
+      this.pending.forEach((digest) => {
+        const alert = digest.repositories.get(event.repositoryId);
+        if (alert) alert.recovered = true;
+      });
+      return;
+    }
+    if (event.transition !== "crashed" && event.transition !== "parked" && event.transition !== "restarting") {
+      return;
+    }
+
+    const repository = await storage.getRepositoryById(event.repositoryId);
+    if (!repository) return;
+    const digest = this.pending.get(repository.userId) ?? (await this.openDigest(repository.userId));
+    if (!digest) return;
+
+    let alert = digest.repositories.get(repository.id);
+    if (!alert) {
+      alert = { name: repository.name, crashes: 0, exitReason: null, parked: false, nextRestartAt: null, recovered: false };
+      digest.repositories.set(repository.id, alert);
+    }
+    alert.recovered = false;
+    if (event.transition === "crashed") {
+      alert.crashes++;
+      alert.exitReason = event.exitReason ?? alert.exitReason;
+      alert.nextRestartAt = null;
+    } else if (event.transition === "parked") {
+      alert.parked = true;
+      alert.nextRestartAt = null;
+    } else {
+      alert.nextRestartAt = event.nextRestartAt;
+    }
+  }
+
+  // Starts collecting events for an owner with a linked chat
+  private async openDigest(userId: string): Promise<PendingDigest | undefined> {
+    const owner = await getPrincipal(userId);
+    if (!owner?.telegramChatId) return undefined;
+
+    // Another event may have opened it while the owner was loaded
+    const existing = this.pending.get(userId);
+    if (existing) return existing;
+
+    const now = Date.now();
+    this.lastSentAt.forEach((sentAt, id) => {
+      if (now - sentAt >= BOT_ALERT_MIN_INTERVAL_MS) this.lastSentAt.delete(id);
+    });
+    const dueAt = Math.max(now + BOT_ALERT_WINDOW_MS, (this.lastSentAt.get(userId) ?? 0) + BOT_ALERT_MIN_INTERVAL_MS);
+    setTimeout(() => this.flush(userId), dueAt - now).unref();
+
+    const digest: PendingDigest = { chatId: owner.telegramChatId, repositories: new Map() };
+    this.pending.set(userId, digest);
+    return digest;
+  }
+
+  private async flush(userId: string): Promise<void> {
+    const digest = this.pending.get(userId);
+    this.pending.delete(userId);
+    if (!digest || digest.repositories.size === 0 || !this.send) return;
+
+    this.lastSentAt.set(userId, Date.now());
+    try {
+      await this.send(digest.chatId, this.render(digest));
+    } catch (error: any) {
+      console.error(`[CrashAlerts] Failed to notify ${userId}: ${error.message}`);
+    }
+  }
+
+  private render(digest: PendingDigest): string {
+    const count = digest.repositories.size;
+    const sections = Array.from(digest.repositories.entries()).map(([repositoryId, alert]) => {
+      const lines: string[] = [];
+      if (alert.crashes > 0) {
+        const times = alert.crashes > 1 ? ` ${alert.crashes} times` : "";
+        const reason = alert.exitReason ? `: ${EXIT_REASON_MESSAGES[alert.exitReason]}` : "";
+        lines.push(`❌ ${alert.name} crashed${times}${reason}`);
+      } else {
+        lines.push(`🔁 ${alert.name} is restarting`);
+      }
+
+      if (alert.recovered) {
+        lines.push("✅ Running again");
+      } else if (alert.parked) {
+        lines.push("🛑 Crash loop detected: automatic restarts paused until the next manual start");
+      } else if (alert.nextRestartAt) {
+        const seconds = Math.max(0, Math.round((alert.nextRestartAt - Date.now()) / 1000));
+        lines.push(seconds > 0 ? `🔁 Restarting in ${seconds}s` : "🔁 Restarting");
+      }
+
+      const logLines = scheduler
+        .getLogBacklog(repositoryId)
+        .slice(-BOT_ALERT_LOG_LINES)
+        .map((entry) => (entry.line.length > MAX_LOG_LINE_LENGTH ? `${entry.line.slice(0, MAX_LOG_LINE_LENGTH)}…` : entry.line));
+      if (logLines.length > 0) {
+        lines.push("", "Last log lines:", ...logLines);
+      }
+      return lines.join("\n");
+    });
+
+    const header = count > 1 ? `⚠️ ${count} repositories need attention` : "⚠️ Repository alert";
+    const text = [header, ...sections].join("\n\n");
+    return text.length > TELEGRAM_MESSAGE_LIMIT ? `${text.slice(0, TELEGRAM_MESSAGE_LIMIT - 1)}…` : text;
+  }
+}
+
+export const crashAlerts = new CrashAlerts();
@@ -0,0 +1,36 @@
+import { test } from "node:test";
+import assert from "node:assert/strict";
+import { normalizeRequirements, requirementName } from "./depEnvironments";
+
+test("formatting differences normalize to the same requirements", () => {
+  const a = normalizeRequirements("Flask==2.0\n# web\nrequests >= 2.31  # http\n\n");
+  const b = normalizeRequirements("requests>=2.31\r\nflask == 2.0\r\n");
+
+  assert.deepEqual(a, ["flask==2.0", "requests>=2.31"]);
+  assert.deepEqual(a, b);
+});
+
+test("names are compared in canonical form and duplicates collapse", () => {
+  assert.deepEqual(normalizeRequirements("Python_Telegram.Bot\npython-telegram-bot\n"), ["python-telegram-bot"]);
+  assert.deepEqual(normalizeRequirements("uvicorn [ standard ] >= 0.20"), ["uvicorn[standard]>=0.20"]);
+});
+
+test("markers, URLs and options keep their tokens", () => {
+  assert.deepEqual(normalizeRequirements('pywin32 >= 300 ; sys_platform == "win32"'), ['pywin32>=300 ; sys_platform == "win32"']);
+  assert.deepEqual(normalizeRequirements("pkg @ https://example.com/pkg-1.0.tar.gz"), ["pkg @ https://example.com/pkg-1.0.tar.gz"]);
+  assert.deepEqual(normalizeRequirements("-r   base.txt\n--index-url  https://example.com/simple"), [
+    "--index-url https://example.com/simple",
+    "-r base.txt",
+  ]);
+});
+
+test("a '#' inside a token is not a comment", () => {
+  assert.deepEqual(normalizeRequirements("pkg @ https://example.com/pkg.zip#sha256=abc"), ["pkg @ https://example.com/pkg.zip#sha256=abc"]);
+});
+
+test("requirementName extracts the canonical package name", () => {
+  assert.equal(requirementName("Django>=4.2"), "django");
+  assert.equal(requirementName(" python_telegram.bot[socks] ~= 20.0"), "python-telegram-bot");
+  assert.equal(requirementName('pywin32; sys_platform == "win32"'), "pywin32");
+  assert.equal(requirementName("pkg @ https://example.com/pkg.zip"), "pkg");
+});
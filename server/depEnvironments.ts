@@ -0,0 +1,385 @@
+import { createHash, randomBytes } from "crypto";
+import * as fs from "fs";
+import * as path from "path";
+import { wheelhouse, type PipOptions, type PipResult } from "./wheelhouse";
+import type { Interpreter } from "./interpreters";
+
+const PYTHON_ENV_DIR = process.env.PYTHON_ENV_DIR || path.join(process.cwd(), "pyenvs");
+// Environments not used by a start or a running process for this long are removed
+const ENV_MAX_IDLE_DAYS = parseFloat(process.env.PYTHON_ENV_MAX_IDLE_DAYS || "14");
+const PRUNE_INTERVAL_MS = 24 * 60 * 60 * 1000;
+
+export interface PythonEnvironment {
+  key: string;
+  dir: string;
+  sitePackages: string;
+  binDir: string;
+  // True when an existing environment was reused and pip did not run
+  reused: boolean;
+}
+
+type OutputHandler = NonNullable<PipOptions["onOutput"]>;
+
+// Lines that refer to local files or other requirement files; environments
+// using them cannot be shared between repositories.
+const PRIVATE_REQUIREMENT = /^(-e|--editable|-r|--requirement|-c|--constraint|\.|\/)|file:/;
+// -r/-c lines and the file they name
+const REFERENCE = /^(?:-r|--requirement|-c|--constraint)(?:\s+|=)(.+)$/;
+
+/**
+ * Normalise requirements.txt so formatting differences (comments, blank lines,
+ * ordering, name casing) do not produce different environments.
+ */
+export function normalizeRequirements(text: string): string[] {
+  const lines = new Set<string>();
+  for (const raw of text.split(/\r?\n/)) {
+    const line = raw.replace(/(^|\s)#.*$/, "").trim();
+    if (!line) continue;
+
+    if (line.startsWith("-")) {
+      lines.add(line.replace(/\s+/g, " "));
+      continue;
+    }
+
+    const match = line.match(/^([A-Za-z0-9][A-Za-z0-9._-]*)(.*)$/);
+    if (match) {
+      const name = match[1].toLowerCase().replace(/[-_.]+/g, "-");
+      // Spaces are insignificant only in extras and version specifiers; a URL,
+      // environment marker or per-requirement option keeps its tokens
+      const rest = match[2].trim();
+      const boundary = rest.search(/@|;|\s--/);
+      const specifier = (boundary === -1 ? rest : rest.slice(0, boundary)).replace(/\s+/g, "");
+      const tail = boundary === -1 ? "" : rest.slice(boundary).trim().replace(/\s+/g, " ");
+      lines.add(tail ? `${name}${specifier} ${tail}` : name + specifier);
+    } else {
+      lines.add(line);
+    }
+  }
+  return Array.from(lines).sort();
+}
+
+// Package name of a requirement specifier, in PEP 503 canonical form
+export function requirementName(spec: string): string {
+  return spec.trim().split(/[<>=!~\[;@ ]/)[0].toLowerCase().replace(/[-_.]+/g, "-");
+}
+
+/**
+ * Content-addressed Python dependency environments. Each environment is a
+ * `pip install --target` directory keyed by the interpreter and the normalised
+ * requirements, built once and attached to processes through PYTHONPATH.
+ * Packages installed from the terminal go into a per-repository overlay so
+ * tenants never modify a shared environment.
+ */
+class DependencyEnvironments {
+  private building: Map<string, Promise<PythonEnvironment>> = new Map();
+  // Environments attached to live processes, with the number of processes using each
+  private inUse: Map<string, number> = new Map();
+
+  constructor() {
+    setInterval(() => {
+      this.pruneIdle().catch((error) => console.error("[Environments] Prune failed:", error));
+    }, PRUNE_INTERVAL_MS).unref();
+  }
+
+  async environmentKey(python: string, requirements: string[], repositoryId: string, workDir: string): Promise<string> {
+    const hash = createHash("sha256");
+    hash.update(`${python}\n`);
+    // Requirements pointing at local files are only valid inside their repository
+    if (this.isPrivate(requirements)) {
+      hash.update(`repository:${repositoryId}\n`);
+    }
+    hash.update(requirements.join("\n"));
+    // Editing a file pulled in with -r or -c has to produce a new environment too
+    await this.hashReferencedFiles(hash, requirements, workDir, workDir, new Set());
+    return hash.digest("hex").slice(0, 32);
+  }
+
+  // Nested references resolve relative to the file that contains them, as in pip
+  private async hashReferencedFiles(
+    hash: ReturnType<typeof createHash>,
+    lines: string[],
+    dir: string,
+    workDir: string,
+    seen: Set<string>
+  ): Promise<void> {
+    for (const line of lines) {
+      const match = line.match(REFERENCE);
+      if (!match) continue;
+      const file = path.resolve(dir, match[1].trim());
+      if (seen.has(file)) continue;
+      seen.add(file);
+
+      // A missing file hashes as empty; pip reports it when the environment is built
+      const content = await fs.promises.readFile(file, "utf8").catch(() => "");
+      hash.update(`\n${path.relative(workDir, file)}\n${content}`);
+      const nested = content.split(/\r?\n/).map((nestedLine) => nestedLine.replace(/(^|\s)#.*$/, "").trim());
+      await this.hashReferencedFiles(hash, nested, path.dirname(file), workDir, seen);
+    }
+  }
+
+  // The environment for these requirements if it is already built, without running pip
+  async findExisting(repositoryId: string, requirementsText: string, options: { python: string; workDir: string }): Promise<PythonEnvironment | null> {
+    const key = await this.environmentKey(options.python, normalizeRequirements(requirementsText), repositoryId, options.workDir);
+    const dir = path.join(PYTHON_ENV_DIR, key);
+    if (!fs.existsSync(path.join(dir, "manifest.json"))) {
+      return null;
+    }
+    await this.touch(dir);
+    return this.describe(key, true);
+  }
+
+  async ensureForRequirements(
+    repositoryId: string,
+    requirementsText: string,
+    options: { python: string; workDir: string; onOutput?: OutputHandler }
+  ): Promise<PythonEnvironment> {
+    const existing = await this.findExisting(repositoryId, requirementsText, options);
+    if (existing) {
+      return existing;
+    }
+
+    const requirements = normalizeRequirements(requirementsText);
+    const key = await this.environmentKey(options.python, requirements, repositoryId, options.workDir);
+
+    // Concurrent starts with the same requirements wait for one build
+    let pending = this.building.get(key);
+    if (!pending) {
+      pending = this.build(key, requirements, options).finally(() => this.building.delete(key));
+      this.building.set(key, pending);
+    }
+    return pending;
+  }
+
+  // Marks an environment as attached to a running process until the returned
+  // function is called, so pruneIdle leaves it alone however long the process runs
+  retain(key: string): () => void {
+    this.inUse.set(key, (this.inUse.get(key) ?? 0) + 1);
+    let released = false;
+    return () => {
+      if (released) return;
+      released = true;
+      const count = (this.inUse.get(key) ?? 1) - 1;
+      if (count > 0) {
+        this.inUse.set(key, count);
+      } else {
+        this.inUse.delete(key);
+      }
+    };
+  }
+
+  isPrivate(requirements: string[]): boolean {
+    return requirements.some((line) => PRIVATE_REQUIREMENT.test(line));
+  }
+
+  overlayDir(repositoryId: string): string {
+    return path.join(PYTHON_ENV_DIR, "overlays", repositoryId);
+  }
+
+  overlaySitePackages(repositoryId: string): string {
+    return path.join(this.overlayDir(repositoryId), "site-packages");
+  }
+
+  hasOverlayPackages(repositoryId: string): boolean {
+    try {
+      return fs.readdirSync(this.overlaySitePackages(repositoryId)).length > 0;
+    } catch {
+      return false;
+    }
+  }
+
+  async installIntoOverlay(repositoryId: string, packageName: string, python: string, options: PipOptions = {}): Promise<PipResult> {
+    const dir = this.overlayDir(repositoryId);
+    await fs.promises.mkdir(dir, { recursive: true });
+    return wheelhouse.install(python, [packageName], {
+      target: this.overlaySitePackages(repositoryId),
+      cwd: dir,
+      upgrade: true,
+      ...options,
+    });
+  }
+
+  // pip cannot uninstall from a --target directory, so the overlay is rebuilt
+  // from the packages that were explicitly requested, minus the removed one.
+  async uninstallFromOverlay(repositoryId: string, packageName: string, python: string, options: PipOptions = {}): Promise<PipResult> {
+    const requested = await this.requestedOverlayPackages(repositoryId);
+    const remaining = requested.filter((pkg) => requirementName(pkg) !== requirementName(packageName));
+    if (remaining.length === requested.length) {
+      throw new Error(`${packageName} is not installed for this repository`);
+    }
+
+    const dir = this.overlayDir(repositoryId);
+    const sitePackages = this.overlaySitePackages(repositoryId);
+    if (remaining.length === 0) {
+      await fs.promises.rm(sitePackages, { recursive: true, force: true });
+      return { code: 0, output: `Successfully uninstalled ${packageName}` };
+    }
+
+    // Built next to the current overlay and swapped in only once pip succeeded,
+    // so a failed or cancelled rebuild leaves the installed packages in place
+    const suffix = randomBytes(4).toString("hex");
+    const rebuilt = path.join(dir, `.site-packages.${suffix}`);
+    const previous = path.join(dir, `.site-packages.old.${suffix}`);
+    try {
+      const result = await wheelhouse.install(python, remaining, { target: rebuilt, cwd: dir, ...options });
+      if (result.code !== 0) {
+        return result;
+      }
+      await fs.promises.rename(sitePackages, previous);
+      await fs.promises.rename(rebuilt, sitePackages).catch(async (error) => {
+        await fs.promises.rename(previous, sitePackages);
+        throw error;
+      });
+      return { code: 0, output: `Successfully uninstalled ${packageName}\n${result.output}` };
+    } finally {
+      await fs.promises.rm(rebuilt, { recursive: true, force: true });
+      await fs.promises.rm(previous, { recursive: true, force: true });
+    }
+  }
+
+  async removeOverlay(repositoryId: string): Promise<void> {
+    await fs.promises.rm(this.overlayDir(repositoryId), { recursive: true, force: true });
+  }
+
+  // Environment for terminal commands: plain `pip install` lands in the overlay
+  terminalEnv(repositoryId: string, interpreter: Interpreter): NodeJS.ProcessEnv {
+    fs.mkdirSync(this.overlaySitePackages(repositoryId), { recursive: true });
+    const env = this.attach(
+      {
+        ...process.env,
+        PIP_TARGET: this.overlaySitePackages(repositoryId),
+        PYTHONPYCACHEPREFIX: interpreter.pycachePrefix,
+      },
+      repositoryId,
+      null
+    );
+    // python and pip resolve to the repository's interpreter
+    return { ...env, PATH: [interpreter.binDir, env.PATH].filter(Boolean).join(path.delimiter) };
+  }
+
+  // Build the process environment with the overlay first, then the shared environment
+  attach(baseEnv: NodeJS.ProcessEnv, repositoryId: string, environment: PythonEnvironment | null): NodeJS.ProcessEnv {
+    const pythonPath: string[] = [];
+    const binPath: string[] = [];
+
+    const overlay = this.overlaySitePackages(repositoryId);
+    if (fs.existsSync(overlay)) {
+      pythonPath.push(overlay);
+      binPath.push(path.join(overlay, "bin"));
+    }
+    if (environment) {
+      pythonPath.push(environment.sitePackages);
+      binPath.push(environment.binDir);
+    }
+    if (pythonPath.length === 0) {
+      return baseEnv;
+    }
+
+    return {
+      ...baseEnv,
+      PYTHONPATH: [...pythonPath, baseEnv.PYTHONPATH].filter(Boolean).join(path.delimiter),
+      PATH: [...binPath, baseEnv.PATH].filter(Boolean).join(path.delimiter),
+    };
+  }
+
+  private async build(
+    key: string,
+    requirements: string[],
+    options: { python: string; workDir: string; onOutput?: OutputHandler }
+  ): Promise<PythonEnvironment> {
+    const finalDir = path.join(PYTHON_ENV_DIR, key);
+    const tempDir = path.join(PYTHON_ENV_DIR, `.${key}.${randomBytes(4).toString("hex")}`);
+    await fs.promises.mkdir(tempDir, { recursive: true });
+
+    try {
+      // Private requirement sets are installed from the repository's own file so
+      // nested -r/-c references and local paths resolve as the author wrote them
+      let requirementsPath = path.join(options.workDir, "requirements.txt");
+      if (!this.isPrivate(requirements)) {
+        requirementsPath = path.join(tempDir, "requirements.txt");
+        await fs.promises.writeFile(requirementsPath, requirements.join("\n") + "\n");
+      }
+
+      const result = await wheelhouse.install(options.python, ["-r", requirementsPath], {
+        target: path.join(tempDir, "site-packages"),
+        cwd: options.workDir,
+        onOutput: options.onOutput,
+      });
+      if (result.code !== 0) {
+        throw new Error(`pip install failed with code ${result.code}`);
+      }
+
+      await fs.promises.writeFile(
+        path.join(tempDir, "manifest.json"),
+        JSON.stringify({ key, python: options.python, requirements, createdAt: new Date().toISOString() }, null, 2)
+      );
+      await fs.promises.rename(tempDir, finalDir).catch(async (error) => {
+        // Another server process finished the same environment first
+        if (!fs.existsSync(path.join(finalDir, "manifest.json"))) throw error;
+        await fs.promises.rm(tempDir, { recursive: true, force: true });
+      });
+      return this.describe(key, false);
+    } catch (error) {
+      await fs.promises.rm(tempDir, { recursive: true, force: true });
+      throw error;
+    }
+  }
+
+  private describe(key: string, reused: boolean): PythonEnvironment {
+    const dir = path.join(PYTHON_ENV_DIR, key);
+    const sitePackages = path.join(dir, "site-packages");
+    return { key, dir, sitePackages, binDir: path.join(sitePackages, "bin"), reused };
+  }
+
+  private async touch(dir: string): Promise<void> {
+    const now = new Date();
+    await fs.promises.utimes(path.join(dir, "manifest.json"), now, now).catch(() => undefined);
+  }
+
+  // Pinned specifiers (name==version) of the packages installed on request,
+  // as marked by pip's REQUESTED file; their dependencies are left to pip
+  private async requestedOverlayPackages(repositoryId: string): Promise<string[]> {
+    const sitePackages = this.overlaySitePackages(repositoryId);
+    let names: string[];
+    try {
+      names = await fs.promises.readdir(sitePackages);
+    } catch {
+      return [];
+    }
+
+    const requested: string[] = [];
+    for (const name of names) {
+      const match = name.match(/^(.+)-([^-]+)\.dist-info$/);
+      if (match && fs.existsSync(path.join(sitePackages, name, "REQUESTED"))) {
+        requested.push(`${match[1]}==${match[2]}`);
+      }
+    }
+    return requested;
+  }
+
+  private async pruneIdle(): Promise<void> {
+    let names: string[];
+    try {
+      names = await fs.promises.readdir(PYTHON_ENV_DIR);
+    } catch {
+      return;
+    }
+
+    const cutoff = Date.now() - ENV_MAX_IDLE_DAYS * 24 * 60 * 60 * 1000;
+    for (const name of names) {
+      if (name === "overlays" || name.startsWith(".")) continue;
+      // In use right now; touching restarts its idle time from the latest check
+      if (this.inUse.has(name)) {
+        await this.touch(path.join(PYTHON_ENV_DIR, name));
+        continue;
+      }
+      const manifest = path.join(PYTHON_ENV_DIR, name, "manifest.json");
+      const stat = await fs.promises.stat(manifest).catch(() => null);
+      if (stat && stat.mtimeMs < cutoff) {
+        await fs.promises.rm(path.join(PYTHON_ENV_DIR, name), { recursive: true, force: true });
+        console.log(`[Environments] Removed idle environment ${name}`);
+      }
+    }
+  }
+}
+
+export const dependencyEnvironments = new DependencyEnvironments();
@@ -1,12 +1,36 @@
 import TelegramBot from 'node-telegram-bot-api';
+import { timingSafeEqual } from 'crypto';
+import type { Express } from 'express';
 import { db } from './db';
-import { users, repositories } from '@shared/schema';
-import { eq, isNotNull } from 'drizzle-orm';
+import { users, repositories, activeRepositoryStatuses, type Repository } from '@shared/schema';
+import { eq } from 'drizzle-orm';
 import bcrypt from 'bcrypt';
-import { pythonProcessManager } from './pythonProcessManager';
+import { scheduler } from './scheduler';
+import { crashAlerts } from './crashAlerts';
+import { authCache } from './authCache';
+import { getPrincipal, ownsRepository } from './auth';
+import { TtlCache } from './ttlCache';
+import { botUpdateQueue } from './botUpdateQueue';
 
 const BOT_TOKEN = process.env.HOSTYRIA_BOT_TOKEN;
 const ENABLE_BOT = process.env.ENABLE_TELEGRAM_BOT !== 'false';
+// 'polling' (default) or 'webhook'. In webhook mode Telegram posts updates to
+// TELEGRAM_WEBHOOK_URL + WEBHOOK_PATH on this server instead of being polled.
+const BOT_MODE = process.env.TELEGRAM_BOT_MODE === 'webhook' ? 'webhook' : 'polling';
+const WEBHOOK_URL = process.env.TELEGRAM_WEBHOOK_URL;
+// Sent back by Telegram in X-Telegram-Bot-Api-Secret-Token on every webhook call
+const WEBHOOK_SECRET = process.env.TELEGRAM_WEBHOOK_SECRET;
+const WEBHOOK_PATH = '/telegram/webhook';
+// Bot API server, e.g. a local fake for testing
+const TELEGRAM_API_URL = process.env.TELEGRAM_API_URL;
+// Per-chat state is dropped after this long without activity and reloaded on the next message
+const BOT_SESSION_TTL_MS = parseInt(process.env.BOT_SESSION_TTL_MS || '1800000', 10);
+// Chats kept in memory; the least recently active are dropped first
+const BOT_SESSION_MAX_ENTRIES = parseInt(process.env.BOT_SESSION_MAX_ENTRIES || '10000', 10);
+// A login that is not finished within this long has to be started again
+const BOT_LOGIN_TTL_MS = parseInt(process.env.BOT_LOGIN_TTL_MS || '600000', 10);
+// Repository lists are reused for this long; status transitions are applied to them meanwhile
+const BOT_VIEW_TTL_MS = parseInt(process.env.BOT_VIEW_TTL_MS || '15000', 10);
 
 if (!BOT_TOKEN) {
   if (ENABLE_BOT) {
@@ -18,7 +42,17 @@ if (!BOT_TOKEN) {
   }
 }
 
-const bot = BOT_TOKEN ? new TelegramBot(BOT_TOKEN, { polling: ENABLE_BOT }) : null;
+if (BOT_TOKEN && ENABLE_BOT && BOT_MODE === 'webhook' && (!WEBHOOK_URL || !WEBHOOK_SECRET)) {
+  console.error('⚠️  TELEGRAM_BOT_MODE=webhook requires TELEGRAM_WEBHOOK_URL and TELEGRAM_WEBHOOK_SECRET');
+  process.exit(1);
+}
+
+const bot = BOT_TOKEN
+  ? new TelegramBot(BOT_TOKEN, {
+      polling: ENABLE_BOT && BOT_MODE === 'polling',
+      ...(TELEGRAM_API_URL ? { baseApiUrl: TELEGRAM_API_URL } : {}),
+    })
+  : null;
 
 if (!bot) {
   console.log('⚠️  Telegram Bot is NOT initialized (no token provided)');
@@ -28,34 +62,56 @@ if (!bot) {
   console.log('   The bot will not respond to messages until enabled.');
 }
 
-// Store user sessions (telegram_id -> user data)
-const userSessions = new Map<number, { userId: string; email: string; username: string }>();
-const loginStates = new Map<number, { step: 'email' | 'password'; email?: string }>();
-const messageIds = new Map<number, number>(); // Store last message ID for each chat
+interface BotSession {
+  userId: string;
+  email: string;
+  username: string;
+}
 
-// Load sessions from database on startup
-async function loadSessionsFromDatabase() {
-  try {
-    const usersWithTelegram = await db.select().from(users).where(isNotNull(users.telegramChatId));
-    for (const user of usersWithTelegram) {
-      if (user.telegramChatId) {
-        const chatId = parseInt(user.telegramChatId);
-        userSessions.set(chatId, {
-          userId: user.id,
-          email: user.email,
-          username: user.username
-        });
-      }
-    }
-    console.log(`Loaded ${userSessions.size} Telegram sessions from database`);
-  } catch (error) {
-    console.error('Error loading Telegram sessions:', error);
+type RepositorySummary = Pick<Repository, 'id' | 'name' | 'status'>;
+
+// Chat state is bounded: only recently active chats stay in memory. The linked
+// account of a chat lives in users.telegram_chat_id and is loaded on demand;
+// null records a chat that is known not to be linked.
+const sessions = new TtlCache<number, BotSession | null>(BOT_SESSION_TTL_MS, BOT_SESSION_MAX_ENTRIES);
+const loginStates = new TtlCache<number, { step: 'email' | 'password'; email?: string }>(BOT_LOGIN_TTL_MS, BOT_SESSION_MAX_ENTRIES);
+const messageIds = new TtlCache<number, number>(BOT_SESSION_TTL_MS, BOT_SESSION_MAX_ENTRIES); // Last message ID for each chat
+const repositoryViews = new TtlCache<number, string>(BOT_SESSION_TTL_MS, BOT_SESSION_MAX_ENTRIES); // Repository whose details each chat is showing
+// Repositories of each user as shown in the menus, keyed by user id
+const repositoryLists = new TtlCache<string, RepositorySummary[]>(BOT_VIEW_TTL_MS, BOT_SESSION_MAX_ENTRIES);
+
+async function getSession(chatId: number): Promise<BotSession | null> {
+  if (sessions.has(chatId)) {
+    return sessions.get(chatId) ?? null;
+  }
+
+  const generation = sessions.generation;
+  const [user] = await db.select({ id: users.id, email: users.email, username: users.username })
+    .from(users)
+    .where(eq(users.telegramChatId, chatId.toString()))
+    .limit(1);
+  const session = user ? { userId: user.id, email: user.email, username: user.username } : null;
+  if (generation === sessions.generation) {
+    sessions.set(chatId, session);
   }
+  return session;
 }
 
-// Call on startup only if bot is enabled
-if (ENABLE_BOT) {
-  loadSessionsFromDatabase();
+async function getRepositoryList(userId: string): Promise<RepositorySummary[]> {
+  const cached = repositoryLists.get(userId);
+  if (cached) {
+    return cached;
+  }
+
+  const generation = repositoryLists.generation;
+  const list = await db.select({ id: repositories.id, name: repositories.name, status: repositories.status })
+    .from(repositories)
+    .where(eq(repositories.userId, userId))
+    .orderBy(repositories.createdAt, repositories.id);
+  if (generation === repositoryLists.generation) {
+    repositoryLists.set(userId, list);
+  }
+  return list;
 }
 
 // Welcome message with login
@@ -113,17 +169,17 @@ async function sendSupportMessage(chatId: number) {
 
 // Main dashboard
 async function sendDashboard(chatId: number) {
-  const session = userSessions.get(chatId);
+  const session = await getSession(chatId);
 
   if (!session) {
     await sendWelcomeMessage(chatId);
     return;
   }
 
-  const [user] = await db.select().from(users).where(eq(users.id, session.userId)).limit(1);
+  const user = await getPrincipal(session.userId);
 
   if (!user) {
-    userSessions.delete(chatId);
+    sessions.set(chatId, null);
     await sendWelcomeMessage(chatId);
     return;
   }
@@ -160,14 +216,14 @@ async function sendDashboard(chatId: number) {
 
 // Show repositories
 async function showRepositories(chatId: number) {
-  const session = userSessions.get(chatId);
+  const session = await getSession(chatId);
 
   if (!session) {
     await sendWelcomeMessage(chatId);
     return;
   }
 
-  const userRepos = await db.select().from(repositories).where(eq(repositories.userId, session.userId));
+  const userRepos = await getRepositoryList(session.userId);
 
   if (userRepos.length === 0) {
     const lastMessageId = messageIds.get(chatId);
@@ -217,18 +273,17 @@ async function showRepositories(chatId: number) {
 
 // Show repository details
 async function showRepositoryDetails(chatId: number, repoId: string) {
-  const session = userSessions.get(chatId);
+  const session = await getSession(chatId);
 
   if (!session) {
     await sendWelcomeMessage(chatId);
     return;
   }
 
-  const [repo] = await db.select().from(repositories)
-    .where(eq(repositories.id, repoId))
-    .limit(1);
+  // Only the owner's repositories are in the list, so this is also the ownership check
+  const repo = (await getRepositoryList(session.userId)).find(r => r.id === repoId);
 
-  if (!repo || repo.userId !== session.userId) {
+  if (!repo) {
     const lastMessageId = messageIds.get(chatId);
     const text = 'Repository not found.';
 
@@ -249,9 +304,10 @@ async function showRepositoryDetails(chatId: number, repoId: string) {
     return;
   }
 
+  repositoryViews.set(chatId, repoId);
   const repoText = `Repo name: ${repo.name}\nStatus: ${repo.status}`;
 
-  const actionButton = repo.status === 'running'
+  const actionButton = (activeRepositoryStatuses as readonly string[]).includes(repo.status)
     ? { text: 'Stop', callback_data: `stop_${repoId}` }
     : { text: 'Start', callback_data: `start_${repoId}` };
 
@@ -281,176 +337,241 @@ async function showRepositoryDetails(chatId: number, repoId: string) {
   }
 }
 
-// Handle /start command
+// Handlers run through the update queue instead of inside the polling loop or
+// webhook request: in order within a chat, BOT_UPDATE_CONCURRENCY at a time overall
 if (bot) {
-bot.onText(/\/start/, async (msg) => {
-  const chatId = msg.chat.id;
-  messageIds.set(chatId, msg.message_id);
-
-  if (userSessions.has(chatId)) {
-    await sendDashboard(chatId);
-  } else {
-    await sendWelcomeMessage(chatId);
-  }
-});
-
 // Handle callback queries
-bot.on('callback_query', async (query) => {
-  const chatId = query.message!.chat.id;
-  const data = query.data!;
+bot.on('callback_query', (query) => {
+  botUpdateQueue.push(query.message?.chat.id ?? query.from.id, async () => {
+    const chatId = query.message!.chat.id;
+    const data = query.data!;
 
-  await bot.answerCallbackQuery(query.id);
-
-  // Store the message ID from callback query
-  if (query.message) {
-    messageIds.set(chatId, query.message.message_id);
-  }
+    await bot.answerCallbackQuery(query.id);
 
-  if (data === 'login') {
-    loginStates.set(chatId, { step: 'email' });
-    try {
-      await bot.editMessageText('Enter your HostYria email:', {
-        chat_id: chatId,
-        message_id: query.message!.message_id
-      });
-    } catch (error) {
-      const sent = await bot.sendMessage(chatId, 'Enter your HostYria email:');
-      messageIds.set(chatId, sent.message_id);
+    // Store the message ID from callback query
+    if (query.message) {
+      messageIds.set(chatId, query.message.message_id);
     }
-  } else if (data === 'support') {
-    await sendSupportMessage(chatId);
-  } else if (data === 'my_repository') {
-    await showRepositories(chatId);
-  } else if (data === 'back_to_dashboard') {
-    await sendDashboard(chatId);
-  } else if (data === 'logout') {
-    const session = userSessions.get(chatId);
-    if (session) {
-      // Remove telegramChatId from database
-      await db.update(users)
-        .set({ telegramChatId: null })
-        .where(eq(users.id, session.userId));
-    }
-    userSessions.delete(chatId);
-    loginStates.delete(chatId);
+    // Repository screens register themselves again when they render
+    repositoryViews.delete(chatId);
 
-    try {
-      await bot.editMessageText('You have been logged out successfully.', {
-        chat_id: chatId,
-        message_id: query.message!.message_id
-      });
-    } catch (error) {
-      await bot.sendMessage(chatId, 'You have been logged out successfully.');
-    }
+    if (data === 'login') {
+      loginStates.set(chatId, { step: 'email' });
+      try {
+        await bot.editMessageText('Enter your HostYria email:', {
+          chat_id: chatId,
+          message_id: query.message!.message_id
+        });
+      } catch (error) {
+        const sent = await bot.sendMessage(chatId, 'Enter your HostYria email:');
+        messageIds.set(chatId, sent.message_id);
+      }
+    } else if (data === 'support') {
+      await sendSupportMessage(chatId);
+    } else if (data === 'my_repository') {
+      await showRepositories(chatId);
+    } else if (data === 'back_to_dashboard') {
+      await sendDashboard(chatId);
+    } else if (data === 'logout') {
+      const session = await getSession(chatId);
+      if (session) {
+        // Remove telegramChatId from database
+        await db.update(users)
+          .set({ telegramChatId: null })
+          .where(eq(users.id, session.userId));
+        authCache.invalidateUser(session.userId);
+      }
+      // delete() also discards a lookup of this chat that is still in flight
+      sessions.delete(chatId);
+      sessions.set(chatId, null);
+      loginStates.delete(chatId);
 
-    await sendWelcomeMessage(chatId);
-  } else if (data.startsWith('repo_')) {
-    const repoId = data.substring(5);
-    await showRepositoryDetails(chatId, repoId);
-  } else if (data.startsWith('start_') || data.startsWith('stop_')) {
-    const action = data.startsWith('start_') ? 'start' : 'stop';
-    const repoId = data.substring(action.length + 1);
-
-    const session = userSessions.get(chatId);
-    if (!session) {
-      sendWelcomeMessage(chatId);
-      return;
-    }
+      try {
+        await bot.editMessageText('You have been logged out successfully.', {
+          chat_id: chatId,
+          message_id: query.message!.message_id
+        });
+      } catch (error) {
+        await bot.sendMessage(chatId, 'You have been logged out successfully.');
+      }
 
-    const [repo] = await db.select().from(repositories)
-      .where(eq(repositories.id, repoId))
-      .limit(1);
+      await sendWelcomeMessage(chatId);
+    } else if (data.startsWith('repo_')) {
+      const repoId = data.substring(5);
+      await showRepositoryDetails(chatId, repoId);
+    } else if (data.startsWith('start_') || data.startsWith('stop_')) {
+      const action = data.startsWith('start_') ? 'start' : 'stop';
+      const repoId = data.substring(action.length + 1);
+
+      const session = await getSession(chatId);
+      if (!session) {
+        sendWelcomeMessage(chatId);
+        return;
+      }
 
-    if (!repo || repo.userId !== session.userId) {
-      bot.sendMessage(chatId, 'Repository not found.');
-      return;
-    }
+      if (!(await ownsRepository(session.userId, repoId))) {
+        bot.sendMessage(chatId, 'Repository not found.');
+        return;
+      }
 
-    try {
-      if (action === 'start') {
-        bot.sendMessage(chatId, '⏳ Starting repository...');
-        await pythonProcessManager.startRepository(repoId);
-        bot.sendMessage(chatId, '✅ Repository started successfully!');
-      } else {
-        bot.sendMessage(chatId, '⏳ Stopping repository...');
-        if (pythonProcessManager.isRunning(repoId)) {
-          pythonProcessManager.stopRepository(repoId);
+      try {
+        if (action === 'start') {
+          bot.sendMessage(chatId, '⏳ Starting repository...');
+          await scheduler.startRepository(repoId);
+          bot.sendMessage(chatId, '✅ Repository started successfully!');
         } else {
-          await db.update(repositories)
-            .set({ status: 'stopped' })
-            .where(eq(repositories.id, repoId));
+          bot.sendMessage(chatId, '⏳ Stopping repository...');
+          await scheduler.stopRepository(repoId);
+          bot.sendMessage(chatId, '⏹️ Repository stopped successfully!');
         }
-        bot.sendMessage(chatId, '⏹️ Repository stopped successfully!');
+        await showRepositoryDetails(chatId, repoId);
+      } catch (error: any) {
+        // The list may be missing the repository's latest status if the action failed midway
+        repositoryLists.delete(session.userId);
+        bot.sendMessage(chatId, `❌ Error: ${error.message || 'Failed to ' + action + ' repository'}`);
       }
-      await showRepositoryDetails(chatId, repoId);
-    } catch (error: any) {
-      bot.sendMessage(chatId, `❌ Error: ${error.message || 'Failed to ' + action + ' repository'}`);
     }
-  }
+  });
 });
 
-// Handle text messages (for login flow)
-bot.on('message', async (msg) => {
-  const chatId = msg.chat.id;
-  const text = msg.text;
+// Handle /start and text messages (for login flow). Each update is one queued
+// task, which is what the queue's capacity counts.
+bot.on('message', (msg) => {
+  botUpdateQueue.push(msg.chat.id, async () => {
+    const chatId = msg.chat.id;
+    const text = msg.text;
 
-  if (!text || text.startsWith('/')) return;
+    if (text?.startsWith('/start')) {
+      messageIds.set(chatId, msg.message_id);
 
-  const loginState = loginStates.get(chatId);
+      if (await getSession(chatId)) {
+        await sendDashboard(chatId);
+      } else {
+        await sendWelcomeMessage(chatId);
+      }
+      return;
+    }
 
-  if (!loginState) return;
+    if (!text || text.startsWith('/')) return;
 
-  if (loginState.step === 'email') {
-    loginState.email = text;
-    loginState.step = 'password';
-    loginStates.set(chatId, loginState);
-    bot.sendMessage(chatId, 'Enter your HostYria password:');
-  } else if (loginState.step === 'password') {
-    const email = loginState.email!;
-    const password = text;
+    const loginState = loginStates.get(chatId);
 
-    bot.sendMessage(chatId, 'Animation login... ⏳');
+    if (!loginState) return;
 
-    // Authenticate user
-    const [user] = await db.select().from(users).where(eq(users.email, email)).limit(1);
+    if (loginState.step === 'email') {
+      loginState.email = text;
+      loginState.step = 'password';
+      loginStates.set(chatId, loginState);
+      bot.sendMessage(chatId, 'Enter your HostYria password:');
+    } else if (loginState.step === 'password') {
+      const email = loginState.email!;
+      const password = text;
 
-    if (!user) {
-      loginStates.delete(chatId);
-      bot.sendMessage(chatId, 'Login failed, please check your login information.\n\nOr you can contact us (press Support 🆘) for more details.');
-      sendWelcomeMessage(chatId);
-      return;
-    }
+      bot.sendMessage(chatId, 'Animation login... ⏳');
+
+      // Authenticate user
+      const [user] = await db.select().from(users).where(eq(users.email, email)).limit(1);
+
+      if (!user) {
+        loginStates.delete(chatId);
+        bot.sendMessage(chatId, 'Login failed, please check your login information.\n\nOr you can contact us (press Support 🆘) for more details.');
+        sendWelcomeMessage(chatId);
+        return;
+      }
+
+      const passwordMatch = await bcrypt.compare(password, user.password);
 
-    const passwordMatch = await bcrypt.compare(password, user.password);
+      if (!passwordMatch) {
+        loginStates.delete(chatId);
+        bot.sendMessage(chatId, 'Login failed, please check your login information.\n\nOr you can contact us (press Support 🆘) for more details.');
+        sendWelcomeMessage(chatId);
+        return;
+      }
 
-    if (!passwordMatch) {
       loginStates.delete(chatId);
-      bot.sendMessage(chatId, 'Login failed, please check your login information.\n\nOr you can contact us (press Support 🆘) for more details.');
-      sendWelcomeMessage(chatId);
-      return;
+
+      // Save telegramChatId to database
+      await db.update(users)
+        .set({ telegramChatId: chatId.toString() })
+        .where(eq(users.id, user.id));
+      authCache.invalidateUser(user.id);
+
+      // A user is linked to one chat at a time; any other chat of theirs now loads as signed out
+      sessions.deleteWhere(session => session?.userId === user.id);
+      sessions.set(chatId, { userId: user.id, email: user.email, username: user.username });
+
+      await sendDashboard(chatId);
     }
+  });
+});
+
+}
 
-    // Login successful - save session in memory and database
-    userSessions.set(chatId, {
-      userId: user.id,
-      email: user.email,
-      username: user.username
+// Open repository screens follow status transitions instead of showing the
+// status from when they were rendered
+if (bot && ENABLE_BOT) {
+  scheduler.onStatusChange((event) => {
+    repositoryLists.forEach((list) => {
+      const repo = list.find(r => r.id === event.repositoryId);
+      if (repo) repo.status = event.status;
+    });
+    repositoryViews.forEach((repoId, chatId) => {
+      if (repoId !== event.repositoryId) return;
+      showRepositoryDetails(chatId, repoId).catch((error) => {
+        console.error('Error refreshing Telegram repository view:', error);
+      });
     });
-    loginStates.delete(chatId);
+  });
 
-    // Save telegramChatId to database
-    await db.update(users)
-      .set({ telegramChatId: chatId.toString() })
-      .where(eq(users.id, user.id));
+  // Crashes, crash-loop parking and restarts are pushed to the owner's chat
+  crashAlerts.start((chatId, text) => bot.sendMessage(chatId, text));
+}
 
-    await sendDashboard(chatId);
-  }
-});
+if (bot && ENABLE_BOT && BOT_MODE === 'webhook') {
+  bot.setWebHook(`${WEBHOOK_URL!.replace(/\/$/, '')}${WEBHOOK_PATH}`, { secret_token: WEBHOOK_SECRET })
+    .then(() => console.log('HostYria Bot webhook registered'))
+    .catch((error) => console.error('Error registering Telegram webhook:', error));
+}
+
+// Polled updates are confirmed to Telegram by the offset of the next poll, so a
+// dropped one would be lost for good. Polling stops while the queue is full
+// instead; the updates of the poll already in flight are still queued past the
+// limit, and polling resumes once the queue is half empty.
+if (bot && ENABLE_BOT && BOT_MODE === 'polling') {
+  let pollingChange = Promise.resolve();
+  botUpdateQueue.onPressure((full) => {
+    console.warn(`[BotUpdates] Queue ${full ? 'full, pausing' : 'has room again, resuming'} polling`);
+    pollingChange = pollingChange
+      .then(() => (full ? bot.stopPolling() : bot.startPolling()))
+      .catch((error) => console.error('Error changing Telegram polling state:', error));
+  });
+}
+
+// Receives updates in webhook mode. Nothing is mounted in polling mode.
+export function mountBotWebhook(app: Express) {
+  if (!bot || !ENABLE_BOT || BOT_MODE !== 'webhook') return;
+
+  const expectedSecret = Buffer.from(WEBHOOK_SECRET!);
+  app.post(WEBHOOK_PATH, (req, res) => {
+    const secret = Buffer.from(req.get('X-Telegram-Bot-Api-Secret-Token') ?? '');
+    if (secret.length !== expectedSecret.length || !timingSafeEqual(secret, expectedSecret)) {
+      return res.status(401).json({ message: 'Unauthorized' });
+    }
+    // Telegram redelivers updates it gets an error for, so a full queue pushes
+    // back instead of dropping. An update enqueues at most one task, so room for
+    // one is room for the whole update.
+    if (botUpdateQueue.isFull()) {
+      return res.status(503).json({ message: 'Update queue full' });
+    }
 
+    // Emits to the handlers above, which only enqueue, so this answers immediately
+    bot.processUpdate(req.body);
+    res.sendStatus(200);
+  });
 }
 
 if (bot && ENABLE_BOT) {
-  console.log('HostYria Bot started successfully! 🚀');
+  console.log(`HostYria Bot started successfully in ${BOT_MODE} mode! 🚀`);
 } else if (bot) {
   console.log('HostYria Bot initialized (polling disabled)');
 } else {
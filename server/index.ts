@@ -3,7 +3,10 @@ import express, { type Request, Response, NextFunction } from "express";
 import { registerRoutes } from "./routes";
 import { setupVite, serveStatic, log } from "./vite";
 import { db } from "./db";
-import "./hostyria-bot";
+import { scheduler } from "./scheduler";
+import { interpreterRegistry } from "./interpreters";
+import { requestMetrics } from "./requestMetrics";
+import { mountBotWebhook } from "./hostyria-bot";
 
 const app = express();
 
@@ -12,6 +15,8 @@ declare module 'http' {
     rawBody: unknown
   }
 }
+// First, so timings include body parsing
+app.use(requestMetrics.middleware);
 app.use(express.json({
   limit: '50mb',
   verify: (req, _res, buf) => {
@@ -20,35 +25,7 @@ app.use(express.json({
 }));
 app.use(express.urlencoded({ extended: false, limit: '50mb' }));
 
-app.use((req, res, next) => {
-  const start = Date.now();
-  const path = req.path;
-  let capturedJsonResponse: Record<string, any> | undefined = undefined;
-
-  const originalResJson = res.json;
-  res.json = function (bodyJson, ...args) {
-    capturedJsonResponse = bodyJson;
-    return originalResJson.apply(res, [bodyJson, ...args]);
-  };
-
-  res.on("finish", () => {
-    const duration = Date.now() - start;
-    if (path.startsWith("/api")) {
-      let logLine = `${req.method} ${path} ${res.statusCode} in ${duration}ms`;
-      if (capturedJsonResponse) {
-        logLine += ` :: ${JSON.stringify(capturedJsonResponse)}`;
-      }
-
-      if (logLine.length > 80) {
-        logLine = logLine.slice(0, 79) + "…";
-      }
-
-      log(logLine);
-    }
-  });
-
-  next();
-});
+mountBotWebhook(app);
 
 (async () => {
   const server = await registerRoutes(app);
@@ -80,5 +57,18 @@ app.use((req, res, next) => {
   server.listen(port, host, () => {
     log(`serving on port ${port} in ${app.get("env")} mode`);
     log(`Server running at http://${host}:${port}`);
+
+    // Discover Python interpreters and start their prewarmed pools, then bring
+    // back repositories that were running before this server restarted
+    interpreterRegistry
+      .discover()
+      .then(() => {
+        if (process.env.RESTORE_RUNNING_REPOSITORIES !== "false") {
+          return scheduler.restoreRunningRepositories();
+        }
+      })
+      .catch((error) => {
+        console.error("Error restoring running repositories:", error);
+      });
   });
 })();
\ No newline at end of file
@@ -0,0 +1,308 @@
+import { execFile, spawn, type ChildProcess } from "child_process";
+import * as fs from "fs";
+import * as path from "path";
+import { promisify } from "util";
+import { resourceLimits } from "./resourceLimits";
+
+const execFileAsync = promisify(execFile);
+
+// Extra interpreter paths, comma separated, checked in addition to python3.x on PATH
+const PYTHON_INTERPRETERS = (process.env.PYTHON_INTERPRETERS || "").split(",").map((p) => p.trim()).filter(Boolean);
+// Idle interpreters kept started per version, ready to run a repository
+const PREWARM_POOL_SIZE = parseInt(process.env.PYTHON_PREWARM_POOL_SIZE || "1", 10);
+// Resolved up front: hosted processes change directory before Python reads PYTHONPYCACHEPREFIX
+const PYTHON_CACHE_DIR = path.resolve(process.env.PYTHON_CACHE_DIR || "pycache");
+const CANDIDATE_MINOR_VERSIONS = [8, 9, 10, 11, 12, 13, 14];
+// Server variables a launcher starts with; the hosted process gets LaunchSpec.env instead
+const LAUNCHER_ENV_KEYS = ["PATH", "HOME", "LANG", "LC_ALL", "LC_CTYPE", "TZ", "TMPDIR"];
+
+export interface Interpreter {
+  // "major.minor", the value stored in repositories.pythonVersion
+  version: string;
+  fullVersion: string;
+  executable: string;
+  // Bytecode for this interpreter (stdlib and hosted code) is written here
+  pycachePrefix: string;
+  // Compiled modules shared between repositories, one file per source content hash
+  codeCacheDir: string;
+  // python/pip shims for terminal commands
+  binDir: string;
+}
+
+export interface LaunchSpec {
+  script: string;
+  cwd: string;
+  env: NodeJS.ProcessEnv;
+  // Entries placed on sys.path after the script directory (PYTHONPATH equivalent)
+  path: string[];
+  limits?: LaunchLimits | null;
+}
+
+export interface LaunchLimits {
+  // resource module constant name (e.g. "RLIMIT_NOFILE") to soft and hard
+  // limit, applied by the hosted process itself before any user code runs
+  rlimits: Record<string, number>;
+  // cgroup v2 directory the server moves the process into before it gets its spec
+  cgroup: string | null;
+}
+
+// Python function applying the rlimits of LaunchLimits to the current process
+export const APPLY_LIMITS_SOURCE = `
+def apply_limits(limits):
+    import resource
+    for name, value in limits["rlimits"].items():
+        kind = getattr(resource, name)
+        hard = resource.getrlimit(kind)[1]
+        if hard != resource.RLIM_INFINITY:
+            value = min(value, hard)
+        resource.setrlimit(kind, (value, value))
+`;
+
+// Python function that runs a script as __main__ like `python script.py`, but
+// through the import system's loader so the entry script's bytecode is read
+// from the cache (and written to it) instead of being compiled on every start.
+export const RUN_SCRIPT_SOURCE = `
+def run_script(path):
+    import importlib.machinery, types
+    loader = importlib.machinery.SourceFileLoader("__main__", path)
+    code = loader.get_code("__main__")
+    main = types.ModuleType("__main__")
+    main.__file__ = path
+    main.__loader__ = loader
+    main.__builtins__ = __builtins__
+    sys.modules["__main__"] = main
+    exec(code, main.__dict__)
+`;
+
+// Waits for one JSON launch spec on stdin, then becomes the hosted program.
+// An empty line (server shutting down) exits without running anything.
+const LAUNCHER_SOURCE = `
+import json, os, sys
+${RUN_SCRIPT_SOURCE}
+${APPLY_LIMITS_SOURCE}
+line = sys.stdin.readline()
+if not line.strip():
+    sys.exit(0)
+spec = json.loads(line)
+os.chdir(spec["cwd"])
+os.environ.clear()
+os.environ.update(spec["env"])
+script = os.path.abspath(spec["script"])
+sys.argv = [spec["script"]]
+sys.path[0:1] = [os.path.dirname(script)] + spec["path"]
+if spec.get("limits"):
+    apply_limits(spec["limits"])
+del line, spec
+run_script(script)
+`;
+
+/**
+ * Discovers the CPython versions installed on the host, maps
+ * repositories.pythonVersion to one of them and keeps a small pool of
+ * already-started interpreters per version so a start only has to hand the
+ * launcher its script.
+ */
+class InterpreterRegistry {
+  private interpreters: Map<string, Interpreter> = new Map();
+  private defaultVersion: string | null = null;
+  private pools: Map<string, ChildProcess[]> = new Map();
+  private discovery: Promise<void> | null = null;
+
+  discover(): Promise<void> {
+    if (!this.discovery) {
+      this.discovery = this.runDiscovery();
+    }
+    return this.discovery;
+  }
+
+  list(): Interpreter[] {
+    return Array.from(this.interpreters.values()).sort((a, b) => compareVersions(a.version, b.version));
+  }
+
+  getDefaultVersion(): string | null {
+    return this.defaultVersion;
+  }
+
+  isSupported(version: string): boolean {
+    return this.interpreters.has(version);
+  }
+
+  // null is the server default
+  resolve(version: string | null): Interpreter {
+    const interpreter = this.interpreters.get(version ?? this.defaultVersion ?? "");
+    if (!interpreter) {
+      if (version === null) {
+        throw new Error("No Python interpreter is available on this server.");
+      }
+      const available = this.list().map((i) => i.version).join(", ") || "none";
+      throw new Error(`Python ${version} is not available on this server (available: ${available}). Choose another version in Settings.`);
+    }
+    return interpreter;
+  }
+
+  // Start the script on a prewarmed interpreter when one is idle, otherwise on
+  // a fresh one. A prewarmed interpreter has already read its PYTHON* startup
+  // variables, so `fresh` starts a new one with spec.env from the beginning.
+  launch(interpreter: Interpreter, spec: LaunchSpec, fresh = false): ChildProcess {
+    if (fresh) {
+      const child = this.spawnLauncher(interpreter, spec.env);
+      this.confine(child, spec);
+      child.stdin?.write(JSON.stringify(spec) + "\n");
+      return child;
+    }
+
+    const pool = this.pools.get(interpreter.version) ?? [];
+    let child = pool.shift();
+    while (child && (child.exitCode !== null || child.signalCode !== null)) {
+      child = pool.shift();
+    }
+    if (!child) {
+      child = this.spawnLauncher(interpreter);
+    }
+
+    child.ref();
+    this.confine(child, spec);
+    child.stdin?.write(JSON.stringify(spec) + "\n");
+    this.fillPool(interpreter);
+    return child;
+  }
+
+  // The launcher waits for its spec, so nothing of the script runs outside the group
+  private confine(child: ChildProcess, spec: LaunchSpec): void {
+    if (spec.limits?.cgroup && child.pid) {
+      resourceLimits.place(spec.limits.cgroup, child.pid);
+    }
+  }
+
+  private async runDiscovery(): Promise<void> {
+    const candidates = [
+      ...PYTHON_INTERPRETERS,
+      ...CANDIDATE_MINOR_VERSIONS.map((minor) => `python3.${minor}`),
+      "python3",
+    ];
+
+    for (const candidate of candidates) {
+      try {
+        const { stdout } = await execFileAsync(candidate, [
+          "-c",
+          "import sys; print('%d.%d' % sys.version_info[:2]); print(sys.version.split()[0]); print(sys.executable)",
+        ]);
+        const [version, fullVersion, executable] = stdout.trim().split("\n");
+        if (candidate === "python3" && !this.defaultVersion) {
+          this.defaultVersion = version;
+        }
+        if (this.interpreters.has(version)) continue;
+
+        this.interpreters.set(version, {
+          version,
+          fullVersion,
+          executable,
+          pycachePrefix: path.join(PYTHON_CACHE_DIR, version, "bytecode"),
+          codeCacheDir: path.join(PYTHON_CACHE_DIR, version, "code"),
+          binDir: path.join(PYTHON_CACHE_DIR, version, "bin"),
+        });
+      } catch {
+        // Not installed
+      }
+    }
+
+    if (!this.defaultVersion) {
+      this.defaultVersion = this.list().pop()?.version ?? null;
+    }
+    console.log(`[Interpreters] Found Python ${this.list().map((i) => i.fullVersion).join(", ") || "none"}`);
+
+    for (const interpreter of Array.from(this.interpreters.values())) {
+      await this.writeShims(interpreter);
+      this.fillPool(interpreter);
+      this.precompileStdlib(interpreter);
+    }
+  }
+
+  // `python` and `pip` in the terminal run the repository's interpreter
+  private async writeShims(interpreter: Interpreter): Promise<void> {
+    await fs.promises.mkdir(interpreter.binDir, { recursive: true });
+    for (const name of ["python", "python3"]) {
+      const link = path.join(interpreter.binDir, name);
+      await fs.promises.rm(link, { force: true });
+      await fs.promises.symlink(interpreter.executable, link);
+    }
+    for (const name of ["pip", "pip3"]) {
+      await fs.promises.writeFile(path.join(interpreter.binDir, name), `#!/bin/sh\nexec "${interpreter.executable}" -m pip "$@"\n`, {
+        mode: 0o755,
+      });
+    }
+  }
+
+  private spawnLauncher(interpreter: Interpreter, env: NodeJS.ProcessEnv = launcherEnv(interpreter)): ChildProcess {
+    const child = spawn(interpreter.executable, ["-u", "-c", LAUNCHER_SOURCE], {
+      env,
+      stdio: ["pipe", "pipe", "pipe"],
+    });
+    child.on("error", (error) => {
+      console.error(`[Interpreters] Failed to start Python ${interpreter.version}:`, error.message);
+    });
+    return child;
+  }
+
+  private fillPool(interpreter: Interpreter): void {
+    if (PREWARM_POOL_SIZE <= 0) return;
+
+    const pool = this.pools.get(interpreter.version) ?? [];
+    this.pools.set(interpreter.version, pool);
+    while (pool.length < PREWARM_POOL_SIZE) {
+      const child = this.spawnLauncher(interpreter);
+      // Idle launchers must not keep the server alive or outlive it
+      child.unref();
+      child.once("exit", () => {
+        const index = pool.indexOf(child);
+        if (index !== -1) pool.splice(index, 1);
+      });
+      pool.push(child);
+    }
+  }
+
+  // Hosted processes run with PYTHONPYCACHEPREFIX, so the stdlib bytecode they
+  // load lives under the prefix as well; compile it once per interpreter.
+  private precompileStdlib(interpreter: Interpreter): void {
+    const marker = path.join(interpreter.pycachePrefix, ".stdlib-compiled");
+    if (fs.existsSync(marker)) return;
+
+    const compile = spawn(
+      interpreter.executable,
+      ["-c", "import compileall, sysconfig; compileall.compile_dir(sysconfig.get_paths()['stdlib'], quiet=1, workers=0)"],
+      { env: launcherEnv(interpreter), stdio: "ignore" }
+    );
+    compile.on("exit", (code) => {
+      if (code === 0) {
+        fs.promises.mkdir(interpreter.pycachePrefix, { recursive: true })
+          .then(() => fs.promises.writeFile(marker, new Date().toISOString()))
+          .catch(() => undefined);
+        console.log(`[Interpreters] Precompiled stdlib for Python ${interpreter.version}`);
+      }
+    });
+    compile.on("error", () => undefined);
+  }
+}
+
+// Environment for interpreters started ahead of a repository: locale and
+// paths only, none of the server's own configuration or credentials
+export function launcherEnv(interpreter: Interpreter): NodeJS.ProcessEnv {
+  const env: NodeJS.ProcessEnv = { PYTHONPYCACHEPREFIX: interpreter.pycachePrefix };
+  for (const key of LAUNCHER_ENV_KEYS) {
+    if (process.env[key] !== undefined) env[key] = process.env[key];
+  }
+  return env;
+}
+
+// PYTHONHASHSEED, PYTHONOPTIMIZE, ...: read once when the interpreter starts
+export function isStartupVariable(name: string): boolean {
+  return /^PYTHON[A-Z]/.test(name);
+}
+
+function compareVersions(a: string, b: string): number {
+  const [aMajor, aMinor] = a.split(".").map(Number);
+  const [bMajor, bMinor] = b.split(".").map(Number);
+  return aMajor - bMajor || aMinor - bMinor;
+}
+
+export const interpreterRegistry = new InterpreterRegistry();
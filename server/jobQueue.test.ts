@@ -0,0 +1,123 @@
+import { test } from "node:test";
+import assert from "node:assert/strict";
+import type { JobContext, JobKind } from "./jobQueue";
+
+// Limits are read when the module loads
+process.env.JOB_CONCURRENCY = "2";
+process.env.JOB_PER_USER_CONCURRENCY = "1";
+process.env.JOB_MAX_QUEUED_PER_USER = "2";
+process.env.JOB_COMMAND_TIMEOUT_MS = "50";
+const { jobQueue } = await import("./jobQueue");
+
+// A runner that records its start and runs until release() or an abort
+function blocker(started: string[], name: string) {
+  let release!: () => void;
+  const released = new Promise<void>((resolve) => {
+    release = resolve;
+  });
+  const run = ({ signal }: JobContext) =>
+    new Promise<void>((resolve, reject) => {
+      started.push(name);
+      signal.addEventListener("abort", () => reject(new Error("killed")));
+      released.then(resolve);
+    });
+  return { run, release };
+}
+
+// Lets a finished job release its slot and the next one start
+const settle = () => new Promise((resolve) => setImmediate(resolve));
+
+function enqueue(userId: string, run: (context: JobContext) => Promise<void>, kind: JobKind = "install") {
+  return jobQueue.enqueue({ kind, userId, repositoryId: `${userId}-repo`, description: kind }, run);
+}
+
+test("users are served round-robin within the per-user limit", async () => {
+  const started: string[] = [];
+  const a1 = blocker(started, "a1");
+  const a2 = blocker(started, "a2");
+  const b1 = blocker(started, "b1");
+  const c1 = blocker(started, "c1");
+
+  const jobs = [enqueue("rr-a", a1.run), enqueue("rr-a", a2.run), enqueue("rr-b", b1.run), enqueue("rr-c", c1.run)];
+  assert.deepEqual(started, ["a1", "b1"]);
+  assert.equal(jobs[1].job.status, "queued");
+
+  // a2 waits for a1 even though a slot is free, so c1 goes first
+  b1.release();
+  await settle();
+  assert.deepEqual(started, ["a1", "b1", "c1"]);
+
+  a1.release();
+  await settle();
+  assert.deepEqual(started, ["a1", "b1", "c1", "a2"]);
+
+  a2.release();
+  c1.release();
+  const finished = await Promise.all(jobs.map(({ done }) => done));
+  assert.ok(finished.every((job) => job.status === "succeeded"));
+});
+
+test("a user's waiting jobs are capped, requirements builds excepted", async () => {
+  const started: string[] = [];
+  const running = blocker(started, "running");
+  const first = enqueue("cap", running.run);
+  const waiting = [enqueue("cap", async () => {}), enqueue("cap", async () => {})];
+
+  assert.throws(() => enqueue("cap", async () => {}), /Too many queued jobs/);
+  const requirements = enqueue("cap", async () => {}, "requirements");
+
+  running.release();
+  await Promise.all([first.done, ...waiting.map(({ done }) => done), requirements.done]);
+});
+
+test("cancelling a queued job finishes it without running it", async () => {
+  const started: string[] = [];
+  const running = blocker(started, "running");
+  const first = enqueue("cancel-queued", running.run);
+  const second = enqueue("cancel-queued", blocker(started, "second").run);
+
+  assert.equal(jobQueue.cancel(second.job.id), true);
+  assert.equal((await second.done).status, "cancelled");
+
+  running.release();
+  await first.done;
+  assert.deepEqual(started, ["running"]);
+  assert.equal(jobQueue.cancel(second.job.id), false);
+});
+
+test("cancelling a running job aborts its runner", async () => {
+  const { job, done } = enqueue("cancel-running", blocker([], "running").run);
+
+  assert.equal(jobQueue.cancel(job.id), true);
+  const finished = await done;
+  assert.equal(finished.status, "cancelled");
+});
+
+test("commands that outlive the timeout fail", async () => {
+  const { done } = enqueue("timeout", blocker([], "command").run, "command");
+
+  const finished = await done;
+  assert.equal(finished.status, "failed");
+  assert.match(finished.error ?? "", /^Timed out/);
+});
+
+test("a runner's failure and output are recorded on the job", async () => {
+  const events: string[] = [];
+  jobQueue.onEvent((event) => {
+    if (event.job.repositoryId !== "output-repo") return;
+    events.push(event.type === "job_output" ? `output:${event.data}` : event.job.status);
+  });
+
+  const { job, done } = enqueue("output", async ({ onOutput }) => {
+    onOutput("collecting\n");
+    onOutput(Buffer.from("done\n"));
+    throw new Error("pip exited with 1");
+  });
+
+  const finished = await done;
+  assert.equal(finished.status, "failed");
+  assert.equal(finished.error, "pip exited with 1");
+  assert.equal(finished.output, "collecting\ndone\n");
+  assert.deepEqual(jobQueue.getJobsForRepository("output-repo").map(({ id }) => id), [job.id]);
+  assert.deepEqual(events, ["queued", "running", "output:collecting\n", "output:done\n", "failed"]);
+});
@@ -0,0 +1,335 @@
+import { randomUUID } from "crypto";
+
+// pip installs and requirements builds running at once across all users
+const JOB_CONCURRENCY = parseInt(process.env.JOB_CONCURRENCY || "2", 10);
+// Terminal commands have their own slots, so long-running commands never hold up installs or starts
+const JOB_COMMAND_CONCURRENCY = parseInt(process.env.JOB_COMMAND_CONCURRENCY || "2", 10);
+// Terminal commands still running after this long are killed and fail; 0 disables
+const JOB_COMMAND_TIMEOUT_MS = parseInt(process.env.JOB_COMMAND_TIMEOUT_MS || "600000", 10);
+// Jobs of each pool a single user may have running at once
+const JOB_PER_USER_CONCURRENCY = parseInt(process.env.JOB_PER_USER_CONCURRENCY || "1", 10);
+// Jobs a single user may have waiting in the queue. Requirements builds are not
+// counted or refused: each belongs to a repository start, so they are already
+// bounded by the user's repositories, and refusing one would start it without packages.
+const JOB_MAX_QUEUED_PER_USER = parseInt(process.env.JOB_MAX_QUEUED_PER_USER || "10", 10);
+// Output kept per job for clients that load it over REST
+const JOB_OUTPUT_TAIL_BYTES = 64 * 1024;
+// Finished jobs kept for status lookups
+const JOB_HISTORY_LIMIT = 500;
+
+export type JobKind = "install" | "uninstall" | "command" | "requirements" | "seed";
+type JobPool = "packages" | "commands";
+export type JobStatus = "queued" | "running" | "succeeded" | "failed" | "cancelled";
+
+export interface Job {
+  id: string;
+  kind: JobKind;
+  userId: string;
+  // null for platform jobs such as wheelhouse seeding
+  repositoryId: string | null;
+  description: string;
+  status: JobStatus;
+  createdAt: number;
+  startedAt: number | null;
+  finishedAt: number | null;
+  error: string | null;
+  output: string;
+}
+
+export interface JobContext {
+  signal: AbortSignal;
+  onOutput: (data: Buffer | string) => void;
+}
+
+export type JobRunner = (context: JobContext) => Promise<void>;
+
+export interface JobEvent {
+  type: "job_status" | "job_output";
+  job: Job;
+  data?: string;
+}
+
+interface TimingStats {
+  count: number;
+  totalMs: number;
+  maxMs: number;
+}
+
+interface QueuedJob {
+  job: Job;
+  run: JobRunner;
+  controller: AbortController;
+  done: Promise<Job>;
+  resolve: (job: Job) => void;
+  timedOut: boolean;
+}
+
+interface PoolState {
+  concurrency: number;
+  queues: Map<string, QueuedJob[]>;
+  // Users with queued jobs in dispatch order; the user served last moves to the back
+  userOrder: string[];
+  runningByUser: Map<string, number>;
+  running: number;
+}
+
+function poolOf(kind: JobKind): JobPool {
+  return kind === "command" ? "commands" : "packages";
+}
+
+function createPool(concurrency: number): PoolState {
+  return { concurrency, queues: new Map(), userOrder: [], runningByUser: new Map(), running: 0 };
+}
+
+/**
+ * Bounded worker pools for pip operations and terminal commands. Jobs are
+ * queued per user and dispatched round-robin, so one user's backlog cannot
+ * delay everybody else, and the global caps keep installs from starving the
+ * hosted processes of CPU. Terminal commands run in a pool of their own with
+ * a maximum runtime, since a command like `python main.py` may never exit.
+ */
+class JobQueue {
+  private jobs: Map<string, QueuedJob> = new Map();
+  private pools: Record<JobPool, PoolState> = {
+    packages: createPool(JOB_CONCURRENCY),
+    commands: createPool(JOB_COMMAND_CONCURRENCY),
+  };
+  private finished: string[] = [];
+  private listeners: Array<(event: JobEvent) => void> = [];
+  private waitStats: TimingStats = { count: 0, totalMs: 0, maxMs: 0 };
+  private runStats: Map<JobKind, TimingStats> = new Map();
+
+  enqueue(
+    params: { kind: JobKind; userId: string; repositoryId: string | null; description: string },
+    run: JobRunner
+  ): { job: Job; done: Promise<Job> } {
+    const pool = this.pools[poolOf(params.kind)];
+    const queue = pool.queues.get(params.userId) ?? [];
+    const queuedForUser = [this.pools.packages, this.pools.commands].reduce(
+      (count, { queues }) => count + (queues.get(params.userId)?.filter((entry) => entry.job.kind !== "requirements").length ?? 0),
+      0
+    );
+    if (params.kind !== "requirements" && queuedForUser >= JOB_MAX_QUEUED_PER_USER) {
+      throw new Error("Too many queued jobs. Please wait for the current ones to finish.");
+    }
+
+    const job: Job = {
+      id: randomUUID(),
+      ...params,
+      status: "queued",
+      createdAt: Date.now(),
+      startedAt: null,
+      finishedAt: null,
+      error: null,
+      output: "",
+    };
+
+    let resolve!: (job: Job) => void;
+    const done = new Promise<Job>((r) => {
+      resolve = r;
+    });
+    const entry: QueuedJob = { job, run, controller: new AbortController(), done, resolve, timedOut: false };
+
+    this.jobs.set(job.id, entry);
+    queue.push(entry);
+    pool.queues.set(params.userId, queue);
+    if (!pool.userOrder.includes(params.userId)) {
+      pool.userOrder.push(params.userId);
+    }
+
+    this.emit({ type: "job_status", job });
+    this.dispatch(pool);
+    return { job, done };
+  }
+
+  getJob(jobId: string): Job | undefined {
+    return this.jobs.get(jobId)?.job;
+  }
+
+  getJobsForRepository(repositoryId: string): Job[] {
+    return Array.from(this.jobs.values())
+      .map((entry) => entry.job)
+      .filter((job) => job.repositoryId === repositoryId)
+      .sort((a, b) => b.createdAt - a.createdAt);
+  }
+
+  cancel(jobId: string): boolean {
+    const entry = this.jobs.get(jobId);
+    if (!entry) return false;
+
+    if (entry.job.status === "queued") {
+      const pool = this.pools[poolOf(entry.job.kind)];
+      const queue = pool.queues.get(entry.job.userId) ?? [];
+      const index = queue.indexOf(entry);
+      if (index !== -1) queue.splice(index, 1);
+      if (queue.length === 0) {
+        pool.queues.delete(entry.job.userId);
+        pool.userOrder = pool.userOrder.filter((id) => id !== entry.job.userId);
+      }
+      this.finish(entry, "cancelled", null);
+      return true;
+    }
+    if (entry.job.status === "running") {
+      // The runner kills its process; the job finishes as cancelled when it returns
+      entry.controller.abort();
+      return true;
+    }
+    return false;
+  }
+
+  onEvent(listener: (event: JobEvent) => void): void {
+    this.listeners.push(listener);
+  }
+
+  getMetrics() {
+    let queued = 0;
+    Object.values(this.pools).forEach((pool) => {
+      pool.queues.forEach((queue) => {
+        queued += queue.length;
+      });
+    });
+
+    const average = (stats: TimingStats) => ({
+      count: stats.count,
+      avgMs: stats.count ? Math.round(stats.totalMs / stats.count) : 0,
+      maxMs: stats.maxMs,
+    });
+    const runTime: Record<string, ReturnType<typeof average>> = {};
+    this.runStats.forEach((stats, kind) => {
+      runTime[kind] = average(stats);
+    });
+
+    return {
+      concurrency: JOB_CONCURRENCY,
+      commandConcurrency: JOB_COMMAND_CONCURRENCY,
+      commandTimeoutMs: JOB_COMMAND_TIMEOUT_MS,
+      running: this.pools.packages.running + this.pools.commands.running,
+      runningCommands: this.pools.commands.running,
+      queued,
+      waitTime: average(this.waitStats),
+      runTime,
+    };
+  }
+
+  private dispatch(pool: PoolState): void {
+    while (pool.running < pool.concurrency) {
+      const entry = this.nextJob(pool);
+      if (!entry) return;
+      this.start(pool, entry);
+    }
+  }
+
+  // Round-robin over users that have queued work and spare per-user capacity
+  private nextJob(pool: PoolState): QueuedJob | undefined {
+    for (let i = 0; i < pool.userOrder.length; i++) {
+      const userId = pool.userOrder[i];
+      const queue = pool.queues.get(userId);
+      if (!queue || queue.length === 0) continue;
+      if ((pool.runningByUser.get(userId) ?? 0) >= JOB_PER_USER_CONCURRENCY) continue;
+
+      const entry = queue.shift()!;
+      pool.userOrder.splice(i, 1);
+      if (queue.length > 0) {
+        pool.userOrder.push(userId);
+      } else {
+        pool.queues.delete(userId);
+      }
+      return entry;
+    }
+    return undefined;
+  }
+
+  private start(pool: PoolState, entry: QueuedJob): void {
+    const { job } = entry;
+    pool.running++;
+    pool.runningByUser.set(job.userId, (pool.runningByUser.get(job.userId) ?? 0) + 1);
+
+    job.status = "running";
+    job.startedAt = Date.now();
+    this.record(this.waitStats, job.startedAt - job.createdAt);
+    this.emit({ type: "job_status", job });
+
+    const context: JobContext = {
+      signal: entry.controller.signal,
+      onOutput: (data) => this.appendOutput(entry, data.toString()),
+    };
+
+    // The runner kills its process on abort, as for a cancel, but the job fails
+    let timeout: NodeJS.Timeout | undefined;
+    if (job.kind === "command" && JOB_COMMAND_TIMEOUT_MS > 0) {
+      timeout = setTimeout(() => {
+        entry.timedOut = true;
+        entry.controller.abort();
+      }, JOB_COMMAND_TIMEOUT_MS);
+    }
+    const stopped = (): JobStatus | null => {
+      if (entry.timedOut) return "failed";
+      return entry.controller.signal.aborted ? "cancelled" : null;
+    };
+    const timeoutError = `Timed out after ${Math.round(JOB_COMMAND_TIMEOUT_MS / 1000)}s`;
+
+    entry
+      .run(context)
+      .then(
+        () => this.finish(entry, stopped() ?? "succeeded", entry.timedOut ? timeoutError : null),
+        (error: any) => this.finish(entry, stopped() ?? "failed", entry.timedOut ? timeoutError : error?.message ?? String(error))
+      )
+      .finally(() => {
+        clearTimeout(timeout);
+        pool.running--;
+        const count = (pool.runningByUser.get(job.userId) ?? 1) - 1;
+        if (count > 0) {
+          pool.runningByUser.set(job.userId, count);
+        } else {
+          pool.runningByUser.delete(job.userId);
+        }
+
+        const stats = this.runStats.get(job.kind) ?? { count: 0, totalMs: 0, maxMs: 0 };
+        this.record(stats, (job.finishedAt ?? Date.now()) - (job.startedAt ?? Date.now()));
+        this.runStats.set(job.kind, stats);
+
+        this.dispatch(pool);
+      });
+  }
+
+  private appendOutput(entry: QueuedJob, data: string): void {
+    const { job } = entry;
+    job.output += data;
+    if (job.output.length > JOB_OUTPUT_TAIL_BYTES) {
+      job.output = job.output.slice(job.output.length - JOB_OUTPUT_TAIL_BYTES);
+    }
+    this.emit({ type: "job_output", job, data });
+  }
+
+  private finish(entry: QueuedJob, status: JobStatus, error: string | null): void {
+    const { job } = entry;
+    job.status = status;
+    job.error = error;
+    job.finishedAt = Date.now();
+    this.emit({ type: "job_status", job });
+    entry.resolve(job);
+
+    this.finished.push(job.id);
+    while (this.finished.length > JOB_HISTORY_LIMIT) {
+      this.jobs.delete(this.finished.shift()!);
+    }
+  }
+
+  private record(stats: TimingStats, durationMs: number): void {
+    stats.count++;
+    stats.totalMs += durationMs;
+    stats.maxMs = Math.max(stats.maxMs, durationMs);
+  }
+
+  private emit(event: JobEvent): void {
+    this.listeners.forEach((listener) => {
+      try {
+        listener(event);
+      } catch (error) {
+        console.error("[Jobs] Listener failed:", error);
+      }
+    });
+  }
+}
+
+export const jobQueue = new JobQueue();
@@ -0,0 +1,96 @@
+import { test } from "node:test";
+import assert from "node:assert/strict";
+import { LineSplitter, LogRingBuffer, MAX_LOG_LINE_LENGTH, OutputTail } from "./logBuffer";
+
+// Bytes a line costs in a LogRingBuffer, including its bookkeeping
+const entryBytes = (line: string) => Buffer.byteLength(line) + 32;
+
+test("the ring buffer numbers entries and evicts the oldest over its byte budget", () => {
+  const buffer = new LogRingBuffer(entryBytes("aaaa") * 2);
+  assert.equal(buffer.lastSeq, 0);
+
+  assert.equal(buffer.push({ timestamp: 1, line: "aaaa" }), 1);
+  assert.equal(buffer.push({ timestamp: 2, line: "bbbb" }), 2);
+  assert.equal(buffer.push({ timestamp: 3, line: "cccc" }), 3);
+
+  assert.deepEqual(buffer.snapshot().map(({ line }) => line), ["bbbb", "cccc"]);
+  assert.equal(buffer.size, entryBytes("aaaa") * 2);
+  assert.equal(buffer.lastSeq, 3);
+});
+
+test("the ring buffer keeps the newest entry even when it alone exceeds the budget", () => {
+  const buffer = new LogRingBuffer(10);
+  buffer.push({ timestamp: 1, line: "first" });
+  buffer.push({ timestamp: 2, line: "x".repeat(100) });
+
+  assert.deepEqual(buffer.snapshot(), [{ timestamp: 2, line: "x".repeat(100) }]);
+});
+
+test("sequence numbers keep counting across eviction, compaction and clear", () => {
+  const buffer = new LogRingBuffer(entryBytes("line") * 10);
+  for (let i = 1; i <= 3000; i++) {
+    assert.equal(buffer.push({ timestamp: i, line: "line" }), i);
+  }
+  const snapshot = buffer.snapshot();
+  assert.equal(snapshot.length, 10);
+  assert.equal(snapshot[0].timestamp, 2991);
+
+  buffer.clear();
+  assert.deepEqual(buffer.snapshot(), []);
+  assert.equal(buffer.size, 0);
+  assert.equal(buffer.push({ timestamp: 0, line: "after clear" }), 3001);
+});
+
+test("the line splitter joins chunks, strips CR and holds back split UTF-8", () => {
+  const lines: string[] = [];
+  const splitter = new LineSplitter((line) => lines.push(line));
+  const euro = Buffer.from("€\n");
+
+  splitter.write("one\r\ntw");
+  splitter.write(Buffer.from("o\n"));
+  splitter.write(euro.subarray(0, 1));
+  splitter.write(euro.subarray(1));
+  splitter.write("tail");
+  assert.equal(splitter.hasPartial, true);
+  splitter.end();
+
+  assert.deepEqual(lines, ["one", "two", "€", "tail"]);
+});
+
+test("the line splitter cuts overlong lines into pieces", () => {
+  const lines: string[] = [];
+  const splitter = new LineSplitter((line) => lines.push(line));
+
+  splitter.write("x".repeat(MAX_LOG_LINE_LENGTH * 2 + 5) + "\n");
+
+  assert.deepEqual(lines.map((line) => line.length), [MAX_LOG_LINE_LENGTH, MAX_LOG_LINE_LENGTH, 5]);
+});
+
+test("the line splitter emits an idle partial line only after a quiet interval", () => {
+  const lines: string[] = [];
+  const splitter = new LineSplitter((line) => lines.push(line));
+
+  splitter.write("Name: ");
+  splitter.flushIdle();
+  assert.deepEqual(lines, []);
+  splitter.flushIdle();
+  assert.deepEqual(lines, ["Name: "]);
+  assert.equal(splitter.hasPartial, false);
+});
+
+test("the output tail keeps only the last characters", () => {
+  const tail = new OutputTail(10);
+  for (let i = 0; i < 100; i++) tail.write(`${i},`);
+
+  assert.equal(tail.toString(), ",97,98,99,");
+});
+
+test("the output tail decodes UTF-8 split across chunks", () => {
+  const tail = new OutputTail(100);
+  const text = Buffer.from("héllo");
+
+  tail.write(text.subarray(0, 2));
+  tail.write(text.subarray(2));
+
+  assert.equal(tail.toString(), "héllo");
+});
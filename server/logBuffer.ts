@@ -0,0 +1,157 @@
+import { StringDecoder } from "string_decoder";
+
+export interface LogEntry {
+  timestamp: number;
+  line: string;
+}
+
+// Receives a batch of complete lines and the sequence number of the first one
+export type LogCallback = (message: string, seq: number) => void;
+
+// Longest line kept in one piece; anything longer is cut into several entries
+export const MAX_LOG_LINE_LENGTH = 16 * 1024;
+
+// Rough per-entry bookkeeping cost, counted against the byte budget
+const ENTRY_OVERHEAD_BYTES = 32;
+
+/**
+ * Bounded history of log lines for one repository. The budget is in bytes so a
+ * bot printing a few huge lines costs the same as one printing many small ones.
+ */
+export class LogRingBuffer {
+  private entries: Array<LogEntry & { bytes: number }> = [];
+  private head = 0;
+  private bytes = 0;
+  // Entries ever pushed; the newest entry's position in the live stream
+  private pushed = 0;
+
+  constructor(private maxBytes: number) {}
+
+  // Returns the entry's sequence number, counted from 1
+  push(entry: LogEntry): number {
+    const bytes = Buffer.byteLength(entry.line, "utf-8") + ENTRY_OVERHEAD_BYTES;
+    this.entries.push({ ...entry, bytes });
+    this.bytes += bytes;
+
+    // Always keep the newest entry, even if it alone exceeds the budget
+    while (this.bytes > this.maxBytes && this.head < this.entries.length - 1) {
+      this.bytes -= this.entries[this.head].bytes;
+      this.head++;
+    }
+
+    // Compact once the evicted prefix dominates the array
+    if (this.head > 1024 && this.head * 2 > this.entries.length) {
+      this.entries = this.entries.slice(this.head);
+      this.head = 0;
+    }
+    return ++this.pushed;
+  }
+
+  snapshot(): LogEntry[] {
+    const result: LogEntry[] = [];
+    for (let i = this.head; i < this.entries.length; i++) {
+      const { timestamp, line } = this.entries[i];
+      result.push({ timestamp, line });
+    }
+    return result;
+  }
+
+  get size(): number {
+    return this.bytes;
+  }
+
+  // Sequence number of the newest entry, 0 before the first push
+  get lastSeq(): number {
+    return this.pushed;
+  }
+
+  clear(): void {
+    this.entries = [];
+    this.head = 0;
+    this.bytes = 0;
+  }
+}
+
+/**
+ * Turns raw stdout/stderr chunks into complete lines. Multibyte UTF-8 sequences
+ * split across chunks are held back by the decoder until they are complete.
+ */
+export class LineSplitter {
+  private decoder = new StringDecoder("utf8");
+  private partial = "";
+  private touched = false;
+
+  constructor(private onLine: (line: string) => void) {}
+
+  write(chunk: Buffer | string): void {
+    const text = this.partial + (typeof chunk === "string" ? chunk : this.decoder.write(chunk));
+    const lines = text.split("\n");
+    this.partial = lines.pop() ?? "";
+    this.touched = true;
+
+    for (const line of lines) {
+      this.emit(line.endsWith("\r") ? line.slice(0, -1) : line);
+    }
+
+    if (this.partial.length > MAX_LOG_LINE_LENGTH) {
+      this.emit(this.partial);
+      this.partial = "";
+    }
+  }
+
+  get hasPartial(): boolean {
+    return this.partial.length > 0;
+  }
+
+  // Emit a trailing partial line (e.g. an input prompt) once no more data has
+  // arrived for it since the previous call.
+  flushIdle(): void {
+    if (this.partial && !this.touched) {
+      this.emit(this.partial);
+      this.partial = "";
+    }
+    this.touched = false;
+  }
+
+  end(): void {
+    const rest = this.partial + this.decoder.end();
+    this.partial = "";
+    if (rest) {
+      this.emit(rest);
+    }
+  }
+
+  private emit(line: string): void {
+    for (let i = 0; i < line.length || i === 0; i += MAX_LOG_LINE_LENGTH) {
+      this.onLine(line.slice(i, i + MAX_LOG_LINE_LENGTH));
+    }
+  }
+}
+
+/**
+ * The last `maxLength` characters of a process's output. Chunks are kept as
+ * they arrive and dropped from the front once they are no longer needed, so
+ * a command printing without end costs a fixed amount of memory.
+ */
+export class OutputTail {
+  private decoder = new StringDecoder("utf8");
+  private chunks: string[] = [];
+  private length = 0;
+
+  constructor(private maxLength: number) {}
+
+  write(chunk: Buffer | string): void {
+    const text = typeof chunk === "string" ? chunk : this.decoder.write(chunk);
+    if (!text) return;
+    this.chunks.push(text);
+    this.length += text.length;
+    while (this.chunks.length > 1 && this.length - this.chunks[0].length >= this.maxLength) {
+      this.length -= this.chunks.shift()!.length;
+    }
+  }
+
+  toString(): string {
+    const text = this.chunks.join("");
+    return text.length > this.maxLength ? text.slice(text.length - this.maxLength) : text;
+  }
+}
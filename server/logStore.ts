@@ -0,0 +1,371 @@
+import * as fs from "fs";
+import * as path from "path";
+import * as zlib from "zlib";
+import { promisify } from "util";
+import { Worker } from "worker_threads";
+import type { LogEntry } from "./logBuffer";
+
+const gzip = promisify(zlib.gzip);
+const gunzip = promisify(zlib.gunzip);
+
+const LOG_STORE_DIR = process.env.LOG_STORE_DIR || path.join(process.cwd(), "logs");
+// Uncompressed bytes collected before a block is compressed and appended
+const LOG_BLOCK_BYTES = 64 * 1024;
+// Upper bound on how long a partially filled block stays in memory
+const LOG_BLOCK_FLUSH_MS = 1000;
+// Compressed size at which a new segment file is started
+const LOG_SEGMENT_BYTES = parseInt(process.env.LOG_SEGMENT_BYTES || String(8 * 1024 * 1024), 10);
+const LOG_RETENTION_BYTES = parseInt(process.env.LOG_RETENTION_BYTES || String(64 * 1024 * 1024), 10);
+const LOG_RETENTION_DAYS = parseFloat(process.env.LOG_RETENTION_DAYS || "7");
+const RETENTION_SWEEP_MS = 60 * 60 * 1000;
+// Matching time one search may use before it is abandoned
+const LOG_SEARCH_TIMEOUT_MS = parseInt(process.env.LOG_SEARCH_TIMEOUT_MS || "2000", 10);
+// Lines sent to the search worker per round trip
+const SEARCH_BATCH_LINES = 1000;
+
+// User patterns are matched in a worker thread: a pattern that backtracks
+// catastrophically only occupies that thread until the search times out,
+// never the event loop serving the API
+const SEARCH_WORKER_SOURCE = `
+const { parentPort, workerData } = require("worker_threads");
+const pattern = new RegExp(workerData.source, workerData.flags);
+parentPort.on("message", (lines) => {
+  parentPort.postMessage(lines.map((line) => pattern.test(line)));
+});
+`;
+
+export class LogSearchTimeoutError extends Error {
+  constructor() {
+    super(`Search took longer than ${LOG_SEARCH_TIMEOUT_MS}ms; use a simpler pattern or a shorter time range`);
+  }
+}
+
+/**
+ * One entry per compressed block. Blocks are independent gzip members, so a
+ * reader can seek straight to `offset` and decompress `length` bytes.
+ */
+interface BlockIndexEntry {
+  offset: number;
+  length: number;
+  firstTs: number;
+  lastTs: number;
+  lines: number;
+}
+
+interface SegmentInfo {
+  name: string;
+  dataPath: string;
+  indexPath: string;
+  blocks: BlockIndexEntry[];
+}
+
+interface RepositoryLogState {
+  dir: string;
+  segmentName: string | null;
+  segmentSize: number;
+  block: string[];
+  blockBytes: number;
+  blockFirstTs: number;
+  blockLastTs: number;
+  writeChain: Promise<void>;
+}
+
+export interface LogQuery {
+  from?: number;
+  to?: number;
+  // Reading stops between blocks once this is aborted
+  signal?: AbortSignal;
+}
+
+/**
+ * Persistent, rotating, compressed store for hosted process output.
+ * Layout: <LOG_STORE_DIR>/<repositoryId>/<firstTs>.log.gz plus a
+ * <firstTs>.idx file with one JSON line per block.
+ */
+class LogStore {
+  private states: Map<string, RepositoryLogState> = new Map();
+  private flushTimer: NodeJS.Timeout | null = null;
+
+  constructor() {
+    setInterval(() => {
+      this.enforceRetentionForAll().catch((error) => {
+        console.error("[Log Store] Retention sweep failed:", error);
+      });
+    }, RETENTION_SWEEP_MS).unref();
+  }
+
+  append(repositoryId: string, timestamp: number, line: string): void {
+    const state = this.getState(repositoryId);
+    const encoded = `${timestamp}\t${line}\n`;
+
+    if (state.block.length === 0) {
+      state.blockFirstTs = timestamp;
+    }
+    state.block.push(encoded);
+    state.blockBytes += encoded.length;
+    state.blockLastTs = timestamp;
+
+    if (state.blockBytes >= LOG_BLOCK_BYTES) {
+      this.flushBlock(repositoryId, state);
+    } else if (!this.flushTimer) {
+      this.flushTimer = setTimeout(() => {
+        this.flushTimer = null;
+        this.states.forEach((s, id) => this.flushBlock(id, s));
+      }, LOG_BLOCK_FLUSH_MS);
+      this.flushTimer.unref();
+    }
+  }
+
+  async tail(repositoryId: string, lines: number): Promise<LogEntry[]> {
+    const state = this.states.get(repositoryId);
+    const result: LogEntry[] = state ? this.decodeBlock(state.block.join("")).slice(-lines) : [];
+
+    const segments = await this.loadSegments(repositoryId);
+    for (let s = segments.length - 1; s >= 0 && result.length < lines; s--) {
+      const segment = segments[s];
+      for (let b = segment.blocks.length - 1; b >= 0 && result.length < lines; b--) {
+        const entries = await this.readBlock(segment, segment.blocks[b]);
+        result.unshift(...entries.slice(-(lines - result.length)));
+      }
+    }
+
+    return result;
+  }
+
+  // Yields entries in chronological order, reading only blocks that overlap the range
+  async *range(repositoryId: string, query: LogQuery = {}): AsyncGenerator<LogEntry> {
+    const from = query.from ?? 0;
+    const to = query.to ?? Number.MAX_SAFE_INTEGER;
+
+    const segments = await this.loadSegments(repositoryId);
+    for (const segment of segments) {
+      for (const block of segment.blocks) {
+        if (query.signal?.aborted) return;
+        if (block.lastTs < from || block.firstTs > to) continue;
+        for (const entry of await this.readBlock(segment, block)) {
+          if (entry.timestamp >= from && entry.timestamp <= to) {
+            yield entry;
+          }
+        }
+      }
+    }
+
+    const state = this.states.get(repositoryId);
+    if (state && state.block.length > 0) {
+      for (const entry of this.decodeBlock(state.block.join(""))) {
+        if (entry.timestamp >= from && entry.timestamp <= to) {
+          yield entry;
+        }
+      }
+    }
+  }
+
+  // Throws LogSearchTimeoutError once matching has taken LOG_SEARCH_TIMEOUT_MS in total
+  async *search(repositoryId: string, pattern: RegExp, query: LogQuery = {}): AsyncGenerator<LogEntry> {
+    // Without g/y, test() keeps no state between lines
+    const flags = pattern.flags.replace(/[gy]/g, "");
+    const worker = new Worker(SEARCH_WORKER_SOURCE, { eval: true, workerData: { source: pattern.source, flags } });
+    let remainingMs = LOG_SEARCH_TIMEOUT_MS;
+    const match = async (batch: LogEntry[]) => {
+      const started = Date.now();
+      const matches = await this.matchInWorker(worker, batch.map((entry) => entry.line), remainingMs);
+      remainingMs -= Date.now() - started;
+      return batch.filter((_entry, i) => matches[i]);
+    };
+
+    try {
+      let batch: LogEntry[] = [];
+      for await (const entry of this.range(repositoryId, query)) {
+        batch.push(entry);
+        if (batch.length >= SEARCH_BATCH_LINES) {
+          yield* await match(batch);
+          batch = [];
+        }
+      }
+      if (batch.length > 0) {
+        yield* await match(batch);
+      }
+    } finally {
+      worker.terminate();
+    }
+  }
+
+  private matchInWorker(worker: Worker, lines: string[], timeoutMs: number): Promise<boolean[]> {
+    return new Promise((resolve, reject) => {
+      const cleanup = () => {
+        clearTimeout(timer);
+        worker.off("message", onMessage);
+        worker.off("error", onError);
+      };
+      const onMessage = (matches: boolean[]) => {
+        cleanup();
+        resolve(matches);
+      };
+      const onError = (error: Error) => {
+        cleanup();
+        reject(error);
+      };
+      const timer = setTimeout(() => {
+        cleanup();
+        reject(new LogSearchTimeoutError());
+      }, Math.max(0, timeoutMs));
+
+      worker.on("message", onMessage);
+      worker.on("error", onError);
+      worker.postMessage(lines);
+    });
+  }
+
+  async remove(repositoryId: string): Promise<void> {
+    const state = this.states.get(repositoryId);
+    this.states.delete(repositoryId);
+    if (state) {
+      await state.writeChain;
+    }
+    await fs.promises.rm(path.join(LOG_STORE_DIR, repositoryId), { recursive: true, force: true });
+  }
+
+  private getState(repositoryId: string): RepositoryLogState {
+    let state = this.states.get(repositoryId);
+    if (!state) {
+      state = {
+        dir: path.join(LOG_STORE_DIR, repositoryId),
+        segmentName: null,
+        segmentSize: 0,
+        block: [],
+        blockBytes: 0,
+        blockFirstTs: 0,
+        blockLastTs: 0,
+        writeChain: Promise.resolve(),
+      };
+      this.states.set(repositoryId, state);
+    }
+    return state;
+  }
+
+  // Compress the in-memory block and append it to the active segment.
+  // Writes for one repository are chained so offsets stay consistent.
+  private flushBlock(repositoryId: string, state: RepositoryLogState): void {
+    if (state.block.length === 0) return;
+
+    const raw = state.block.join("");
+    const lines = state.block.length;
+    const firstTs = state.blockFirstTs;
+    const lastTs = state.blockLastTs;
+    state.block = [];
+    state.blockBytes = 0;
+
+    state.writeChain = state.writeChain
+      .then(async () => {
+        const compressed = await gzip(raw);
+        await fs.promises.mkdir(state.dir, { recursive: true });
+
+        let rotated = false;
+        if (!state.segmentName || state.segmentSize >= LOG_SEGMENT_BYTES) {
+          state.segmentName = String(firstTs).padStart(15, "0");
+          state.segmentSize = 0;
+          rotated = true;
+        }
+
+        const entry: BlockIndexEntry = { offset: state.segmentSize, length: compressed.length, firstTs, lastTs, lines };
+        await fs.promises.appendFile(path.join(state.dir, `${state.segmentName}.log.gz`), compressed);
+        await fs.promises.appendFile(path.join(state.dir, `${state.segmentName}.idx`), JSON.stringify(entry) + "\n");
+        state.segmentSize += compressed.length;
+
+        if (rotated) {
+          await this.enforceRetention(repositoryId);
+        }
+      })
+      .catch((error) => {
+        console.error(`[Log Store] Failed to write logs for ${repositoryId}:`, error);
+      });
+  }
+
+  private async loadSegments(repositoryId: string): Promise<SegmentInfo[]> {
+    const dir = path.join(LOG_STORE_DIR, repositoryId);
+    let names: string[];
+    try {
+      names = await fs.promises.readdir(dir);
+    } catch {
+      return [];
+    }
+
+    const segments: SegmentInfo[] = [];
+    for (const file of names.filter((n) => n.endsWith(".idx")).sort()) {
+      const name = file.slice(0, -".idx".length);
+      const indexPath = path.join(dir, file);
+      const content = await fs.promises.readFile(indexPath, "utf-8").catch(() => "");
+      const blocks: BlockIndexEntry[] = [];
+      for (const line of content.split("\n")) {
+        if (!line) continue;
+        try {
+          blocks.push(JSON.parse(line));
+        } catch {
+          // A torn write at the end of the index only loses the last block
+        }
+      }
+      segments.push({ name, dataPath: path.join(dir, `${name}.log.gz`), indexPath, blocks });
+    }
+    return segments;
+  }
+
+  private async readBlock(segment: SegmentInfo, block: BlockIndexEntry): Promise<LogEntry[]> {
+    const handle = await fs.promises.open(segment.dataPath, "r");
+    try {
+      const buffer = Buffer.alloc(block.length);
+      await handle.read(buffer, 0, block.length, block.offset);
+      return this.decodeBlock((await gunzip(buffer)).toString("utf-8"));
+    } finally {
+      await handle.close();
+    }
+  }
+
+  private decodeBlock(raw: string): LogEntry[] {
+    const entries: LogEntry[] = [];
+    for (const record of raw.split("\n")) {
+      const tab = record.indexOf("\t");
+      if (tab === -1) continue;
+      entries.push({ timestamp: Number(record.slice(0, tab)), line: record.slice(tab + 1) });
+    }
+    return entries;
+  }
+
+  // Drop the oldest segments until the repository fits the size and age budget.
+  // The active segment is never removed.
+  private async enforceRetention(repositoryId: string): Promise<void> {
+    const active = this.states.get(repositoryId)?.segmentName;
+    const segments = await this.loadSegments(repositoryId);
+    const cutoff = Date.now() - LOG_RETENTION_DAYS * 24 * 60 * 60 * 1000;
+
+    const sizes = await Promise.all(
+      segments.map((segment) => fs.promises.stat(segment.dataPath).then((st) => st.size, () => 0))
+    );
+    let total = sizes.reduce((sum, size) => sum + size, 0);
+
+    for (let i = 0; i < segments.length; i++) {
+      const segment = segments[i];
+      if (segment.name === active) break;
+
+      const lastTs = segment.blocks.length ? segment.blocks[segment.blocks.length - 1].lastTs : 0;
+      if (total <= LOG_RETENTION_BYTES && lastTs >= cutoff) break;
+
+      await fs.promises.rm(segment.dataPath, { force: true });
+      await fs.promises.rm(segment.indexPath, { force: true });
+      total -= sizes[i];
+    }
+  }
+
+  private async enforceRetentionForAll(): Promise<void> {
+    let repositoryIds: string[];
+    try {
+      repositoryIds = await fs.promises.readdir(LOG_STORE_DIR);
+    } catch {
+      return;
+    }
+    for (const repositoryId of repositoryIds) {
+      await this.enforceRetention(repositoryId);
+    }
+  }
+}
+
+export const logStore = new LogStore();
@@ -0,0 +1,57 @@
+import * as os from "os";
+import { pythonProcessManager } from "./pythonProcessManager";
+import { processSupervisor } from "./supervisor";
+import { processMetrics, type Resolution, type TopSort } from "./processMetrics";
+import type { JobContext } from "./jobQueue";
+
+export interface NodeCapacity {
+  cpus: number;
+  // 1, 5 and 15 minute load averages
+  loadAverage: number[];
+  totalMemoryBytes: number;
+  freeMemoryBytes: number;
+}
+
+export function readCapacity(): NodeCapacity {
+  return {
+    cpus: os.cpus().length,
+    loadAverage: os.loadavg(),
+    totalMemoryBytes: os.totalmem(),
+    freeMemoryBytes: os.freemem(),
+  };
+}
+
+/**
+ * What the scheduler can ask a node to do. The API server calls these
+ * directly for its own node; worker agents run them for requests received
+ * over their scheduler connection.
+ */
+export const nodeOperations = {
+  start: (repositoryId: string) => processSupervisor.startRepository(repositoryId),
+  stop: async (repositoryId: string) => processSupervisor.stopRepository(repositoryId),
+  forget: async (repositoryId: string) => processSupervisor.forget(repositoryId),
+  // Stops without a status write, for runs the scheduler no longer wants on this node
+  abandon: async (repositoryId: string, reason: string) => {
+    processSupervisor.forget(repositoryId);
+    pythonProcessManager.abandon(repositoryId, reason);
+  },
+  sync: (repositoryId: string) => pythonProcessManager.syncRuntimeFilesToDatabase(repositoryId),
+  refreshLimits: (repositoryId: string) => pythonProcessManager.refreshLimits(repositoryId),
+  // Run where the repository's runtime directory and package overlay are; the
+  // context is supplied by the scheduler (see Scheduler.callWithContext)
+  executeCommand: (repositoryId: string, command: string, context?: Partial<JobContext>) =>
+    pythonProcessManager.executeCommand(repositoryId, command, context),
+  installPackage: (repositoryId: string, packageName: string, context?: Partial<JobContext>) =>
+    pythonProcessManager.installPackage(repositoryId, packageName, context),
+  uninstallPackage: (repositoryId: string, packageName: string, context?: Partial<JobContext>) =>
+    pythonProcessManager.uninstallPackage(repositoryId, packageName, context),
+  supervisorStatus: async (repositoryId: string) => processSupervisor.getStatus(repositoryId),
+  logBacklog: async (repositoryId: string) => pythonProcessManager.getLogBacklog(repositoryId),
+  clearLogBacklog: async (repositoryId: string) => pythonProcessManager.clearLogBacklog(repositoryId),
+  metricsCurrent: async (repositoryId: string) => processMetrics.getCurrent(repositoryId),
+  metricsHistory: async (repositoryId: string, resolution: Resolution) => processMetrics.getHistory(repositoryId, resolution),
+  metricsTop: async (limit: number, sort: TopSort) => processMetrics.getTop(limit, sort),
+};
+
+export type NodeOperations = typeof nodeOperations;
+export type NodeMethod = keyof NodeOperations;
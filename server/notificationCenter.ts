@@ -0,0 +1,55 @@
+import type { Notification } from "@shared/schema";
+import { webSocketHub } from "./wsHub";
+
+/**
+ * Delivers notifications to the owner's open sockets as they are created and
+ * keeps each user's unread count in memory, so reading the badge never hits
+ * Postgres. Counts are loaded once from a grouped query at startup and then
+ * moved by the storage methods that create or read notifications; a
+ * notification changed by another server instance is only picked up here
+ * after a restart.
+ */
+class NotificationCenter {
+  private unread: Map<string, number> = new Map();
+  private loaded = false;
+
+  load(counts: Array<{ userId: string; count: number }>): void {
+    this.unread = new Map(counts.map(({ userId, count }) => [userId, count]));
+    this.loaded = true;
+    console.log(`[Notifications] Loaded unread counts for ${counts.length} users`);
+  }
+
+  // undefined until load() has run, so callers can fall back to counting rows
+  unreadCount(userId: string): number | undefined {
+    if (!this.loaded) return undefined;
+    return this.unread.get(userId) ?? 0;
+  }
+
+  created(notification: Notification): void {
+    const count = this.adjust(notification.userId, notification.isRead ? 0 : 1);
+    webSocketHub.publishToUser(notification.userId, { type: "notification", notification, unreadCount: count });
+  }
+
+  // ids is omitted when every notification of the user was marked read
+  read(userId: string, ids?: string[]): void {
+    const count = ids ? this.adjust(userId, -ids.length) : this.reset(userId);
+    webSocketHub.publishToUser(userId, { type: "notifications_read", ids, unreadCount: count });
+  }
+
+  private adjust(userId: string, delta: number): number {
+    const count = Math.max(0, (this.unread.get(userId) ?? 0) + delta);
+    if (count === 0) {
+      this.unread.delete(userId);
+    } else {
+      this.unread.set(userId, count);
+    }
+    return count;
+  }
+
+  private reset(userId: string): number {
+    this.unread.delete(userId);
+    return 0;
+  }
+}
+
+export const notificationCenter = new NotificationCenter();
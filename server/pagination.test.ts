@@ -0,0 +1,61 @@
+import { test } from "node:test";
+import assert from "node:assert/strict";
+import { PgDialect, pgTable, text, timestamp } from "drizzle-orm/pg-core";
+import { decodeCursor, encodeCursor, InvalidCursorError, keyset, pageSize, toPage } from "./pagination";
+
+const items = pgTable("items", {
+  id: text("id").primaryKey(),
+  createdAt: timestamp("created_at").notNull(),
+  updatedAt: timestamp("updated_at"),
+});
+const dialect = new PgDialect();
+
+test("cursors round-trip and malformed ones are refused", () => {
+  const cursor = encodeCursor("2024-01-02 03:04:05.123456", "abc");
+  assert.deepEqual(decodeCursor(cursor), ["2024-01-02 03:04:05.123456", "abc"]);
+
+  for (const bad of ["", "not base64 json", Buffer.from('["only one"]').toString("base64url"), Buffer.from("[1, 2]").toString("base64url")]) {
+    assert.throws(() => decodeCursor(bad), InvalidCursorError);
+  }
+});
+
+test("pageSize defaults and clamps the requested limit", () => {
+  assert.equal(pageSize(), 50);
+  assert.equal(pageSize(NaN), 50);
+  assert.equal(pageSize(0), 50);
+  assert.equal(pageSize(-3), 1);
+  assert.equal(pageSize(10.7), 10);
+  assert.equal(pageSize(5000), 200);
+});
+
+test("toPage drops the lookahead row and points the cursor at the last returned row", () => {
+  const rows = ["a", "b", "c"].map((id, i) => ({ id, cursorKey: `2024-01-0${i + 1}` }));
+
+  const page = toPage(rows, 2);
+  assert.deepEqual(page.items, [{ id: "a" }, { id: "b" }]);
+  assert.deepEqual(decodeCursor(page.nextCursor!), ["2024-01-02", "b"]);
+
+  const last = toPage(rows, 3);
+  assert.equal(last.items.length, 3);
+  assert.equal(last.nextCursor, null);
+  assert.deepEqual(toPage([], 3), { items: [], nextCursor: null });
+});
+
+test("keyset pages start strictly after the cursor row in the listing's direction", () => {
+  const cursor = encodeCursor("2024-01-02 00:00:00", "b");
+
+  const desc = keyset(items.createdAt, items.id);
+  assert.equal(desc.after(), undefined);
+  const descQuery = dialect.sqlToQuery(desc.after(cursor)!);
+  assert.match(descQuery.sql, /\("items"\."created_at", "items"\."id"\) < \(\$1::timestamp, \$2\)/);
+  assert.deepEqual(descQuery.params, ["2024-01-02 00:00:00", "b"]);
+
+  const asc = keyset(items.createdAt, items.id, "asc");
+  assert.match(dialect.sqlToQuery(asc.after(cursor)!).sql, /\) > \(/);
+  assert.throws(() => asc.after("garbage"), InvalidCursorError);
+});
+
+test("keyset sorts rows without a timestamp as the epoch", () => {
+  const page = keyset(items.updatedAt, items.id);
+  assert.match(dialect.sqlToQuery(page.cursorKey).sql, /coalesce\("items"\."updated_at", 'epoch'::timestamp\)::text/);
+});
@@ -0,0 +1,82 @@
+import { sql, asc, desc, type SQL } from "drizzle-orm";
+import type { PgColumn } from "drizzle-orm/pg-core";
+import type { Page } from "@shared/schema";
+
+// Cursor pagination shared by the storage listings
+
+const DEFAULT_PAGE_SIZE = 50;
+const MAX_PAGE_SIZE = 200;
+
+export interface PageOptions {
+  cursor?: string;
+  limit?: number;
+  // Columns to return besides id; every column of the listing when omitted
+  fields?: string[];
+}
+
+export class InvalidCursorError extends Error {
+  constructor() {
+    super("Invalid cursor");
+  }
+}
+
+export function encodeCursor(sortKey: string, id: string): string {
+  return Buffer.from(JSON.stringify([sortKey, id])).toString("base64url");
+}
+
+export function decodeCursor(cursor: string): [string, string] {
+  try {
+    const decoded = JSON.parse(Buffer.from(cursor, "base64url").toString("utf-8"));
+    if (Array.isArray(decoded) && decoded.length === 2 && decoded.every((part) => typeof part === "string")) {
+      return decoded as [string, string];
+    }
+  } catch {}
+  throw new InvalidCursorError();
+}
+
+export function pageSize(limit?: number): number {
+  if (!limit || !Number.isFinite(limit)) return DEFAULT_PAGE_SIZE;
+  return Math.min(Math.max(Math.floor(limit), 1), MAX_PAGE_SIZE);
+}
+
+/**
+ * Keyset ordering on (timestamp column, id); rows without a timestamp sort as
+ * the epoch. Cursors carry the exact timestamp text and id of the last row
+ * returned, so the next page starts strictly after it even when timestamps tie.
+ */
+export function keyset(column: PgColumn, id: PgColumn, direction: "asc" | "desc" = "desc") {
+  const key = column.notNull ? sql`${column}` : sql`coalesce(${column}, 'epoch'::timestamp)`;
+  const order = direction === "asc" ? asc : desc;
+  return {
+    cursorKey: sql<string>`${key}::text`,
+    orderBy: [order(key), order(id)],
+    after(cursor?: string): SQL | undefined {
+      if (!cursor) return undefined;
+      const [sortKey, cursorId] = decodeCursor(cursor);
+      return direction === "asc"
+        ? sql`(${key}, ${id}) > (${sortKey}::timestamp, ${cursorId})`
+        : sql`(${key}, ${id}) < (${sortKey}::timestamp, ${cursorId})`;
+    },
+  };
+}
+
+// Narrows a listing's columns to the requested fields; unknown names are ignored.
+// Typed as the full column set only so select() accepts it: listings that use
+// it return Projected rows.
+export function project<T extends Record<string, unknown>>(columns: T, fields?: string[]): T {
+  if (!fields || fields.length === 0) return columns;
+  return Object.fromEntries(
+    Object.entries(columns).filter(([name]) => name === "id" || fields.includes(name))
+  ) as T;
+}
+
+// Rows are fetched with one extra to know whether another page exists
+export function toPage<T extends { id: string }>(rows: Array<T & { cursorKey: string }>, limit: number): Page<T> {
+  const hasMore = rows.length > limit;
+  const pageRows = hasMore ? rows.slice(0, limit) : rows;
+  const last = pageRows[pageRows.length - 1];
+  return {
+    items: pageRows.map(({ cursorKey: _cursorKey, ...row }) => row as unknown as T),
+    nextCursor: hasMore && last ? encodeCursor(last.cursorKey, last.id) : null,
+  };
+}
@@ -0,0 +1,339 @@
+import * as fs from "fs";
+import { pythonProcessManager } from "./pythonProcessManager";
+
+const PROCESS_METRICS_INTERVAL_MS = parseInt(process.env.PROCESS_METRICS_INTERVAL_MS || "1000", 10);
+// utime/stime in /proc/<pid>/stat are in USER_HZ, which Linux fixes at 100
+const CLOCK_TICKS_PER_SECOND = 100;
+
+export type Resolution = "1s" | "1m" | "1h";
+export const RESOLUTIONS: Resolution[] = ["1s", "1m", "1h"];
+
+// "1s" holds raw samples (one per sampling interval); the others are averages
+// over their bucket. Capacities: 5 minutes, 3 hours and 7 days.
+const TIERS: Record<Resolution, { bucketMs: number; capacity: number }> = {
+  "1s": { bucketMs: 0, capacity: 300 },
+  "1m": { bucketMs: 60 * 1000, capacity: 180 },
+  "1h": { bucketMs: 60 * 60 * 1000, capacity: 168 },
+};
+
+export type TopSort = "cpu" | "memory" | "io" | "fds";
+
+// The value getTop orders by
+export function topSortValue(point: MetricsPoint, sort: TopSort): number {
+  switch (sort) {
+    case "memory":
+      return point.rssBytes;
+    case "io":
+      return point.readBytesPerSec + point.writeBytesPerSec;
+    case "fds":
+      return point.fds;
+    default:
+      return point.cpuPercent;
+  }
+}
+
+export interface MetricsPoint {
+  timestamp: number;
+  cpuPercent: number;
+  cpuPercentMax: number;
+  rssBytes: number;
+  rssBytesMax: number;
+  fds: number;
+  threads: number;
+  processes: number;
+  readBytesPerSec: number;
+  writeBytesPerSec: number;
+}
+
+const AVERAGED_FIELDS = ["cpuPercent", "rssBytes", "fds", "threads", "processes", "readBytesPerSec", "writeBytesPerSec"] as const;
+type AveragedField = (typeof AVERAGED_FIELDS)[number];
+
+interface ProcessCounters {
+  cpuTicks: number;
+  rssBytes: number;
+  threads: number;
+  fds: number;
+  readBytes: number;
+  writeBytes: number;
+}
+
+// Running averages for one downsampled bucket; maxima are kept as maxima
+class Aggregate {
+  private count = 0;
+  private sums = Object.fromEntries(AVERAGED_FIELDS.map((field) => [field, 0])) as Record<AveragedField, number>;
+  private cpuPercentMax = 0;
+  private rssBytesMax = 0;
+
+  constructor(readonly start: number) {}
+
+  add(point: MetricsPoint): void {
+    this.count++;
+    for (const field of AVERAGED_FIELDS) {
+      this.sums[field] += point[field];
+    }
+    this.cpuPercentMax = Math.max(this.cpuPercentMax, point.cpuPercentMax);
+    this.rssBytesMax = Math.max(this.rssBytesMax, point.rssBytesMax);
+  }
+
+  toPoint(): MetricsPoint {
+    const average = (value: number) => (this.count ? value / this.count : 0);
+    return {
+      timestamp: this.start,
+      cpuPercent: round(average(this.sums.cpuPercent)),
+      cpuPercentMax: this.cpuPercentMax,
+      rssBytes: Math.round(average(this.sums.rssBytes)),
+      rssBytesMax: this.rssBytesMax,
+      fds: Math.round(average(this.sums.fds)),
+      threads: Math.round(average(this.sums.threads)),
+      processes: Math.round(average(this.sums.processes)),
+      readBytesPerSec: Math.round(average(this.sums.readBytesPerSec)),
+      writeBytesPerSec: Math.round(average(this.sums.writeBytesPerSec)),
+    };
+  }
+}
+
+interface RepositorySeries {
+  tiers: Record<Resolution, MetricsPoint[]>;
+  pending: { "1m": Aggregate | null; "1h": Aggregate | null };
+  // Counters per PID from the previous sample, for CPU and I/O deltas
+  previous: Map<number, ProcessCounters>;
+  lastSampleAt: number;
+  running: boolean;
+}
+
+/**
+ * Samples CPU, memory, file descriptors, threads and disk I/O of every
+ * running repository (its process and all descendants) from /proc, and keeps
+ * a downsampled history per repository in memory.
+ */
+class ProcessMetrics {
+  private series: Map<string, RepositorySeries> = new Map();
+  private listeners: Map<string, Set<(point: MetricsPoint) => void>> = new Map();
+  private globalListeners: Array<(repositoryId: string, point: MetricsPoint) => void> = [];
+  private readonly enabled = fs.existsSync("/proc/self/stat");
+
+  constructor() {
+    if (!this.enabled) {
+      console.log("[Metrics] /proc is not available, process metrics are disabled");
+      return;
+    }
+    this.schedule();
+  }
+
+  getCurrent(repositoryId: string): MetricsPoint | null {
+    const series = this.series.get(repositoryId);
+    if (!series?.running) return null;
+    const points = series.tiers["1s"];
+    return points[points.length - 1] ?? null;
+  }
+
+  // History for a resolution, including the bucket that is still filling up
+  getHistory(repositoryId: string, resolution: Resolution): MetricsPoint[] {
+    const series = this.series.get(repositoryId);
+    if (!series) return [];
+    const points = series.tiers[resolution].slice();
+    const pending = resolution === "1s" ? null : series.pending[resolution];
+    if (pending) points.push(pending.toPoint());
+    return points;
+  }
+
+  // Running repositories ordered by their latest sample
+  getTop(limit: number, sort: TopSort): Array<MetricsPoint & { repositoryId: string }> {
+    const current: Array<MetricsPoint & { repositoryId: string }> = [];
+    this.series.forEach((_series, repositoryId) => {
+      const point = this.getCurrent(repositoryId);
+      if (point) current.push({ repositoryId, ...point });
+    });
+    return current.sort((a, b) => topSortValue(b, sort) - topSortValue(a, sort)).slice(0, limit);
+  }
+
+  subscribe(repositoryId: string, listener: (point: MetricsPoint) => void): () => void {
+    let listeners = this.listeners.get(repositoryId);
+    if (!listeners) {
+      listeners = new Set();
+      this.listeners.set(repositoryId, listeners);
+    }
+    listeners.add(listener);
+    return () => {
+      listeners!.delete(listener);
+      if (listeners!.size === 0) this.listeners.delete(repositoryId);
+    };
+  }
+
+  // Every sample of every repository (used by worker nodes)
+  subscribeAll(listener: (repositoryId: string, point: MetricsPoint) => void): void {
+    this.globalListeners.push(listener);
+  }
+
+  // setTimeout rather than setInterval so a slow /proc scan never overlaps the next one
+  private schedule(): void {
+    setTimeout(() => {
+      this.sampleAll()
+        .catch((error) => console.error("[Metrics] Sampling failed:", error))
+        .finally(() => this.schedule());
+    }, PROCESS_METRICS_INTERVAL_MS).unref();
+  }
+
+  private async sampleAll(): Promise<void> {
+    const now = Date.now();
+    const running = pythonProcessManager.getRunningProcesses();
+    const runningIds = new Set(running.map((entry) => entry.repositoryId));
+
+    this.series.forEach((series, repositoryId) => {
+      if (runningIds.has(repositoryId)) return;
+      series.running = false;
+      series.previous.clear();
+      // History of stopped repositories is kept as long as the hourly tier reaches back
+      if (now - series.lastSampleAt > TIERS["1h"].bucketMs * TIERS["1h"].capacity) {
+        this.series.delete(repositoryId);
+      }
+    });
+
+    for (const { repositoryId, pid } of running) {
+      const point = await this.sample(repositoryId, pid, now);
+      if (!point) continue;
+      this.listeners.get(repositoryId)?.forEach((listener) => listener(point));
+      this.globalListeners.forEach((listener) => listener(repositoryId, point));
+    }
+  }
+
+  private async sample(repositoryId: string, rootPid: number, now: number): Promise<MetricsPoint | null> {
+    let series = this.series.get(repositoryId);
+    if (!series) {
+      series = {
+        tiers: { "1s": [], "1m": [], "1h": [] },
+        pending: { "1m": null, "1h": null },
+        previous: new Map(),
+        lastSampleAt: 0,
+        running: true,
+      };
+      this.series.set(repositoryId, series);
+    }
+
+    const elapsedSeconds = series.running && series.lastSampleAt
+      ? (now - series.lastSampleAt) / 1000
+      : PROCESS_METRICS_INTERVAL_MS / 1000;
+
+    let cpuTicks = 0;
+    let readBytes = 0;
+    let writeBytes = 0;
+    const totals = { rssBytes: 0, fds: 0, threads: 0, processes: 0 };
+    const current = new Map<number, ProcessCounters>();
+
+    for (const pid of await this.processTree(rootPid)) {
+      const counters = await this.readProcess(pid);
+      if (!counters) continue;
+      current.set(pid, counters);
+
+      // PIDs seen for the first time started during this interval; all their usage counts
+      const previous = series.previous.get(pid);
+      cpuTicks += Math.max(0, counters.cpuTicks - (previous?.cpuTicks ?? 0));
+      readBytes += Math.max(0, counters.readBytes - (previous?.readBytes ?? 0));
+      writeBytes += Math.max(0, counters.writeBytes - (previous?.writeBytes ?? 0));
+      totals.rssBytes += counters.rssBytes;
+      totals.fds += counters.fds;
+      totals.threads += counters.threads;
+      totals.processes++;
+    }
+
+    series.previous = current;
+    series.lastSampleAt = now;
+    series.running = true;
+    if (current.size === 0) return null;
+
+    const cpuPercent = round((cpuTicks / CLOCK_TICKS_PER_SECOND / elapsedSeconds) * 100);
+    const point: MetricsPoint = {
+      timestamp: now,
+      cpuPercent,
+      cpuPercentMax: cpuPercent,
+      rssBytes: totals.rssBytes,
+      rssBytesMax: totals.rssBytes,
+      fds: totals.fds,
+      threads: totals.threads,
+      processes: totals.processes,
+      readBytesPerSec: Math.round(readBytes / elapsedSeconds),
+      writeBytesPerSec: Math.round(writeBytes / elapsedSeconds),
+    };
+
+    this.append(series.tiers["1s"], point, TIERS["1s"].capacity);
+    this.rollUp(series, "1m", point);
+    return point;
+  }
+
+  private rollUp(series: RepositorySeries, resolution: "1m" | "1h", point: MetricsPoint): void {
+    const { bucketMs, capacity } = TIERS[resolution];
+    const start = Math.floor(point.timestamp / bucketMs) * bucketMs;
+
+    let pending = series.pending[resolution];
+    if (pending && pending.start !== start) {
+      const completed = pending.toPoint();
+      this.append(series.tiers[resolution], completed, capacity);
+      if (resolution === "1m") {
+        this.rollUp(series, "1h", completed);
+      }
+      pending = null;
+    }
+    if (!pending) {
+      pending = new Aggregate(start);
+      series.pending[resolution] = pending;
+    }
+    pending.add(point);
+  }
+
+  private append(points: MetricsPoint[], point: MetricsPoint, capacity: number): void {
+    points.push(point);
+    if (points.length > capacity) {
+      points.splice(0, points.length - capacity);
+    }
+  }
+
+  // The root process and its descendants, via /proc/<pid>/task/<tid>/children
+  private async processTree(rootPid: number): Promise<number[]> {
+    const pids = [rootPid];
+    for (let i = 0; i < pids.length; i++) {
+      const tasks = await fs.promises.readdir(`/proc/${pids[i]}/task`).catch(() => [] as string[]);
+      for (const tid of tasks) {
+        const children = await fs.promises.readFile(`/proc/${pids[i]}/task/${tid}/children`, "utf-8").catch(() => "");
+        for (const child of children.split(" ")) {
+          const pid = parseInt(child, 10);
+          if (pid && !pids.includes(pid)) pids.push(pid);
+        }
+      }
+    }
+    return pids;
+  }
+
+  private async readProcess(pid: number): Promise<ProcessCounters | null> {
+    let stat: string;
+    let status: string;
+    try {
+      [stat, status] = await Promise.all([
+        fs.promises.readFile(`/proc/${pid}/stat`, "utf-8"),
+        fs.promises.readFile(`/proc/${pid}/status`, "utf-8"),
+      ]);
+    } catch {
+      // Exited between listing and reading
+      return null;
+    }
+
+    // The command name may contain spaces and parentheses; fields resume after the last ")"
+    const fields = stat.slice(stat.lastIndexOf(")") + 2).split(" ");
+    const utime = parseInt(fields[11], 10);
+    const stime = parseInt(fields[12], 10);
+    const threads = parseInt(fields[17], 10);
+    const rssKb = parseInt(status.match(/^VmRSS:\s+(\d+)/m)?.[1] ?? "0", 10);
+
+    const io = await fs.promises.readFile(`/proc/${pid}/io`, "utf-8").catch(() => "");
+    const readBytes = parseInt(io.match(/^read_bytes:\s+(\d+)/m)?.[1] ?? "0", 10);
+    const writeBytes = parseInt(io.match(/^write_bytes:\s+(\d+)/m)?.[1] ?? "0", 10);
+    const fds = (await fs.promises.readdir(`/proc/${pid}/fd`).catch(() => [] as string[])).length;
+
+    return { cpuTicks: utime + stime, rssBytes: rssKb * 1024, threads, fds, readBytes, writeBytes };
+  }
+}
+
+function round(value: number): number {
+  return Math.round(value * 10) / 10;
+}
+
+export const processMetrics = new ProcessMetrics();
@@ -1,18 +1,107 @@
-import { spawn, type ChildProcess } from "child_process";
+import { spawn } from "child_process";
 import * as fs from "fs";
 import * as path from "path";
-import { storage } from "./storage";
+import { createHash } from "crypto";
+import { storage, type FileIndexEntry, type FileChangeSet } from "./storage";
+import { mapWithConcurrency } from "./concurrency";
+import { LineSplitter, LogRingBuffer, OutputTail, type LogCallback, type LogEntry } from "./logBuffer";
+import { logStore } from "./logStore";
+import { dependencyEnvironments, type PythonEnvironment } from "./depEnvironments";
+import { jobQueue, type JobContext } from "./jobQueue";
+import { interpreterRegistry, isStartupVariable, type Interpreter, type LaunchSpec } from "./interpreters";
+import { zygotePool, type HostedProcess } from "./zygote";
+import { bytecodeCache } from "./bytecodeCache";
+import { resourceLimits, EXIT_REASON_MESSAGES, type ExitReason } from "./resourceLimits";
+import type { Repository } from "@shared/schema";
 import chokidar from "chokidar";
 
+// Number of runtime files read in parallel while syncing back to the database
+const SYNC_READ_CONCURRENCY = 16;
+
+// Per-repository log history kept in memory for replay to new subscribers
+const LOG_BUFFER_BYTES = parseInt(process.env.LOG_BUFFER_BYTES || String(256 * 1024), 10);
+// How long log lines are coalesced before being handed to subscribers
+const LOG_FLUSH_INTERVAL_MS = parseInt(process.env.LOG_FLUSH_INTERVAL_MS || "50", 10);
+
+// Directories that hold installed packages or caches rather than user code;
+// they are never synced back to the database
+const SYNC_IGNORED_DIRECTORIES = new Set([".venv", "venv", "__pycache__"]);
+// Terminal command output kept for the result; the job streams all of it
+const COMMAND_OUTPUT_TAIL_LENGTH = 64 * 1024;
+// "pool" starts each repository on a prewarmed interpreter; "zygote" forks it
+// from a process that already imported the common heavy modules
+const PYTHON_LAUNCH_MODE = process.env.PYTHON_LAUNCH_MODE || "pool";
+
 interface ProcessInfo {
-  process: ChildProcess;
+  process: HostedProcess;
+  repositoryId: string;
+  stdout: LineSplitter;
+  stderr: LineSplitter;
+  startedAt: number;
+  // Set when the process is being stopped on purpose (user stop, restart)
+  stopping: boolean;
+}
+
+export interface ProcessExitEvent {
   repositoryId: string;
+  code: number | null;
+  signal: NodeJS.Signals | null;
+  intentional: boolean;
+  uptimeMs: number;
+  // Set when a resource limit ended the run
+  reason: ExitReason | null;
+}
+
+// 'parked' follows a crash when the supervisor gives up on a crash loop
+export type RepositoryTransition = "starting" | "running" | "crashed" | "parked" | "restarting" | "stopped" | "completed";
+
+// What the repositories table says after each transition
+const TRANSITION_STATUS: Record<RepositoryTransition, Repository["status"]> = {
+  starting: "starting",
+  running: "running",
+  crashed: "error",
+  parked: "error",
+  restarting: "restarting",
+  stopped: "stopped",
+  completed: "completed",
+};
+
+export interface RepositoryStatusEvent {
+  repositoryId: string;
+  transition: RepositoryTransition;
+  status: Repository["status"];
+  at: number;
+  // Resource limit that ended the run, for 'crashed'
+  exitReason: ExitReason | null;
+  // When the pending restart runs, for 'restarting'
+  nextRestartAt: number | null;
+}
+
+export interface FileSyncReport {
+  filesCreated: number;
+  filesUpdated: number;
+  filesDeleted: number;
+  foldersCreated: number;
+  foldersDeleted: number;
+  bytesWritten: number;
+  durationMs: number;
 }
 
 class PythonProcessManager {
   private processes: Map<string, ProcessInfo> = new Map();
-  private logCallbacks: Map<string, Array<(message: string) => void>> = new Map();
+  private logCallbacks: Map<string, Array<LogCallback>> = new Map();
+  private fileSyncCallbacks: Map<string, Array<(action: string) => void>> = new Map();
+  private fileSyncListeners: Array<(repositoryId: string, action: string) => void> = [];
+  private exitListeners: Array<(event: ProcessExitEvent) => void> = [];
+  private statusListeners: Array<(event: RepositoryStatusEvent) => void> = [];
+  // Last pending status write per repository, so transitions land in order
+  private statusWrites: Map<string, Promise<void>> = new Map();
   private fileWatchers: Map<string, any> = new Map();
+  private logBuffers: Map<string, LogRingBuffer> = new Map();
+  // Lines not yet delivered to subscribers, with the sequence number of the first one
+  private pendingLogLines: Map<string, { seq: number; entries: LogEntry[] }> = new Map();
+  private logLineListeners: Array<(repositoryId: string, entries: LogEntry[]) => void> = [];
+  private logFlushTimer: NodeJS.Timeout | null = null;
 
   async startRepository(repositoryId: string): Promise<void> {
     if (this.processes.has(repositoryId)) {
@@ -24,10 +113,31 @@ class PythonProcessManager {
       throw new Error("Repository not found");
     }
 
+    await this.setStatus(repositoryId, "starting");
+    try {
+      await this.launchRepository(repository);
+    } catch (error) {
+      await this.setStatus(repositoryId, "crashed");
+      throw error;
+    }
+  }
+
+  private async launchRepository(repository: Repository): Promise<void> {
+    const repositoryId = repository.id;
     if (!repository.mainFile) {
       throw new Error("No main file configured. Please set a main file in settings.");
     }
 
+    // Fail before touching the filesystem when the version is not installed
+    await interpreterRegistry.discover();
+    let interpreter: Interpreter;
+    try {
+      interpreter = interpreterRegistry.resolve(repository.pythonVersion);
+    } catch (error: any) {
+      this.emitLog(repositoryId, `❌ ${error.message}\n`);
+      throw error;
+    }
+
     const workDir = path.join(process.cwd(), "runtime", repositoryId);
     
     // Create work directory if it doesn't exist
@@ -40,6 +150,8 @@ class PythonProcessManager {
 
     this.emitLog(repositoryId, `📁 Preparing files in: ${workDir}\n`);
 
+    // Taken before reading, so files saved while they are written out stay newer
+    const materializedAt = new Date();
     const files = await storage.getFiles(repositoryId);
     
     // Write all files to disk
@@ -69,141 +181,223 @@ class PythonProcessManager {
       this.emitLog(repositoryId, `  ✓ Written: ${relativePath}\n`);
     }
 
+    // Persisted so a sync after a server restart still knows which rows were on disk
+    await storage.updateRepositoryById(repositoryId, { filesMaterializedAt: materializedAt });
+
     // Verify main file exists
     const mainFilePath = path.join(workDir, repository.mainFile);
     if (!fs.existsSync(mainFilePath)) {
       const errorMsg = `Main file not found: ${repository.mainFile}`;
       this.emitLog(repositoryId, `❌ ${errorMsg}\n`);
-      await storage.updateRepositoryById(repositoryId, { status: "error" });
       throw new Error(errorMsg);
     }
     
     this.emitLog(repositoryId, `✓ Main file found: ${repository.mainFile}\n`);
 
+    // Unchanged sources reuse their compiled code instead of being parsed again
+    const sources = files
+      .filter((file) => !file.isDirectory && file.name.endsWith(".py"))
+      .map((file) => path.join(workDir, file.path || "", file.name));
+    if (sources.length > 0) {
+      try {
+        const compiled = await bytecodeCache.prepare(interpreter, sources);
+        this.emitLog(repositoryId, `✓ Bytecode ready: ${compiled.hits} of ${compiled.files} modules from cache\n`);
+      } catch (error: any) {
+        console.error(`[Bytecode] Failed to prepare ${repositoryId}:`, error.message);
+      }
+    }
+
     const envVars = await storage.getEnvironmentVariables(repositoryId);
-    const env = { ...process.env };
+    let env: NodeJS.ProcessEnv = { ...process.env, PYTHONUNBUFFERED: "1", PYTHONPYCACHEPREFIX: interpreter.pycachePrefix };
     for (const envVar of envVars) {
       env[envVar.key] = envVar.value;
     }
 
-    // Check if requirements.txt exists and handle auto-installation
+    // Check if requirements.txt exists and attach its dependency environment
+    let environment: PythonEnvironment | null = null;
     const requirementsFile = files.find((f) => f.name === "requirements.txt" && !f.isDirectory);
     if (requirementsFile && requirementsFile.content.trim()) {
       this.emitLog(repositoryId, "ℹ️ requirements.txt detected.\n");
       
       if (repository.autoInstallFromRequirements) {
-        this.emitLog(repositoryId, "📦 Auto-installing packages from requirements.txt...\n");
-        
+        const stdoutLines = this.createLineSplitter(repositoryId);
         try {
-          const requirementsPath = path.join(workDir, "requirements.txt");
-          
-          // Install packages using pip
-          const installOutput = await new Promise<string>((resolve, reject) => {
-            // Use --user flag and --break-system-packages for Render/externally-managed environments
-            const pipInstall = spawn("python3", ["-m", "pip", "install", "--user", "--break-system-packages", "-r", requirementsPath], {
-              cwd: workDir,
-            });
-
-            let output = "";
-            let errorOutput = "";
-
-            pipInstall.stdout?.on("data", (data) => {
-              const message = data.toString();
-              output += message;
-              this.emitLog(repositoryId, message);
-            });
-
-            pipInstall.stderr?.on("data", (data) => {
-              const message = data.toString();
-              errorOutput += message;
-              this.emitLog(repositoryId, message);
-            });
-
-            pipInstall.on("close", (code) => {
-              if (code !== 0) {
-                reject(new Error(errorOutput || `pip install failed with code ${code}`));
-              } else {
-                resolve(output);
-              }
-            });
-
-            pipInstall.on("error", (error) => {
-              reject(error);
-            });
+          environment = await dependencyEnvironments.findExisting(repositoryId, requirementsFile.content, {
+            python: interpreter.executable,
+            workDir,
           });
+          if (!environment) {
+            // Builds share the install worker pool with terminal and package jobs
+            this.emitLog(repositoryId, "📦 Queued installation of requirements.txt...\n");
+            const { done } = jobQueue.enqueue(
+              { kind: "requirements", userId: repository.userId, repositoryId, description: "pip install -r requirements.txt" },
+              async ({ onOutput }) => {
+                environment = await dependencyEnvironments.ensureForRequirements(repositoryId, requirementsFile.content, {
+                  python: interpreter.executable,
+                  workDir,
+                  onOutput: (data) => {
+                    stdoutLines.write(data);
+                    onOutput(data);
+                  },
+                });
+              }
+            );
+            const job = await done;
+            if (job.status !== "succeeded" || !environment) {
+              throw new Error(job.error || "Installation was cancelled");
+            }
+          }
+          stdoutLines.end();
 
-          this.emitLog(repositoryId, "\n✅ Packages installed successfully from requirements.txt\n");
+          if (environment.reused) {
+            this.emitLog(repositoryId, `✓ Requirements unchanged, using environment ${environment.key.slice(0, 12)}\n`);
+          } else {
+            this.emitLog(repositoryId, `\n✅ Packages installed into environment ${environment.key.slice(0, 12)}\n`);
+          }
         } catch (error: any) {
+          stdoutLines.end();
           this.emitLog(repositoryId, `\n❌ Failed to install packages: ${error.message}\n`);
           this.emitLog(repositoryId, "ℹ️ You can install packages manually from the Terminal tab\n");
         }
       } else {
         this.emitLog(repositoryId, "ℹ️ Auto-install from requirements.txt is disabled.\n");
-        this.emitLog(repositoryId, "ℹ️ Please install packages manually using the Terminal tab:\n");
-        this.emitLog(repositoryId, "ℹ️ Run: pip install --user -r requirements.txt\n");
+        this.emitLog(repositoryId, "ℹ️ Enable it in Settings, or install packages from the Terminal tab: pip install -r requirements.txt\n");
       }
     }
 
-    this.emitLog(repositoryId, `\n🚀 Starting ${repository.mainFile}...\n`);
+    // Packages installed from the Terminal tab live in a per-repository overlay
+    env = dependencyEnvironments.attach(env, repositoryId, environment);
+
+    const profile = resourceLimits.profileFor(await storage.getUser(repository.userId));
+    const limits = resourceLimits.prepare(repositoryId, profile);
+    if (limits) {
+      this.emitLog(
+        repositoryId,
+        `🔒 Resource tier ${profile.tier}: ${Math.round(profile.memoryBytes / 1024 / 1024)} MB memory, ` +
+          `${profile.maxOpenFiles} open files, ${profile.maxProcesses} processes\n`
+      );
+    }
+
+    this.emitLog(repositoryId, `\n🚀 Starting ${repository.mainFile} with Python ${interpreter.fullVersion}...\n`);
     this.emitLog(repositoryId, `Working directory: ${workDir}\n`);
 
-    const childProcess = spawn("python3", ["-u", repository.mainFile], {
-      cwd: workDir,
-      env,
-      stdio: ['pipe', 'pipe', 'pipe'],
-    });
+    const childProcess = await this.launchProcess(
+      repositoryId,
+      interpreter,
+      environment,
+      {
+        script: repository.mainFile,
+        cwd: workDir,
+        env,
+        path: (env.PYTHONPATH || "").split(path.delimiter).filter(Boolean),
+        limits,
+      },
+      envVars.some((envVar) => isStartupVariable(envVar.key))
+    );
 
     if (!childProcess.pid) {
       const errorMsg = "Failed to spawn Python process";
       this.emitLog(repositoryId, `❌ ${errorMsg}\n`);
-      await storage.updateRepositoryById(repositoryId, { status: "error" });
       throw new Error(errorMsg);
     }
 
     this.emitLog(repositoryId, `✓ Process started with PID: ${childProcess.pid}\n`);
 
-    this.processes.set(repositoryId, {
+    const processInfo: ProcessInfo = {
       process: childProcess,
       repositoryId,
-    });
+      stdout: this.createLineSplitter(repositoryId),
+      stderr: this.createLineSplitter(repositoryId, "[ERROR] "),
+      startedAt: Date.now(),
+      stopping: false,
+    };
+    this.processes.set(repositoryId, processInfo);
+    const releaseEnvironment = environment ? dependencyEnvironments.retain(environment.key) : () => undefined;
 
-    childProcess.stdout?.on("data", (data) => {
-      const message = data.toString();
-      if (message) {
-        this.emitLog(repositoryId, message);
-      }
+    childProcess.stdout?.on("data", (data: Buffer) => {
+      processInfo.stdout.write(data);
     });
 
-    childProcess.stderr?.on("data", (data) => {
-      const message = data.toString();
-      if (message) {
-        this.emitLog(repositoryId, `[ERROR] ${message}`);
-      }
+    childProcess.stderr?.on("data", (data: Buffer) => {
+      processInfo.stderr.write(data);
     });
 
     childProcess.on("error", (error) => {
       this.emitLog(repositoryId, `❌ Process error: ${error.message}`);
-      this.processes.delete(repositoryId);
-      storage.updateRepositoryById(repositoryId, { status: "error" });
+      releaseEnvironment();
+      if (this.processes.get(repositoryId) === processInfo) {
+        this.processes.delete(repositoryId);
+        this.setStatus(repositoryId, "crashed");
+      }
     });
 
     childProcess.on("exit", (code, signal) => {
-      let status: "stopped" | "error" | "completed";
-      if (code === 0) {
-        status = "completed";
-        this.emitLog(repositoryId, `✅ Process completed successfully (exit code ${code})`);
-      } else {
-        status = "error";
-        this.emitLog(repositoryId, `❌ Process exited with code ${code}${signal ? ` and signal ${signal}` : ''}`);
+      processInfo.stdout.end();
+      processInfo.stderr.end();
+      releaseEnvironment();
+      if (this.processes.get(repositoryId) === processInfo) {
+        this.processes.delete(repositoryId);
+      }
+
+      const reason = code !== 0 && !processInfo.stopping ? resourceLimits.exitReason(repositoryId) : null;
+      resourceLimits.release(repositoryId);
+
+      // Intentional stops already recorded their status in stopRepository
+      if (!processInfo.stopping) {
+        let transition: RepositoryTransition;
+        if (code === 0) {
+          transition = "completed";
+          this.emitLog(repositoryId, `✅ Process completed successfully (exit code ${code})`);
+        } else {
+          transition = "crashed";
+          this.emitLog(repositoryId, `❌ Process exited with code ${code}${signal ? ` and signal ${signal}` : ''}`);
+          if (reason) {
+            this.emitLog(repositoryId, `\n❌ Resource limit: ${EXIT_REASON_MESSAGES[reason]}. Upgrade your tier by topping up your balance for more headroom.`);
+          }
+        }
+        this.setStatus(repositoryId, transition, { exitReason: reason });
       }
-      this.processes.delete(repositoryId);
-      storage.updateRepositoryById(repositoryId, { status });
+
+      const event: ProcessExitEvent = {
+        repositoryId,
+        code,
+        signal,
+        intentional: processInfo.stopping,
+        uptimeMs: Date.now() - processInfo.startedAt,
+        reason,
+      };
+      this.exitListeners.forEach((listener) => listener(event));
     });
 
-    await storage.updateRepositoryById(repositoryId, { status: "running" });
+    // A process that already exited has recorded its own transition
+    if (this.processes.get(repositoryId) === processInfo) {
+      await this.setStatus(repositoryId, "running");
+    }
     this.emitLog(repositoryId, "\n✓ Application is now running\n\n--- Application Output ---\n");
   }
 
+  private async launchProcess(
+    repositoryId: string,
+    interpreter: Interpreter,
+    environment: PythonEnvironment | null,
+    spec: LaunchSpec,
+    // The user set PYTHON* variables, which only a newly started interpreter reads
+    fresh: boolean
+  ): Promise<HostedProcess> {
+    if (fresh) {
+      return interpreterRegistry.launch(interpreter, spec, true);
+    }
+    // Overlay packages could shadow modules the zygote already imported
+    if (PYTHON_LAUNCH_MODE === "zygote" && !dependencyEnvironments.hasOverlayPackages(repositoryId)) {
+      try {
+        return await zygotePool.launch(interpreter, environment?.sitePackages ?? null, spec);
+      } catch (error: any) {
+        console.error(`[Zygote] Falling back to a regular start for ${repositoryId}: ${error.message}`);
+      }
+    }
+    return interpreterRegistry.launch(interpreter, spec);
+  }
+
   startFileWatcher(repositoryId: string, workDir: string): void {
     // إيقاف المراقب القديم إذا كان موجوداً
     if (this.fileWatchers.has(repositoryId)) {
@@ -324,12 +518,32 @@ class PythonProcessManager {
   }
 
   private emitFileSync(repositoryId: string, action: string): void {
-    const callbacks = this.logCallbacks.get(repositoryId);
+    const callbacks = this.fileSyncCallbacks.get(repositoryId);
     if (callbacks) {
-      // إرسال إشارة واضحة للتزامن
-      callbacks.forEach((callback) => {
-        callback(`__FILE_SYNC__:${action}\n`);
-      });
+      callbacks.forEach((callback) => callback(action));
+    }
+    this.fileSyncListeners.forEach((listener) => listener(repositoryId, action));
+  }
+
+  // File sync actions of every repository (used by worker nodes)
+  onFileSync(listener: (repositoryId: string, action: string) => void): void {
+    this.fileSyncListeners.push(listener);
+  }
+
+  subscribeToFileSync(repositoryId: string, callback: (action: string) => void): void {
+    if (!this.fileSyncCallbacks.has(repositoryId)) {
+      this.fileSyncCallbacks.set(repositoryId, []);
+    }
+    this.fileSyncCallbacks.get(repositoryId)!.push(callback);
+  }
+
+  unsubscribeFromFileSync(repositoryId: string, callback: (action: string) => void): void {
+    const callbacks = this.fileSyncCallbacks.get(repositoryId);
+    if (callbacks) {
+      const index = callbacks.indexOf(callback);
+      if (index !== -1) {
+        callbacks.splice(index, 1);
+      }
     }
   }
 
@@ -341,28 +555,125 @@ class PythonProcessManager {
     
     if (!processInfo) {
       // إذا لم تكن العملية تعمل، فقط حدّث الحالة
-      storage.updateRepositoryById(repositoryId, { status: "stopped" });
+      this.setStatus(repositoryId, "stopped");
       return;
     }
 
+    processInfo.stopping = true;
     processInfo.process.kill();
     this.processes.delete(repositoryId);
     this.emitLog(repositoryId, "⏹️ Process stopped");
-    storage.updateRepositoryById(repositoryId, { status: "stopped" });
+    this.setStatus(repositoryId, "stopped");
+  }
+
+  // Kills the process without recording a status: the database already holds
+  // what the scheduler decided (a run on another node, or a stop recorded
+  // while this node was unreachable)
+  abandon(repositoryId: string, reason: string): void {
+    const processInfo = this.processes.get(repositoryId);
+    if (!processInfo) return;
+
+    processInfo.stopping = true;
+    processInfo.process.kill();
+    this.processes.delete(repositoryId);
+    this.emitLog(repositoryId, `⏹️ Process stopped: ${reason}\n`);
   }
 
   isRunning(repositoryId: string): boolean {
     return this.processes.has(repositoryId);
   }
 
-  subscribeToLogs(repositoryId: string, callback: (message: string) => void): void {
+  // Re-derives the tier from the owner's balance, which may have changed since the start
+  async refreshLimits(repositoryId: string): Promise<void> {
+    if (!this.processes.has(repositoryId)) return;
+    const repository = await storage.getRepositoryById(repositoryId);
+    if (!repository) return;
+
+    const profile = resourceLimits.profileFor(await storage.getUser(repository.userId));
+    if (resourceLimits.update(repositoryId, profile)) {
+      this.emitLog(
+        repositoryId,
+        `🔒 Resource tier changed to ${profile.tier}: ${Math.round(profile.memoryBytes / 1024 / 1024)} MB memory, ` +
+          `${profile.maxProcesses} processes (open files from the next start)\n`
+      );
+    }
+  }
+
+  // Root PID of every running repository; descendants are found through /proc
+  getRunningProcesses(): Array<{ repositoryId: string; pid: number; startedAt: number }> {
+    const running: Array<{ repositoryId: string; pid: number; startedAt: number }> = [];
+    this.processes.forEach((info, repositoryId) => {
+      if (info.process.pid) {
+        running.push({ repositoryId, pid: info.process.pid, startedAt: info.startedAt });
+      }
+    });
+    return running;
+  }
+
+  onProcessExit(listener: (event: ProcessExitEvent) => void): void {
+    this.exitListeners.push(listener);
+  }
+
+  // Every status transition recorded on this node, after it is written
+  onStatusChange(listener: (event: RepositoryStatusEvent) => void): void {
+    this.statusListeners.push(listener);
+  }
+
+  /**
+   * Records a status transition: the repositories row is updated once and the
+   * event then goes to every status listener. Transitions of one repository
+   * are written in the order they were reported. Never rejects.
+   */
+  setStatus(
+    repositoryId: string,
+    transition: RepositoryTransition,
+    details: { exitReason?: ExitReason | null; nextRestartAt?: number | null } = {}
+  ): Promise<void> {
+    const event: RepositoryStatusEvent = {
+      repositoryId,
+      transition,
+      status: TRANSITION_STATUS[transition],
+      at: Date.now(),
+      exitReason: transition === "crashed" ? details.exitReason ?? null : null,
+      nextRestartAt: details.nextRestartAt ?? null,
+    };
+
+    const write = (this.statusWrites.get(repositoryId) ?? Promise.resolve()).then(async () => {
+      try {
+        await storage.updateRepositoryById(repositoryId, {
+          status: event.status,
+          statusChangedAt: new Date(event.at),
+          // A new run clears the reason the last one ended
+          ...(transition === "crashed" || transition === "running" ? { exitReason: event.exitReason } : {}),
+        });
+      } catch (error) {
+        console.error(`[Status] Failed to record ${transition} for ${repositoryId}:`, error);
+        return;
+      }
+      this.statusListeners.forEach((listener) => {
+        try {
+          listener(event);
+        } catch (error) {
+          console.error(`[Status] Listener failed for ${repositoryId}:`, error);
+        }
+      });
+    });
+
+    this.statusWrites.set(repositoryId, write);
+    write.then(() => {
+      if (this.statusWrites.get(repositoryId) === write) this.statusWrites.delete(repositoryId);
+    });
+    return write;
+  }
+
+  subscribeToLogs(repositoryId: string, callback: LogCallback): void {
     if (!this.logCallbacks.has(repositoryId)) {
       this.logCallbacks.set(repositoryId, []);
     }
     this.logCallbacks.get(repositoryId)!.push(callback);
   }
 
-  unsubscribeFromLogs(repositoryId: string, callback: (message: string) => void): void {
+  unsubscribeFromLogs(repositoryId: string, callback: LogCallback): void {
     const callbacks = this.logCallbacks.get(repositoryId);
     if (callbacks) {
       const index = callbacks.indexOf(callback);
@@ -372,70 +683,230 @@ class PythonProcessManager {
     }
   }
 
+  // Write a platform message (supervisor, installer) into the repository's log stream
+  logSystemMessage(repositoryId: string, message: string): void {
+    this.emitLog(repositoryId, message.endsWith("\n") ? message : `${message}\n`);
+  }
+
+  // Every flushed batch of log lines, for all repositories (used by worker nodes)
+  onLogLines(listener: (repositoryId: string, entries: LogEntry[]) => void): void {
+    this.logLineListeners.push(listener);
+  }
+
+  getLogBacklog(repositoryId: string): LogEntry[] {
+    return this.logBuffers.get(repositoryId)?.snapshot() ?? [];
+  }
+
+  // Sequence number of the newest buffered line; live messages carry the numbers that follow
+  getLogSeq(repositoryId: string): number {
+    return this.logBuffers.get(repositoryId)?.lastSeq ?? 0;
+  }
+
+  clearLogBacklog(repositoryId: string): void {
+    this.logBuffers.delete(repositoryId);
+    this.pendingLogLines.delete(repositoryId);
+  }
+
   private emitLog(repositoryId: string, message: string): void {
-    const callbacks = this.logCallbacks.get(repositoryId);
-    if (callbacks) {
-      callbacks.forEach((callback) => callback(message));
+    const lines = message.split("\n");
+    if (lines[lines.length - 1] === "") {
+      lines.pop();
+    }
+    for (const line of lines) {
+      this.appendLogLine(repositoryId, line);
     }
   }
 
-  async syncRuntimeFilesToDatabase(repositoryId: string): Promise<void> {
+  private createLineSplitter(repositoryId: string, prefix: string = ""): LineSplitter {
+    return new LineSplitter((line) => this.appendLogLine(repositoryId, prefix + line));
+  }
+
+  private appendLogLine(repositoryId: string, line: string): void {
+    let buffer = this.logBuffers.get(repositoryId);
+    if (!buffer) {
+      buffer = new LogRingBuffer(LOG_BUFFER_BYTES);
+      this.logBuffers.set(repositoryId, buffer);
+    }
+    const timestamp = Date.now();
+    const seq = buffer.push({ timestamp, line });
+    logStore.append(repositoryId, timestamp, line);
+
+    let pending = this.pendingLogLines.get(repositoryId);
+    if (!pending) {
+      pending = { seq, entries: [] };
+      this.pendingLogLines.set(repositoryId, pending);
+    }
+    pending.entries.push({ timestamp, line });
+    this.scheduleLogFlush();
+  }
+
+  private scheduleLogFlush(): void {
+    if (this.logFlushTimer) return;
+    this.logFlushTimer = setTimeout(() => {
+      this.logFlushTimer = null;
+      this.flushLogs();
+    }, LOG_FLUSH_INTERVAL_MS);
+    this.logFlushTimer.unref();
+  }
+
+  // Deliver coalesced lines as one message per repository per flush interval
+  private flushLogs(): void {
+    let hasPartial = false;
+    this.processes.forEach((info) => {
+      info.stdout.flushIdle();
+      info.stderr.flushIdle();
+      hasPartial = hasPartial || info.stdout.hasPartial || info.stderr.hasPartial;
+    });
+
+    const pending = this.pendingLogLines;
+    this.pendingLogLines = new Map();
+    pending.forEach(({ seq, entries }, repositoryId) => {
+      this.logLineListeners.forEach((listener) => listener(repositoryId, entries));
+      const callbacks = this.logCallbacks.get(repositoryId);
+      if (!callbacks || callbacks.length === 0) return;
+      const message = entries.map((entry) => entry.line).join("\n") + "\n";
+      callbacks.forEach((callback) => callback(message, seq));
+    });
+
+    if (hasPartial) {
+      this.scheduleLogFlush();
+    }
+  }
+
+  async syncRuntimeFilesToDatabase(repositoryId: string): Promise<FileSyncReport> {
+    const startedAt = Date.now();
+    const report: FileSyncReport = {
+      filesCreated: 0,
+      filesUpdated: 0,
+      filesDeleted: 0,
+      foldersCreated: 0,
+      foldersDeleted: 0,
+      bytesWritten: 0,
+      durationMs: 0,
+    };
+
     const workDir = path.join(process.cwd(), "runtime", repositoryId);
-    
     if (!fs.existsSync(workDir)) {
-      return;
+      report.durationMs = Date.now() - startedAt;
+      return report;
+    }
+
+    // Walk the runtime directory and the database index at the same time
+    const [diskEntries, index, repository] = await Promise.all([
+      this.walkRuntimeDirectory(workDir),
+      storage.getFileIndex(repositoryId),
+      storage.getRepositoryById(repositoryId),
+    ]);
+
+    const existing = new Map<string, FileIndexEntry>();
+    for (const entry of index) {
+      existing.set(entry.path ? `${entry.path}/${entry.name}` : entry.name, entry);
+    }
+
+    const changes: FileChangeSet = { inserts: [], updates: [], deletes: [] };
+    const seen = new Set<string>();
+
+    for (const relativePath of diskEntries.directories) {
+      seen.add(relativePath);
+      if (existing.has(relativePath)) continue;
+
+      const pathParts = relativePath.split("/");
+      const name = pathParts.pop() || "";
+      changes.inserts.push({ name, path: pathParts.join("/"), content: "", size: 0, isDirectory: true });
+      report.foldersCreated++;
     }
 
-    const scanDirectory = async (dirPath: string, relativePath: string = ""): Promise<void> => {
-      const items = fs.readdirSync(dirPath, { withFileTypes: true });
+    const hashed = await mapWithConcurrency(diskEntries.files, SYNC_READ_CONCURRENCY, async (relativePath) => {
+      const content = await fs.promises.readFile(path.join(workDir, relativePath), "utf-8");
+      return { relativePath, content, hash: createHash("md5").update(content, "utf-8").digest("hex") };
+    });
+
+    for (const { relativePath, content, hash } of hashed) {
+      seen.add(relativePath);
+      const row = existing.get(relativePath);
+      if (row && row.contentHash === hash) continue;
+
+      const size = Buffer.byteLength(content, "utf-8");
+      if (row) {
+        changes.updates.push({ id: row.id, content, size });
+        report.filesUpdated++;
+      } else {
+        const pathParts = relativePath.split("/");
+        const name = pathParts.pop() || "";
+        changes.inserts.push({ name, path: pathParts.join("/"), content, size, isDirectory: false });
+        report.filesCreated++;
+      }
+      report.bytesWritten += size;
+    }
+
+    // Only prune rows that were part of the last materialisation; anything created
+    // through the API afterwards has not been written to disk yet.
+    const materializedAt = repository?.filesMaterializedAt;
+    if (materializedAt) {
+      existing.forEach((row, relativePath) => {
+        if (seen.has(relativePath) || !row.updatedAt || row.updatedAt > materializedAt) return;
+        changes.deletes.push(row.id);
+        if (row.isDirectory) {
+          report.foldersDeleted++;
+        } else {
+          report.filesDeleted++;
+        }
+      });
+    }
+
+    await storage.applyFileChanges(repositoryId, changes);
+
+    report.durationMs = Date.now() - startedAt;
+    if (changes.inserts.length || changes.updates.length || changes.deletes.length) {
+      console.log(
+        `[File Sync] ${repositoryId}: +${report.filesCreated} ~${report.filesUpdated} -${report.filesDeleted} files, ` +
+          `${report.bytesWritten} bytes in ${report.durationMs}ms`
+      );
+      this.emitFileSync(repositoryId, "files_synced");
+    }
+    return report;
+  }
+
+  private async walkRuntimeDirectory(workDir: string): Promise<{ directories: string[]; files: string[] }> {
+    const directories: string[] = [];
+    const filePaths: string[] = [];
+
+    const scanDirectory = async (relativePath: string): Promise<void> => {
+      const items = await fs.promises.readdir(path.join(workDir, relativePath), { withFileTypes: true });
+      const subdirectories: string[] = [];
 
       for (const item of items) {
-        const itemPath = path.join(dirPath, item.name);
         const itemRelativePath = relativePath ? `${relativePath}/${item.name}` : item.name;
-
         if (item.isDirectory()) {
-          // Check if folder exists in DB
-          const existingFolder = await storage.getFileByPath(repositoryId, itemRelativePath);
-          if (!existingFolder) {
-            await storage.createFile(repositoryId, {
-              name: item.name,
-              path: relativePath,
-              content: "",
-              size: 0,
-              isDirectory: true,
-            });
-          }
-          // Recursively scan subdirectories
-          await scanDirectory(itemPath, itemRelativePath);
-        } else {
-          // Check if file exists in DB
-          const existingFile = await storage.getFileByPath(repositoryId, itemRelativePath);
-          const content = fs.readFileSync(itemPath, "utf-8");
-          const size = Buffer.byteLength(content, "utf-8");
-
-          if (existingFile) {
-            // Update if content changed
-            if (existingFile.content !== content) {
-              await storage.updateFile(existingFile.id, repositoryId, { content, size });
-            }
-          } else {
-            // Create new file
-            await storage.createFile(repositoryId, {
-              name: item.name,
-              path: relativePath,
-              content,
-              size,
-              isDirectory: false,
-            });
-          }
+          if (SYNC_IGNORED_DIRECTORIES.has(item.name)) continue;
+          directories.push(itemRelativePath);
+          subdirectories.push(itemRelativePath);
+        } else if (item.isFile()) {
+          filePaths.push(itemRelativePath);
         }
       }
+
+      await Promise.all(subdirectories.map(scanDirectory));
     };
 
-    await scanDirectory(workDir);
+    await scanDirectory("");
+    return { directories, files: filePaths };
   }
 
-  async executeCommand(repositoryId: string, command: string): Promise<string> {
+  async executeCommand(repositoryId: string, command: string, context: Partial<JobContext> = {}): Promise<string> {
+    // pip cannot remove packages from the overlay's --target directory itself
+    const uninstall = command.trim().match(/^pip3?\s+uninstall\s+(.+)$/);
+    if (uninstall) {
+      const packages = uninstall[1].split(/\s+/).filter((arg) => arg && !arg.startsWith("-"));
+      const outputs: string[] = [];
+      for (const packageName of packages) {
+        outputs.push(await this.uninstallPackage(repositoryId, packageName, context));
+      }
+      return outputs.join("\n") || "No packages specified";
+    }
+
+    const interpreter = await this.interpreterFor(repositoryId);
+
     return new Promise((resolve, reject) => {
       const workDir = path.join(process.cwd(), "runtime", repositoryId);
       
@@ -448,27 +919,56 @@ class PythonProcessManager {
       const cmd = parts[0];
       const args = parts.slice(1);
 
-      // Execute the command
+      // Execute the command with the repository's package overlay attached.
+      // Detached so cancellation can kill the whole process group the shell starts.
       const proc = spawn(cmd, args, {
         cwd: workDir,
         shell: true,
+        detached: true,
+        env: dependencyEnvironments.terminalEnv(repositoryId, interpreter),
       });
 
-      let output = "";
-      let errorOutput = "";
+      const signalGroup = (signal: NodeJS.Signals) => {
+        try {
+          if (proc.pid) process.kill(-proc.pid, signal);
+        } catch {
+          proc.kill(signal);
+        }
+      };
+      // Commands that ignore SIGTERM are killed, so a cancelled or timed-out job frees its slot
+      let killTimer: NodeJS.Timeout | undefined;
+      const abort = () => {
+        signalGroup("SIGTERM");
+        killTimer = setTimeout(() => signalGroup("SIGKILL"), 5000);
+        killTimer.unref();
+      };
+      if (context.signal?.aborted) {
+        abort();
+      }
+      context.signal?.addEventListener("abort", abort, { once: true });
 
-      proc.stdout?.on("data", (data) => {
-        output += data.toString();
+      // Everything is streamed through the job; only the end is kept for the result
+      const output = new OutputTail(COMMAND_OUTPUT_TAIL_LENGTH);
+      const errorOutput = new OutputTail(COMMAND_OUTPUT_TAIL_LENGTH);
+
+      proc.stdout?.on("data", (data: Buffer) => {
+        output.write(data);
+        context.onOutput?.(data);
       });
 
-      proc.stderr?.on("data", (data) => {
-        errorOutput += data.toString();
+      proc.stderr?.on("data", (data: Buffer) => {
+        errorOutput.write(data);
+        context.onOutput?.(data);
       });
 
       proc.on("close", (code) => {
-        const fullOutput = output + (errorOutput ? `\n${errorOutput}` : "");
-        if (code !== 0 && !output) {
-          reject(new Error(errorOutput || `Command failed with code ${code}`));
+        context.signal?.removeEventListener("abort", abort);
+        clearTimeout(killTimer);
+        const stdout = output.toString();
+        const stderr = errorOutput.toString();
+        const fullOutput = stdout + (stderr ? `\n${stderr}` : "");
+        if (code !== 0 && !stdout) {
+          reject(new Error(stderr || `Command failed with code ${code}`));
         } else {
           resolve(fullOutput || "Command executed successfully");
         }
@@ -480,75 +980,34 @@ class PythonProcessManager {
     });
   }
 
-  async installPackage(repositoryId: string, packageName: string): Promise<string> {
-    return new Promise((resolve, reject) => {
-      const workDir = path.join(process.cwd(), "runtime", repositoryId);
-      
-      if (!fs.existsSync(workDir)) {
-        fs.mkdirSync(workDir, { recursive: true });
-      }
-
-      const pipInstall = spawn("python3", ["-m", "pip", "install", "--user", "--break-system-packages", packageName], {
-        cwd: workDir,
-      });
-
-      let output = "";
-      let errorOutput = "";
-
-      pipInstall.stdout?.on("data", (data) => {
-        output += data.toString();
-      });
-
-      pipInstall.stderr?.on("data", (data) => {
-        errorOutput += data.toString();
-      });
-
-      pipInstall.on("close", (code) => {
-        if (code !== 0) {
-          reject(new Error(errorOutput || `Failed to install ${packageName}`));
-        } else {
-          resolve(output);
-        }
-      });
-
-      pipInstall.on("error", (error) => {
-        reject(error);
-      });
-    });
+  // Terminal installs go into the repository's overlay, never into a shared
+  // environment or the server's user site. Output is streamed through the
+  // job context, so errors only carry the exit code.
+  async installPackage(repositoryId: string, packageName: string, context: Partial<JobContext> = {}): Promise<string> {
+    const { executable } = await this.interpreterFor(repositoryId);
+    const result = await dependencyEnvironments.installIntoOverlay(repositoryId, packageName, executable, context);
+    if (result.code !== 0) {
+      throw new Error(`Failed to install ${packageName} (exit code ${result.code})`);
+    }
+    return result.output;
   }
 
-  async uninstallPackage(repositoryId: string, packageName: string): Promise<string> {
-    return new Promise((resolve, reject) => {
-      const workDir = path.join(process.cwd(), "runtime", repositoryId);
-
-      // Use --break-system-packages for Render/externally-managed environments
-      const pipUninstall = spawn("python3", ["-m", "pip", "uninstall", "-y", "--break-system-packages", packageName], {
-        cwd: workDir,
-      });
-
-      let output = "";
-      let errorOutput = "";
-
-      pipUninstall.stdout?.on("data", (data) => {
-        output += data.toString();
-      });
-
-      pipUninstall.stderr?.on("data", (data) => {
-        errorOutput += data.toString();
-      });
-
-      pipUninstall.on("close", (code) => {
-        if (code !== 0) {
-          reject(new Error(errorOutput || `Failed to uninstall ${packageName}`));
-        } else {
-          resolve(output);
-        }
-      });
+  async uninstallPackage(repositoryId: string, packageName: string, context: Partial<JobContext> = {}): Promise<string> {
+    const { executable } = await this.interpreterFor(repositoryId);
+    const result = await dependencyEnvironments.uninstallFromOverlay(repositoryId, packageName, executable, context);
+    if (result.code !== 0) {
+      throw new Error(`Failed to uninstall ${packageName} (exit code ${result.code})`);
+    }
+    return result.output;
+  }
 
-      pipUninstall.on("error", (error) => {
-        reject(error);
-      });
-    });
+  private async interpreterFor(repositoryId: string): Promise<Interpreter> {
+    const repository = await storage.getRepositoryById(repositoryId);
+    if (!repository) {
+      throw new Error("Repository not found");
+    }
+    await interpreterRegistry.discover();
+    return interpreterRegistry.resolve(repository.pythonVersion);
   }
 }
 
@@ -0,0 +1,77 @@
+import { test, mock } from "node:test";
+import assert from "node:assert/strict";
+import { EventEmitter } from "events";
+import { requestMetrics } from "./requestMetrics";
+
+// Passes one fake request through the middleware, taking durationMs to finish
+function simulate(route: string, durationMs: number, status = 200): void {
+  const times = [0n, BigInt(Math.round(durationMs * 1e6))];
+  const hrtime = mock.method(process.hrtime, "bigint", () => times.shift()!);
+  const req = { method: "GET", path: "/metrics-test", baseUrl: "", route: { path: route }, headers: { "content-length": "10" } };
+  const res = Object.assign(new EventEmitter(), { statusCode: status, getHeader: () => "100" });
+  try {
+    requestMetrics.middleware(req as any, res as any, () => {});
+    res.emit("finish");
+  } finally {
+    hrtime.mock.restore();
+  }
+}
+
+function summaryOf(route: string) {
+  const summary = requestMetrics.getSummary().find((entry) => entry.route === route);
+  assert.ok(summary, `no summary for ${route}`);
+  return summary;
+}
+
+test("quantiles interpolate within a bucket and never exceed the slowest request", () => {
+  for (let i = 0; i < 100; i++) simulate("/uniform", 7);
+
+  const { latencyMs } = summaryOf("/uniform");
+  assert.equal(latencyMs.p50, 6);
+  assert.equal(latencyMs.p99, 7);
+  assert.equal(latencyMs.max, 7);
+  assert.equal(latencyMs.avg, 7);
+});
+
+test("quantiles follow the tail into slower buckets", () => {
+  for (let i = 0; i < 90; i++) simulate("/tail", 3);
+  for (let i = 0; i < 10; i++) simulate("/tail", 400);
+
+  const { latencyMs } = summaryOf("/tail");
+  assert.equal(latencyMs.p50, 2.8);
+  assert.equal(latencyMs.p95, 325);
+  assert.equal(latencyMs.p99, 385);
+  assert.equal(latencyMs.max, 400);
+});
+
+test("requests slower than the last bucket are bounded by the maximum", () => {
+  simulate("/slow", 20000);
+
+  assert.equal(summaryOf("/slow").latencyMs.p50, 15000);
+});
+
+test("statuses and payload sizes are counted per route", () => {
+  simulate("/mixed", 1, 200);
+  simulate("/mixed", 1, 404);
+  simulate("/mixed", 1, 404);
+
+  const summary = summaryOf("/mixed");
+  assert.equal(summary.count, 3);
+  assert.deepEqual(summary.statuses, { 200: 1, 404: 2 });
+  assert.equal(summary.avgRequestBytes, 10);
+  assert.equal(summary.avgResponseBytes, 100);
+});
+
+test("the Prometheus histogram is cumulative and labels are escaped", () => {
+  simulate('/quoted/"x"', 7);
+  simulate('/quoted/"x"', 30);
+
+  const labels = 'method="GET",route="/quoted/\\"x\\""';
+  const lines = requestMetrics.renderPrometheus().split("\n");
+  assert.ok(lines.includes(`http_request_duration_seconds_bucket{${labels},le="0.005"} 0`));
+  assert.ok(lines.includes(`http_request_duration_seconds_bucket{${labels},le="0.01"} 1`));
+  assert.ok(lines.includes(`http_request_duration_seconds_bucket{${labels},le="0.05"} 2`));
+  assert.ok(lines.includes(`http_request_duration_seconds_bucket{${labels},le="+Inf"} 2`));
+  assert.ok(lines.includes(`http_request_duration_seconds_count{${labels}} 2`));
+  assert.ok(lines.includes(`http_requests_total{${labels},status="200"} 2`));
+});
@@ -0,0 +1,188 @@
+import type { Request, Response, NextFunction } from "express";
+import { log } from "./vite";
+
+// Fraction of /api responses whose JSON body is added to the log line; 0 disables
+const REQUEST_LOG_BODY_SAMPLE_RATE = parseFloat(process.env.REQUEST_LOG_BODY_SAMPLE_RATE || "0");
+const MAX_LOGGED_BODY_LENGTH = 200;
+// Upper bounds of the latency buckets (ms); slower requests land in +Inf
+const LATENCY_BUCKETS_MS = [5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000];
+
+interface RouteStats {
+  method: string;
+  route: string;
+  // One count per bucket in LATENCY_BUCKETS_MS plus +Inf, not cumulative
+  buckets: number[];
+  count: number;
+  durationSumMs: number;
+  maxMs: number;
+  statuses: Map<number, number>;
+  requestBytes: number;
+  responseBytes: number;
+}
+
+export interface RouteSummary {
+  method: string;
+  route: string;
+  count: number;
+  statuses: Record<number, number>;
+  latencyMs: { p50: number; p95: number; p99: number; max: number; avg: number };
+  avgRequestBytes: number;
+  avgResponseBytes: number;
+}
+
+/**
+ * Per-route request metrics: a latency histogram, status counts and payload
+ * sizes from Content-Length, keyed by the Express route pattern so ids in
+ * paths don't create new series. Recording is a few counter updates when the
+ * response finishes; bodies are only serialized again for sampled log lines.
+ */
+class RequestMetrics {
+  private routes: Map<string, RouteStats> = new Map();
+
+  middleware = (req: Request, res: Response, next: NextFunction): void => {
+    const start = process.hrtime.bigint();
+
+    let body: unknown;
+    const sampled = REQUEST_LOG_BODY_SAMPLE_RATE > 0 && req.path.startsWith("/api") && Math.random() < REQUEST_LOG_BODY_SAMPLE_RATE;
+    if (sampled) {
+      const json = res.json;
+      res.json = function (bodyJson, ...args) {
+        body = bodyJson;
+        return json.apply(res, [bodyJson, ...args]);
+      };
+    }
+
+    res.on("finish", () => {
+      const durationMs = Number(process.hrtime.bigint() - start) / 1e6;
+      // Set once a route handler matched; everything else shares one series
+      const route = req.route ? `${req.baseUrl}${String(req.route.path)}` : req.path.startsWith("/api") ? "unmatched" : "other";
+      this.record(req, res, route, durationMs);
+
+      if (req.path.startsWith("/api")) {
+        let line = `${req.method} ${req.path} ${res.statusCode} in ${durationMs.toFixed(1)}ms`;
+        if (body !== undefined) {
+          const json = JSON.stringify(body) ?? "";
+          line += ` :: ${json.length > MAX_LOGGED_BODY_LENGTH ? `${json.slice(0, MAX_LOGGED_BODY_LENGTH)}…` : json}`;
+        }
+        log(line);
+      }
+    });
+
+    next();
+  };
+
+  private record(req: Request, res: Response, route: string, durationMs: number): void {
+    const key = `${req.method} ${route}`;
+    let stats = this.routes.get(key);
+    if (!stats) {
+      stats = {
+        method: req.method,
+        route,
+        buckets: new Array(LATENCY_BUCKETS_MS.length + 1).fill(0),
+        count: 0,
+        durationSumMs: 0,
+        maxMs: 0,
+        statuses: new Map(),
+        requestBytes: 0,
+        responseBytes: 0,
+      };
+      this.routes.set(key, stats);
+    }
+
+    let bucket = 0;
+    while (bucket < LATENCY_BUCKETS_MS.length && durationMs > LATENCY_BUCKETS_MS[bucket]) bucket++;
+    stats.buckets[bucket]++;
+    stats.count++;
+    stats.durationSumMs += durationMs;
+    stats.maxMs = Math.max(stats.maxMs, durationMs);
+    stats.statuses.set(res.statusCode, (stats.statuses.get(res.statusCode) ?? 0) + 1);
+    stats.requestBytes += Number(req.headers["content-length"]) || 0;
+    stats.responseBytes += Number(res.getHeader("content-length")) || 0;
+  }
+
+  // Estimated from the histogram by interpolating within the bucket holding the rank
+  private quantile(stats: RouteStats, q: number): number {
+    const rank = q * stats.count;
+    let seen = 0;
+    for (let i = 0; i < stats.buckets.length; i++) {
+      const inBucket = stats.buckets[i];
+      if (inBucket > 0 && seen + inBucket >= rank) {
+        const lower = i === 0 ? 0 : LATENCY_BUCKETS_MS[i - 1];
+        const upper = i < LATENCY_BUCKETS_MS.length ? Math.min(LATENCY_BUCKETS_MS[i], stats.maxMs) : stats.maxMs;
+        return lower + (Math.max(upper, lower) - lower) * ((rank - seen) / inBucket);
+      }
+      seen += inBucket;
+    }
+    return 0;
+  }
+
+  // Busiest routes first
+  getSummary(): RouteSummary[] {
+    const round = (value: number) => Math.round(value * 10) / 10;
+    return Array.from(this.routes.values())
+      .sort((a, b) => b.count - a.count)
+      .map((stats) => ({
+        method: stats.method,
+        route: stats.route,
+        count: stats.count,
+        statuses: Object.fromEntries(stats.statuses),
+        latencyMs: {
+          p50: round(this.quantile(stats, 0.5)),
+          p95: round(this.quantile(stats, 0.95)),
+          p99: round(this.quantile(stats, 0.99)),
+          max: round(stats.maxMs),
+          avg: round(stats.durationSumMs / stats.count),
+        },
+        avgRequestBytes: Math.round(stats.requestBytes / stats.count),
+        avgResponseBytes: Math.round(stats.responseBytes / stats.count),
+      }));
+  }
+
+  // Prometheus text exposition format, version 0.0.4
+  renderPrometheus(): string {
+    const lines: string[] = [];
+    const all = Array.from(this.routes.values());
+    const labels = (stats: RouteStats) => `method="${escapeLabel(stats.method)}",route="${escapeLabel(stats.route)}"`;
+
+    lines.push("# HELP http_request_duration_seconds Time from request arrival until the response finished.");
+    lines.push("# TYPE http_request_duration_seconds histogram");
+    for (const stats of all) {
+      let cumulative = 0;
+      LATENCY_BUCKETS_MS.forEach((bound, i) => {
+        cumulative += stats.buckets[i];
+        lines.push(`http_request_duration_seconds_bucket{${labels(stats)},le="${bound / 1000}"} ${cumulative}`);
+      });
+      lines.push(`http_request_duration_seconds_bucket{${labels(stats)},le="+Inf"} ${stats.count}`);
+      lines.push(`http_request_duration_seconds_sum{${labels(stats)}} ${stats.durationSumMs / 1000}`);
+      lines.push(`http_request_duration_seconds_count{${labels(stats)}} ${stats.count}`);
+    }
+
+    lines.push("# HELP http_requests_total Finished requests by status code.");
+    lines.push("# TYPE http_requests_total counter");
+    for (const stats of all) {
+      stats.statuses.forEach((count, status) => {
+        lines.push(`http_requests_total{${labels(stats)},status="${status}"} ${count}`);
+      });
+    }
+
+    lines.push("# HELP http_request_size_bytes_total Request bodies received, from Content-Length.");
+    lines.push("# TYPE http_request_size_bytes_total counter");
+    for (const stats of all) {
+      lines.push(`http_request_size_bytes_total{${labels(stats)}} ${stats.requestBytes}`);
+    }
+
+    lines.push("# HELP http_response_size_bytes_total Response bodies sent, from Content-Length.");
+    lines.push("# TYPE http_response_size_bytes_total counter");
+    for (const stats of all) {
+      lines.push(`http_response_size_bytes_total{${labels(stats)}} ${stats.responseBytes}`);
+    }
+
+    return lines.join("\n") + "\n";
+  }
+}
+
+function escapeLabel(value: string): string {
+  return value.replace(/\\/g, "\\\\").replace(/"/g, '\\"').replace(/\n/g, "\\n");
+}
+
+export const requestMetrics = new RequestMetrics();
@@ -0,0 +1,248 @@
+import * as fs from "fs";
+import * as path from "path";
+import type { User } from "@shared/schema";
+import type { LaunchLimits } from "./interpreters";
+
+// "false" starts hosted processes without any limits
+const RESOURCE_LIMITS_ENABLED = process.env.RESOURCE_LIMITS_ENABLED !== "false";
+// Delegated cgroup v2 subtree (writable by the server user) for per-repository groups
+const CGROUP_ROOT = process.env.CGROUP_ROOT || "/sys/fs/cgroup/hostyria";
+// Minimum account balance (USD) for the standard and premium tiers
+const STANDARD_TIER_BALANCE = parseFloat(process.env.RESOURCE_TIER_STANDARD_BALANCE || "5");
+const PREMIUM_TIER_BALANCE = parseFloat(process.env.RESOURCE_TIER_PREMIUM_BALANCE || "20");
+
+const MB = 1024 * 1024;
+
+export type ResourceTier = "free" | "standard" | "premium";
+
+// Why a process exited, when a limit is the cause
+export type ExitReason = "oom" | "pids_limit";
+
+export interface ResourceProfile {
+  tier: ResourceTier;
+  // cgroup memory.max: resident memory of the repository's processes combined
+  memoryBytes: number;
+  // RLIMIT_AS per process; generous because threads and allocator arenas reserve address space
+  addressSpaceBytes: number;
+  maxOpenFiles: number;
+  // cgroup pids.max (processes and threads)
+  maxProcesses: number;
+  // cgroup cpu.weight, the CPU share under contention (kernel default 100)
+  cpuWeight: number;
+}
+
+export const RESOURCE_PROFILES: Record<ResourceTier, ResourceProfile> = {
+  free: { tier: "free", memoryBytes: 256 * MB, addressSpaceBytes: 2048 * MB, maxOpenFiles: 256, maxProcesses: 64, cpuWeight: 50 },
+  standard: { tier: "standard", memoryBytes: 512 * MB, addressSpaceBytes: 4096 * MB, maxOpenFiles: 1024, maxProcesses: 128, cpuWeight: 100 },
+  premium: { tier: "premium", memoryBytes: 1024 * MB, addressSpaceBytes: 8192 * MB, maxOpenFiles: 4096, maxProcesses: 256, cpuWeight: 200 },
+};
+
+export const EXIT_REASON_MESSAGES: Record<ExitReason, string> = {
+  oom: "the memory limit was exceeded and the process was killed (out of memory)",
+  pids_limit: "the process limit was reached",
+};
+
+// Files of a repository group the server writes; every file in the group is
+// made read-only once the process has been placed, so the limits cannot be
+// changed from inside (including by hosted code sharing the server's uid
+// without first changing the mode back)
+const CGROUP_WRITTEN_FILES = ["memory.max", "memory.swap.max", "pids.max", "cpu.weight", "cgroup.procs"];
+
+interface CgroupCounters {
+  oomKills: number;
+  pidsMax: number;
+}
+
+/**
+ * Per-repository resource profiles derived from the owner's balance tier.
+ * File-descriptor and address-space rlimits are applied by the hosted process
+ * before user code runs; memory, process count and CPU weight use a cgroup v2
+ * group per repository when a delegated subtree is available. The server
+ * writes those limits and moves the process into the group itself.
+ */
+class ResourceLimits {
+  private cgroups: boolean | null = null;
+  // memory.events / pids.events counters when the current run started
+  private baselines: Map<string, CgroupCounters> = new Map();
+  // Tier whose limits the repository's group currently has
+  private tiers: Map<string, ResourceTier> = new Map();
+
+  tierFor(user: Pick<User, "isAdmin" | "balance"> | undefined): ResourceTier {
+    if (user?.isAdmin) return "premium";
+    const balance = parseFloat(user?.balance ?? "0") || 0;
+    if (balance >= PREMIUM_TIER_BALANCE) return "premium";
+    if (balance >= STANDARD_TIER_BALANCE) return "standard";
+    return "free";
+  }
+
+  profileFor(user: Pick<User, "isAdmin" | "balance"> | undefined): ResourceProfile {
+    return RESOURCE_PROFILES[this.tierFor(user)];
+  }
+
+  get enabled(): boolean {
+    return RESOURCE_LIMITS_ENABLED;
+  }
+
+  cgroupsAvailable(): boolean {
+    if (this.cgroups === null) {
+      this.cgroups = this.setUpCgroupRoot();
+    }
+    return this.cgroups;
+  }
+
+  // Limits for the next run of a repository; null when limits are disabled
+  prepare(repositoryId: string, profile: ResourceProfile): LaunchLimits | null {
+    if (!RESOURCE_LIMITS_ENABLED) return null;
+
+    let cgroup: string | null = null;
+    if (this.cgroupsAvailable()) {
+      try {
+        cgroup = path.join(CGROUP_ROOT, repositoryId);
+        fs.mkdirSync(cgroup, { recursive: true });
+        this.writeLimits(cgroup, profile);
+        this.tiers.set(repositoryId, profile.tier);
+        this.baselines.set(repositoryId, this.readCounters(cgroup));
+      } catch (error: any) {
+        console.error(`[Limits] Could not configure cgroup for ${repositoryId}:`, error.message);
+        cgroup = null;
+      }
+    }
+
+    return {
+      rlimits: {
+        RLIMIT_NOFILE: profile.maxOpenFiles,
+        RLIMIT_AS: profile.addressSpaceBytes,
+      },
+      cgroup,
+    };
+  }
+
+  // Move a started process into its group before it runs any user code, then
+  // make the group read-only. A failure leaves the process unconfined, like a
+  // host without cgroups, rather than failing the start.
+  place(cgroup: string, pid: number): void {
+    try {
+      fs.writeFileSync(path.join(cgroup, "cgroup.procs"), String(pid));
+    } catch (error: any) {
+      console.error(`[Limits] Could not move process ${pid} into ${cgroup}:`, error.message);
+    }
+    this.setWritable(cgroup, false);
+  }
+
+  // Give a running repository the limits of its owner's current tier; false
+  // when it has no group or already has them. rlimits keep their start values.
+  update(repositoryId: string, profile: ResourceProfile): boolean {
+    const current = this.tiers.get(repositoryId);
+    if (!current || current === profile.tier) return false;
+
+    const cgroup = path.join(CGROUP_ROOT, repositoryId);
+    try {
+      this.writeLimits(cgroup, profile);
+      this.tiers.set(repositoryId, profile.tier);
+      return true;
+    } catch (error: any) {
+      console.error(`[Limits] Could not update cgroup for ${repositoryId}:`, error.message);
+      return false;
+    } finally {
+      this.setWritable(cgroup, false);
+    }
+  }
+
+  // Which limit, if any, ended the run that just exited
+  exitReason(repositoryId: string): ExitReason | null {
+    const baseline = this.baselines.get(repositoryId);
+    if (!baseline) return null;
+
+    const counters = this.readCounters(path.join(CGROUP_ROOT, repositoryId));
+    if (counters.oomKills > baseline.oomKills) return "oom";
+    if (counters.pidsMax > baseline.pidsMax) return "pids_limit";
+    return null;
+  }
+
+  // Remove the repository's group once its processes are gone
+  release(repositoryId: string): void {
+    this.tiers.delete(repositoryId);
+    if (!this.baselines.delete(repositoryId)) return;
+    try {
+      fs.rmdirSync(path.join(CGROUP_ROOT, repositoryId));
+    } catch {
+      // Still has processes (e.g. a detached grandchild); reused on the next start
+    }
+  }
+
+  // Create the subtree and enable the controllers for repository groups
+  private setUpCgroupRoot(): boolean {
+    if (!RESOURCE_LIMITS_ENABLED || !fs.existsSync("/sys/fs/cgroup/cgroup.controllers")) {
+      console.log("[Limits] cgroup v2 is not available; applying rlimits only");
+      return false;
+    }
+    try {
+      fs.mkdirSync(CGROUP_ROOT, { recursive: true });
+      fs.writeFileSync(path.join(CGROUP_ROOT, "cgroup.subtree_control"), "+cpu +memory +pids");
+      console.log(`[Limits] Using cgroup v2 groups under ${CGROUP_ROOT}`);
+      return true;
+    } catch (error: any) {
+      console.log(`[Limits] Cannot use ${CGROUP_ROOT} (${error.code || error.message}); applying rlimits only`);
+      return false;
+    }
+  }
+
+  private writeLimits(cgroup: string, profile: ResourceProfile): void {
+    this.setWritable(cgroup, true);
+    fs.writeFileSync(path.join(cgroup, "memory.max"), String(profile.memoryBytes));
+    fs.writeFileSync(path.join(cgroup, "pids.max"), String(profile.maxProcesses));
+    fs.writeFileSync(path.join(cgroup, "cpu.weight"), String(profile.cpuWeight));
+    // Without this the memory limit only pushes the bot into swap
+    this.tryWrite(path.join(cgroup, "memory.swap.max"), "0");
+  }
+
+  // Read-only also covers the directory, so no nested groups can be created
+  private setWritable(cgroup: string, writable: boolean): void {
+    try {
+      if (writable) {
+        fs.chmodSync(cgroup, 0o755);
+        for (const file of CGROUP_WRITTEN_FILES) {
+          this.tryChmod(path.join(cgroup, file), 0o644);
+        }
+        return;
+      }
+      for (const file of fs.readdirSync(cgroup)) {
+        const target = path.join(cgroup, file);
+        this.tryChmod(target, fs.statSync(target).mode & 0o555);
+      }
+      fs.chmodSync(cgroup, 0o555);
+    } catch (error: any) {
+      console.error(`[Limits] Could not change permissions of ${cgroup}:`, error.message);
+    }
+  }
+
+  private tryChmod(file: string, mode: number): void {
+    try {
+      fs.chmodSync(file, mode);
+    } catch {
+      // Controller file not present
+    }
+  }
+
+  private readCounters(cgroup: string): CgroupCounters {
+    const read = (file: string, key: string) => {
+      try {
+        const match = fs.readFileSync(path.join(cgroup, file), "utf-8").match(new RegExp(`^${key} (\\d+)`, "m"));
+        return match ? parseInt(match[1], 10) : 0;
+      } catch {
+        return 0;
+      }
+    };
+    return { oomKills: read("memory.events", "oom_kill"), pidsMax: read("pids.events", "max") };
+  }
+
+  private tryWrite(file: string, value: string): void {
+    try {
+      fs.writeFileSync(file, value);
+    } catch {
+      // Controller file not present (e.g. swap accounting disabled)
+    }
+  }
+}
+
+export const resourceLimits = new ResourceLimits();
@@ -1,15 +1,32 @@
-import express, { type Express } from "express";
+import express, { type Express, type Response } from "express";
+import { once } from "events";
+import { timingSafeEqual } from "crypto";
 import { createServer, type Server } from "http";
-import { WebSocketServer, WebSocket } from "ws";
-import { storage } from "./storage";
-import { isAuthenticated, hashPassword, verifyPassword } from "./auth";
+import { storage, InvalidCursorError, InvalidAmountError, type PageOptions } from "./storage";
+import { isAuthenticated, hashPassword, verifyPassword, getPrincipal, ownsRepository, getRepositoryOwner } from "./auth";
+import { authCache } from "./authCache";
+import { botUpdateQueue } from "./botUpdateQueue";
+import { requestMetrics } from "./requestMetrics";
 import { pythonProcessManager } from "./pythonProcessManager";
+import { logStore, LogSearchTimeoutError } from "./logStore";
+import { dependencyEnvironments } from "./depEnvironments";
+import { wheelhouse } from "./wheelhouse";
+import { jobQueue, type Job } from "./jobQueue";
+import { interpreterRegistry } from "./interpreters";
+import { bytecodeCache } from "./bytecodeCache";
+import { processMetrics, RESOLUTIONS, type Resolution, type TopSort } from "./processMetrics";
+import { resourceLimits } from "./resourceLimits";
+import { scheduler } from "./scheduler";
+import { webSocketHub } from "./wsHub";
+import { notificationCenter } from "./notificationCenter";
+import type { LogEntry } from "./logBuffer";
 import session from "express-session";
 import connectPg from "connect-pg-simple";
 import AdmZip from "adm-zip";
 import {
   insertRepositorySchema,
   insertFileSchema,
+  normalizeAmount,
 } from "@shared/schema";
 import {
   registerSchema,
@@ -23,6 +40,7 @@ import bcrypt from "bcrypt";
 import multer from "multer";
 import path from "path";
 import fs from "fs";
+import os from "os";
 
 const uploadDir = path.join(process.cwd(), "attached_assets", "uploads");
 if (!fs.existsSync(uploadDir)) {
@@ -31,16 +49,73 @@ if (!fs.existsSync(uploadDir)) {
 
 const upload = multer({ dest: uploadDir });
 
+const MAX_LOG_TAIL_LINES = 5000;
+const MAX_LOG_SEARCH_RESULTS = 5000;
+const MAX_LOG_SEARCH_PATTERN_LENGTH = 200;
+
+// Job as sent to clients; output is streamed separately and only included on request
+function publicJob(job: Job): Omit<Job, "output"> {
+  const { output, ...rest } = job;
+  return rest;
+}
+
+// ?cursor=, ?limit= and ?fields=a,b shared by every list endpoint
+function parsePageOptions(query: any): PageOptions {
+  return {
+    cursor: typeof query.cursor === "string" && query.cursor ? query.cursor : undefined,
+    limit: parseInt(query.limit, 10) || undefined,
+    fields: typeof query.fields === "string" && query.fields ? query.fields.split(",") : undefined,
+  };
+}
+
+function parseLogTime(value: unknown): number | undefined {
+  if (typeof value !== "string" || !value) return undefined;
+  const time = /^\d+$/.test(value) ? Number(value) : Date.parse(value);
+  return Number.isNaN(time) ? undefined : time;
+}
+
+// Write entries as NDJSON, respecting backpressure. The query is aborted as soon
+// as the client goes away, including while waiting for a drain that will never come.
+async function streamLogEntries(res: Response, query: (signal: AbortSignal) => AsyncIterable<LogEntry>, limit: number) {
+  res.setHeader("Content-Type", "application/x-ndjson; charset=utf-8");
+  const controller = new AbortController();
+  const abort = () => controller.abort();
+  res.on("close", abort);
+
+  try {
+    let count = 0;
+    for await (const entry of query(controller.signal)) {
+      if (controller.signal.aborted || count >= limit) break;
+      const line = JSON.stringify({ timestamp: new Date(entry.timestamp).toISOString(), message: entry.line }) + "\n";
+      if (!res.write(line)) {
+        try {
+          await once(res, "drain", { signal: controller.signal });
+        } catch {
+          break;
+        }
+      }
+      count++;
+    }
+  } finally {
+    res.off("close", abort);
+  }
+  if (!controller.signal.aborted) {
+    res.end();
+  }
+}
+
 
 function getSession() {
   const sessionTtl = 7 * 24 * 60 * 60 * 1000;
   const pgStore = connectPg(session);
-  const sessionStore = new pgStore({
-    conString: process.env.DATABASE_URL,
-    createTableIfMissing: false,
-    ttl: sessionTtl,
-    tableName: "sessions",
-  });
+  const sessionStore = authCache.wrapSessionStore(
+    new pgStore({
+      conString: process.env.DATABASE_URL,
+      createTableIfMissing: false,
+      ttl: sessionTtl,
+      tableName: "sessions",
+    })
+  );
   return session({
     secret: process.env.SESSION_SECRET || "your-secret-key-change-in-production",
     store: sessionStore,
@@ -56,12 +131,37 @@ function getSession() {
 
 export async function registerRoutes(app: Express): Promise<Server> {
   app.set("trust proxy", 1);
-  app.use(getSession());
+  const sessionMiddleware = getSession();
+  app.use(sessionMiddleware);
 
   app.get("/health", (_req, res) => {
     res.status(200).json({ status: "ok", timestamp: new Date().toISOString() });
   });
 
+  // Prometheus scrape endpoint. Scrapers send METRICS_TOKEN as a bearer token;
+  // without a token configured, only signed-in admins can read it.
+  app.get("/metrics", async (req: any, res) => {
+    try {
+      const token = process.env.METRICS_TOKEN;
+      if (token) {
+        const expected = Buffer.from(`Bearer ${token}`);
+        const given = Buffer.from(req.get("Authorization") ?? "");
+        if (given.length !== expected.length || !timingSafeEqual(given, expected)) {
+          return res.status(401).json({ message: "Unauthorized" });
+        }
+      } else {
+        const user = req.session?.userId ? await getPrincipal(req.session.userId) : undefined;
+        if (!user?.isAdmin) {
+          return res.status(403).json({ message: "Unauthorized" });
+        }
+      }
+      res.type("text/plain; version=0.0.4").send(requestMetrics.renderPrometheus());
+    } catch (error) {
+      console.error("Error rendering metrics:", error);
+      res.status(500).json({ message: "Failed to render metrics" });
+    }
+  });
+
   app.post("/api/auth/register", async (req, res) => {
     try {
       const data = registerSchema.parse(req.body);
@@ -125,14 +225,18 @@ export async function registerRoutes(app: Express): Promise<Server> {
   });
 
   app.post("/api/auth/logout", (req, res) => {
+    const userId = req.session.userId;
     req.session.destroy(() => {
+      if (userId) {
+        authCache.invalidateUser(userId);
+      }
       res.json({ message: "Logged out successfully" });
     });
   });
 
   app.get("/api/auth/user", isAuthenticated, async (req: any, res) => {
     try {
-      const user = await storage.getUser(req.session.userId);
+      const user = await getPrincipal(req.session.userId);
       if (!user) {
         return res.status(404).json({ message: "User not found" });
       }
@@ -145,10 +249,11 @@ export async function registerRoutes(app: Express): Promise<Server> {
 
   app.get("/api/repositories", isAuthenticated, async (req: any, res) => {
     try {
-      const userId = req.session.userId;
-      const repos = await storage.getRepositories(userId);
-      res.json(repos);
+      res.json(await storage.getRepositories(req.session.userId, parsePageOptions(req.query)));
     } catch (error) {
+      if (error instanceof InvalidCursorError) {
+        return res.status(400).json({ message: error.message });
+      }
       console.error("Error fetching repositories:", error);
       res.status(500).json({ message: "Failed to fetch repositories" });
     }
@@ -163,18 +268,7 @@ export async function registerRoutes(app: Express): Promise<Server> {
         return res.status(404).json({ message: "Repository not found" });
       }
 
-      // تزامن الحالة مع الحالة الفعلية للعملية
-      const isActuallyRunning = pythonProcessManager.isRunning(req.params.id);
-      if (repo.status === "running" && !isActuallyRunning) {
-        // إذا كانت قاعدة البيانات تقول running لكن العملية غير موجودة
-        await storage.updateRepositoryById(req.params.id, { status: "stopped" });
-        repo.status = "stopped";
-      } else if (repo.status === "stopped" && isActuallyRunning) {
-        // إذا كانت قاعدة البيانات تقول stopped لكن العملية موجودة
-        await storage.updateRepositoryById(req.params.id, { status: "running" });
-        repo.status = "running";
-      }
-
+      // Status is kept current by the process manager's transitions
       res.json(repo);
     } catch (error) {
       console.error("Error fetching repository:", error);
@@ -182,10 +276,27 @@ export async function registerRoutes(app: Express): Promise<Server> {
     }
   });
 
+  app.get("/api/python-versions", isAuthenticated, async (_req, res) => {
+    try {
+      await interpreterRegistry.discover();
+      res.json({
+        default: interpreterRegistry.getDefaultVersion(),
+        versions: interpreterRegistry.list().map(({ version, fullVersion }) => ({ version, fullVersion })),
+      });
+    } catch (error) {
+      console.error("Error fetching Python versions:", error);
+      res.status(500).json({ message: "Failed to fetch Python versions" });
+    }
+  });
+
   app.post("/api/repositories", isAuthenticated, async (req: any, res) => {
     try {
       const userId = req.session.userId;
       const data = insertRepositorySchema.parse(req.body);
+      await interpreterRegistry.discover();
+      if (data.pythonVersion && !interpreterRegistry.isSupported(data.pythonVersion)) {
+        return res.status(400).json({ message: `Python ${data.pythonVersion} is not available on this server` });
+      }
       const repo = await storage.createRepository(userId, data);
       res.json(repo);
     } catch (error: any) {
@@ -197,7 +308,20 @@ export async function registerRoutes(app: Express): Promise<Server> {
   app.patch("/api/repositories/:id", isAuthenticated, async (req: any, res) => {
     try {
       const userId = req.session.userId;
-      const repo = await storage.updateRepository(req.params.id, userId, req.body);
+      const data = insertRepositorySchema.partial().parse(req.body);
+      // Only a newly chosen version has to exist here; saving other settings
+      // keeps working on a host that lacks the repository's current one
+      if (data.pythonVersion) {
+        await interpreterRegistry.discover();
+        if (!interpreterRegistry.isSupported(data.pythonVersion)) {
+          const current = await storage.getRepository(req.params.id, userId);
+          if (current?.pythonVersion !== data.pythonVersion) {
+            return res.status(400).json({ message: `Python ${data.pythonVersion} is not available on this server` });
+          }
+        }
+      }
+
+      const repo = await storage.updateRepository(req.params.id, userId, data);
 
       if (!repo) {
         return res.status(404).json({ message: "Repository not found" });
@@ -214,16 +338,28 @@ export async function registerRoutes(app: Express): Promise<Server> {
     try {
       const userId = req.session.userId;
 
-      if (pythonProcessManager.isRunning(req.params.id)) {
-        pythonProcessManager.stopRepository(req.params.id);
+      const repo = await storage.getRepository(req.params.id, userId);
+      if (!repo) {
+        return res.status(404).json({ message: "Repository not found" });
       }
 
+      await scheduler.stopRepository(req.params.id);
+      await scheduler.forget(req.params.id);
+
       const deleted = await storage.deleteRepository(req.params.id, userId);
 
       if (!deleted) {
         return res.status(404).json({ message: "Repository not found" });
       }
 
+      scheduler.clearLogBacklog(req.params.id);
+      logStore.remove(req.params.id).catch((error) => {
+        console.error("Error removing stored logs:", error);
+      });
+      dependencyEnvironments.removeOverlay(req.params.id).catch((error) => {
+        console.error("Error removing package overlay:", error);
+      });
+
       res.json({ message: "Repository deleted successfully" });
     } catch (error: any) {
       console.error("Error deleting repository:", error);
@@ -240,8 +376,8 @@ export async function registerRoutes(app: Express): Promise<Server> {
         return res.status(404).json({ message: "Repository not found" });
       }
 
-      await pythonProcessManager.startRepository(req.params.id);
-      res.json({ message: "Repository started successfully" });
+      await scheduler.startRepository(req.params.id);
+      res.json({ message: "Repository started successfully", node: scheduler.nodeFor(req.params.id) });
     } catch (error: any) {
       console.error("Error starting repository:", error);
       res.status(400).json({ message: error.message || "Failed to start repository" });
@@ -257,41 +393,199 @@ export async function registerRoutes(app: Express): Promise<Server> {
         return res.status(404).json({ message: "Repository not found" });
       }
 
-      // إذا كانت العملية تعمل فعلياً، أوقفها
-      if (pythonProcessManager.isRunning(req.params.id)) {
-        pythonProcessManager.stopRepository(req.params.id);
-      } else {
-        // إذا لم تكن العملية تعمل، فقط حدّث الحالة في قاعدة البيانات
-        await storage.updateRepositoryById(req.params.id, { status: "stopped" });
-      }
+      // يوقف العملية إن كانت تعمل ويلغي أي إعادة تشغيل مجدولة
+      await scheduler.stopRepository(req.params.id);
 
       // Sync runtime files to database after stopping
-      await pythonProcessManager.syncRuntimeFilesToDatabase(req.params.id);
+      const syncReport = await scheduler.syncRuntimeFiles(req.params.id);
 
-      res.json({ message: "Repository stopped successfully" });
+      res.json({ message: "Repository stopped successfully", syncReport });
     } catch (error: any) {
       console.error("Error stopping repository:", error);
       res.status(400).json({ message: error.message || "Failed to stop repository" });
     }
   });
 
-  app.post("/api/repositories/:id/sync-files", isAuthenticated, async (req: any, res) => {
+  app.get("/api/repositories/:id/supervisor", isAuthenticated, async (req: any, res) => {
     try {
-      const userId = req.session.userId;
-      const repo = await storage.getRepository(req.params.id, userId);
+      const repo = await storage.getRepository(req.params.id, req.session.userId);
+      if (!repo) {
+        return res.status(404).json({ message: "Repository not found" });
+      }
+
+      res.json({
+        restartPolicy: repo.restartPolicy,
+        node: scheduler.nodeFor(req.params.id),
+        ...(await scheduler.getSupervisorStatus(req.params.id)),
+      });
+    } catch (error) {
+      console.error("Error fetching supervisor status:", error);
+      res.status(500).json({ message: "Failed to fetch supervisor status" });
+    }
+  });
 
+  app.get("/api/repositories/:id/jobs", isAuthenticated, async (req: any, res) => {
+    try {
+      if (!(await ownsRepository(req.session.userId, req.params.id))) {
+        return res.status(404).json({ message: "Repository not found" });
+      }
+
+      res.json(jobQueue.getJobsForRepository(req.params.id).map(publicJob));
+    } catch (error) {
+      console.error("Error fetching jobs:", error);
+      res.status(500).json({ message: "Failed to fetch jobs" });
+    }
+  });
+
+  app.get("/api/repositories/:id/metrics", isAuthenticated, async (req: any, res) => {
+    try {
+      if (!(await ownsRepository(req.session.userId, req.params.id))) {
+        return res.status(404).json({ message: "Repository not found" });
+      }
+
+      const resolution = (req.query.resolution || "1s") as Resolution;
+      if (!RESOLUTIONS.includes(resolution)) {
+        return res.status(400).json({ message: `resolution must be one of ${RESOLUTIONS.join(", ")}` });
+      }
+
+      res.json({
+        current: await scheduler.getCurrentMetrics(req.params.id),
+        resolution,
+        points: await scheduler.getMetricsHistory(req.params.id, resolution),
+      });
+    } catch (error) {
+      console.error("Error fetching metrics:", error);
+      res.status(500).json({ message: "Failed to fetch metrics" });
+    }
+  });
+
+  app.get("/api/repositories/:id/limits", isAuthenticated, async (req: any, res) => {
+    try {
+      const repo = await storage.getRepository(req.params.id, req.session.userId);
       if (!repo) {
         return res.status(404).json({ message: "Repository not found" });
       }
 
-      await pythonProcessManager.syncRuntimeFilesToDatabase(req.params.id);
-      res.json({ message: "Files synced successfully" });
+      const profile = resourceLimits.profileFor(await getPrincipal(repo.userId));
+      res.json({
+        enabled: resourceLimits.enabled,
+        cgroups: resourceLimits.enabled && resourceLimits.cgroupsAvailable(),
+        ...profile,
+      });
+    } catch (error) {
+      console.error("Error fetching resource limits:", error);
+      res.status(500).json({ message: "Failed to fetch resource limits" });
+    }
+  });
+
+  app.get("/api/jobs/:jobId", isAuthenticated, async (req: any, res) => {
+    const job = jobQueue.getJob(req.params.jobId);
+    if (!job || job.userId !== req.session.userId) {
+      return res.status(404).json({ message: "Job not found" });
+    }
+    res.json({ ...publicJob(job), output: job.output });
+  });
+
+  app.post("/api/jobs/:jobId/cancel", isAuthenticated, async (req: any, res) => {
+    const job = jobQueue.getJob(req.params.jobId);
+    if (!job || job.userId !== req.session.userId) {
+      return res.status(404).json({ message: "Job not found" });
+    }
+    if (!jobQueue.cancel(job.id)) {
+      return res.status(400).json({ message: `Job is already ${job.status}` });
+    }
+    res.json({ message: "Job cancellation requested", job: publicJob(job) });
+  });
+
+  app.post("/api/repositories/:id/sync-files", isAuthenticated, async (req: any, res) => {
+    try {
+      if (!(await ownsRepository(req.session.userId, req.params.id))) {
+        return res.status(404).json({ message: "Repository not found" });
+      }
+
+      const syncReport = await scheduler.syncRuntimeFiles(req.params.id);
+      res.json({ message: "Files synced successfully", syncReport });
     } catch (error: any) {
       console.error("Error syncing files:", error);
       res.status(400).json({ message: error.message || "Failed to sync files" });
     }
   });
 
+  app.get("/api/repositories/:id/logs/tail", isAuthenticated, async (req: any, res) => {
+    try {
+      if (!(await ownsRepository(req.session.userId, req.params.id))) {
+        return res.status(404).json({ message: "Repository not found" });
+      }
+
+      const lines = Math.min(Math.max(parseInt(req.query.lines as string, 10) || 200, 1), MAX_LOG_TAIL_LINES);
+      const entries = await logStore.tail(req.params.id, lines);
+      res.json({
+        entries: entries.map((entry) => ({ timestamp: new Date(entry.timestamp).toISOString(), message: entry.line })),
+      });
+    } catch (error: any) {
+      console.error("Error reading logs:", error);
+      res.status(500).json({ message: "Failed to read logs" });
+    }
+  });
+
+  app.get("/api/repositories/:id/logs/range", isAuthenticated, async (req: any, res) => {
+    try {
+      if (!(await ownsRepository(req.session.userId, req.params.id))) {
+        return res.status(404).json({ message: "Repository not found" });
+      }
+
+      const from = parseLogTime(req.query.from);
+      const to = parseLogTime(req.query.to);
+      const limit = Math.min(parseInt(req.query.limit as string, 10) || MAX_LOG_SEARCH_RESULTS, MAX_LOG_SEARCH_RESULTS);
+      await streamLogEntries(res, (signal) => logStore.range(req.params.id, { from, to, signal }), limit);
+    } catch (error: any) {
+      console.error("Error reading log range:", error);
+      if (!res.headersSent) {
+        res.status(500).json({ message: "Failed to read logs" });
+      } else {
+        res.end();
+      }
+    }
+  });
+
+  app.get("/api/repositories/:id/logs/search", isAuthenticated, async (req: any, res) => {
+    try {
+      if (!(await ownsRepository(req.session.userId, req.params.id))) {
+        return res.status(404).json({ message: "Repository not found" });
+      }
+
+      const query = req.query.q;
+      if (typeof query !== "string" || !query || query.length > MAX_LOG_SEARCH_PATTERN_LENGTH) {
+        return res.status(400).json({ message: `Search pattern is required (max ${MAX_LOG_SEARCH_PATTERN_LENGTH} characters)` });
+      }
+
+      let pattern: RegExp;
+      try {
+        pattern = new RegExp(query, req.query.ignoreCase === "true" ? "i" : "");
+      } catch (error: any) {
+        return res.status(400).json({ message: `Invalid pattern: ${error.message}` });
+      }
+
+      const from = parseLogTime(req.query.from);
+      const to = parseLogTime(req.query.to);
+      const limit = Math.min(parseInt(req.query.limit as string, 10) || 500, MAX_LOG_SEARCH_RESULTS);
+      await streamLogEntries(res, (signal) => logStore.search(req.params.id, pattern, { from, to, signal }), limit);
+    } catch (error: any) {
+      if (error instanceof LogSearchTimeoutError) {
+        if (!res.headersSent) {
+          return res.status(400).json({ message: error.message });
+        }
+        return res.end();
+      }
+      console.error("Error searching logs:", error);
+      if (!res.headersSent) {
+        res.status(500).json({ message: "Failed to search logs" });
+      } else {
+        res.end();
+      }
+    }
+  });
+
   app.post("/api/repositories/:id/execute-command", isAuthenticated, async (req: any, res) => {
     try {
       const userId = req.session.userId;
@@ -301,7 +595,7 @@ export async function registerRoutes(app: Express): Promise<Server> {
         return res.status(404).json({ message: "Repository not found" });
       }
 
-      if (pythonProcessManager.isRunning(req.params.id)) {
+      if (scheduler.isRunning(req.params.id)) {
         return res.status(400).json({ message: "Cannot execute commands while repository is running. Please stop it first." });
       }
 
@@ -310,8 +604,13 @@ export async function registerRoutes(app: Express): Promise<Server> {
         return res.status(400).json({ message: "Command is required" });
       }
 
-      const output = await pythonProcessManager.executeCommand(req.params.id, command);
-      res.json({ success: true, output });
+      const { job } = jobQueue.enqueue(
+        { kind: "command", userId, repositoryId: req.params.id, description: command },
+        async (context) => {
+          await scheduler.executeCommand(req.params.id, command, context);
+        }
+      );
+      res.status(202).json({ job: publicJob(job) });
     } catch (error: any) {
       console.error("Error executing command:", error);
       res.status(400).json({ message: error.message || "Failed to execute command" });
@@ -327,7 +626,7 @@ export async function registerRoutes(app: Express): Promise<Server> {
         return res.status(404).json({ message: "Repository not found" });
       }
 
-      if (pythonProcessManager.isRunning(req.params.id)) {
+      if (scheduler.isRunning(req.params.id)) {
         return res.status(400).json({ message: "Cannot install packages while repository is running. Please stop it first." });
       }
 
@@ -336,8 +635,13 @@ export async function registerRoutes(app: Express): Promise<Server> {
         return res.status(400).json({ message: "Package name is required" });
       }
 
-      const output = await pythonProcessManager.installPackage(req.params.id, packageName);
-      res.json({ message: "Package installed successfully", output });
+      const { job } = jobQueue.enqueue(
+        { kind: "install", userId, repositoryId: req.params.id, description: `pip install ${packageName}` },
+        async (context) => {
+          await scheduler.installPackage(req.params.id, packageName, context);
+        }
+      );
+      res.status(202).json({ message: "Package installation queued", job: publicJob(job) });
     } catch (error: any) {
       console.error("Error installing package:", error);
       res.status(400).json({ message: error.message || "Failed to install package" });
@@ -353,7 +657,7 @@ export async function registerRoutes(app: Express): Promise<Server> {
         return res.status(404).json({ message: "Repository not found" });
       }
 
-      if (pythonProcessManager.isRunning(req.params.id)) {
+      if (scheduler.isRunning(req.params.id)) {
         return res.status(400).json({ message: "Cannot uninstall packages while repository is running. Please stop it first." });
       }
 
@@ -362,8 +666,13 @@ export async function registerRoutes(app: Express): Promise<Server> {
         return res.status(400).json({ message: "Package name is required" });
       }
 
-      const output = await pythonProcessManager.uninstallPackage(req.params.id, packageName);
-      res.json({ message: "Package uninstalled successfully", output });
+      const { job } = jobQueue.enqueue(
+        { kind: "uninstall", userId, repositoryId: req.params.id, description: `pip uninstall ${packageName}` },
+        async (context) => {
+          await scheduler.uninstallPackage(req.params.id, packageName, context);
+        }
+      );
+      res.status(202).json({ message: "Package removal queued", job: publicJob(job) });
     } catch (error: any) {
       console.error("Error uninstalling package:", error);
       res.status(400).json({ message: error.message || "Failed to uninstall package" });
@@ -372,10 +681,7 @@ export async function registerRoutes(app: Express): Promise<Server> {
 
   app.get("/api/repositories/:id/files", isAuthenticated, async (req: any, res) => {
     try {
-      const userId = req.session.userId;
-      const repo = await storage.getRepository(req.params.id, userId);
-
-      if (!repo) {
+      if (!(await ownsRepository(req.session.userId, req.params.id))) {
         return res.status(404).json({ message: "Repository not found" });
       }
 
@@ -415,10 +721,7 @@ export async function registerRoutes(app: Express): Promise<Server> {
 
   app.post("/api/repositories/:id/folders", isAuthenticated, async (req: any, res) => {
     try {
-      const userId = req.session.userId;
-      const repo = await storage.getRepository(req.params.id, userId);
-
-      if (!repo) {
+      if (!(await ownsRepository(req.session.userId, req.params.id))) {
         return res.status(404).json({ message: "Repository not found" });
       }
 
@@ -543,10 +846,7 @@ export async function registerRoutes(app: Express): Promise<Server> {
 
   app.patch("/api/repositories/:repositoryId/files/:fileId", isAuthenticated, async (req: any, res) => {
     try {
-      const userId = req.session.userId;
-      const repo = await storage.getRepository(req.params.repositoryId, userId);
-
-      if (!repo) {
+      if (!(await ownsRepository(req.session.userId, req.params.repositoryId))) {
         return res.status(404).json({ message: "Repository not found" });
       }
 
@@ -571,10 +871,7 @@ export async function registerRoutes(app: Express): Promise<Server> {
 
   app.delete("/api/repositories/:repositoryId/files/:fileId", isAuthenticated, async (req: any, res) => {
     try {
-      const userId = req.session.userId;
-      const repo = await storage.getRepository(req.params.repositoryId, userId);
-
-      if (!repo) {
+      if (!(await ownsRepository(req.session.userId, req.params.repositoryId))) {
         return res.status(404).json({ message: "Repository not found" });
       }
 
@@ -593,10 +890,7 @@ export async function registerRoutes(app: Express): Promise<Server> {
 
   app.get("/api/repositories/:id/env", isAuthenticated, async (req: any, res) => {
     try {
-      const userId = req.session.userId;
-      const repo = await storage.getRepository(req.params.id, userId);
-
-      if (!repo) {
+      if (!(await ownsRepository(req.session.userId, req.params.id))) {
         return res.status(404).json({ message: "Repository not found" });
       }
 
@@ -610,10 +904,7 @@ export async function registerRoutes(app: Express): Promise<Server> {
 
   app.post("/api/repositories/:id/env", isAuthenticated, async (req: any, res) => {
     try {
-      const userId = req.session.userId;
-      const repo = await storage.getRepository(req.params.id, userId);
-
-      if (!repo) {
+      if (!(await ownsRepository(req.session.userId, req.params.id))) {
         return res.status(404).json({ message: "Repository not found" });
       }
 
@@ -633,14 +924,16 @@ export async function registerRoutes(app: Express): Promise<Server> {
 
   app.get("/api/admin/users", isAuthenticated, async (req: any, res) => {
     try {
-      const user = await storage.getUser(req.session.userId);
+      const user = await getPrincipal(req.session.userId);
       if (!user?.isAdmin) {
         return res.status(403).json({ message: "Unauthorized" });
       }
 
-      const allUsers = await storage.getAllUsers();
-      res.json(allUsers);
+      res.json(await storage.getAllUsers(parsePageOptions(req.query)));
     } catch (error) {
+      if (error instanceof InvalidCursorError) {
+        return res.status(400).json({ message: error.message });
+      }
       console.error("Error fetching users:", error);
       res.status(500).json({ message: "Failed to fetch users" });
     }
@@ -648,14 +941,16 @@ export async function registerRoutes(app: Express): Promise<Server> {
 
   app.get("/api/admin/users/:userId/repositories", isAuthenticated, async (req: any, res) => {
     try {
-      const user = await storage.getUser(req.session.userId);
+      const user = await getPrincipal(req.session.userId);
       if (!user?.isAdmin) {
         return res.status(403).json({ message: "Unauthorized" });
       }
 
-      const repos = await storage.getRepositories(req.params.userId);
-      res.json(repos);
+      res.json(await storage.getRepositories(req.params.userId, parsePageOptions(req.query)));
     } catch (error) {
+      if (error instanceof InvalidCursorError) {
+        return res.status(400).json({ message: error.message });
+      }
       console.error("Error fetching user repositories:", error);
       res.status(500).json({ message: "Failed to fetch repositories" });
     }
@@ -663,7 +958,7 @@ export async function registerRoutes(app: Express): Promise<Server> {
 
   app.post("/api/admin/change-user-password", isAuthenticated, async (req: any, res) => {
     try {
-      const user = await storage.getUser(req.session.userId);
+      const user = await getPrincipal(req.session.userId);
       if (!user?.isAdmin) {
         return res.status(403).json({ message: "Unauthorized" });
       }
@@ -687,6 +982,230 @@ export async function registerRoutes(app: Express): Promise<Server> {
     }
   });
 
+  app.get("/api/admin/jobs", isAuthenticated, async (req: any, res) => {
+    try {
+      const user = await getPrincipal(req.session.userId);
+      if (!user?.isAdmin) {
+        return res.status(403).json({ message: "Unauthorized" });
+      }
+
+      res.json(jobQueue.getMetrics());
+    } catch (error) {
+      console.error("Error fetching job metrics:", error);
+      res.status(500).json({ message: "Failed to fetch job metrics" });
+    }
+  });
+
+  app.get("/api/admin/wheelhouse", isAuthenticated, async (req: any, res) => {
+    try {
+      const user = await getPrincipal(req.session.userId);
+      if (!user?.isAdmin) {
+        return res.status(403).json({ message: "Unauthorized" });
+      }
+
+      res.json(await wheelhouse.getStats());
+    } catch (error) {
+      console.error("Error fetching wheelhouse stats:", error);
+      res.status(500).json({ message: "Failed to fetch wheelhouse stats" });
+    }
+  });
+
+  app.get("/api/admin/metrics/top", isAuthenticated, async (req: any, res) => {
+    try {
+      const user = await getPrincipal(req.session.userId);
+      if (!user?.isAdmin) {
+        return res.status(403).json({ message: "Unauthorized" });
+      }
+
+      const sort = (["cpu", "memory", "io", "fds"].includes(req.query.sort) ? req.query.sort : "cpu") as TopSort;
+      const limit = Math.min(Math.max(parseInt(req.query.limit, 10) || 10, 1), 100);
+      const top = await scheduler.getTopMetrics(limit, sort);
+      const repositories = await Promise.all(
+        top.map(async (entry) => {
+          const repo = await storage.getRepositoryById(entry.repositoryId);
+          return { ...entry, name: repo?.name ?? null, userId: repo?.userId ?? null };
+        })
+      );
+
+      res.json({
+        host: {
+          cpus: os.cpus().length,
+          loadAverage: os.loadavg(),
+          totalMemoryBytes: os.totalmem(),
+          freeMemoryBytes: os.freemem(),
+        },
+        sort,
+        repositories,
+      });
+    } catch (error) {
+      console.error("Error fetching top metrics:", error);
+      res.status(500).json({ message: "Failed to fetch metrics" });
+    }
+  });
+
+  app.get("/api/admin/nodes", isAuthenticated, async (req: any, res) => {
+    try {
+      const user = await getPrincipal(req.session.userId);
+      if (!user?.isAdmin) {
+        return res.status(403).json({ message: "Unauthorized" });
+      }
+
+      res.json({ enabled: scheduler.enabled, nodes: scheduler.listNodes() });
+    } catch (error) {
+      console.error("Error fetching nodes:", error);
+      res.status(500).json({ message: "Failed to fetch nodes" });
+    }
+  });
+
+  app.post("/api/admin/nodes/:id/drain", isAuthenticated, async (req: any, res) => {
+    try {
+      const user = await getPrincipal(req.session.userId);
+      if (!user?.isAdmin) {
+        return res.status(403).json({ message: "Unauthorized" });
+      }
+      if (!scheduler.enabled) {
+        return res.status(400).json({ message: "Multi-node scheduling is not enabled" });
+      }
+
+      const migrating = scheduler.drain(req.params.id);
+      res.status(202).json({ message: "Node is draining", migrating });
+    } catch (error: any) {
+      console.error("Error draining node:", error);
+      res.status(error.message === "Node not found" ? 404 : 500).json({ message: error.message || "Failed to drain node" });
+    }
+  });
+
+  app.post("/api/admin/nodes/:id/undrain", isAuthenticated, async (req: any, res) => {
+    try {
+      const user = await getPrincipal(req.session.userId);
+      if (!user?.isAdmin) {
+        return res.status(403).json({ message: "Unauthorized" });
+      }
+
+      scheduler.undrain(req.params.id);
+      res.json({ message: "Node accepts repositories again" });
+    } catch (error: any) {
+      console.error("Error undraining node:", error);
+      res.status(error.message === "Node not found" ? 404 : 500).json({ message: error.message || "Failed to undrain node" });
+    }
+  });
+
+  app.get("/api/admin/auth-cache", isAuthenticated, async (req: any, res) => {
+    try {
+      const user = await getPrincipal(req.session.userId);
+      if (!user?.isAdmin) {
+        return res.status(403).json({ message: "Unauthorized" });
+      }
+
+      res.json(authCache.getStats());
+    } catch (error) {
+      console.error("Error fetching auth cache stats:", error);
+      res.status(500).json({ message: "Failed to fetch auth cache stats" });
+    }
+  });
+
+  app.get("/api/admin/bot-updates", isAuthenticated, async (req: any, res) => {
+    try {
+      const user = await getPrincipal(req.session.userId);
+      if (!user?.isAdmin) {
+        return res.status(403).json({ message: "Unauthorized" });
+      }
+
+      res.json(botUpdateQueue.getStats());
+    } catch (error) {
+      console.error("Error fetching bot update queue stats:", error);
+      res.status(500).json({ message: "Failed to fetch bot update queue stats" });
+    }
+  });
+
+  app.get("/api/admin/request-metrics", isAuthenticated, async (req: any, res) => {
+    try {
+      const user = await getPrincipal(req.session.userId);
+      if (!user?.isAdmin) {
+        return res.status(403).json({ message: "Unauthorized" });
+      }
+
+      res.json(requestMetrics.getSummary());
+    } catch (error) {
+      console.error("Error fetching request metrics:", error);
+      res.status(500).json({ message: "Failed to fetch request metrics" });
+    }
+  });
+
+  app.get("/api/admin/bytecode-cache", isAuthenticated, async (req: any, res) => {
+    try {
+      const user = await getPrincipal(req.session.userId);
+      if (!user?.isAdmin) {
+        return res.status(403).json({ message: "Unauthorized" });
+      }
+
+      res.json(await bytecodeCache.getStats());
+    } catch (error) {
+      console.error("Error fetching bytecode cache stats:", error);
+      res.status(500).json({ message: "Failed to fetch bytecode cache stats" });
+    }
+  });
+
+  app.post("/api/admin/wheelhouse/seed", isAuthenticated, async (req: any, res) => {
+    try {
+      const user = await getPrincipal(req.session.userId);
+      if (!user?.isAdmin) {
+        return res.status(403).json({ message: "Unauthorized" });
+      }
+
+      const { packages } = req.body;
+      if (!Array.isArray(packages) || packages.length === 0 || !packages.every((pkg) => typeof pkg === "string" && pkg && !pkg.startsWith("-"))) {
+        return res.status(400).json({ message: "A list of package specifiers is required" });
+      }
+
+      // Wheels are built per interpreter; without a version the server default is seeded
+      await interpreterRegistry.discover();
+      const { pythonVersion } = req.body;
+      const version = typeof pythonVersion === "string" && pythonVersion ? pythonVersion : interpreterRegistry.getDefaultVersion();
+      if (!version || !interpreterRegistry.isSupported(version)) {
+        const available = interpreterRegistry.list().map((interpreter) => interpreter.version).join(", ") || "none";
+        return res.status(400).json({ message: `Python ${version ?? "interpreter"} is not available (available: ${available})` });
+      }
+
+      // Building wheels can take minutes; progress and the result are read from the job
+      const python = interpreterRegistry.resolve(version).executable;
+      const { job } = jobQueue.enqueue(
+        { kind: "seed", userId: req.session.userId, repositoryId: null, description: `pip wheel ${packages.join(" ")}` },
+        async ({ signal, onOutput }) => {
+          const result = await wheelhouse.seed(python, packages, { signal, onOutput });
+          if (result.code !== 0 && !signal.aborted) {
+            throw new Error(`pip wheel failed with code ${result.code}`);
+          }
+        }
+      );
+      res.status(202).json({ message: "Wheelhouse seeding queued", job: publicJob(job) });
+    } catch (error: any) {
+      console.error("Error seeding wheelhouse:", error);
+      res.status(500).json({ message: error.message || "Failed to seed wheelhouse" });
+    }
+  });
+
+  app.post("/api/admin/wheelhouse/prune", isAuthenticated, async (req: any, res) => {
+    try {
+      const user = await getPrincipal(req.session.userId);
+      if (!user?.isAdmin) {
+        return res.status(403).json({ message: "Unauthorized" });
+      }
+
+      const olderThanDays = req.body.olderThanDays !== undefined ? Number(req.body.olderThanDays) : undefined;
+      const maxBytes = req.body.maxBytes !== undefined ? Number(req.body.maxBytes) : undefined;
+      if ((olderThanDays === undefined && maxBytes === undefined) || Number.isNaN(olderThanDays) || Number.isNaN(maxBytes)) {
+        return res.status(400).json({ message: "olderThanDays or maxBytes is required" });
+      }
+
+      const result = await wheelhouse.prune({ olderThanDays, maxBytes });
+      res.json({ ...result, stats: await wheelhouse.getStats() });
+    } catch (error: any) {
+      console.error("Error pruning wheelhouse:", error);
+      res.status(500).json({ message: error.message || "Failed to prune wheelhouse" });
+    }
+  });
+
   app.get("/api/payment-methods", async (_req, res) => {
     try {
       const methods = await storage.getPaymentMethods();
@@ -699,7 +1218,7 @@ export async function registerRoutes(app: Express): Promise<Server> {
 
   app.post("/api/payment-methods", isAuthenticated, async (req: any, res) => {
     try {
-      const user = await storage.getUser(req.session.userId);
+      const user = await getPrincipal(req.session.userId);
       if (!user?.isAdmin) {
         return res.status(403).json({ message: "Unauthorized" });
       }
@@ -714,7 +1233,7 @@ export async function registerRoutes(app: Express): Promise<Server> {
 
   app.patch("/api/payment-methods/:id", isAuthenticated, async (req: any, res) => {
     try {
-      const user = await storage.getUser(req.session.userId);
+      const user = await getPrincipal(req.session.userId);
       if (!user?.isAdmin) {
         return res.status(403).json({ message: "Unauthorized" });
       }
@@ -732,7 +1251,7 @@ export async function registerRoutes(app: Express): Promise<Server> {
 
   app.delete("/api/payment-methods/:id", isAuthenticated, async (req: any, res) => {
     try {
-      const user = await storage.getUser(req.session.userId);
+      const user = await getPrincipal(req.session.userId);
       if (!user?.isAdmin) {
         return res.status(403).json({ message: "Unauthorized" });
       }
@@ -750,26 +1269,24 @@ export async function registerRoutes(app: Express): Promise<Server> {
 
   app.get("/api/balance-requests", isAuthenticated, async (req: any, res) => {
     try {
-      const user = await storage.getUser(req.session.userId);
+      const user = await getPrincipal(req.session.userId);
       if (!user) {
         return res.status(404).json({ message: "User not found" });
       }
 
-      const requests = user.isAdmin
-        ? await storage.getBalanceRequests()
-        : await storage.getUserBalanceRequests(req.session.userId);
+      // Admins see everyone's requests; other users only their own
+      const userId = user.isAdmin ? undefined : req.session.userId;
+      const status = typeof req.query.status === "string" && req.query.status ? req.query.status : undefined;
+      const [page, counts] = await Promise.all([
+        storage.getBalanceRequestsWithUsers({ userId, status, ...parsePageOptions(req.query) }),
+        storage.getBalanceRequestStatusCounts(userId),
+      ]);
 
-      // Replace "Unknown" with actual user data
-      const enrichedRequests = await Promise.all(requests.map(async (req) => {
-        const user = await storage.getUser(req.userId);
-        return {
-          ...req,
-          user: user ? { id: user.id, username: user.username, email: user.email } : { id: null, username: "Unknown", email: "Unknown" },
-        };
-      }));
-
-      res.json(enrichedRequests);
+      res.json({ ...page, counts });
     } catch (error) {
+      if (error instanceof InvalidCursorError) {
+        return res.status(400).json({ message: error.message });
+      }
       console.error("Error fetching balance requests:", error);
       res.status(500).json({ message: "Failed to fetch balance requests" });
     }
@@ -781,11 +1298,16 @@ export async function registerRoutes(app: Express): Promise<Server> {
         return res.status(400).json({ message: "Screenshot is required" });
       }
 
+      const amountSent = normalizeAmount(req.body.amountSent);
+      if (!amountSent) {
+        return res.status(400).json({ message: "Amount sent must be a positive number with at most two decimals, e.g. 1000 or 1,000.50" });
+      }
+
       const screenshotUrl = `/uploads/${req.file.filename}`;
       const balanceRequest = await storage.createBalanceRequest({
         userId: req.session.userId,
         paymentMethodId: req.body.paymentMethodId,
-        amountSent: req.body.amountSent.toString(),
+        amountSent,
         transactionId: req.body.transactionId,
         screenshotUrl,
       });
@@ -799,7 +1321,7 @@ export async function registerRoutes(app: Express): Promise<Server> {
 
   app.patch("/api/balance-requests/:id/status", isAuthenticated, async (req: any, res) => {
     try {
-      const user = await storage.getUser(req.session.userId);
+      const user = await getPrincipal(req.session.userId);
       if (!user?.isAdmin) {
         return res.status(403).json({ message: "Unauthorized" });
       }
@@ -809,51 +1331,109 @@ export async function registerRoutes(app: Express): Promise<Server> {
         return res.status(400).json({ message: "Invalid status" });
       }
 
-      const updatedRequest = await storage.updateBalanceRequestStatus(
-        req.params.id,
-        req.body.status
-      );
+      const existing = await storage.getBalanceRequest(req.params.id);
+      if (!existing) {
+        return res.status(404).json({ message: "Balance request not found" });
+      }
+
+      const updatedRequest = await storage.updateBalanceRequestStatus(req.params.id, status);
+      if (!updatedRequest) {
+        return res.status(409).json({ message: "Balance request has already been reviewed" });
+      }
 
       // Create notification for user
-      if (updatedRequest) {
-        const isApproved = req.body.status === 'approved';
-        await storage.createNotification({
-          userId: updatedRequest.userId,
-          title: isApproved ? '✅ تمت الموافقة على طلب الإيداع' : '❌ تم رفض طلب الإيداع',
-          message: isApproved
-            ? `تمت الموافقة على طلب إيداع بقيمة ${updatedRequest.amountSent} وتم إضافة المبلغ إلى رصيدك.`
-            : `تم رفض طلب الإيداع الخاص بك. يرجى التواصل مع الدعم للمزيد من التفاصيل.`,
-          type: isApproved ? 'balance_approved' : 'balance_rejected',
-          relatedId: updatedRequest.id,
+      const isApproved = status === 'approved';
+      if (isApproved) {
+        // The deposit may lift the owner into a higher resource tier
+        scheduler.refreshLimits(updatedRequest.userId).catch((error) => {
+          console.error("Error updating resource limits after deposit:", error);
         });
       }
+      await storage.createNotification({
+        userId: updatedRequest.userId,
+        title: isApproved ? '✅ تمت الموافقة على طلب الإيداع' : '❌ تم رفض طلب الإيداع',
+        message: isApproved
+          ? `تمت الموافقة على طلب إيداع بقيمة ${updatedRequest.amountSent} وتم إضافة المبلغ إلى رصيدك.`
+          : `تم رفض طلب الإيداع الخاص بك. يرجى التواصل مع الدعم للمزيد من التفاصيل.`,
+        type: isApproved ? 'balance_approved' : 'balance_rejected',
+        relatedId: updatedRequest.id,
+      });
 
       res.json(updatedRequest);
     } catch (error: any) {
+      if (error instanceof InvalidAmountError) {
+        return res.status(409).json({ message: `${error.message}; reject the request instead` });
+      }
       console.error("Error updating balance request status:", error);
       res.status(400).json({ message: error.message || "Failed to update balance request status" });
     }
   });
 
+  app.get("/api/balance/transactions", isAuthenticated, async (req: any, res) => {
+    try {
+      res.json(await storage.getBalanceTransactions(req.session.userId, parsePageOptions(req.query)));
+    } catch (error) {
+      if (error instanceof InvalidCursorError) {
+        return res.status(400).json({ message: error.message });
+      }
+      console.error("Error fetching balance transactions:", error);
+      res.status(500).json({ message: "Failed to fetch balance transactions" });
+    }
+  });
+
+  app.get("/api/admin/balance/summary", isAuthenticated, async (req: any, res) => {
+    try {
+      const user = await getPrincipal(req.session.userId);
+      if (!user?.isAdmin) {
+        return res.status(403).json({ message: "Unauthorized" });
+      }
+
+      res.json(await storage.getBalanceSummary());
+    } catch (error) {
+      console.error("Error fetching balance summary:", error);
+      res.status(500).json({ message: "Failed to fetch balance summary" });
+    }
+  });
+
   // Admin support endpoints
   app.get("/api/admin/support/messages", isAuthenticated, async (req: any, res) => {
     try {
-      const user = await storage.getUser(req.session.userId);
+      const user = await getPrincipal(req.session.userId);
       if (!user?.isAdmin) {
         return res.status(403).json({ message: "Unauthorized" });
       }
 
-      const messages = await storage.getAllSupportMessages();
-      res.json(messages);
+      const userId = typeof req.query.userId === "string" && req.query.userId ? req.query.userId : undefined;
+      res.json(await storage.getSupportMessagesWithUsers({ userId, ...parsePageOptions(req.query) }));
     } catch (error) {
+      if (error instanceof InvalidCursorError) {
+        return res.status(400).json({ message: error.message });
+      }
       console.error("Error fetching all support messages:", error);
       res.status(500).json({ message: "Failed to fetch messages" });
     }
   });
 
+  app.get("/api/admin/support/conversations", isAuthenticated, async (req: any, res) => {
+    try {
+      const user = await getPrincipal(req.session.userId);
+      if (!user?.isAdmin) {
+        return res.status(403).json({ message: "Unauthorized" });
+      }
+
+      res.json(await storage.getSupportConversations(parsePageOptions(req.query)));
+    } catch (error) {
+      if (error instanceof InvalidCursorError) {
+        return res.status(400).json({ message: error.message });
+      }
+      console.error("Error fetching support conversations:", error);
+      res.status(500).json({ message: "Failed to fetch conversations" });
+    }
+  });
+
   app.post("/api/admin/support/messages/:userId/reply", isAuthenticated, async (req: any, res) => {
     try {
-      const user = await storage.getUser(req.session.userId);
+      const user = await getPrincipal(req.session.userId);
       if (!user?.isAdmin) {
         return res.status(403).json({ message: "Unauthorized" });
       }
@@ -885,12 +1465,60 @@ export async function registerRoutes(app: Express): Promise<Server> {
     }
   });
 
+  // Notification routes. New notifications and count changes are also pushed
+  // over /ws, so clients only call these on load and after reconnecting.
+  app.get("/api/notifications", isAuthenticated, async (req: any, res) => {
+    try {
+      res.json(await storage.getNotifications(req.session.userId, parsePageOptions(req.query)));
+    } catch (error) {
+      if (error instanceof InvalidCursorError) {
+        return res.status(400).json({ message: error.message });
+      }
+      console.error("Error fetching notifications:", error);
+      res.status(500).json({ message: "Failed to fetch notifications" });
+    }
+  });
+
+  app.get("/api/notifications/unread-count", isAuthenticated, async (req: any, res) => {
+    try {
+      res.json({ count: await storage.getUnreadNotificationsCount(req.session.userId) });
+    } catch (error) {
+      console.error("Error fetching unread notification count:", error);
+      res.status(500).json({ message: "Failed to fetch unread notification count" });
+    }
+  });
+
+  app.patch("/api/notifications/:id/read", isAuthenticated, async (req: any, res) => {
+    try {
+      const notification = await storage.markNotificationAsRead(req.params.id, req.session.userId);
+      if (!notification) {
+        return res.status(404).json({ message: "Notification not found" });
+      }
+      res.json(notification);
+    } catch (error) {
+      console.error("Error marking notification as read:", error);
+      res.status(500).json({ message: "Failed to mark notification as read" });
+    }
+  });
+
+  app.post("/api/notifications/mark-all-read", isAuthenticated, async (req: any, res) => {
+    try {
+      const updated = await storage.markAllNotificationsAsRead(req.session.userId);
+      res.json({ updated });
+    } catch (error) {
+      console.error("Error marking notifications as read:", error);
+      res.status(500).json({ message: "Failed to mark notifications as read" });
+    }
+  });
+
   // Notes routes
   app.get("/api/notes", isAuthenticated, async (req: any, res) => {
     try {
-      const notes = await storage.getNotes(req.session.userId);
-      res.json(notes);
+      res.json(await storage.getNotes(req.session.userId, parsePageOptions(req.query)));
     } catch (error) {
+      if (error instanceof InvalidCursorError) {
+        return res.status(400).json({ message: error.message });
+      }
       console.error("Error fetching notes:", error);
       res.status(500).json({ message: "Failed to fetch notes" });
     }
@@ -980,46 +1608,78 @@ export async function registerRoutes(app: Express): Promise<Server> {
 
   const httpServer = createServer(app);
 
-  const wss = new WebSocketServer({ server: httpServer, path: "/ws" });
+  webSocketHub.registerTopic("logs", {
+    source: (repositoryId, publish) =>
+      scheduler.subscribeToLogs(repositoryId, (message, seq) => publish({ type: "log", message, seq })),
+    // Lines buffered but not yet flushed are in the backlog and in the next live
+    // message; seq lets the client drop the live copies
+    replay: (repositoryId) => {
+      const backlog = scheduler.getLogBacklog(repositoryId);
+      if (backlog.length === 0) return null;
+      return {
+        type: "log_backlog",
+        seq: scheduler.getLogSeq(repositoryId),
+        entries: backlog.map((entry) => ({
+          timestamp: new Date(entry.timestamp).toISOString(),
+          message: entry.line,
+        })),
+      };
+    },
+  });
 
-  wss.on("connection", (ws: WebSocket) => {
-    let subscribedRepositoryId: string | null = null;
-    let logCallback: ((message: string) => void) | null = null;
+  webSocketHub.registerTopic("file-sync", {
+    source: (repositoryId, publish) => scheduler.subscribeToFileSync(repositoryId, (action) => publish({ type: "file_sync", action })),
+  });
 
-    ws.on("message", (data: string) => {
-      try {
-        const message = JSON.parse(data.toString());
+  webSocketHub.registerTopic("metrics", {
+    source: (repositoryId, publish) => scheduler.subscribeToMetrics(repositoryId, (sample) => publish({ type: "metrics", sample })),
+    replay: (repositoryId) => {
+      // Only the API server's own samples are in memory here; worker history is served over REST
+      const points = processMetrics.getHistory(repositoryId, "1s");
+      return points.length > 0 ? { type: "metrics_history", resolution: "1s", points } : null;
+    },
+  });
 
-        if (message.type === "subscribe" && message.repositoryId) {
-          if (subscribedRepositoryId && logCallback) {
-            pythonProcessManager.unsubscribeFromLogs(subscribedRepositoryId, logCallback);
-          }
+  // Job events are published for every job; the hub drops them when nobody is subscribed
+  jobQueue.onEvent((event) => {
+    if (!event.job.repositoryId) return;
+    if (event.type === "job_output") {
+      webSocketHub.publish("jobs", event.job.repositoryId, { type: "job_output", jobId: event.job.id, data: event.data });
+    } else {
+      webSocketHub.publish("jobs", event.job.repositoryId, { type: "job_status", job: publicJob(event.job) });
+    }
+  });
 
-          subscribedRepositoryId = message.repositoryId as string;
-          logCallback = (logMessage: string) => {
-            if (ws.readyState === WebSocket.OPEN) {
-              ws.send(
-                JSON.stringify({
-                  type: "log",
-                  repositoryId: subscribedRepositoryId,
-                  message: logMessage,
-                })
-              );
-            }
-          };
+  webSocketHub.registerTopic("jobs", {
+    replay: (repositoryId) => {
+      const active = jobQueue
+        .getJobsForRepository(repositoryId)
+        .filter((job) => job.status === "queued" || job.status === "running");
+      return active.length > 0 ? { type: "job_list", jobs: active.map(publicJob) } : null;
+    },
+  });
 
-          pythonProcessManager.subscribeToLogs(subscribedRepositoryId as string, logCallback);
-        }
-      } catch (error) {
-        console.error("Error processing WebSocket message:", error);
-      }
-    });
+  // Repository lists and detail pages follow status transitions live
+  scheduler.onStatusChange((event) => {
+    getRepositoryOwner(event.repositoryId)
+      .then((userId) => {
+        if (userId) webSocketHub.publishToUser(userId, { type: "repository_status", ...event });
+      })
+      .catch((error) => console.error("Error publishing repository status:", error));
+  });
 
-    ws.on("close", () => {
-      if (subscribedRepositoryId && logCallback) {
-        pythonProcessManager.unsubscribeFromLogs(subscribedRepositoryId, logCallback);
-      }
-    });
+  scheduler.listen();
+
+  // Unread counts are kept in memory from here on; without them the count
+  // endpoint keeps querying Postgres
+  try {
+    notificationCenter.load(await storage.getUnreadNotificationCounts());
+  } catch (error) {
+    console.error("Error loading unread notification counts:", error);
+  }
+
+  webSocketHub.attach(httpServer, sessionMiddleware, async (userId, repositoryId) => {
+    return ownsRepository(userId, repositoryId);
   });
 
   return httpServer;
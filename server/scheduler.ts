@@ -0,0 +1,729 @@
+import { timingSafeEqual } from "crypto";
+import { WebSocketServer, WebSocket } from "ws";
+import { storage } from "./storage";
+import { pythonProcessManager, type RepositoryStatusEvent } from "./pythonProcessManager";
+import { processSupervisor } from "./supervisor";
+import { processMetrics, topSortValue, type MetricsPoint, type Resolution, type TopSort } from "./processMetrics";
+import { dependencyEnvironments } from "./depEnvironments";
+import { logStore } from "./logStore";
+import { LogRingBuffer, type LogCallback, type LogEntry } from "./logBuffer";
+import { mapWithConcurrency } from "./concurrency";
+import { nodeOperations, readCapacity, type NodeCapacity, type NodeMethod, type NodeOperations } from "./nodeOperations";
+import type { JobContext } from "./jobQueue";
+import { activeRepositoryStatuses } from "@shared/schema";
+
+// Port worker agents connect to; multi-node scheduling is off unless this and WORKER_TOKEN are set
+const SCHEDULER_PORT = parseInt(process.env.SCHEDULER_PORT || "0", 10);
+const SCHEDULER_HOST = process.env.SCHEDULER_HOST || "0.0.0.0";
+const WORKER_TOKEN = process.env.WORKER_TOKEN || "";
+// "false" keeps hosted processes off the API server when workers are connected
+const SCHEDULER_LOCAL_NODE = process.env.SCHEDULER_LOCAL_NODE !== "false";
+// Repositories of a worker that stays disconnected this long are started elsewhere
+const NODE_LOST_AFTER_MS = parseInt(process.env.NODE_LOST_AFTER_MS || "60000", 10);
+// How long a restarted API server waits for workers to report before restoring repositories
+const SCHEDULER_RESTORE_DELAY_MS = parseInt(process.env.SCHEDULER_RESTORE_DELAY_MS || "15000", 10);
+const RESTORE_CONCURRENCY = parseInt(process.env.SUPERVISOR_RESTORE_CONCURRENCY || "4", 10);
+const LOCAL_NODE_ID = "local";
+const HELLO_TIMEOUT_MS = 10 * 1000;
+const REQUEST_TIMEOUT_MS = 15 * 1000;
+// Starts may install requirements first
+const START_TIMEOUT_MS = 10 * 60 * 1000;
+// Memory assumed for a repository placed recently, until the node's reports reflect it
+const PLACEMENT_RESERVE_BYTES = 256 * 1024 * 1024;
+const PLACEMENT_RESERVE_MS = 30 * 1000;
+const LOG_BUFFER_BYTES = parseInt(process.env.LOG_BUFFER_BYTES || String(256 * 1024), 10);
+
+type NodeResult<M extends NodeMethod> = Awaited<ReturnType<NodeOperations[M]>>;
+// Operations that take a job context: output is streamed back and the job can cancel them
+type ContextMethod = "executeCommand" | "installPackage" | "uninstallPackage";
+
+// The request never reached a node able to run it, so no node recorded the failure
+class NodeUnavailableError extends Error {}
+
+interface PendingRequest {
+  resolve: (value: any) => void;
+  reject: (error: Error) => void;
+  // Unset for context calls, which the job queue times out
+  timer?: NodeJS.Timeout;
+  onOutput?: (data: Buffer) => void;
+}
+
+interface ExecutionNode {
+  id: string;
+  // null for the API server's own node
+  ws: WebSocket | null;
+  capacity: NodeCapacity;
+  running: Set<string>;
+  draining: boolean;
+  lastSeenAt: number;
+  disconnectedAt: number | null;
+  recentPlacements: number[];
+  pending: Map<number, PendingRequest>;
+  // Stops requested while the worker was disconnected, applied when it returns
+  pendingStops: Set<string>;
+}
+
+export interface NodeSummary {
+  id: string;
+  local: boolean;
+  connected: boolean;
+  draining: boolean;
+  capacity: NodeCapacity;
+  running: number;
+  lastSeenAt: number;
+}
+
+/**
+ * Places repositories on execution nodes: the API server itself and any
+ * worker agents (server/worker.ts) connected on SCHEDULER_PORT. Nodes report
+ * free CPU and memory; starts go to the node with the most headroom, draining
+ * a node migrates its repositories, and logs, metrics and status transitions
+ * from workers are fed into the same streams and stores local repositories use.
+ */
+class Scheduler {
+  private nodes: Map<string, ExecutionNode> = new Map();
+  // Node a repository last ran on; preferred for the next start and for
+  // operations on stopped repositories (pending restarts, runtime files)
+  private lastNode: Map<string, string> = new Map();
+  private starting: Set<string> = new Set();
+  private remoteLogs: Map<string, LogRingBuffer> = new Map();
+  private logListeners: Map<string, Set<LogCallback>> = new Map();
+  private metricsListeners: Map<string, Set<(point: MetricsPoint) => void>> = new Map();
+  private fileSyncListeners: Map<string, Set<(action: string) => void>> = new Map();
+  private statusListeners: Array<(event: RepositoryStatusEvent) => void> = [];
+  private nextRequestId = 1;
+
+  constructor() {
+    this.nodes.set(LOCAL_NODE_ID, {
+      id: LOCAL_NODE_ID,
+      ws: null,
+      capacity: readCapacity(),
+      running: new Set(),
+      draining: !SCHEDULER_LOCAL_NODE,
+      lastSeenAt: Date.now(),
+      disconnectedAt: null,
+      recentPlacements: [],
+      pending: new Map(),
+      pendingStops: new Set(),
+    });
+    pythonProcessManager.onStatusChange((event) => this.emitStatus(event));
+  }
+
+  get enabled(): boolean {
+    return SCHEDULER_PORT > 0 && WORKER_TOKEN.length > 0;
+  }
+
+  listen(): void {
+    if (!this.enabled) return;
+
+    const wss = new WebSocketServer({ port: SCHEDULER_PORT, host: SCHEDULER_HOST });
+    wss.on("connection", (ws) => this.acceptWorker(ws));
+    wss.on("listening", () => console.log(`[Scheduler] Accepting worker nodes on ${SCHEDULER_HOST}:${SCHEDULER_PORT}`));
+    wss.on("error", (error) => console.error("[Scheduler] Worker endpoint failed:", error));
+
+    setInterval(() => this.replaceLostNodes(), 10 * 1000).unref();
+  }
+
+  isRunning(repositoryId: string): boolean {
+    return this.nodeFor(repositoryId) !== null;
+  }
+
+  // The node the repository is running on, if any
+  nodeFor(repositoryId: string): string | null {
+    if (pythonProcessManager.isRunning(repositoryId)) return LOCAL_NODE_ID;
+    for (const node of Array.from(this.nodes.values())) {
+      if (node.ws && node.running.has(repositoryId)) return node.id;
+    }
+    return null;
+  }
+
+  async startRepository(repositoryId: string): Promise<void> {
+    if (this.isRunning(repositoryId)) {
+      throw new Error("Repository is already running");
+    }
+    if (this.starting.has(repositoryId)) {
+      throw new Error("Repository is already starting");
+    }
+
+    this.starting.add(repositoryId);
+    try {
+      const node = this.place(repositoryId);
+      node.recentPlacements.push(Date.now());
+      this.lastNode.set(repositoryId, node.id);
+      if (node.ws) {
+        this.remoteLogs.delete(repositoryId);
+        console.log(`[Scheduler] Starting ${repositoryId} on ${node.id}`);
+      }
+      await this.call(node, "start", repositoryId);
+      if (node.ws) node.running.add(repositoryId);
+    } finally {
+      this.starting.delete(repositoryId);
+    }
+  }
+
+  async stopRepository(repositoryId: string): Promise<void> {
+    const unreachable = this.unreachableNode(repositoryId);
+    if (unreachable) {
+      // The worker may still be running it, so the local node cannot stop it;
+      // the stop is recorded now and carried out when the worker returns
+      console.log(`[Scheduler] ${unreachable.id} is disconnected; stopping ${repositoryId} when it reconnects`);
+      unreachable.pendingStops.add(repositoryId);
+      unreachable.running.delete(repositoryId);
+      await pythonProcessManager.setStatus(repositoryId, "stopped");
+      return;
+    }
+
+    const node = this.homeNode(repositoryId);
+    await this.call(node, "stop", repositoryId);
+    node.running.delete(repositoryId);
+  }
+
+  async forget(repositoryId: string): Promise<void> {
+    const home = this.homeNode(repositoryId);
+    await this.call(home, "forget", repositoryId);
+    if (home.id !== LOCAL_NODE_ID) {
+      processSupervisor.forget(repositoryId);
+    }
+    this.lastNode.delete(repositoryId);
+    this.remoteLogs.delete(repositoryId);
+  }
+
+  // After a balance change: running repositories of the user get the limits of their new tier
+  async refreshLimits(userId: string): Promise<void> {
+    const active = await storage.getRepositoriesByStatus(activeRepositoryStatuses);
+    await mapWithConcurrency(
+      active.filter((repo) => repo.userId === userId && this.isRunning(repo.id)),
+      RESTORE_CONCURRENCY,
+      async (repo) => {
+        await this.call(this.homeNode(repo.id), "refreshLimits", repo.id).catch((error) => {
+          console.error(`[Scheduler] Could not update limits of ${repo.id}: ${error.message}`);
+        });
+      }
+    );
+  }
+
+  syncRuntimeFiles(repositoryId: string) {
+    return this.call(this.homeNode(repositoryId), "sync", repositoryId);
+  }
+
+  // Terminal commands and package changes run on the repository's node, next
+  // to its runtime directory and package overlay
+  executeCommand(repositoryId: string, command: string, context: JobContext): Promise<string> {
+    return this.callWithContext(this.commandNode(repositoryId), "executeCommand", context, repositoryId, command);
+  }
+
+  installPackage(repositoryId: string, packageName: string, context: JobContext): Promise<string> {
+    return this.callWithContext(this.commandNode(repositoryId), "installPackage", context, repositoryId, packageName);
+  }
+
+  uninstallPackage(repositoryId: string, packageName: string, context: JobContext): Promise<string> {
+    return this.callWithContext(this.commandNode(repositoryId), "uninstallPackage", context, repositoryId, packageName);
+  }
+
+  getSupervisorStatus(repositoryId: string) {
+    return this.call(this.homeNode(repositoryId), "supervisorStatus", repositoryId);
+  }
+
+  getLogBacklog(repositoryId: string): LogEntry[] {
+    if (this.homeNode(repositoryId).ws) {
+      return this.remoteLogs.get(repositoryId)?.snapshot() ?? [];
+    }
+    return pythonProcessManager.getLogBacklog(repositoryId);
+  }
+
+  getLogSeq(repositoryId: string): number {
+    if (this.homeNode(repositoryId).ws) {
+      return this.remoteLogs.get(repositoryId)?.lastSeq ?? 0;
+    }
+    return pythonProcessManager.getLogSeq(repositoryId);
+  }
+
+  clearLogBacklog(repositoryId: string): void {
+    this.remoteLogs.delete(repositoryId);
+    pythonProcessManager.clearLogBacklog(repositoryId);
+  }
+
+  // Log messages for a repository wherever it runs; returns the unsubscribe function
+  subscribeToLogs(repositoryId: string, callback: LogCallback): () => void {
+    pythonProcessManager.subscribeToLogs(repositoryId, callback);
+    this.addListener(this.logListeners, repositoryId, callback);
+    return () => {
+      pythonProcessManager.unsubscribeFromLogs(repositoryId, callback);
+      this.removeListener(this.logListeners, repositoryId, callback);
+    };
+  }
+
+  // Runtime directory changes picked up by the file watcher of whichever node has it
+  subscribeToFileSync(repositoryId: string, callback: (action: string) => void): () => void {
+    pythonProcessManager.subscribeToFileSync(repositoryId, callback);
+    this.addListener(this.fileSyncListeners, repositoryId, callback);
+    return () => {
+      pythonProcessManager.unsubscribeFromFileSync(repositoryId, callback);
+      this.removeListener(this.fileSyncListeners, repositoryId, callback);
+    };
+  }
+
+  subscribeToMetrics(repositoryId: string, callback: (point: MetricsPoint) => void): () => void {
+    const unsubscribeLocal = processMetrics.subscribe(repositoryId, callback);
+    this.addListener(this.metricsListeners, repositoryId, callback);
+    return () => {
+      unsubscribeLocal();
+      this.removeListener(this.metricsListeners, repositoryId, callback);
+    };
+  }
+
+  // Status transitions of repositories on every node, already written to the database
+  onStatusChange(listener: (event: RepositoryStatusEvent) => void): void {
+    this.statusListeners.push(listener);
+  }
+
+  getCurrentMetrics(repositoryId: string) {
+    return this.call(this.homeNode(repositoryId), "metricsCurrent", repositoryId);
+  }
+
+  getMetricsHistory(repositoryId: string, resolution: Resolution) {
+    return this.call(this.homeNode(repositoryId), "metricsHistory", repositoryId, resolution);
+  }
+
+  // Host-wide top view across every connected node
+  async getTopMetrics(limit: number, sort: TopSort): Promise<Array<MetricsPoint & { repositoryId: string; nodeId: string }>> {
+    const results = await Promise.allSettled(
+      this.connectedNodes().map(async (node) =>
+        (await this.call(node, "metricsTop", limit, sort)).map((entry) => ({ ...entry, nodeId: node.id }))
+      )
+    );
+    return results
+      .flatMap((result) => (result.status === "fulfilled" ? result.value : []))
+      .sort((a, b) => topSortValue(b, sort) - topSortValue(a, sort))
+      .slice(0, limit);
+  }
+
+  listNodes(): NodeSummary[] {
+    this.refreshLocalNode();
+    return Array.from(this.nodes.values()).map((node) => ({
+      id: node.id,
+      local: node.id === LOCAL_NODE_ID,
+      connected: node.id === LOCAL_NODE_ID || node.ws !== null,
+      draining: node.draining,
+      capacity: node.capacity,
+      running: node.running.size,
+      lastSeenAt: node.lastSeenAt,
+    }));
+  }
+
+  // Stop placing repositories on a node and move the ones it runs elsewhere
+  drain(nodeId: string): number {
+    const node = this.nodes.get(nodeId);
+    if (!node) {
+      throw new Error("Node not found");
+    }
+    node.draining = true;
+    this.refreshLocalNode();
+
+    const repositoryIds = Array.from(node.running);
+    console.log(`[Scheduler] Draining ${nodeId}: migrating ${repositoryIds.length} repositories`);
+    mapWithConcurrency(repositoryIds, RESTORE_CONCURRENCY, (repositoryId) => this.migrate(repositoryId, node)).catch((error) => {
+      console.error(`[Scheduler] Drain of ${nodeId} failed:`, error);
+    });
+    return repositoryIds.length;
+  }
+
+  undrain(nodeId: string): void {
+    const node = this.nodes.get(nodeId);
+    if (!node) {
+      throw new Error("Node not found");
+    }
+    node.draining = nodeId === LOCAL_NODE_ID ? !SCHEDULER_LOCAL_NODE : false;
+  }
+
+  // Start every repository the database marks as running that no node runs.
+  // With workers, wait for them to reconnect and report first.
+  async restoreRunningRepositories(): Promise<void> {
+    if (!this.enabled) {
+      return processSupervisor.restoreRunningRepositories();
+    }
+
+    await new Promise((resolve) => setTimeout(resolve, SCHEDULER_RESTORE_DELAY_MS));
+    const running = await storage.getRepositoriesByStatus(activeRepositoryStatuses);
+    const toRestore = running.filter((repo) => !this.isRunning(repo.id));
+    if (toRestore.length === 0) return;
+
+    console.log(`[Scheduler] Restoring ${toRestore.length} running repositories`);
+    await mapWithConcurrency(toRestore, RESTORE_CONCURRENCY, async (repo) => {
+      try {
+        await this.startRepository(repo.id);
+      } catch (error: any) {
+        console.error(`[Scheduler] Failed to restore ${repo.id}: ${error.message}`);
+        await this.recordFailedStart(repo.id, error);
+      }
+    });
+  }
+
+  private async migrate(repositoryId: string, from: ExecutionNode): Promise<void> {
+    try {
+      await this.call(from, "stop", repositoryId);
+      from.running.delete(repositoryId);
+      // Runtime files written by the bot go to the database so the next node sees them
+      await this.call(from, "sync", repositoryId).catch((error) => {
+        console.error(`[Scheduler] Sync before migrating ${repositoryId} failed: ${error.message}`);
+      });
+      await this.startRepository(repositoryId);
+      console.log(`[Scheduler] Migrated ${repositoryId} from ${from.id} to ${this.nodeFor(repositoryId)}`);
+    } catch (error: any) {
+      console.error(`[Scheduler] Failed to migrate ${repositoryId}: ${error.message}`);
+      await this.recordFailedStart(repositoryId, error);
+    }
+  }
+
+  private place(repositoryId: string): ExecutionNode {
+    const local = this.nodes.get(LOCAL_NODE_ID)!;
+    if (!this.enabled) return local;
+
+    this.refreshLocalNode();
+    // Terminal-installed packages live in an overlay on the API server's disk
+    if (dependencyEnvironments.hasOverlayPackages(repositoryId) && SCHEDULER_LOCAL_NODE) {
+      return local;
+    }
+
+    const candidates = this.connectedNodes().filter((node) => !node.draining && this.freeMemory(node) >= PLACEMENT_RESERVE_BYTES);
+    if (candidates.length === 0) {
+      throw new NodeUnavailableError("No node has free capacity to run this repository. Please try again later.");
+    }
+
+    // Staying on the previous node reuses its runtime directory and environments
+    const previous = candidates.find((node) => node.id === this.lastNode.get(repositoryId));
+    if (previous) return previous;
+
+    return candidates.reduce((best, node) => (this.score(node) > this.score(best) ? node : best));
+  }
+
+  // Share of CPU and memory still free, whichever is scarcer
+  private score(node: ExecutionNode): number {
+    const { cpus, loadAverage, totalMemoryBytes } = node.capacity;
+    const freeCpu = cpus > 0 ? Math.max(0, cpus - loadAverage[0]) / cpus : 0;
+    const freeMemory = totalMemoryBytes > 0 ? this.freeMemory(node) / totalMemoryBytes : 0;
+    return Math.min(freeCpu, freeMemory);
+  }
+
+  private freeMemory(node: ExecutionNode): number {
+    const cutoff = Date.now() - PLACEMENT_RESERVE_MS;
+    node.recentPlacements = node.recentPlacements.filter((at) => at > cutoff);
+    return node.capacity.freeMemoryBytes - node.recentPlacements.length * PLACEMENT_RESERVE_BYTES;
+  }
+
+  private connectedNodes(): ExecutionNode[] {
+    return Array.from(this.nodes.values()).filter((node) => node.id === LOCAL_NODE_ID || node.ws !== null);
+  }
+
+  // Where a repository runs, or ran last (if that node is still connected)
+  private homeNode(repositoryId: string): ExecutionNode {
+    const nodeId = this.nodeFor(repositoryId) ?? this.lastNode.get(repositoryId);
+    const node = nodeId ? this.nodes.get(nodeId) : undefined;
+    return node && (node.id === LOCAL_NODE_ID || node.ws) ? node : this.nodes.get(LOCAL_NODE_ID)!;
+  }
+
+  // The worker the repository ran on last, while it is disconnected but not yet given up on
+  private unreachableNode(repositoryId: string): ExecutionNode | null {
+    if (pythonProcessManager.isRunning(repositoryId)) return null;
+    const nodeId = this.lastNode.get(repositoryId);
+    const node = nodeId ? this.nodes.get(nodeId) : undefined;
+    return node && node.id !== LOCAL_NODE_ID && !node.ws ? node : null;
+  }
+
+  // Commands must see the repository's files, which another node does not have
+  private commandNode(repositoryId: string): ExecutionNode {
+    const unreachable = this.unreachableNode(repositoryId);
+    if (unreachable) {
+      throw new NodeUnavailableError(`Node ${unreachable.id} with this repository's files is disconnected. Please try again later.`);
+    }
+    return this.homeNode(repositoryId);
+  }
+
+  private refreshLocalNode(): void {
+    const local = this.nodes.get(LOCAL_NODE_ID)!;
+    local.capacity = readCapacity();
+    local.lastSeenAt = Date.now();
+    local.running = new Set(pythonProcessManager.getRunningProcesses().map((entry) => entry.repositoryId));
+  }
+
+  private call<M extends NodeMethod>(node: ExecutionNode, method: M, ...args: Parameters<NodeOperations[M]>): Promise<NodeResult<M>> {
+    if (!node.ws) {
+      return (nodeOperations[method] as (...params: any[]) => Promise<NodeResult<M>>)(...args);
+    }
+
+    const ws = node.ws;
+    return new Promise((resolve, reject) => {
+      if (ws.readyState !== WebSocket.OPEN) {
+        reject(new NodeUnavailableError(`Node ${node.id} is not connected`));
+        return;
+      }
+      const id = this.nextRequestId++;
+      const timer = setTimeout(() => {
+        node.pending.delete(id);
+        reject(new NodeUnavailableError(`Node ${node.id} did not answer ${method} in time`));
+      }, method === "start" ? START_TIMEOUT_MS : REQUEST_TIMEOUT_MS);
+      node.pending.set(id, { resolve, reject, timer });
+      ws.send(JSON.stringify({ type: "request", id, method, args }));
+    });
+  }
+
+  // Like call(), for operations taking a job context. The worker streams the
+  // output back as "output" messages and aborts the operation on "cancel".
+  // There is no request timeout: the job queue aborts commands that run too long.
+  private callWithContext<M extends ContextMethod>(
+    node: ExecutionNode,
+    method: M,
+    context: JobContext,
+    ...args: [string, string]
+  ): Promise<string> {
+    if (!node.ws) {
+      return nodeOperations[method](...args, context);
+    }
+
+    const ws = node.ws;
+    return new Promise((resolve, reject) => {
+      if (ws.readyState !== WebSocket.OPEN) {
+        reject(new NodeUnavailableError(`Node ${node.id} is not connected`));
+        return;
+      }
+      const id = this.nextRequestId++;
+      const cancel = () => {
+        if (ws.readyState === WebSocket.OPEN) ws.send(JSON.stringify({ type: "cancel", id }));
+      };
+      const settle = () => context.signal.removeEventListener("abort", cancel);
+      node.pending.set(id, {
+        resolve: (value) => {
+          settle();
+          resolve(value);
+        },
+        reject: (error) => {
+          settle();
+          reject(error);
+        },
+        onOutput: (data) => context.onOutput(data),
+      });
+      ws.send(JSON.stringify({ type: "request", id, method, args, withContext: true }));
+      if (context.signal.aborted) {
+        cancel();
+      } else {
+        context.signal.addEventListener("abort", cancel, { once: true });
+      }
+    });
+  }
+
+  private acceptWorker(ws: WebSocket): void {
+    let node: ExecutionNode | null = null;
+    const helloTimer = setTimeout(() => ws.close(4001, "Hello expected"), HELLO_TIMEOUT_MS);
+
+    ws.on("message", (data) => {
+      let message: any;
+      try {
+        message = JSON.parse(data.toString());
+      } catch {
+        return;
+      }
+
+      if (!node) {
+        if (message.type !== "hello" || !this.validToken(message.token) || typeof message.nodeId !== "string") {
+          ws.close(4003, "Unauthorized");
+          return;
+        }
+        clearTimeout(helloTimer);
+        node = this.registerWorker(ws, message);
+        return;
+      }
+      this.handleWorkerMessage(node, message);
+    });
+
+    ws.on("close", () => {
+      clearTimeout(helloTimer);
+      if (!node || node.ws !== ws) return;
+      console.warn(`[Scheduler] Worker ${node.id} disconnected`);
+      node.ws = null;
+      node.disconnectedAt = Date.now();
+      node.pending.forEach((request) => {
+        clearTimeout(request.timer);
+        request.reject(new NodeUnavailableError(`Node ${node!.id} disconnected`));
+      });
+      node.pending.clear();
+    });
+    ws.on("error", () => undefined);
+  }
+
+  private registerWorker(ws: WebSocket, hello: { nodeId: string; capacity: NodeCapacity; running: string[] }): ExecutionNode {
+    const existing = this.nodes.get(hello.nodeId);
+    if (existing?.ws) {
+      existing.ws.close(4000, "Replaced by a new connection");
+    }
+
+    const node: ExecutionNode = {
+      id: hello.nodeId,
+      ws,
+      capacity: hello.capacity,
+      running: new Set(),
+      draining: existing?.draining ?? false,
+      lastSeenAt: Date.now(),
+      disconnectedAt: null,
+      recentPlacements: [],
+      pending: new Map(),
+      pendingStops: new Set(),
+    };
+    this.nodes.set(node.id, node);
+    console.log(`[Scheduler] Worker ${node.id} connected (${hello.capacity.cpus} CPUs, ${hello.running.length} running)`);
+
+    // Repositories started elsewhere while this worker was away run only once.
+    // "abandon" leaves the database alone: it describes the other run.
+    const adopted: string[] = [];
+    for (const repositoryId of hello.running) {
+      if (this.isRunning(repositoryId) || this.starting.has(repositoryId)) {
+        console.warn(`[Scheduler] ${repositoryId} already runs elsewhere; stopping it on ${node.id}`);
+        this.call(node, "abandon", repositoryId, "started on another node while this one was unreachable").catch(() => undefined);
+        continue;
+      }
+      node.running.add(repositoryId);
+      this.lastNode.set(repositoryId, node.id);
+      adopted.push(repositoryId);
+    }
+    this.verifyAdopted(node, adopted, existing?.pendingStops ?? new Set()).catch((error) => {
+      console.error(`[Scheduler] Could not check the repositories of ${node.id}:`, error);
+    });
+    return node;
+  }
+
+  // A returning worker keeps only the runs the database still marks active
+  // and that were not stopped while it was away
+  private async verifyAdopted(node: ExecutionNode, adopted: string[], stopped: Set<string>): Promise<void> {
+    if (adopted.length === 0) return;
+    const active = new Set((await storage.getRepositoriesByStatus(activeRepositoryStatuses)).map((repo) => repo.id));
+    for (const repositoryId of adopted) {
+      if (active.has(repositoryId) && !stopped.has(repositoryId)) continue;
+      console.warn(`[Scheduler] ${repositoryId} is no longer active; stopping it on ${node.id}`);
+      node.running.delete(repositoryId);
+      this.call(node, "abandon", repositoryId, "stopped while this node was unreachable").catch(() => undefined);
+    }
+  }
+
+  private handleWorkerMessage(node: ExecutionNode, message: any): void {
+    node.lastSeenAt = Date.now();
+
+    switch (message.type) {
+      case "heartbeat":
+        node.capacity = message.capacity;
+        node.running = new Set(message.running);
+        node.running.forEach((repositoryId) => this.lastNode.set(repositoryId, node.id));
+        break;
+      case "logs":
+        this.receiveLogs(message.repositoryId, message.entries);
+        break;
+      case "metrics":
+        this.metricsListeners.get(message.repositoryId)?.forEach((listener) => listener(message.sample));
+        break;
+      case "file_sync":
+        this.fileSyncListeners.get(message.repositoryId)?.forEach((listener) => listener(message.action));
+        break;
+      case "output":
+        node.pending.get(message.id)?.onOutput?.(Buffer.from(message.data, "base64"));
+        break;
+      case "exit":
+        node.running.delete(message.event.repositoryId);
+        break;
+      case "status":
+        this.emitStatus(message.event);
+        break;
+      case "response": {
+        const request = node.pending.get(message.id);
+        if (!request) return;
+        node.pending.delete(message.id);
+        clearTimeout(request.timer);
+        if (message.error) {
+          request.reject(new Error(message.error));
+        } else {
+          request.resolve(message.result);
+        }
+        break;
+      }
+    }
+  }
+
+  // Worker logs are kept like local ones: replay buffer, persistent store, live subscribers
+  private receiveLogs(repositoryId: string, entries: LogEntry[]): void {
+    let buffer = this.remoteLogs.get(repositoryId);
+    if (!buffer) {
+      buffer = new LogRingBuffer(LOG_BUFFER_BYTES);
+      this.remoteLogs.set(repositoryId, buffer);
+    }
+    // Numbered here rather than on the worker, so a worker restart does not reuse numbers
+    let seq = 0;
+    for (const entry of entries) {
+      const entrySeq = buffer.push(entry);
+      if (seq === 0) seq = entrySeq;
+      logStore.append(repositoryId, entry.timestamp, entry.line);
+    }
+
+    const listeners = this.logListeners.get(repositoryId);
+    if (!listeners || listeners.size === 0) return;
+    const message = entries.map((entry) => entry.line).join("\n") + "\n";
+    listeners.forEach((listener) => listener(message, seq));
+  }
+
+  private emitStatus(event: RepositoryStatusEvent): void {
+    this.statusListeners.forEach((listener) => {
+      try {
+        listener(event);
+      } catch (error) {
+        console.error(`[Scheduler] Status listener failed for ${event.repositoryId}:`, error);
+      }
+    });
+  }
+
+  // Nodes record the starts they fail themselves; this covers the ones no node attempted
+  private async recordFailedStart(repositoryId: string, error: unknown): Promise<void> {
+    if (error instanceof NodeUnavailableError) {
+      await pythonProcessManager.setStatus(repositoryId, "crashed");
+    }
+  }
+
+  private replaceLostNodes(): void {
+    const now = Date.now();
+    this.nodes.forEach((node, nodeId) => {
+      if (node.ws || node.disconnectedAt === null || now - node.disconnectedAt < NODE_LOST_AFTER_MS) return;
+
+      this.nodes.delete(nodeId);
+      const orphaned = Array.from(node.running);
+      console.warn(`[Scheduler] Worker ${nodeId} lost; starting its ${orphaned.length} repositories elsewhere`);
+      orphaned.forEach((repositoryId) => this.lastNode.delete(repositoryId));
+      mapWithConcurrency(orphaned, RESTORE_CONCURRENCY, async (repositoryId) => {
+        try {
+          await this.startRepository(repositoryId);
+        } catch (error: any) {
+          console.error(`[Scheduler] Failed to move ${repositoryId}: ${error.message}`);
+          await this.recordFailedStart(repositoryId, error);
+        }
+      }).catch(() => undefined);
+    });
+  }
+
+  private validToken(token: unknown): boolean {
+    if (typeof token !== "string") return false;
+    const expected = Buffer.from(WORKER_TOKEN);
+    const received = Buffer.from(token);
+    return expected.length === received.length && timingSafeEqual(expected, received);
+  }
+
+  private addListener<T>(map: Map<string, Set<T>>, repositoryId: string, listener: T): void {
+    let listeners = map.get(repositoryId);
+    if (!listeners) {
+      listeners = new Set();
+      map.set(repositoryId, listeners);
+    }
+    listeners.add(listener);
+  }
+
+  private removeListener<T>(map: Map<string, Set<T>>, repositoryId: string, listener: T): void {
+    const listeners = map.get(repositoryId);
+    listeners?.delete(listener);
+    if (listeners && listeners.size === 0) map.delete(repositoryId);
+  }
+}
+
+export const scheduler = new Scheduler();
@@ -5,6 +5,7 @@ import {
   environmentVariables,
   paymentMethods,
   balanceRequests,
+  balanceTransactions,
   supportMessages,
   notifications,
   notes,
@@ -20,23 +21,109 @@ import {
   type InsertPaymentMethod,
   type BalanceRequest,
   type InsertBalanceRequest,
+  type BalanceTransaction,
+  type InsertBalanceTransaction,
+  type BalanceSummary,
   type SupportMessage,
   type InsertSupportMessage,
   type Notification,
   type InsertNotification,
   type Note,
   type InsertNote,
+  type Page,
+  type Projected,
+  normalizeAmount,
+  convertToUsd,
+  parseUsdRate,
+  type PublicUser,
+  type BalanceRequestWithUser,
+  type SupportMessageWithUser,
+  type SupportConversation,
 } from "@shared/schema";
 import { db } from "./db";
-import { eq, and, sql, desc } from "drizzle-orm";
+import { authCache } from "./authCache";
+import { notificationCenter } from "./notificationCenter";
+import { eq, and, sql, inArray, notExists, getTableColumns } from "drizzle-orm";
+import { alias } from "drizzle-orm/pg-core";
+import { keyset, pageSize, project, toPage, type PageOptions } from "./pagination";
+
+export { InvalidCursorError, type PageOptions } from "./pagination";
+
+// Lightweight view of a file row used for diffing against the runtime directory.
+// `contentHash` is the md5 of the stored content, computed by Postgres so the
+// content itself never leaves the database.
+export interface FileIndexEntry {
+  id: string;
+  name: string;
+  path: string;
+  isDirectory: boolean;
+  size: number;
+  contentHash: string;
+  updatedAt: Date | null;
+}
+
+export interface FileChangeSet {
+  inserts: InsertFile[];
+  updates: Array<{ id: string; content: string; size: number }>;
+  deletes: string[];
+}
+
+export class InvalidAmountError extends Error {
+  constructor(amount: string, reason = "is not a valid number") {
+    super(`Amount "${amount}" ${reason}`);
+  }
+}
+
+const { password: _password, ...publicUserColumns } = getTableColumns(users);
+
+type Transaction = Parameters<Parameters<typeof db.transaction>[0]>[0];
+
+/**
+ * Appends a ledger entry and moves the user's balance by its amount, inside
+ * the caller's transaction. Returns undefined without touching the balance
+ * when an entry with the same idempotency key already exists.
+ */
+async function postLedgerEntry(
+  tx: Transaction,
+  entry: Omit<InsertBalanceTransaction, 'id' | 'createdAt'>
+): Promise<BalanceTransaction | undefined> {
+  const [posted] = await tx
+    .insert(balanceTransactions)
+    .values(entry)
+    .onConflictDoNothing({ target: balanceTransactions.idempotencyKey })
+    .returning();
+  if (!posted) return undefined;
+
+  await tx
+    .update(users)
+    .set({ balance: sql`${users.balance} + ${posted.amount}::numeric`, updatedAt: new Date() })
+    .where(eq(users.id, posted.userId));
+  return posted;
+}
+
+// uq_files_repository_path_name, and what an insert onto an existing path changes
+const fileIdentity = [files.repositoryId, files.path, files.name];
+const replaceFileContent = {
+  content: sql`excluded.content`,
+  size: sql`excluded.size`,
+  isDirectory: sql`excluded.is_directory`,
+  updatedAt: sql`now()`,
+};
+
+const userSummary = {
+  id: users.id,
+  username: users.username,
+  email: users.email,
+};
 
 export interface IStorage {
   getUser(id: string): Promise<User | undefined>;
   upsertUser(user: InsertUser): Promise<User>;
 
-  getRepositories(userId: string): Promise<Repository[]>;
+  getRepositories(userId: string, options?: PageOptions): Promise<Page<Projected<Repository>>>;
   getRepository(id: string, userId: string): Promise<Repository | undefined>;
   getRepositoryById(id: string): Promise<Repository | undefined>;
+  getRepositoriesByStatus(statuses: readonly Repository['status'][]): Promise<Repository[]>;
   createRepository(userId: string, repo: InsertRepository): Promise<Repository>;
   updateRepository(id: string, userId: string, repo: Partial<Omit<Repository, 'id' | 'userId' | 'createdAt' | 'updatedAt'>>): Promise<Repository | undefined>;
   updateRepositoryById(id: string, repo: Partial<Omit<Repository, 'id' | 'userId' | 'createdAt' | 'updatedAt'>>): Promise<Repository | undefined>;
@@ -48,6 +135,8 @@ export interface IStorage {
   createFile(repositoryId: string, file: InsertFile): Promise<File>;
   updateFile(fileId: string, repositoryId: string, updates: { content?: string; size?: number }): Promise<File | null>;
   deleteFile(fileId: string, repositoryId: string): Promise<boolean>;
+  getFileIndex(repositoryId: string): Promise<FileIndexEntry[]>;
+  applyFileChanges(repositoryId: string, changes: FileChangeSet): Promise<void>;
 
   getEnvironmentVariables(repositoryId: string): Promise<EnvironmentVariable[]>;
   setEnvironmentVariables(repositoryId: string, vars: Array<{ key: string; value: string }>): Promise<void>;
@@ -58,25 +147,30 @@ export interface IStorage {
   updatePaymentMethod(id: string, data: Partial<Omit<PaymentMethod, 'id' | 'createdAt'>>): Promise<PaymentMethod | undefined>;
   deletePaymentMethod(id: string): Promise<boolean>;
 
-  getBalanceRequests(): Promise<BalanceRequest[]>;
   getBalanceRequest(id: string): Promise<BalanceRequest | undefined>;
-  getUserBalanceRequests(userId: string): Promise<BalanceRequest[]>;
+  getBalanceRequestsWithUsers(filter: { userId?: string; status?: string } & PageOptions): Promise<Page<Projected<BalanceRequestWithUser>>>;
+  getBalanceRequestStatusCounts(userId?: string): Promise<Record<string, number>>;
   createBalanceRequest(data: Omit<InsertBalanceRequest, 'id' | 'createdAt' | 'status'>): Promise<BalanceRequest>;
-  updateBalanceRequestStatus(id: string, status: string, adminNotes?: string): Promise<BalanceRequest | undefined>;
-  updateUserBalance(userId: string, amount: number): Promise<User | undefined>;
+  updateBalanceRequestStatus(id: string, status: 'approved' | 'rejected'): Promise<BalanceRequest | undefined>;
+  applyBalanceTransaction(entry: Omit<InsertBalanceTransaction, 'id' | 'createdAt'>): Promise<BalanceTransaction | undefined>;
+  getBalanceTransactions(userId: string, options?: PageOptions): Promise<Page<Projected<BalanceTransaction>>>;
+  getBalanceSummary(): Promise<BalanceSummary>;
 
   // Notifications
   createNotification(notification: InsertNotification): Promise<Notification>;
-  getNotifications(userId: string): Promise<Notification[]>;
+  getNotifications(userId: string, options?: PageOptions): Promise<Page<Projected<Notification>>>;
   getUnreadNotificationsCount(userId: string): Promise<number>;
-  markNotificationAsRead(id: string): Promise<Notification | undefined>;
+  getUnreadNotificationCounts(): Promise<Array<{ userId: string; count: number }>>;
+  markNotificationAsRead(id: string, userId: string): Promise<Notification | undefined>;
+  markAllNotificationsAsRead(userId: string): Promise<number>;
 
   // Support Messages
   createSupportMessage(data: InsertSupportMessage): Promise<SupportMessage>;
-  getAllSupportMessages(): Promise<SupportMessage[]>;
+  getSupportMessagesWithUsers(filter: { userId?: string } & PageOptions): Promise<Page<Projected<SupportMessageWithUser>>>;
+  getSupportConversations(options: PageOptions): Promise<Page<SupportConversation>>;
 
   // Notes
-  getNotes(userId: string): Promise<Note[]>;
+  getNotes(userId: string, options?: PageOptions): Promise<Page<Projected<Note>>>;
   getNote(id: string, userId: string): Promise<Note | undefined>;
   createNote(userId: string, data: InsertNote): Promise<Note>;
   updateNote(id: string, userId: string, data: Partial<InsertNote>): Promise<Note | undefined>;
@@ -101,15 +195,20 @@ export class DatabaseStorage implements IStorage {
         },
       })
       .returning();
+    authCache.invalidateUser(user.id);
     return user;
   }
 
-  async getRepositories(userId: string): Promise<Repository[]> {
-    return await db
-      .select()
+  async getRepositories(userId: string, options: PageOptions = {}): Promise<Page<Projected<Repository>>> {
+    const limit = pageSize(options.limit);
+    const page = keyset(repositories.createdAt, repositories.id, "asc");
+    const rows = await db
+      .select({ ...project(getTableColumns(repositories), options.fields), cursorKey: page.cursorKey })
       .from(repositories)
-      .where(eq(repositories.userId, userId))
-      .orderBy(repositories.createdAt);
+      .where(and(eq(repositories.userId, userId), page.after(options.cursor)))
+      .orderBy(...page.orderBy)
+      .limit(limit + 1);
+    return toPage(rows, limit);
   }
 
   async getRepository(id: string, userId: string): Promise<Repository | undefined> {
@@ -117,6 +216,7 @@ export class DatabaseStorage implements IStorage {
       .select()
       .from(repositories)
       .where(and(eq(repositories.id, id), eq(repositories.userId, userId)));
+    if (repo) authCache.owners.set(repo.id, repo.userId);
     return repo;
   }
 
@@ -128,11 +228,20 @@ export class DatabaseStorage implements IStorage {
     return repo;
   }
 
+  async getRepositoriesByStatus(statuses: readonly Repository['status'][]): Promise<Repository[]> {
+    return await db
+      .select()
+      .from(repositories)
+      .where(inArray(repositories.status, [...statuses]))
+      .orderBy(repositories.updatedAt);
+  }
+
   async createRepository(userId: string, repo: InsertRepository): Promise<Repository> {
     const [created] = await db
       .insert(repositories)
       .values({ ...repo, userId })
       .returning();
+    authCache.owners.set(created.id, created.userId);
     return created;
   }
 
@@ -165,6 +274,7 @@ export class DatabaseStorage implements IStorage {
     const result = await db
       .delete(repositories)
       .where(and(eq(repositories.id, id), eq(repositories.userId, userId)));
+    authCache.owners.delete(id);
     return result.rowCount !== null && result.rowCount > 0;
   }
 
@@ -202,10 +312,13 @@ export class DatabaseStorage implements IStorage {
     return file;
   }
 
+  // Writing to an existing path replaces that file, so the watcher and an
+  // upload racing on the same file don't fail on the unique index
   async createFile(repositoryId: string, file: InsertFile): Promise<File> {
     const [created] = await db
       .insert(files)
       .values({ ...file, repositoryId })
+      .onConflictDoUpdate({ target: fileIdentity, set: replaceFileContent })
       .returning();
     return created;
   }
@@ -234,6 +347,56 @@ export class DatabaseStorage implements IStorage {
     return result.length > 0;
   }
 
+  async getFileIndex(repositoryId: string): Promise<FileIndexEntry[]> {
+    return await db
+      .select({
+        id: files.id,
+        name: files.name,
+        path: files.path,
+        isDirectory: files.isDirectory,
+        size: files.size,
+        contentHash: sql<string>`md5(${files.content})`,
+        updatedAt: files.updatedAt,
+      })
+      .from(files)
+      .where(eq(files.repositoryId, repositoryId));
+  }
+
+  async applyFileChanges(repositoryId: string, changes: FileChangeSet): Promise<void> {
+    const { inserts, updates, deletes } = changes;
+    if (inserts.length === 0 && updates.length === 0 && deletes.length === 0) {
+      return;
+    }
+
+    await db.transaction(async (tx) => {
+      if (deletes.length > 0) {
+        await tx
+          .delete(files)
+          .where(and(eq(files.repositoryId, repositoryId), inArray(files.id, deletes)));
+      }
+
+      if (inserts.length > 0) {
+        await tx
+          .insert(files)
+          .values(inserts.map((file) => ({ ...file, repositoryId })))
+          .onConflictDoUpdate({ target: fileIdentity, set: replaceFileContent });
+      }
+
+      if (updates.length > 0) {
+        const rows = sql.join(
+          updates.map((u) => sql`(${u.id}, ${u.content}, ${u.size}::integer)`),
+          sql`, `
+        );
+        await tx.execute(sql`
+          UPDATE ${files}
+          SET content = v.content, size = v.size, updated_at = now()
+          FROM (VALUES ${rows}) AS v(id, content, size)
+          WHERE ${files.id} = v.id AND ${files.repositoryId} = ${repositoryId}
+        `);
+      }
+    });
+  }
+
   async getEnvironmentVariables(repositoryId: string): Promise<EnvironmentVariable[]> {
     return await db
       .select()
@@ -295,6 +458,7 @@ export class DatabaseStorage implements IStorage {
       .set({ isAdmin, updatedAt: new Date() })
       .where(eq(users.id, userId))
       .returning();
+    authCache.invalidateUser(userId);
     return updated;
   }
 
@@ -302,8 +466,17 @@ export class DatabaseStorage implements IStorage {
     return await db.select().from(paymentMethods).orderBy(paymentMethods.createdAt);
   }
 
-  async getAllUsers(): Promise<User[]> {
-    return await db.select().from(users).orderBy(users.createdAt);
+  // Password hashes are never part of the listing
+  async getAllUsers(options: PageOptions = {}): Promise<Page<Projected<PublicUser>>> {
+    const limit = pageSize(options.limit);
+    const page = keyset(users.createdAt, users.id, "asc");
+    const rows = await db
+      .select({ ...project(publicUserColumns, options.fields), cursorKey: page.cursorKey })
+      .from(users)
+      .where(page.after(options.cursor))
+      .orderBy(...page.orderBy)
+      .limit(limit + 1);
+    return toPage(rows, limit);
   }
 
   async updateUserPassword(userId: string, hashedPassword: string): Promise<boolean> {
@@ -311,6 +484,7 @@ export class DatabaseStorage implements IStorage {
       .update(users)
       .set({ password: hashedPassword })
       .where(eq(users.id, userId));
+    authCache.invalidateUser(userId);
     return result.rowCount !== null && result.rowCount > 0;
   }
 
@@ -338,17 +512,42 @@ export class DatabaseStorage implements IStorage {
     return result.rowCount !== null && result.rowCount > 0;
   }
 
-  async getBalanceRequests(): Promise<BalanceRequest[]> {
-    return await db.select().from(balanceRequests).orderBy(balanceRequests.createdAt);
-  }
-
   async getBalanceRequest(id: string): Promise<BalanceRequest | undefined> {
     const [request] = await db.select().from(balanceRequests).where(eq(balanceRequests.id, id));
     return request;
   }
 
-  async getUserBalanceRequests(userId: string): Promise<BalanceRequest[]> {
-    return await db.select().from(balanceRequests).where(eq(balanceRequests.userId, userId)).orderBy(balanceRequests.createdAt);
+  async getBalanceRequestsWithUsers(
+    filter: { userId?: string; status?: string } & PageOptions
+  ): Promise<Page<Projected<BalanceRequestWithUser>>> {
+    const limit = pageSize(filter.limit);
+    const page = keyset(balanceRequests.createdAt, balanceRequests.id);
+    const rows = await db
+      .select({
+        ...project({ ...getTableColumns(balanceRequests), user: userSummary }, filter.fields),
+        cursorKey: page.cursorKey,
+      })
+      .from(balanceRequests)
+      .leftJoin(users, eq(users.id, balanceRequests.userId))
+      .where(
+        and(
+          filter.userId ? eq(balanceRequests.userId, filter.userId) : undefined,
+          filter.status ? eq(balanceRequests.status, filter.status) : undefined,
+          page.after(filter.cursor)
+        )
+      )
+      .orderBy(...page.orderBy)
+      .limit(limit + 1);
+    return toPage(rows, limit);
+  }
+
+  async getBalanceRequestStatusCounts(userId?: string): Promise<Record<string, number>> {
+    const rows = await db
+      .select({ status: balanceRequests.status, count: sql<number>`count(*)::int` })
+      .from(balanceRequests)
+      .where(userId ? eq(balanceRequests.userId, userId) : undefined)
+      .groupBy(balanceRequests.status);
+    return Object.fromEntries(rows.map((row) => [row.status, row.count]));
   }
 
   async createBalanceRequest(data: Omit<InsertBalanceRequest, 'id' | 'createdAt' | 'status'>): Promise<BalanceRequest> {
@@ -356,45 +555,118 @@ export class DatabaseStorage implements IStorage {
     return created;
   }
 
-  async updateBalanceRequestStatus(id: string, status: string, adminNotes?: string): Promise<BalanceRequest | undefined> {
-    const [updated] = await db
-      .update(balanceRequests)
-      .set({ status })
-      .where(eq(balanceRequests.id, id))
-      .returning();
-
-    if (updated && status === 'approved') {
-      const request = updated;
-      const amountInUsd = parseFloat(request.amountSent);
-      await this.updateUserBalance(request.userId, amountInUsd);
+  // Moves a request out of 'pending' and, on approval, credits it in the same
+  // transaction. Returns undefined if the request is missing or was already
+  // reviewed, so concurrent or repeated approvals credit at most once. Throws
+  // InvalidAmountError, leaving the request pending, if an approved request's
+  // amount is not a number or is worth less than a cent. amountSent is in the
+  // payment method's currency; the ledger and balances are in USD.
+  async updateBalanceRequestStatus(id: string, status: 'approved' | 'rejected'): Promise<BalanceRequest | undefined> {
+    const updated = await db.transaction(async (tx) => {
+      const [request] = await tx
+        .update(balanceRequests)
+        .set({ status })
+        .where(and(eq(balanceRequests.id, id), eq(balanceRequests.status, 'pending')))
+        .returning();
+
+      if (request && status === 'approved') {
+        // Requests created before amounts were validated may hold free text
+        const amount = normalizeAmount(request.amountSent);
+        if (!amount) {
+          throw new InvalidAmountError(request.amountSent);
+        }
+        const [method] = await tx
+          .select({ usdRate: paymentMethods.usdRate })
+          .from(paymentMethods)
+          .where(eq(paymentMethods.id, request.paymentMethodId));
+        if (!method || parseUsdRate(method.usdRate) === null) {
+          throw new InvalidAmountError(request.amountSent, "cannot be converted: the payment method has no valid USD rate");
+        }
+        const usdAmount = convertToUsd(amount, method.usdRate);
+        if (!usdAmount) {
+          throw new InvalidAmountError(request.amountSent, "is less than 0.01 USD at this payment method's rate");
+        }
+        await postLedgerEntry(tx, {
+          userId: request.userId,
+          amount: usdAmount,
+          kind: 'deposit',
+          balanceRequestId: request.id,
+          idempotencyKey: `balance_request:${request.id}`,
+        });
+      }
+      return request;
+    });
+
+    if (updated?.status === 'approved') {
+      authCache.invalidateUser(updated.userId);
     }
-
     return updated;
   }
 
-  async updateUserBalance(userId: string, amount: number): Promise<User | undefined> {
-    const [updated] = await db
-      .update(users)
-      .set({ 
-        balance: sql`(CAST(${users.balance} AS NUMERIC) + ${amount})::TEXT`,
-        updatedAt: new Date() 
-      })
-      .where(eq(users.id, userId))
-      .returning();
-    return updated;
+  async applyBalanceTransaction(
+    entry: Omit<InsertBalanceTransaction, 'id' | 'createdAt'>
+  ): Promise<BalanceTransaction | undefined> {
+    const posted = await db.transaction((tx) => postLedgerEntry(tx, entry));
+    if (posted) authCache.invalidateUser(posted.userId);
+    return posted;
+  }
+
+  async getBalanceTransactions(userId: string, options: PageOptions = {}): Promise<Page<Projected<BalanceTransaction>>> {
+    const limit = pageSize(options.limit);
+    const page = keyset(balanceTransactions.createdAt, balanceTransactions.id);
+    const rows = await db
+      .select({ ...project(getTableColumns(balanceTransactions), options.fields), cursorKey: page.cursorKey })
+      .from(balanceTransactions)
+      .where(and(eq(balanceTransactions.userId, userId), page.after(options.cursor)))
+      .orderBy(...page.orderBy)
+      .limit(limit + 1);
+    return toPage(rows, limit);
+  }
+
+  async getBalanceSummary(): Promise<BalanceSummary> {
+    const [[balances], [deposits], [pending]] = await Promise.all([
+      db.select({ total: sql<string>`coalesce(sum(${users.balance}), 0)::text` }).from(users),
+      db
+        .select({ total: sql<string>`coalesce(sum(${balanceTransactions.amount}), 0)::text`, count: sql<number>`count(*)::int` })
+        .from(balanceTransactions)
+        .where(eq(balanceTransactions.kind, 'deposit')),
+      db
+        .select({ count: sql<number>`count(*)::int` })
+        .from(balanceRequests)
+        .where(eq(balanceRequests.status, 'pending')),
+    ]);
+    return {
+      totalBalance: balances.total,
+      totalDeposits: deposits.total,
+      deposits: deposits.count,
+      pendingRequests: pending.count,
+    };
   }
 
   // Notifications
   async createNotification(notification: InsertNotification): Promise<Notification> {
     const [created] = await db.insert(notifications).values(notification).returning();
+    notificationCenter.created(created);
     return created;
   }
 
-  async getNotifications(userId: string): Promise<Notification[]> {
-    return await db.select().from(notifications).where(eq(notifications.userId, userId)).orderBy(notifications.createdAt);
+  async getNotifications(userId: string, options: PageOptions = {}): Promise<Page<Projected<Notification>>> {
+    const limit = pageSize(options.limit);
+    const page = keyset(notifications.createdAt, notifications.id);
+    const rows = await db
+      .select({ ...project(getTableColumns(notifications), options.fields), cursorKey: page.cursorKey })
+      .from(notifications)
+      .where(and(eq(notifications.userId, userId), page.after(options.cursor)))
+      .orderBy(...page.orderBy)
+      .limit(limit + 1);
+    return toPage(rows, limit);
   }
 
+  // Served from memory once the counts are loaded; the query is the fallback
   async getUnreadNotificationsCount(userId: string): Promise<number> {
+    const cached = notificationCenter.unreadCount(userId);
+    if (cached !== undefined) return cached;
+
     const [result] = await db
       .select({ count: sql<number>`COUNT(*)` })
       .from(notifications)
@@ -402,13 +674,40 @@ export class DatabaseStorage implements IStorage {
     return Number(result.count);
   }
 
-  async markNotificationAsRead(id: string): Promise<Notification | undefined> {
+  async getUnreadNotificationCounts(): Promise<Array<{ userId: string; count: number }>> {
+    return db
+      .select({ userId: notifications.userId, count: sql<number>`count(*)::int` })
+      .from(notifications)
+      .where(eq(notifications.isRead, false))
+      .groupBy(notifications.userId);
+  }
+
+  // Only rows that were actually unread move the counter, so repeats are harmless
+  async markNotificationAsRead(id: string, userId: string): Promise<Notification | undefined> {
     const [updated] = await db
       .update(notifications)
       .set({ isRead: true })
-      .where(eq(notifications.id, id))
+      .where(and(eq(notifications.id, id), eq(notifications.userId, userId), eq(notifications.isRead, false)))
       .returning();
-    return updated;
+    if (updated) {
+      notificationCenter.read(userId, [updated.id]);
+      return updated;
+    }
+    const [existing] = await db
+      .select()
+      .from(notifications)
+      .where(and(eq(notifications.id, id), eq(notifications.userId, userId)));
+    return existing;
+  }
+
+  async markAllNotificationsAsRead(userId: string): Promise<number> {
+    const updated = await db
+      .update(notifications)
+      .set({ isRead: true })
+      .where(and(eq(notifications.userId, userId), eq(notifications.isRead, false)))
+      .returning({ id: notifications.id });
+    notificationCenter.read(userId);
+    return updated.length;
   }
 
   // Support Messages
@@ -417,30 +716,95 @@ export class DatabaseStorage implements IStorage {
     return message;
   }
 
-  async getAllSupportMessages(): Promise<SupportMessage[]> {
-    const messages = await db.select().from(supportMessages).orderBy(supportMessages.createdAt);
-
-    // Get user info for each message
-    const messagesWithUsers = await Promise.all(
-      messages.map(async (msg) => {
-        const user = await this.getUser(msg.userId);
-        return {
-          ...msg,
-          user: user ? { id: user.id, username: user.username, email: user.email } : undefined,
-        };
+  async getSupportMessagesWithUsers(filter: { userId?: string } & PageOptions): Promise<Page<Projected<SupportMessageWithUser>>> {
+    const limit = pageSize(filter.limit);
+    const page = keyset(supportMessages.createdAt, supportMessages.id);
+    const rows = await db
+      .select({
+        ...project({ ...getTableColumns(supportMessages), user: userSummary }, filter.fields),
+        cursorKey: page.cursorKey,
+      })
+      .from(supportMessages)
+      .leftJoin(users, eq(users.id, supportMessages.userId))
+      .where(
+        and(
+          filter.userId ? eq(supportMessages.userId, filter.userId) : undefined,
+          page.after(filter.cursor)
+        )
+      )
+      .orderBy(...page.orderBy)
+      .limit(limit + 1);
+    return toPage(rows, limit);
+  }
+
+  // One row per user with their latest message, most recently active first.
+  // Messages are walked newest first on idx_support_messages_created and only
+  // the newest of each conversation is kept (probed on
+  // idx_support_messages_user_created), so a page reads its own window rather
+  // than aggregating every message; counts are taken for the returned rows only.
+  async getSupportConversations(options: PageOptions): Promise<Page<SupportConversation>> {
+    const limit = pageSize(options.limit);
+    const page = keyset(supportMessages.createdAt, supportMessages.id);
+    const later = alias(supportMessages, "later");
+    const thread = alias(supportMessages, "thread");
+
+    const rows = await db
+      .select({
+        id: supportMessages.id,
+        userId: supportMessages.userId,
+        user: userSummary,
+        lastMessage: getTableColumns(supportMessages),
+        messageCount: sql<number>`(${db
+          .select({ count: sql`count(*)::int` })
+          .from(thread)
+          .where(eq(thread.userId, supportMessages.userId))})`,
+        fromUserCount: sql<number>`(${db
+          .select({ count: sql`count(*)::int` })
+          .from(thread)
+          .where(and(eq(thread.userId, supportMessages.userId), eq(thread.isFromUser, true)))})`,
+        cursorKey: page.cursorKey,
       })
-    );
+      .from(supportMessages)
+      .leftJoin(users, eq(users.id, supportMessages.userId))
+      .where(
+        and(
+          notExists(
+            db
+              .select({ id: later.id })
+              .from(later)
+              .where(
+                and(
+                  eq(later.userId, supportMessages.userId),
+                  sql`(${later.createdAt}, ${later.id}) > (${supportMessages.createdAt}, ${supportMessages.id})`
+                )
+              )
+          ),
+          page.after(options.cursor)
+        )
+      )
+      .orderBy(...page.orderBy)
+      .limit(limit + 1);
 
-    return messagesWithUsers;
+    // The cursor is keyed on the last message; it isn't part of the response shape
+    const result = toPage(rows, limit);
+    return {
+      items: result.items.map(({ id: _id, ...conversation }) => conversation),
+      nextCursor: result.nextCursor,
+    };
   }
 
   // Notes
-  async getNotes(userId: string): Promise<Note[]> {
-    return await db
-      .select()
+  // Most recently edited first
+  async getNotes(userId: string, options: PageOptions = {}): Promise<Page<Projected<Note>>> {
+    const limit = pageSize(options.limit);
+    const page = keyset(notes.updatedAt, notes.id);
+    const rows = await db
+      .select({ ...project(getTableColumns(notes), options.fields), cursorKey: page.cursorKey })
       .from(notes)
-      .where(eq(notes.userId, userId))
-      .orderBy(desc(notes.updatedAt));
+      .where(and(eq(notes.userId, userId), page.after(options.cursor)))
+      .orderBy(...page.orderBy)
+      .limit(limit + 1);
+    return toPage(rows, limit);
   }
 
   async getNote(id: string, userId: string): Promise<Note | undefined> {
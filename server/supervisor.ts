@@ -0,0 +1,185 @@
+import { storage } from "./storage";
+import { pythonProcessManager, type ProcessExitEvent } from "./pythonProcessManager";
+import { mapWithConcurrency } from "./concurrency";
+import { activeRepositoryStatuses, restartPolicies, type RestartPolicy } from "@shared/schema";
+
+const RESTART_BASE_DELAY_MS = 1000;
+const RESTART_MAX_DELAY_MS = 5 * 60 * 1000;
+// A run shorter than this counts towards crash-loop detection
+const QUICK_FAILURE_MS = parseInt(process.env.SUPERVISOR_QUICK_FAILURE_MS || "60000", 10);
+// Consecutive quick failures after which a repository is parked
+const CRASH_LOOP_THRESHOLD = parseInt(process.env.SUPERVISOR_CRASH_LOOP_THRESHOLD || "5", 10);
+// Repositories started in parallel when restoring after a server restart
+const RESTORE_CONCURRENCY = parseInt(process.env.SUPERVISOR_RESTORE_CONCURRENCY || "4", 10);
+
+export interface SupervisorState {
+  restarts: number;
+  consecutiveFailures: number;
+  parked: boolean;
+  nextRestartAt: number | null;
+  lastExit: { code: number | null; signal: string | null; at: number; uptimeMs: number } | null;
+}
+
+/**
+ * Applies per-repository restart policies on top of PythonProcessManager:
+ * exponential backoff with jitter, crash-loop parking and restoring the
+ * repositories that were running before the server restarted.
+ */
+class ProcessSupervisor {
+  private states: Map<string, SupervisorState> = new Map();
+  private timers: Map<string, NodeJS.Timeout> = new Map();
+
+  constructor() {
+    pythonProcessManager.onProcessExit((event) => {
+      this.handleExit(event).catch((error) => {
+        console.error(`[Supervisor] Failed to handle exit of ${event.repositoryId}:`, error);
+      });
+    });
+  }
+
+  // User-initiated start: clears any parked state and pending restart
+  async startRepository(repositoryId: string): Promise<void> {
+    this.cancelRestart(repositoryId);
+    const state = this.getState(repositoryId);
+    state.parked = false;
+    state.consecutiveFailures = 0;
+    await pythonProcessManager.startRepository(repositoryId);
+  }
+
+  // User-initiated stop: also cancels a restart that is waiting on backoff
+  stopRepository(repositoryId: string): void {
+    this.cancelRestart(repositoryId);
+    pythonProcessManager.stopRepository(repositoryId);
+  }
+
+  forget(repositoryId: string): void {
+    this.cancelRestart(repositoryId);
+    this.states.delete(repositoryId);
+  }
+
+  // Cancels every pending restart, e.g. on a worker that fenced itself off
+  forgetAll(): void {
+    Array.from(this.states.keys()).forEach((repositoryId) => this.forget(repositoryId));
+  }
+
+  getStatus(repositoryId: string): SupervisorState {
+    return { ...this.getState(repositoryId) };
+  }
+
+  // Start every repository the database still marks as running (or starting,
+  // or waiting to restart), e.g. after a server restart. Starts run in
+  // parallel up to RESTORE_CONCURRENCY; failed starts record their own status.
+  async restoreRunningRepositories(): Promise<void> {
+    const running = await storage.getRepositoriesByStatus(activeRepositoryStatuses);
+    const toRestore = running.filter((repo) => !pythonProcessManager.isRunning(repo.id));
+    if (toRestore.length === 0) return;
+
+    console.log(`[Supervisor] Restoring ${toRestore.length} running repositories`);
+    const results = await mapWithConcurrency(toRestore, RESTORE_CONCURRENCY, async (repo) => {
+      try {
+        await pythonProcessManager.startRepository(repo.id);
+        return true;
+      } catch (error: any) {
+        console.error(`[Supervisor] Failed to restore ${repo.id}: ${error.message}`);
+        return false;
+      }
+    });
+    console.log(`[Supervisor] Restored ${results.filter(Boolean).length}/${toRestore.length} repositories`);
+  }
+
+  private async handleExit(event: ProcessExitEvent): Promise<void> {
+    if (event.intentional) return;
+
+    const { repositoryId } = event;
+    const state = this.getState(repositoryId);
+    state.lastExit = { code: event.code, signal: event.signal, at: Date.now(), uptimeMs: event.uptimeMs };
+
+    const repository = await storage.getRepositoryById(repositoryId);
+    if (!repository) {
+      this.forget(repositoryId);
+      return;
+    }
+
+    const policy = repository.restartPolicy as RestartPolicy;
+    const failed = event.code !== 0;
+    if (!restartPolicies.includes(policy)) {
+      console.warn(`[Supervisor] Unknown restart policy "${repository.restartPolicy}" for ${repositoryId}, not restarting`);
+      return;
+    }
+    if (policy === "never" || (policy === "on-failure" && !failed)) return;
+
+    this.recordRun(repositoryId, state, event.uptimeMs < QUICK_FAILURE_MS && failed);
+  }
+
+  // Count a finished run and either park the repository or schedule a restart
+  private recordRun(repositoryId: string, state: SupervisorState, quickFailure: boolean): void {
+    state.consecutiveFailures = quickFailure ? state.consecutiveFailures + 1 : 0;
+
+    if (state.consecutiveFailures >= CRASH_LOOP_THRESHOLD) {
+      state.parked = true;
+      state.nextRestartAt = null;
+      console.warn(`[Supervisor] ${repositoryId} parked after ${state.consecutiveFailures} quick failures`);
+      pythonProcessManager.logSystemMessage(
+        repositoryId,
+        `🛑 Crash loop detected (${state.consecutiveFailures} quick failures). Automatic restarts paused until the next manual start.`
+      );
+      pythonProcessManager.setStatus(repositoryId, "parked");
+      return;
+    }
+
+    // Exponential backoff with jitter in [delay/2, delay]
+    const delay = Math.min(RESTART_MAX_DELAY_MS, RESTART_BASE_DELAY_MS * 2 ** state.consecutiveFailures);
+    const jittered = Math.round(delay / 2 + Math.random() * (delay / 2));
+    state.nextRestartAt = Date.now() + jittered;
+    pythonProcessManager.logSystemMessage(repositoryId, `🔁 Restarting in ${(jittered / 1000).toFixed(1)}s...`);
+    pythonProcessManager.setStatus(repositoryId, "restarting", { nextRestartAt: state.nextRestartAt });
+
+    this.cancelRestart(repositoryId);
+    const timer = setTimeout(() => {
+      this.timers.delete(repositoryId);
+      state.nextRestartAt = null;
+      this.restart(repositoryId, state);
+    }, jittered);
+    timer.unref();
+    this.timers.set(repositoryId, timer);
+  }
+
+  private async restart(repositoryId: string, state: SupervisorState): Promise<void> {
+    if (pythonProcessManager.isRunning(repositoryId)) return;
+
+    state.restarts++;
+    try {
+      await pythonProcessManager.startRepository(repositoryId);
+    } catch (error: any) {
+      if (error.message === "Repository not found") {
+        this.forget(repositoryId);
+        return;
+      }
+      console.error(`[Supervisor] Restart of ${repositoryId} failed: ${error.message}`);
+      this.recordRun(repositoryId, state, true);
+    }
+  }
+
+  private cancelRestart(repositoryId: string): void {
+    const timer = this.timers.get(repositoryId);
+    if (timer) {
+      clearTimeout(timer);
+      this.timers.delete(repositoryId);
+    }
+    const state = this.states.get(repositoryId);
+    if (state) {
+      state.nextRestartAt = null;
+    }
+  }
+
+  private getState(repositoryId: string): SupervisorState {
+    let state = this.states.get(repositoryId);
+    if (!state) {
+      state = { restarts: 0, consecutiveFailures: 0, parked: false, nextRestartAt: null, lastExit: null };
+      this.states.set(repositoryId, state);
+    }
+    return state;
+  }
+}
+
+export const processSupervisor = new ProcessSupervisor();
@@ -0,0 +1,81 @@
+import { test } from "node:test";
+import assert from "node:assert/strict";
+import { TtlCache } from "./ttlCache";
+
+test("entries expire after their time to live", (t) => {
+  t.mock.timers.enable({ apis: ["Date"], now: 0 });
+  const cache = new TtlCache<string, number>(1000, 10);
+
+  cache.set("a", 1);
+  t.mock.timers.tick(999);
+  assert.equal(cache.get("a"), 1);
+  assert.equal(cache.has("a"), true);
+
+  t.mock.timers.tick(1);
+  assert.equal(cache.has("a"), false);
+  assert.equal(cache.get("a"), undefined);
+  assert.equal(cache.getStats().entries, 0);
+});
+
+test("the least recently read entry is evicted at the cap", () => {
+  const cache = new TtlCache<string, number>(60_000, 2);
+
+  cache.set("a", 1);
+  cache.set("b", 2);
+  cache.get("a");
+  cache.set("c", 3);
+
+  assert.equal(cache.has("a"), true);
+  assert.equal(cache.has("b"), false);
+  assert.equal(cache.has("c"), true);
+});
+
+test("has() sees entries that hold undefined or null", () => {
+  const cache = new TtlCache<string, string | null | undefined>(60_000, 10);
+
+  cache.set("missing", undefined);
+  cache.set("none", null);
+
+  assert.equal(cache.has("missing"), true);
+  assert.equal(cache.has("none"), true);
+  assert.equal(cache.has("other"), false);
+});
+
+test("removals bump the generation so in-flight loads can detect them", () => {
+  const cache = new TtlCache<string, { owner: string }>(60_000, 10);
+  cache.set("a", { owner: "x" });
+  cache.set("b", { owner: "y" });
+
+  const before = cache.generation;
+  cache.deleteWhere((value) => value.owner === "x");
+  assert.ok(cache.generation > before);
+  assert.equal(cache.has("a"), false);
+  assert.equal(cache.has("b"), true);
+
+  const afterSweep = cache.generation;
+  cache.delete("b");
+  assert.ok(cache.generation > afterSweep);
+});
+
+test("a zero time to live disables caching", () => {
+  const cache = new TtlCache<string, number>(0, 10);
+  cache.set("a", 1);
+  assert.equal(cache.get("a"), undefined);
+});
+
+test("forEach visits live entries without counting reads", (t) => {
+  t.mock.timers.enable({ apis: ["Date"], now: 0 });
+  const cache = new TtlCache<string, number>(1000, 10);
+  cache.set("old", 1);
+  t.mock.timers.tick(600);
+  cache.set("new", 2);
+  t.mock.timers.tick(600);
+
+  const seen: string[] = [];
+  cache.forEach((_value, key) => seen.push(key));
+  assert.deepEqual(seen, ["new"]);
+
+  cache.get("new");
+  cache.get("old");
+  assert.deepEqual(cache.getStats(), { entries: 1, hits: 1, misses: 1, hitRate: 0.5 });
+});
@@ -0,0 +1,80 @@
+export interface CacheStats {
+  entries: number;
+  hits: number;
+  misses: number;
+  hitRate: number;
+}
+
+/**
+ * Map with a per-entry time to live and an entry cap. Reads move an entry to
+ * the back, so the least recently used entries are evicted first once the
+ * cap is reached.
+ */
+export class TtlCache<K, V> {
+  private entries: Map<K, { value: V; expiresAt: number }> = new Map();
+  private hits = 0;
+  private misses = 0;
+  // Bumped on every removal so loads that started earlier don't store stale values
+  generation = 0;
+
+  constructor(private ttlMs: number, private maxEntries: number) {}
+
+  get(key: K): V | undefined {
+    const entry = this.entries.get(key);
+    if (!entry || entry.expiresAt <= Date.now()) {
+      if (entry) this.entries.delete(key);
+      this.misses++;
+      return undefined;
+    }
+    this.hits++;
+    this.entries.delete(key);
+    this.entries.set(key, entry);
+    return entry.value;
+  }
+
+  // Whether a live entry exists, including one holding undefined or null
+  has(key: K): boolean {
+    const entry = this.entries.get(key);
+    return entry !== undefined && entry.expiresAt > Date.now();
+  }
+
+  set(key: K, value: V): void {
+    if (this.ttlMs <= 0) return;
+    this.entries.delete(key);
+    this.entries.set(key, { value, expiresAt: Date.now() + this.ttlMs });
+    if (this.entries.size > this.maxEntries) {
+      const oldest = this.entries.keys().next().value;
+      if (oldest !== undefined) this.entries.delete(oldest);
+    }
+  }
+
+  delete(key: K): void {
+    this.generation++;
+    this.entries.delete(key);
+  }
+
+  deleteWhere(predicate: (value: V) => boolean): void {
+    this.generation++;
+    for (const [key, entry] of Array.from(this.entries.entries())) {
+      if (predicate(entry.value)) this.entries.delete(key);
+    }
+  }
+
+  // Live entries only; does not count as a read
+  forEach(callback: (value: V, key: K) => void): void {
+    const now = Date.now();
+    for (const [key, entry] of Array.from(this.entries.entries())) {
+      if (entry.expiresAt > now) callback(entry.value, key);
+    }
+  }
+
+  getStats(): CacheStats {
+    const lookups = this.hits + this.misses;
+    return {
+      entries: this.entries.size,
+      hits: this.hits,
+      misses: this.misses,
+      hitRate: lookups > 0 ? this.hits / lookups : 0,
+    };
+  }
+}
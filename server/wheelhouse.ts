@@ -0,0 +1,307 @@
+import { spawn } from "child_process";
+import { createHash } from "crypto";
+import { promises as dns } from "dns";
+import * as fs from "fs";
+import * as path from "path";
+import { LineSplitter, OutputTail } from "./logBuffer";
+
+const WHEELHOUSE_DIR = process.env.WHEELHOUSE_DIR || path.join(process.cwd(), "wheelhouse");
+// "true" never contacts the package index, "false" always does, "auto" probes it
+const WHEELHOUSE_OFFLINE = (process.env.WHEELHOUSE_OFFLINE || "auto").toLowerCase();
+const PACKAGE_INDEX_HOST = process.env.PACKAGE_INDEX_HOST || "pypi.org";
+const CONNECTIVITY_CHECK_TTL_MS = 60 * 1000;
+// pip output kept for the result; everything is streamed through onOutput as it arrives
+const PIP_OUTPUT_TAIL_LENGTH = 64 * 1024;
+
+export interface PipResult {
+  code: number | null;
+  // The last PIP_OUTPUT_TAIL_LENGTH characters
+  output: string;
+}
+
+export interface WheelhouseStats {
+  wheels: number;
+  bytes: number;
+  installs: number;
+  offlineInstalls: number;
+  indexFallbacks: number;
+  cacheHits: number;
+  cacheMisses: number;
+  bytesSaved: number;
+  bytesDownloaded: number;
+}
+
+export interface PruneOptions {
+  // Remove wheels not used by an install for this many days
+  olderThanDays?: number;
+  // Then remove least recently used wheels until the cache fits
+  maxBytes?: number;
+}
+
+export interface PipOptions {
+  onOutput?: (data: Buffer) => void;
+  // Aborting kills pip; the result then has a null exit code
+  signal?: AbortSignal;
+}
+
+export function runPip(python: string, args: string[], cwd: string, options: PipOptions = {}): Promise<PipResult> {
+  return new Promise((resolve, reject) => {
+    if (options.signal?.aborted) {
+      resolve({ code: null, output: "Cancelled" });
+      return;
+    }
+
+    const pip = spawn(python, ["-m", "pip", ...args], { cwd });
+    const output = new OutputTail(PIP_OUTPUT_TAIL_LENGTH);
+
+    const abort = () => pip.kill();
+    options.signal?.addEventListener("abort", abort, { once: true });
+    pip.on("close", () => options.signal?.removeEventListener("abort", abort));
+
+    const collect = (data: Buffer) => {
+      output.write(data);
+      options.onOutput?.(data);
+    };
+    pip.stdout?.on("data", collect);
+    pip.stderr?.on("data", collect);
+
+    pip.on("close", (code) => resolve({ code, output: output.toString() }));
+    pip.on("error", reject);
+  });
+}
+
+/**
+ * Platform-wide cache of built wheels. Wheel file names already encode the
+ * package name, version and ABI/platform tags, so one flat directory serves
+ * every interpreter. Installs first make sure the wheels are present
+ * (`pip wheel --find-links`) and then install with `--no-index` from the
+ * cache, which also works when the package index is unreachable.
+ */
+class Wheelhouse {
+  // Running `pip wheel` fetches, with the output handlers of every install waiting on each
+  private fetching: Map<string, { done: Promise<void>; listeners: Set<NonNullable<PipOptions["onOutput"]>> }> = new Map();
+  private online: { value: boolean; checkedAt: number } | null = null;
+  private counters = {
+    installs: 0,
+    offlineInstalls: 0,
+    indexFallbacks: 0,
+    cacheHits: 0,
+    cacheMisses: 0,
+    bytesSaved: 0,
+    bytesDownloaded: 0,
+  };
+
+  get directory(): string {
+    return WHEELHOUSE_DIR;
+  }
+
+  /**
+   * Install requirements into a --target directory through the wheelhouse.
+   * `requirementArgs` are pip requirement arguments, e.g. ["-r", file] or
+   * a list of specifiers.
+   */
+  async install(
+    python: string,
+    requirementArgs: string[],
+    options: PipOptions & { target: string; cwd: string; upgrade?: boolean }
+  ): Promise<PipResult> {
+    await fs.promises.mkdir(WHEELHOUSE_DIR, { recursive: true });
+    this.counters.installs++;
+
+    const before = await this.listWheels();
+    const online = await this.isOnline();
+    if (online) {
+      // Failures here are not fatal: the index install below reports the real error
+      await this.fetch(python, requirementArgs, options.cwd, options.onOutput);
+    } else {
+      this.counters.offlineInstalls++;
+    }
+    // The fetch may be shared with other installs, so it is never killed; stop after it instead
+    if (options.signal?.aborted) {
+      return { code: null, output: "Cancelled" };
+    }
+
+    // Wheels used are picked from the full output, which the result only keeps the end of
+    const used = new Set<string>();
+    const lines = new LineSplitter((line) => {
+      const match = line.match(/Processing\s+(\S+\.whl)/);
+      if (match) used.add(path.basename(match[1]));
+    });
+    const installArgs = ["install", "--target", options.target, ...(options.upgrade ? ["--upgrade"] : [])];
+    const pipOptions: PipOptions = {
+      onOutput: (data) => {
+        lines.write(data);
+        options.onOutput?.(data);
+      },
+      signal: options.signal,
+    };
+    let result = await runPip(
+      python,
+      [...installArgs, "--no-index", "--find-links", WHEELHOUSE_DIR, ...requirementArgs],
+      options.cwd,
+      pipOptions
+    );
+
+    // Requirements that cannot be built as wheels (or a resolver mismatch)
+    // still install straight from the index when it is reachable
+    if (result.code !== 0 && online && !options.signal?.aborted) {
+      this.counters.indexFallbacks++;
+      used.clear();
+      result = await runPip(python, [...installArgs, "--find-links", WHEELHOUSE_DIR, ...requirementArgs], options.cwd, pipOptions);
+    }
+
+    lines.end();
+    if (result.code === 0) {
+      await this.recordUsage(used, before);
+    }
+    return result;
+  }
+
+  // Download or build wheels for the given requirements without installing them
+  async seed(python: string, requirements: string[], options: PipOptions = {}): Promise<PipResult> {
+    await fs.promises.mkdir(WHEELHOUSE_DIR, { recursive: true });
+    const before = await this.listWheels();
+    const result = await runPip(
+      python,
+      ["wheel", "--wheel-dir", WHEELHOUSE_DIR, "--find-links", WHEELHOUSE_DIR, ...requirements],
+      WHEELHOUSE_DIR,
+      options
+    );
+    await this.countDownloads(before);
+    return result;
+  }
+
+  async prune(options: PruneOptions): Promise<{ removed: number; bytesFreed: number }> {
+    const wheels = Array.from((await this.listWheels()).entries())
+      .map(([name, stat]) => ({ name, size: stat.size, usedAt: stat.mtimeMs }))
+      .sort((a, b) => a.usedAt - b.usedAt);
+
+    let total = wheels.reduce((sum, wheel) => sum + wheel.size, 0);
+    const cutoff = options.olderThanDays !== undefined ? Date.now() - options.olderThanDays * 24 * 60 * 60 * 1000 : null;
+    let removed = 0;
+    let bytesFreed = 0;
+
+    for (const wheel of wheels) {
+      const expired = cutoff !== null && wheel.usedAt < cutoff;
+      const overBudget = options.maxBytes !== undefined && total > options.maxBytes;
+      if (!expired && !overBudget) continue;
+
+      await fs.promises.rm(path.join(WHEELHOUSE_DIR, wheel.name), { force: true });
+      total -= wheel.size;
+      removed++;
+      bytesFreed += wheel.size;
+    }
+
+    if (removed > 0) {
+      console.log(`[Wheelhouse] Pruned ${removed} wheels (${bytesFreed} bytes)`);
+    }
+    return { removed, bytesFreed };
+  }
+
+  async getStats(): Promise<WheelhouseStats> {
+    const wheels = await this.listWheels();
+    let bytes = 0;
+    wheels.forEach((stat) => {
+      bytes += stat.size;
+    });
+    return { wheels: wheels.size, bytes, ...this.counters };
+  }
+
+  // Concurrent installs of the same requirements share one `pip wheel` run;
+  // its output goes to every install waiting on it from the moment it joined
+  private async fetch(python: string, requirementArgs: string[], cwd: string, onOutput?: PipOptions["onOutput"]): Promise<void> {
+    const key = await this.fetchKey(requirementArgs, cwd);
+    let pending = this.fetching.get(key);
+    if (!pending) {
+      const listeners: Set<NonNullable<PipOptions["onOutput"]>> = new Set();
+      const done = (async () => {
+        const before = await this.listWheels();
+        await runPip(python, ["wheel", "--wheel-dir", WHEELHOUSE_DIR, "--find-links", WHEELHOUSE_DIR, ...requirementArgs], cwd, {
+          onOutput: (data) => listeners.forEach((listener) => listener(data)),
+        });
+        await this.countDownloads(before);
+      })().finally(() => this.fetching.delete(key));
+      pending = { done, listeners };
+      this.fetching.set(key, pending);
+    } else {
+      onOutput?.(Buffer.from("Waiting for a download of the same requirements that is already running...\n"));
+    }
+
+    if (onOutput) pending.listeners.add(onOutput);
+    try {
+      await pending.done;
+    } finally {
+      if (onOutput) pending.listeners.delete(onOutput);
+    }
+  }
+
+  // Requirement files are keyed by content so edits are never served a stale fetch
+  private async fetchKey(requirementArgs: string[], cwd: string): Promise<string> {
+    const hash = createHash("sha256");
+    for (let i = 0; i < requirementArgs.length; i++) {
+      hash.update(`${requirementArgs[i]}\n`);
+      if (requirementArgs[i] === "-r" && i + 1 < requirementArgs.length) {
+        const content = await fs.promises.readFile(path.resolve(cwd, requirementArgs[i + 1]), "utf-8").catch(() => "");
+        hash.update(content);
+      }
+    }
+    return hash.digest("hex");
+  }
+
+  private async isOnline(): Promise<boolean> {
+    if (WHEELHOUSE_OFFLINE === "true") return false;
+    if (WHEELHOUSE_OFFLINE === "false") return true;
+
+    if (this.online && Date.now() - this.online.checkedAt < CONNECTIVITY_CHECK_TTL_MS) {
+      return this.online.value;
+    }
+    const value = await dns.lookup(PACKAGE_INDEX_HOST).then(
+      () => true,
+      () => false
+    );
+    this.online = { value, checkedAt: Date.now() };
+    return value;
+  }
+
+  private async listWheels(): Promise<Map<string, fs.Stats>> {
+    const wheels = new Map<string, fs.Stats>();
+    let names: string[];
+    try {
+      names = await fs.promises.readdir(WHEELHOUSE_DIR);
+    } catch {
+      return wheels;
+    }
+    for (const name of names) {
+      if (!name.endsWith(".whl")) continue;
+      const stat = await fs.promises.stat(path.join(WHEELHOUSE_DIR, name)).catch(() => null);
+      if (stat) wheels.set(name, stat);
+    }
+    return wheels;
+  }
+
+  private async countDownloads(before: Map<string, fs.Stats>): Promise<void> {
+    const after = await this.listWheels();
+    after.forEach((stat, name) => {
+      if (before.has(name)) return;
+      this.counters.cacheMisses++;
+      this.counters.bytesDownloaded += stat.size;
+    });
+  }
+
+  // pip reports every wheel it installs from --find-links as "Processing <path>.whl".
+  // Wheels that were cached before this install count as hits; their mtime is
+  // bumped so pruning evicts the least recently used wheels first.
+  private async recordUsage(used: Set<string>, before: Map<string, fs.Stats>): Promise<void> {
+    const now = new Date();
+    for (const name of Array.from(used)) {
+      const cached = before.get(name);
+      if (cached) {
+        this.counters.cacheHits++;
+        this.counters.bytesSaved += cached.size;
+      }
+      await fs.promises.utimes(path.join(WHEELHOUSE_DIR, name), now, now).catch(() => undefined);
+    }
+  }
+}
+
+export const wheelhouse = new Wheelhouse();
@@ -0,0 +1,16 @@
+// Worker node entry point: runs repositories placed here by the API server's
+// scheduler. Several workers can run on one machine for testing by giving each
+// its own NODE_ID and WORKER_DATA_DIR.
+import * as fs from "fs";
+import * as path from "path";
+
+// runtime/, pyenvs/, logs/ and the other working directories are resolved
+// against the current directory when modules load, so switch first
+const WORKER_DATA_DIR = process.env.WORKER_DATA_DIR;
+if (WORKER_DATA_DIR) {
+  const dataDir = path.resolve(WORKER_DATA_DIR);
+  fs.mkdirSync(dataDir, { recursive: true });
+  process.chdir(dataDir);
+}
+
+import("./workerAgent").then(({ workerAgent }) => workerAgent.start());
@@ -0,0 +1,155 @@
+import * as os from "os";
+import WebSocket from "ws";
+import { pythonProcessManager } from "./pythonProcessManager";
+import { processMetrics } from "./processMetrics";
+import { interpreterRegistry } from "./interpreters";
+import { processSupervisor } from "./supervisor";
+import { nodeOperations, readCapacity, type NodeMethod } from "./nodeOperations";
+import type { JobContext } from "./jobQueue";
+
+// ws(s)://host:SCHEDULER_PORT of the API server
+const SCHEDULER_URL = process.env.SCHEDULER_URL || "";
+const WORKER_TOKEN = process.env.WORKER_TOKEN || "";
+const NODE_ID = process.env.NODE_ID || os.hostname();
+const HEARTBEAT_INTERVAL_MS = 5 * 1000;
+const MAX_RECONNECT_DELAY_MS = 30 * 1000;
+// Repositories are stopped after the connection has been down this long, so
+// they never run twice once the scheduler starts them elsewhere. Keep it
+// below the API server's NODE_LOST_AFTER_MS.
+const WORKER_FENCE_AFTER_MS = parseInt(process.env.WORKER_FENCE_AFTER_MS || "45000", 10);
+
+/**
+ * Runs repositories on this host for the API server's scheduler. The agent
+ * keeps one outgoing connection, answers start/stop/sync/metrics requests with
+ * the local process manager and forwards logs, metrics, exits and status
+ * transitions (already written to the database here). Processes keep running
+ * through short disconnects and the scheduler reconciles them when the agent
+ * reconnects; after WORKER_FENCE_AFTER_MS the agent stops them itself.
+ */
+class WorkerAgent {
+  private ws: WebSocket | null = null;
+  private reconnectDelay = 1000;
+  private fenceTimer: NodeJS.Timeout | null = null;
+  // Aborts the running context requests (commands, package changes) by request id
+  private cancellations: Map<number, AbortController> = new Map();
+
+  start(): void {
+    if (!SCHEDULER_URL || !WORKER_TOKEN) {
+      console.error("[Worker] SCHEDULER_URL and WORKER_TOKEN must be set");
+      process.exit(1);
+    }
+
+    interpreterRegistry.discover().catch((error) => console.error("[Worker] Interpreter discovery failed:", error));
+
+    pythonProcessManager.onLogLines((repositoryId, entries) => this.send({ type: "logs", repositoryId, entries }));
+    processMetrics.subscribeAll((repositoryId, sample) => this.send({ type: "metrics", repositoryId, sample }));
+    pythonProcessManager.onProcessExit((event) => this.send({ type: "exit", event }));
+    pythonProcessManager.onStatusChange((event) => this.send({ type: "status", event }));
+    pythonProcessManager.onFileSync((repositoryId, action) => this.send({ type: "file_sync", repositoryId, action }));
+
+    setInterval(() => this.heartbeat(), HEARTBEAT_INTERVAL_MS);
+    this.connect();
+  }
+
+  private connect(): void {
+    const ws = new WebSocket(SCHEDULER_URL);
+    this.ws = ws;
+
+    ws.on("open", () => {
+      this.reconnectDelay = 1000;
+      if (this.fenceTimer) {
+        clearTimeout(this.fenceTimer);
+        this.fenceTimer = null;
+      }
+      console.log(`[Worker] Connected to ${SCHEDULER_URL} as ${NODE_ID}`);
+      ws.send(JSON.stringify({ type: "hello", nodeId: NODE_ID, token: WORKER_TOKEN, capacity: readCapacity(), running: this.running() }));
+    });
+
+    ws.on("message", (data) => {
+      try {
+        const message = JSON.parse(data.toString());
+        if (message.type === "request") {
+          this.handleRequest(message.id, message.method, message.args, message.withContext === true);
+        } else if (message.type === "cancel") {
+          this.cancellations.get(message.id)?.abort();
+        }
+      } catch (error) {
+        console.error("[Worker] Invalid message from scheduler:", error);
+      }
+    });
+
+    ws.on("close", (code, reason) => {
+      if (this.ws === ws) this.ws = null;
+      if (!this.fenceTimer && WORKER_FENCE_AFTER_MS > 0) {
+        this.fenceTimer = setTimeout(() => this.fence(), WORKER_FENCE_AFTER_MS);
+      }
+      console.warn(`[Worker] Disconnected from scheduler (${code}${reason.length ? ` ${reason}` : ""}); retrying in ${this.reconnectDelay}ms`);
+      setTimeout(() => this.connect(), this.reconnectDelay);
+      this.reconnectDelay = Math.min(this.reconnectDelay * 2, MAX_RECONNECT_DELAY_MS);
+    });
+
+    ws.on("error", (error) => {
+      console.error("[Worker] Connection error:", error.message);
+    });
+  }
+
+  private async handleRequest(id: number, method: NodeMethod, args: unknown[], withContext: boolean): Promise<void> {
+    const operation = nodeOperations[method] as ((...params: unknown[]) => Promise<unknown>) | undefined;
+    if (!operation) {
+      this.send({ type: "response", id, error: `Unknown method: ${method}` });
+      return;
+    }
+
+    if (withContext) {
+      const controller = new AbortController();
+      this.cancellations.set(id, controller);
+      const context: JobContext = {
+        signal: controller.signal,
+        onOutput: (data) => this.send({ type: "output", id, data: Buffer.from(data).toString("base64") }),
+      };
+      args = [...args, context];
+    }
+
+    try {
+      const result = await operation(...args);
+      this.send({ type: "response", id, result: result ?? null });
+    } catch (error: any) {
+      this.send({ type: "response", id, error: error?.message ?? String(error) });
+    } finally {
+      this.cancellations.delete(id);
+    }
+    if (method === "start" || method === "stop" || method === "abandon") {
+      this.heartbeat();
+    }
+  }
+
+  // Without the scheduler this node cannot tell whether its repositories were
+  // started elsewhere, so it stops them (and any pending restarts) before the
+  // scheduler replaces it. Their database status stays, so they are restarted
+  // wherever the scheduler places them next.
+  private fence(): void {
+    this.fenceTimer = null;
+    const running = this.running();
+    console.warn(`[Worker] No scheduler connection for ${WORKER_FENCE_AFTER_MS}ms; stopping ${running.length} repositories`);
+    processSupervisor.forgetAll();
+    running.forEach((repositoryId) => pythonProcessManager.abandon(repositoryId, "this node lost contact with the scheduler"));
+    this.cancellations.forEach((controller) => controller.abort());
+  }
+
+  private heartbeat(): void {
+    this.send({ type: "heartbeat", capacity: readCapacity(), running: this.running() });
+  }
+
+  private running(): string[] {
+    return pythonProcessManager.getRunningProcesses().map((entry) => entry.repositoryId);
+  }
+
+  // Messages are dropped while disconnected; logs are still kept in the worker's own log store
+  private send(message: object): void {
+    if (this.ws && this.ws.readyState === WebSocket.OPEN) {
+      this.ws.send(JSON.stringify(message));
+    }
+  }
+}
+
+export const workerAgent = new WorkerAgent();
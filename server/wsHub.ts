@@ -0,0 +1,271 @@
+import type { IncomingMessage, Server } from "http";
+import type { RequestHandler } from "express";
+import { WebSocketServer, WebSocket } from "ws";
+
+// Repository status changes are not a topic; they go to all of the owner's sockets
+export type Topic = "logs" | "file-sync" | "metrics" | "jobs";
+export const TOPICS: Topic[] = ["logs", "file-sync", "metrics", "jobs"];
+
+// Outgoing bytes a client may have queued before frames are skipped for it
+const WS_MAX_BUFFERED_BYTES = parseInt(process.env.WS_MAX_BUFFERED_BYTES || String(1024 * 1024), 10);
+const HEARTBEAT_INTERVAL_MS = 30 * 1000;
+// Connections without any subscription are closed after this long without traffic
+const IDLE_TIMEOUT_MS = 5 * 60 * 1000;
+
+type Payload = Record<string, unknown>;
+
+interface TopicHandlers {
+  // Start producing messages for a repository; called when its first subscriber arrives.
+  // Returns a function that stops the source once the last subscriber leaves.
+  source?: (repositoryId: string, publish: (payload: Payload) => void) => () => void;
+  // Initial state sent only to a new subscriber (e.g. buffered log history)
+  replay?: (repositoryId: string) => Payload | null;
+}
+
+interface Client {
+  ws: WebSocket;
+  userId: string;
+  // Whether the session the socket was opened with still belongs to userId
+  sessionActive: () => Promise<boolean>;
+  subscriptions: Set<string>;
+  isAlive: boolean;
+  lastActivity: number;
+  skippedFrames: number;
+}
+
+type Authorizer = (userId: string, repositoryId: string) => Promise<boolean>;
+
+/**
+ * One WebSocket per browser session, multiplexing any number of
+ * (topic, repository) subscriptions. Each published message is serialised
+ * once and the same buffer is sent to every subscriber.
+ */
+class WebSocketHub {
+  private clients: Set<Client> = new Set();
+  // Every open socket of a user, for events that are not tied to a repository
+  private clientsByUser: Map<string, Set<Client>> = new Map();
+  private subscribers: Map<string, Set<Client>> = new Map();
+  private detachers: Map<string, () => void> = new Map();
+  private handlers: Map<Topic, TopicHandlers> = new Map();
+
+  registerTopic(topic: Topic, handlers: TopicHandlers): void {
+    this.handlers.set(topic, handlers);
+  }
+
+  attach(server: Server, sessionParser: RequestHandler, authorize: Authorizer): void {
+    // Resolve the browser session during the upgrade so messages sent right
+    // after the socket opens are never processed without a user
+    const wss = new WebSocketServer({
+      server,
+      path: "/ws",
+      verifyClient: (info, done) => {
+        sessionParser(info.req as any, {} as any, () => {
+          const userId = (info.req as any).session?.userId;
+          done(Boolean(userId), 401, "Unauthorized");
+        });
+      },
+    });
+
+    wss.on("connection", (ws: WebSocket, req: IncomingMessage) => {
+      const { sessionID, sessionStore } = req as any;
+      const userId = (req as any).session.userId as string;
+      const sessionActive = () =>
+        new Promise<boolean>((resolve) => {
+          sessionStore.get(sessionID, (error: unknown, session: any) => resolve(!error && session?.userId === userId));
+        });
+      this.addClient(ws, userId, sessionActive, authorize);
+    });
+
+    const heartbeat = setInterval(() => {
+      const now = Date.now();
+      this.clients.forEach((client) => {
+        if (!client.isAlive) {
+          client.ws.terminate();
+          return;
+        }
+        if (client.subscriptions.size === 0 && now - client.lastActivity > IDLE_TIMEOUT_MS) {
+          client.ws.close(1000, "Idle");
+          return;
+        }
+        client.isAlive = false;
+        client.ws.ping();
+      });
+    }, HEARTBEAT_INTERVAL_MS);
+    heartbeat.unref();
+
+    wss.on("close", () => clearInterval(heartbeat));
+  }
+
+  publish(topic: Topic, repositoryId: string, payload: Payload): void {
+    const subscribers = this.subscribers.get(this.key(topic, repositoryId));
+    if (!subscribers || subscribers.size === 0) return;
+
+    const frame = Buffer.from(JSON.stringify({ ...payload, topic, repositoryId }));
+    subscribers.forEach((client) => this.send(client, frame));
+  }
+
+  // Sends to all of a user's sockets without a subscription; the payload
+  // carries no topic, so clients receive it through their global handlers
+  publishToUser(userId: string, payload: Payload): void {
+    const clients = this.clientsByUser.get(userId);
+    if (!clients || clients.size === 0) return;
+
+    const frame = Buffer.from(JSON.stringify(payload));
+    clients.forEach((client) => this.send(client, frame));
+  }
+
+  hasSubscribers(topic: Topic, repositoryId: string): boolean {
+    return (this.subscribers.get(this.key(topic, repositoryId))?.size ?? 0) > 0;
+  }
+
+  private addClient(ws: WebSocket, userId: string, sessionActive: () => Promise<boolean>, authorize: Authorizer): void {
+    const client: Client = {
+      ws,
+      userId,
+      sessionActive,
+      subscriptions: new Set(),
+      isAlive: true,
+      lastActivity: Date.now(),
+      skippedFrames: 0,
+    };
+    this.clients.add(client);
+    let userClients = this.clientsByUser.get(userId);
+    if (!userClients) {
+      userClients = new Set();
+      this.clientsByUser.set(userId, userClients);
+    }
+    userClients.add(client);
+
+    ws.on("pong", () => {
+      client.isAlive = true;
+    });
+
+    ws.on("message", async (data) => {
+      client.isAlive = true;
+      client.lastActivity = Date.now();
+
+      try {
+        const message = JSON.parse(data.toString());
+
+        if (message.type === "ping") {
+          this.sendPayload(client, { type: "pong" });
+          return;
+        }
+
+        const repositoryId = message.repositoryId;
+        if ((message.type !== "subscribe" && message.type !== "unsubscribe") || typeof repositoryId !== "string") {
+          return;
+        }
+
+        // Older clients subscribe without a topic and expect logs plus file sync events
+        const topics: Topic[] = message.topic ? [message.topic] : ["logs", "file-sync"];
+        if (!topics.every((topic) => TOPICS.includes(topic))) {
+          this.sendPayload(client, { type: "error", message: `Unknown topic: ${message.topic}` });
+          return;
+        }
+
+        if (message.type === "unsubscribe") {
+          topics.forEach((topic) => this.unsubscribe(client, topic, repositoryId));
+          return;
+        }
+
+        // Checked on every subscribe, not once per socket, so a logout or lost access
+        // since the socket opened is honoured; both lookups are served from the auth cache
+        if (!(await client.sessionActive())) {
+          client.ws.close(1008, "Session ended");
+          return;
+        }
+        if (!(await authorize(client.userId, repositoryId))) {
+          this.sendPayload(client, { type: "error", repositoryId, message: "Repository not found" });
+          return;
+        }
+
+        topics.forEach((topic) => this.subscribe(client, topic, repositoryId));
+      } catch (error) {
+        console.error("Error processing WebSocket message:", error);
+      }
+    });
+
+    ws.on("close", () => {
+      this.clients.delete(client);
+      const userClients = this.clientsByUser.get(client.userId);
+      userClients?.delete(client);
+      if (userClients?.size === 0) {
+        this.clientsByUser.delete(client.userId);
+      }
+      Array.from(client.subscriptions).forEach((key) => {
+        const [topic, repositoryId] = this.parseKey(key);
+        this.unsubscribe(client, topic, repositoryId);
+      });
+    });
+  }
+
+  private subscribe(client: Client, topic: Topic, repositoryId: string): void {
+    const key = this.key(topic, repositoryId);
+    if (client.subscriptions.has(key) || client.ws.readyState !== WebSocket.OPEN) return;
+
+    let subscribers = this.subscribers.get(key);
+    if (!subscribers) {
+      subscribers = new Set();
+      this.subscribers.set(key, subscribers);
+    }
+    subscribers.add(client);
+    client.subscriptions.add(key);
+
+    const handlers = this.handlers.get(topic);
+    const initial = handlers?.replay?.(repositoryId);
+    if (initial) {
+      this.sendPayload(client, { ...initial, topic, repositoryId });
+    }
+
+    if (handlers?.source && !this.detachers.has(key)) {
+      this.detachers.set(key, handlers.source(repositoryId, (payload) => this.publish(topic, repositoryId, payload)));
+    }
+  }
+
+  private unsubscribe(client: Client, topic: Topic, repositoryId: string): void {
+    const key = this.key(topic, repositoryId);
+    client.subscriptions.delete(key);
+
+    const subscribers = this.subscribers.get(key);
+    if (!subscribers) return;
+    subscribers.delete(client);
+
+    if (subscribers.size === 0) {
+      this.subscribers.delete(key);
+      const detach = this.detachers.get(key);
+      this.detachers.delete(key);
+      detach?.();
+    }
+  }
+
+  // Skip frames for clients that cannot keep up instead of queueing them in memory
+  private send(client: Client, frame: Buffer): void {
+    const { ws } = client;
+    if (ws.readyState !== WebSocket.OPEN) return;
+    if (ws.bufferedAmount > WS_MAX_BUFFERED_BYTES) {
+      client.skippedFrames++;
+      return;
+    }
+    if (client.skippedFrames > 0) {
+      ws.send(JSON.stringify({ type: "frames_skipped", count: client.skippedFrames }));
+      client.skippedFrames = 0;
+    }
+    ws.send(frame, { binary: false });
+  }
+
+  private sendPayload(client: Client, payload: Payload): void {
+    this.send(client, Buffer.from(JSON.stringify(payload)));
+  }
+
+  private key(topic: Topic, repositoryId: string): string {
+    return `${topic}:${repositoryId}`;
+  }
+
+  private parseKey(key: string): [Topic, string] {
+    const separator = key.indexOf(":");
+    return [key.slice(0, separator) as Topic, key.slice(separator + 1)];
+  }
+}
+
+export const webSocketHub = new WebSocketHub();
@@ -0,0 +1,442 @@
+import { spawn, type ChildProcess } from "child_process";
+import { randomUUID } from "crypto";
+import { EventEmitter } from "events";
+import * as fs from "fs";
+import * as net from "net";
+import * as os from "os";
+import * as path from "path";
+import { PassThrough, type Readable } from "stream";
+import { APPLY_LIMITS_SOURCE, RUN_SCRIPT_SOURCE, launcherEnv, type Interpreter, type LaunchSpec } from "./interpreters";
+import { resourceLimits } from "./resourceLimits";
+
+// Modules imported once by each zygote before it forks hosted processes
+const ZYGOTE_PRELOAD = (process.env.ZYGOTE_PRELOAD || "telegram,telegram.ext").split(",").map((m) => m.trim()).filter(Boolean);
+// Zygotes without running children are shut down after this long
+const ZYGOTE_IDLE_MS = parseInt(process.env.ZYGOTE_IDLE_MS || String(30 * 60 * 1000), 10);
+const FORK_TIMEOUT_MS = 5000;
+// How long an exited child's output streams may keep draining before "exit" is emitted
+const STREAM_DRAIN_MS = 500;
+
+// Preimports ZYGOTE_PRELOAD, then forks one child per JSON spec read from stdin.
+// Each child starts its own session, connects stdin/stdout/stderr to the
+// server's Unix socket and runs the script. The zygote reports forks and
+// child exits as JSON lines on its original stdout. A child with a cgroup in
+// its limits first waits on a pipe until the server, having moved it into the
+// group, sends {"release": token}.
+const ZYGOTE_SOURCE = `
+import gc, importlib, json, os, select, signal, socket, sys
+${RUN_SCRIPT_SOURCE}
+${APPLY_LIMITS_SOURCE}
+
+CONTROL_FD = os.dup(1)
+
+def emit(message):
+    os.write(CONTROL_FD, (json.dumps(message) + "\\n").encode())
+
+for name in sys.argv[1:]:
+    try:
+        importlib.import_module(name)
+    except Exception as error:
+        emit({"event": "preload_failed", "module": name, "error": str(error)})
+gc.collect()
+if hasattr(gc, "freeze"):
+    gc.freeze()
+
+wakeup_r, wakeup_w = os.pipe()
+os.set_blocking(wakeup_w, False)
+signal.set_wakeup_fd(wakeup_w)
+signal.signal(signal.SIGCHLD, lambda signum, frame: None)
+emit({"event": "ready"})
+
+def reap():
+    while True:
+        try:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            return
+        if pid == 0:
+            return
+        if os.WIFSIGNALED(status):
+            emit({"event": "exit", "pid": pid, "code": None, "signal": os.WTERMSIG(status)})
+        else:
+            emit({"event": "exit", "pid": pid, "code": os.WEXITSTATUS(status), "signal": None})
+
+# Write ends of the pipes children wait on until placed, by launch token
+gates = {}
+
+def become_child(spec, gate):
+    os.setsid()
+    signal.set_wakeup_fd(-1)
+    signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+    for fd in [wakeup_r, wakeup_w, CONTROL_FD] + list(gates.values()):
+        os.close(fd)
+    if gate is not None:
+        os.read(gate, 1)
+        os.close(gate)
+    for fd, stream in ((0, "stdin"), (1, "stdout"), (2, "stderr")):
+        conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        conn.connect(spec["socket"])
+        conn.sendall(("%s %s\\n" % (spec["token"], stream)).encode())
+        os.dup2(conn.fileno(), fd)
+        conn.close()
+    os.chdir(spec["cwd"])
+    os.environ.clear()
+    os.environ.update(spec["env"])
+    script = os.path.abspath(spec["script"])
+    sys.argv = [spec["script"]]
+    sys.path[0:1] = [os.path.dirname(script)] + spec["path"]
+    if spec.get("limits"):
+        apply_limits(spec["limits"])
+    run_script(script)
+
+pending = b""
+while True:
+    readable, _, _ = select.select([0, wakeup_r], [], [])
+    if wakeup_r in readable:
+        os.read(wakeup_r, 4096)
+        reap()
+    if 0 in readable:
+        chunk = os.read(0, 65536)
+        if not chunk:
+            break
+        pending += chunk
+        while b"\\n" in pending:
+            line, pending = pending.split(b"\\n", 1)
+            spec = json.loads(line)
+            if "release" in spec:
+                gate = gates.pop(spec["release"], None)
+                if gate is not None:
+                    try:
+                        os.write(gate, b"1")
+                    except OSError:
+                        pass  # the child is already gone
+                    os.close(gate)
+                continue
+            gate = None
+            if (spec.get("limits") or {}).get("cgroup"):
+                gate, gates[spec["token"]] = os.pipe()
+            pid = os.fork()
+            if pid == 0:
+                become_child(spec, gate)
+                sys.exit(0)
+            if gate is not None:
+                os.close(gate)
+            emit({"event": "forked", "token": spec["token"], "pid": pid})
+`;
+
+// What the process manager needs from a hosted process; satisfied by both
+// ChildProcess and ZygoteProcess
+export interface HostedProcess {
+  readonly pid?: number | undefined;
+  readonly stdout: Readable | null;
+  readonly stderr: Readable | null;
+  kill(signal?: NodeJS.Signals): boolean;
+  on(event: "exit", listener: (code: number | null, signal: NodeJS.Signals | null) => void): this;
+  on(event: "error", listener: (error: Error) => void): this;
+}
+
+const SIGNAL_NAMES = new Map<number, NodeJS.Signals>(
+  Object.entries(os.constants.signals).map(([name, value]) => [value, name as NodeJS.Signals])
+);
+
+/**
+ * A process forked by a zygote. It is not a child of the server, so it
+ * mirrors the parts of ChildProcess the process manager uses: pid, stdio
+ * streams, kill() and the "exit" event.
+ */
+export class ZygoteProcess extends EventEmitter {
+  pid: number | undefined;
+  readonly stdin = new PassThrough();
+  readonly stdout = new PassThrough();
+  readonly stderr = new PassThrough();
+  exitCode: number | null = null;
+  signalCode: NodeJS.Signals | null = null;
+  private openStreams = 0;
+  private drainWaiters: Array<() => void> = [];
+
+  kill(signal: NodeJS.Signals = "SIGTERM"): boolean {
+    if (!this.pid || this.exitCode !== null || this.signalCode !== null) return false;
+    try {
+      // The child leads its own session, so this reaches anything it spawned too
+      process.kill(-this.pid, signal);
+      return true;
+    } catch {
+      return false;
+    }
+  }
+
+  attachStream(stream: string, socket: net.Socket): void {
+    if (stream === "stdin") {
+      this.stdin.pipe(socket);
+      socket.on("error", () => undefined);
+      return;
+    }
+    const target = stream === "stdout" ? this.stdout : this.stderr;
+    this.openStreams++;
+    socket.on("data", (data) => target.write(data));
+    socket.on("error", () => undefined);
+    socket.on("close", () => {
+      this.openStreams--;
+      if (this.openStreams === 0) {
+        this.drainWaiters.splice(0).forEach((resolve) => resolve());
+      }
+    });
+  }
+
+  // Emit "exit" once the output sockets have drained, like ChildProcess does
+  finish(code: number | null, signal: NodeJS.Signals | null): void {
+    if (this.exitCode !== null || this.signalCode !== null) return;
+    this.exitCode = code;
+    this.signalCode = signal;
+
+    const drained = this.openStreams === 0 ? Promise.resolve() : new Promise<void>((resolve) => this.drainWaiters.push(resolve));
+    const timeout = new Promise<void>((resolve) => setTimeout(resolve, STREAM_DRAIN_MS));
+    Promise.race([drained, timeout]).then(() => {
+      this.stdout.end();
+      this.stderr.end();
+      this.stdin.destroy();
+      this.emit("exit", code, signal);
+    });
+  }
+}
+
+interface ZygoteState {
+  key: string;
+  process: ChildProcess;
+  ready: Promise<void>;
+  children: Map<number, ZygoteProcess>;
+  pendingForks: Map<
+    string,
+    { child: ZygoteProcess; cgroup: string | null; resolve: (pid: number) => void; reject: (error: Error) => void }
+  >;
+  idleTimer: NodeJS.Timeout | null;
+}
+
+/**
+ * Long-lived Python processes, one per interpreter and dependency
+ * environment, that preimport heavy modules (python-telegram-bot by default)
+ * and fork a child per repository start. Children skip interpreter startup
+ * and those imports, and share the preimported pages copy-on-write.
+ */
+class ZygotePool {
+  private zygotes: Map<string, ZygoteState> = new Map();
+  // Children whose stdio sockets have not connected yet, by launch token
+  private awaitingStreams: Map<string, ZygoteProcess> = new Map();
+  private server: net.Server | null = null;
+  private socketPath = path.join(os.tmpdir(), `hostyria-zygote-${process.pid}.sock`);
+
+  async launch(interpreter: Interpreter, sitePackages: string | null, spec: LaunchSpec): Promise<ZygoteProcess> {
+    await this.ensureServer();
+    const zygote = this.getZygote(interpreter, sitePackages);
+    await zygote.ready;
+
+    const token = randomUUID();
+    const child = new ZygoteProcess();
+    this.awaitingStreams.set(token, child);
+
+    const pid = await new Promise<number>((resolve, reject) => {
+      const timer = setTimeout(() => {
+        zygote.pendingForks.delete(token);
+        reject(new Error("Zygote did not fork in time"));
+      }, FORK_TIMEOUT_MS);
+      zygote.pendingForks.set(token, {
+        child,
+        cgroup: spec.limits?.cgroup ?? null,
+        resolve: (pid) => {
+          clearTimeout(timer);
+          resolve(pid);
+        },
+        reject: (error) => {
+          clearTimeout(timer);
+          reject(error);
+        },
+      });
+      zygote.process.stdin?.write(JSON.stringify({ ...spec, token, socket: this.socketPath }) + "\n");
+    }).catch((error) => {
+      this.awaitingStreams.delete(token);
+      throw error;
+    });
+
+    this.touch(zygote);
+    child.once("exit", () => {
+      this.awaitingStreams.delete(token);
+      zygote.children.delete(pid);
+      this.touch(zygote);
+    });
+    return child;
+  }
+
+  private getZygote(interpreter: Interpreter, sitePackages: string | null): ZygoteState {
+    const key = `${interpreter.version}:${sitePackages ?? ""}`;
+    const existing = this.zygotes.get(key);
+    if (existing) return existing;
+
+    const env = launcherEnv(interpreter);
+    if (sitePackages) {
+      env.PYTHONPATH = [sitePackages, process.env.PYTHONPATH].filter(Boolean).join(path.delimiter);
+    }
+    const child = spawn(interpreter.executable, ["-u", "-c", ZYGOTE_SOURCE, ...ZYGOTE_PRELOAD], {
+      env,
+      stdio: ["pipe", "pipe", "pipe"],
+    });
+
+    let markReady!: () => void;
+    let markFailed!: (error: Error) => void;
+    const state: ZygoteState = {
+      key,
+      process: child,
+      ready: new Promise<void>((resolve, reject) => {
+        markReady = resolve;
+        markFailed = reject;
+      }),
+      children: new Map(),
+      pendingForks: new Map(),
+      idleTimer: null,
+    };
+    // Callers handle rejection through launch(); avoid unhandled rejections here
+    state.ready.catch(() => undefined);
+    this.zygotes.set(key, state);
+
+    let buffer = "";
+    child.stdout?.on("data", (data: Buffer) => {
+      buffer += data.toString();
+      let newline: number;
+      while ((newline = buffer.indexOf("\n")) !== -1) {
+        const line = buffer.slice(0, newline);
+        buffer = buffer.slice(newline + 1);
+        try {
+          this.handleControlMessage(state, JSON.parse(line), markReady);
+        } catch (error) {
+          console.error(`[Zygote] Invalid control message from ${key}:`, line);
+        }
+      }
+    });
+    child.stderr?.on("data", (data: Buffer) => {
+      console.error(`[Zygote ${key}] ${data.toString().trimEnd()}`);
+    });
+
+    const onGone = (error?: Error) => {
+      if (this.zygotes.get(key) !== state) return;
+      this.zygotes.delete(key);
+      if (state.idleTimer) clearTimeout(state.idleTimer);
+      markFailed(error ?? new Error("Zygote exited"));
+      state.pendingForks.forEach((pending) => pending.reject(new Error("Zygote exited")));
+
+      // Orphaned children can no longer be reaped or tracked; stop them so the
+      // supervisor sees an exit and restarts them normally
+      state.children.forEach((orphan) => {
+        orphan.kill("SIGKILL");
+        orphan.finish(null, "SIGKILL");
+      });
+    };
+    child.on("exit", () => onGone());
+    child.on("error", (error) => onGone(error));
+
+    console.log(`[Zygote] Started ${key} preloading ${ZYGOTE_PRELOAD.join(", ") || "nothing"}`);
+    return state;
+  }
+
+  private handleControlMessage(state: ZygoteState, message: any, markReady: () => void): void {
+    switch (message.event) {
+      case "ready":
+        markReady();
+        this.touch(state);
+        break;
+      case "preload_failed":
+        console.warn(`[Zygote ${state.key}] Could not preload ${message.module}: ${message.error}`);
+        break;
+      case "forked": {
+        const pending = state.pendingForks.get(message.token);
+        if (!pending) {
+          // The launch already timed out; nothing will track this child
+          try {
+            process.kill(-message.pid, "SIGKILL");
+          } catch {}
+          this.release(state, message.token);
+          break;
+        }
+        state.pendingForks.delete(message.token);
+        if (pending.cgroup) {
+          resourceLimits.place(pending.cgroup, message.pid);
+          this.release(state, message.token);
+        }
+        // Registered before resolving so an immediate exit report is not lost
+        pending.child.pid = message.pid;
+        state.children.set(message.pid, pending.child);
+        pending.resolve(message.pid);
+        break;
+      }
+      case "exit": {
+        const child = state.children.get(message.pid);
+        const signal = message.signal ? SIGNAL_NAMES.get(message.signal) ?? null : null;
+        child?.finish(message.code, signal);
+        break;
+      }
+    }
+  }
+
+  // Let a forked child waiting for its cgroup placement continue; unknown tokens are ignored
+  private release(state: ZygoteState, token: string): void {
+    state.process.stdin?.write(JSON.stringify({ release: token }) + "\n");
+  }
+
+  private async ensureServer(): Promise<void> {
+    if (this.server) return;
+
+    await fs.promises.rm(this.socketPath, { force: true });
+    const server = net.createServer((socket) => this.acceptStream(socket));
+    this.server = server;
+    await new Promise<void>((resolve, reject) => {
+      server.once("error", reject);
+      server.listen(this.socketPath, () => resolve());
+    });
+    server.unref();
+  }
+
+  // Each connection starts with "<token> <stdin|stdout|stderr>\n"
+  private acceptStream(socket: net.Socket): void {
+    let header = Buffer.alloc(0);
+    const onData = (chunk: Buffer) => {
+      header = Buffer.concat([header, chunk]);
+      const newline = header.indexOf(10);
+      if (newline === -1) {
+        if (header.length > 256) socket.destroy();
+        return;
+      }
+
+      socket.off("data", onData);
+      socket.pause();
+      const rest = header.subarray(newline + 1);
+      if (rest.length > 0) socket.unshift(rest);
+
+      const [token, stream] = header.subarray(0, newline).toString().split(" ");
+      const child = this.awaitingStreams.get(token);
+      if (!child) {
+        socket.destroy();
+        return;
+      }
+      child.attachStream(stream, socket);
+      socket.resume();
+    };
+    socket.on("data", onData);
+    socket.on("error", () => undefined);
+  }
+
+  private touch(state: ZygoteState): void {
+    if (state.idleTimer) {
+      clearTimeout(state.idleTimer);
+      state.idleTimer = null;
+    }
+    if (state.children.size > 0) return;
+
+    state.idleTimer = setTimeout(() => {
+      if (state.children.size === 0) {
+        console.log(`[Zygote] Stopping idle ${state.key}`);
+        state.process.kill();
+      }
+    }, ZYGOTE_IDLE_MS);
+    state.idleTimer.unref();
+  }
+}
+
+export const zygotePool = new ZygotePool();
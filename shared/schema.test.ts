@@ -0,0 +1,66 @@
+import { test } from "node:test";
+import assert from "node:assert/strict";
+import { normalizeAmount, convertToUsd, parseUsdRate } from "./schema";
+
+test("normalizeAmount reads the formats users type", () => {
+  const cases: Array<[unknown, string]> = [
+    ["100", "100.00"],
+    ["100$", "100.00"],
+    ["$ 25", "25.00"],
+    ["10,5", "10.50"],
+    ["0,5", "0.50"],
+    ["1,000.50", "1000.50"],
+    ["1.234,56", "1234.56"],
+    ["1,000,000", "1000000.00"],
+    ["1.000.000", "1000000.00"],
+    ["1 000", "1000.00"],
+    ["1.2500", "1.25"],
+    ["١٠٠ ل.س", "100.00"],
+    ["100٬000", "100000.00"],
+    ["1٬000٫5", "1000.50"],
+    [10.5, "10.50"],
+  ];
+  for (const [input, expected] of cases) {
+    assert.equal(normalizeAmount(input), expected, `normalizeAmount(${JSON.stringify(input)})`);
+  }
+});
+
+test("normalizeAmount refuses ambiguous, imprecise and non-positive amounts", () => {
+  const cases: unknown[] = [
+    "10.000",
+    "12,345",
+    "0.001",
+    0.001,
+    "0",
+    "0.00",
+    "-5",
+    "1e5",
+    "1,00,000",
+    "1.2.3,4,5",
+    "",
+    "abc",
+    "1000000000000",
+    null,
+    undefined,
+    {},
+  ];
+  for (const input of cases) {
+    assert.equal(normalizeAmount(input), null, `normalizeAmount(${JSON.stringify(input)})`);
+  }
+});
+
+test("parseUsdRate accepts positive plain decimals only", () => {
+  assert.equal(parseUsdRate("15000"), 15000);
+  assert.equal(parseUsdRate(" 3.75 "), 3.75);
+  assert.equal(parseUsdRate("0"), null);
+  assert.equal(parseUsdRate("1,5"), null);
+  assert.equal(parseUsdRate("abc"), null);
+});
+
+test("convertToUsd divides by the rate and rounds to cents", () => {
+  assert.equal(convertToUsd("15000.00", "15000"), "1.00");
+  assert.equal(convertToUsd("37.50", "3.75"), "10.00");
+  assert.equal(convertToUsd("10.00", "3"), "3.33");
+  assert.equal(convertToUsd("1.00", "15000"), null);
+  assert.equal(convertToUsd("10.00", "abc"), null);
+});
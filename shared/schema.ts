@@ -1,6 +1,7 @@
 import { sql } from "drizzle-orm";
 import {
   index,
+  uniqueIndex,
   jsonb,
   pgTable,
   timestamp,
@@ -33,15 +34,20 @@ export const users = pgTable("users", {
   username: text("username").notNull().unique(),
   email: text("email").notNull().unique(),
   password: text("password").notNull(),
-  balance: text("balance").notNull().default("0"),
+  balance: numeric("balance", { precision: 14, scale: 2 }).notNull().default("0"),
   isAdmin: boolean("is_admin").notNull().default(false),
   telegramUsername: text("telegram_username"),
   telegramChatId: text("telegram_chat_id"),
   createdAt: timestamp("created_at").defaultNow().notNull(),
   updatedAt: timestamp("updated_at").defaultNow(),
-});
+}, (table) => [
+  index("idx_users_created").on(table.createdAt, table.id),
+  index("idx_users_telegram_chat_id").on(table.telegramChatId).where(sql`${table.telegramChatId} IS NOT NULL`),
+]);
 
 export type User = typeof users.$inferSelect;
+// A user as sent to clients: never includes the password hash
+export type PublicUser = Omit<User, "password">;
 export type InsertUser = typeof users.$inferInsert;
 
 // Payment Methods table
@@ -69,11 +75,103 @@ export const balanceRequests = pgTable("balance_requests", {
   screenshotUrl: text("screenshot_url").notNull(),
   status: text("status").notNull().default("pending"),
   createdAt: timestamp("created_at").defaultNow().notNull(),
-});
+}, (table) => [
+  index("idx_balance_requests_created").on(table.createdAt, table.id),
+  index("idx_balance_requests_user_created").on(table.userId, table.createdAt, table.id),
+  index("idx_balance_requests_status_created").on(table.status, table.createdAt, table.id),
+  index("idx_balance_requests_pending").on(table.createdAt, table.id).where(sql`${table.status} = 'pending'`),
+]);
 
 export type BalanceRequest = typeof balanceRequests.$inferSelect;
 export type InsertBalanceRequest = typeof balanceRequests.$inferInsert;
 
+// Amounts are typed by users ("100$", "10,5", "1,000.50", "1.234,56",
+// "١٠٠ ل.س"). Returns the amount as a plain decimal with two places, or null
+// when it cannot be read unambiguously as a positive number with at most two
+// decimals that fits NUMERIC(14,2).
+export function normalizeAmount(value: unknown): string | null {
+  if (typeof value !== "string" && typeof value !== "number") return null;
+  // Currency symbols or codes before and after the number are dropped; signs,
+  // exponents and anything else inside it make the amount unreadable
+  let text = String(value)
+    .replace(/[\u0660-\u0669]/g, (digit) => String(digit.charCodeAt(0) - 0x0660))
+    .replace(/[\u06f0-\u06f9]/g, (digit) => String(digit.charCodeAt(0) - 0x06f0));
+  if (text.includes("-")) return null;
+  text = text.replace(/^\D+|\D+$/g, "").replace(/\s+/g, "");
+
+  // The Arabic separators (٫ decimal, ٬ thousands) say what they are. Otherwise
+  // the later of "," and "." is the decimal separator when both appear, a
+  // repeated one groups thousands, and a single one followed by exactly three
+  // digits ("10.000") could be either, so it is refused.
+  let decimal: string | null = null;
+  if (text.includes("\u066b")) {
+    decimal = "\u066b";
+  } else if (text.includes(",") && text.includes(".")) {
+    decimal = text.lastIndexOf(",") > text.lastIndexOf(".") ? "," : ".";
+  } else {
+    const separator = text.includes(",") ? "," : text.includes(".") ? "." : null;
+    const parts = separator ? text.split(separator) : [];
+    if (parts.length === 2) {
+      if (/^\d{3}$/.test(parts[1])) return null;
+      decimal = separator;
+    }
+  }
+
+  const [integer, fraction, ...rest] = decimal ? text.split(decimal) : [text, "0"];
+  if (rest.length > 0 || !/^\d+$/.test(fraction)) return null;
+  // Plain digits, or groups of three joined by one thousands separator
+  if (!/^\d+$/.test(integer) && !/^\d{1,3}([,.\u066c])\d{3}(\1\d{3})*$/.test(integer)) return null;
+  // Sub-cent amounts are refused rather than rounded
+  if (fraction.replace(/0+$/, "").length > 2) return null;
+
+  const amount = Number(`${integer.replace(/\D/g, "")}.${fraction}`);
+  if (!(amount > 0) || amount >= 1e12) return null;
+  return amount.toFixed(2);
+}
+
+// paymentMethods.usdRate is how many units of the method's currency make one
+// USD; null when it is not a positive plain decimal
+export function parseUsdRate(usdRate: string): number | null {
+  const text = usdRate.trim();
+  if (!/^\d+(\.\d+)?$/.test(text)) return null;
+  const rate = Number(text);
+  return rate > 0 ? rate : null;
+}
+
+// Converts an amount normalized by normalizeAmount from a payment method's
+// currency to USD; null when the rate is unusable or the result rounds to zero
+export function convertToUsd(amount: string, usdRate: string): string | null {
+  const rate = parseUsdRate(usdRate);
+  if (rate === null) return null;
+  const usd = Math.round((Number(amount) / rate) * 100) / 100;
+  return usd > 0 ? usd.toFixed(2) : null;
+}
+
+// Append-only ledger behind users.balance; every balance change is one row
+export const balanceTransactions = pgTable("balance_transactions", {
+  id: uuid("id").defaultRandom().primaryKey(),
+  userId: uuid("user_id").notNull().references(() => users.id, { onDelete: "cascade" }),
+  amount: numeric("amount", { precision: 14, scale: 2 }).notNull(),
+  kind: text("kind").notNull(), // 'deposit', 'adjustment', 'opening'
+  balanceRequestId: uuid("balance_request_id").references(() => balanceRequests.id, { onDelete: "set null" }),
+  // Applying the same key twice is a no-op, e.g. 'balance_request:<id>'
+  idempotencyKey: text("idempotency_key").notNull().unique(),
+  createdAt: timestamp("created_at").defaultNow().notNull(),
+}, (table) => [
+  index("idx_balance_transactions_user_created").on(table.userId, table.createdAt, table.id),
+  index("idx_balance_transactions_kind").on(table.kind),
+]);
+
+export type BalanceTransaction = typeof balanceTransactions.$inferSelect;
+export type InsertBalanceTransaction = typeof balanceTransactions.$inferInsert;
+
+export interface BalanceSummary {
+  totalBalance: string;
+  totalDeposits: string;
+  deposits: number;
+  pendingRequests: number;
+}
+
 // Support Messages table
 export const supportMessages = pgTable("support_messages", {
   id: uuid("id").defaultRandom().primaryKey(),
@@ -81,7 +179,10 @@ export const supportMessages = pgTable("support_messages", {
   message: text("message").notNull(),
   isFromUser: boolean("is_from_user").notNull().default(true),
   createdAt: timestamp("created_at").defaultNow().notNull(),
-});
+}, (table) => [
+  index("idx_support_messages_created").on(table.createdAt, table.id),
+  index("idx_support_messages_user_created").on(table.userId, table.createdAt, table.id),
+]);
 
 export type SupportMessage = typeof supportMessages.$inferSelect;
 export type InsertSupportMessage = typeof supportMessages.$inferInsert;
@@ -92,8 +193,14 @@ export const repositoryStatus = pgEnum("repository_status", [
   "running",
   "error",
   "completed",
+  "starting",
+  "restarting",
 ]);
 
+// Statuses of repositories that are, or are about to be, running; restored
+// after a server restart and stoppable by the user
+export const activeRepositoryStatuses = ["starting", "running", "restarting"] as const;
+
 // Repositories table
 export const repositories = pgTable("repositories", {
   id: varchar("id").primaryKey().default(sql`gen_random_uuid()`),
@@ -101,12 +208,19 @@ export const repositories = pgTable("repositories", {
   name: varchar("name", { length: 255 }).notNull(),
   description: text("description"),
   mainFile: varchar("main_file", { length: 255 }),
-  pythonVersion: varchar("python_version", { length: 20 }).notNull().default("3.11"),
+  pythonVersion: varchar("python_version", { length: 20 }), // null runs on the server's default interpreter
   autoInstallFromRequirements: boolean("auto_install_from_requirements").notNull().default(false),
+  restartPolicy: varchar("restart_policy", { length: 20 }).notNull().default("on-failure"), // 'never', 'on-failure', 'always'
   status: repositoryStatus("status").notNull().default("stopped"),
-  createdAt: timestamp("created_at").defaultNow(),
+  exitReason: varchar("exit_reason", { length: 40 }), // resource limit that ended the last run: 'oom', 'pids_limit'
+  statusChangedAt: timestamp("status_changed_at"),
+  filesMaterializedAt: timestamp("files_materialized_at"), // files as of this time were last written to the runtime directory
+  createdAt: timestamp("created_at").defaultNow().notNull(),
   updatedAt: timestamp("updated_at").defaultNow(),
-});
+}, (table) => [
+  index("idx_repositories_user_created").on(table.userId, table.createdAt, table.id),
+  index("idx_repositories_status").on(table.status),
+]);
 
 export const repositoriesRelations = relations(repositories, ({ one, many }) => ({
   user: one(users, {
@@ -117,12 +231,20 @@ export const repositoriesRelations = relations(repositories, ({ one, many }) =>
   environmentVariables: many(environmentVariables),
 }));
 
-export const insertRepositorySchema = createInsertSchema(repositories).omit({
+export const restartPolicies = ["never", "on-failure", "always"] as const;
+export type RestartPolicy = (typeof restartPolicies)[number];
+
+export const insertRepositorySchema = createInsertSchema(repositories, {
+  restartPolicy: z.enum(restartPolicies).optional(),
+}).omit({
   id: true,
   userId: true,
   createdAt: true,
   updatedAt: true,
   status: true,
+  exitReason: true,
+  statusChangedAt: true,
+  filesMaterializedAt: true,
 });
 
 export type InsertRepository = z.infer<typeof insertRepositorySchema>;
@@ -139,7 +261,9 @@ export const files = pgTable("files", {
   isDirectory: boolean("is_directory").notNull().default(false),
   createdAt: timestamp("created_at").defaultNow(),
   updatedAt: timestamp("updated_at").defaultNow(),
-});
+}, (table) => [
+  uniqueIndex("uq_files_repository_path_name").on(table.repositoryId, table.path, table.name),
+]);
 
 export const filesRelations = relations(files, ({ one }) => ({
   repository: one(repositories, {
@@ -167,7 +291,9 @@ export const environmentVariables = pgTable("environment_variables", {
   value: text("value").notNull(),
   createdAt: timestamp("created_at").defaultNow(),
   updatedAt: timestamp("updated_at").defaultNow(),
-});
+}, (table) => [
+  index("idx_environment_variables_repository").on(table.repositoryId, table.key),
+]);
 
 export const environmentVariablesRelations = relations(environmentVariables, ({ one }) => ({
   repository: one(repositories, {
@@ -198,7 +324,10 @@ export const notifications = pgTable("notifications", {
   isRead: boolean("is_read").notNull().default(false),
   relatedId: uuid("related_id"), // Reference to related entity (balance request, support message, etc.)
   createdAt: timestamp("created_at").defaultNow().notNull(),
-});
+}, (table) => [
+  index("idx_notifications_user_created").on(table.userId, table.createdAt, table.id),
+  index("idx_notifications_unread").on(table.userId).where(sql`${table.isRead} = false`),
+]);
 
 export type Notification = typeof notifications.$inferSelect;
 export type InsertNotification = typeof notifications.$inferInsert;
@@ -211,7 +340,9 @@ export const notes = pgTable("notes", {
   content: text("content").notNull(),
   createdAt: timestamp("created_at").defaultNow().notNull(),
   updatedAt: timestamp("updated_at").defaultNow().notNull(),
-});
+}, (table) => [
+  index("idx_notes_user_updated").on(table.userId, table.updatedAt, table.id),
+]);
 
 export const insertNoteSchema = createInsertSchema(notes).omit({
   id: true,
@@ -221,4 +352,30 @@ export const insertNoteSchema = createInsertSchema(notes).omit({
 });
 
 export type InsertNote = z.infer<typeof insertNoteSchema>;
-export type Note = typeof notes.$inferSelect;
\ No newline at end of file
+export type Note = typeof notes.$inferSelect;
+// Keyset-paginated list responses; pass nextCursor back as ?cursor= for the next page
+export interface Page<T> {
+  items: T[];
+  nextCursor: string | null;
+}
+
+// A listing row when ?fields= may have narrowed it: id plus the requested columns
+export type Projected<T extends { id: string }> = Pick<T, "id"> & Partial<T>;
+
+// Public fields of a user attached to listings
+export interface UserSummary {
+  id: string;
+  username: string;
+  email: string;
+}
+
+export type BalanceRequestWithUser = BalanceRequest & { user: UserSummary | null };
+export type SupportMessageWithUser = SupportMessage & { user: UserSummary | null };
+
+export interface SupportConversation {
+  userId: string;
+  user: UserSummary | null;
+  lastMessage: SupportMessage;
+  messageCount: number;
+  fromUserCount: number;
+}